@@ -255,7 +255,7 @@ class EnMAPBoxProcessingProvider(QgsProcessingProvider):
 
     def refreshAlgorithms(self, *args, **kwargs):
 
-        copies = [a.create() for a in self.algorithms()]
+        copies = [a.createInstance() for a in self.algorithms()]  # do not initialize, e.g. lazily loaded algorithms
         self.removeAlgorithms(self.algorithms())
         super(EnMAPBoxProcessingProvider, self).refreshAlgorithms()
         self.addAlgorithms(copies)
@@ -150,13 +150,12 @@ def mapper_fullrange(params):
 
     # Load and check data:
 
-    wbild, w1nmbild, bilddata = auxfunul.check_load_data(bildname)
+    wbild, w1nmbild, scale, bsh = auxfunul.check_data(bildname)
 
     wlib, w1nmlib, libdata = auxfunul.check_load_data(libname)
 
     # Data Shape
     lsh = libdata.shape
-    bsh = bilddata.shape
 
     # set flags min max
     minn, maxx, minflag, maxflag = auxfunul.compare_wavelengths(w1nmlib, w1nmbild)
@@ -173,10 +172,10 @@ def mapper_fullrange(params):
     # Claculations Image:
     (correlat, bvlss, bvlserr, vnirposmat,
      vnirdepthmat, swirposmat, swirdepthmat,
-     astsum, depthsum, flsum, allessum) = auxfunul.fitting_cvx_fullrange(
-        wbild, interpol_wvls, bilddata,
+     astsum, depthsum, flsum, allessum) = auxfunul.fitting_cvx_fullrange_tiled(
+        wbild, interpol_wvls, bildname,
         libdat_rel_weighted, libdat_rel_chm_weighted, cvxabs_mod, vnir_thr,
-        swir_thr, lib_flag, mix_minerals, fit_threshold
+        swir_thr, lib_flag, mix_minerals, fit_threshold, scale=scale
     )
 
     # Schreib-Funktionen:
@@ -49,6 +49,12 @@ from scipy import ndimage
 from scipy import optimize
 from scipy import spatial
 
+from enmapboxprocessing.blockprocessor import BlockProcessor
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
+from enmapboxprocessing.utils import Utils
+from qgis.core import QgsRectangle
+
+FIT_BLOCK_PIXELS = 1024  # number of pixels per block, see fitting_cvx_fullrange_tiled
 
 # from engeomap import APP_DIR
 
@@ -205,6 +211,36 @@ def check_load_data(bild):
         print("No data load possible! Please check the Files and headers (.hdr)!")
         print("EnGeoMAP execution halted! Please restart the Application.")
     data = data.astype(float)
+    wavelength, nwav1nm = read_wavelength(bild)
+    if numpy.max(data) < 10:
+        print("The image data will be scaled x10k for processing.")
+        data *= 10000.0
+    return wavelength, nwav1nm, data
+
+
+def check_data(bild):
+    # like check_load_data, but without loading the data: the data maximum is found block-wise,
+    # returns the scale factor and the data shape (bands, lines, samples) instead of the data
+    bildh = os.path.basename(bild)
+    print('...checking ' + bildh)
+    ds = gdal.Open(bild)
+    if ds is None:
+        print("No data load possible! Please check the Files and headers (.hdr)!")
+        print("EnGeoMAP execution halted! Please restart the Application.")
+    shape = (ds.RasterCount, ds.RasterYSize, ds.RasterXSize)
+    lines = max(1, FIT_BLOCK_PIXELS // shape[2])
+    maxima = [numpy.max(ds.ReadAsArray(0, yoff, shape[2], min(lines, shape[1] - yoff)).astype(float))
+              for yoff in range(0, shape[1], lines)]
+    del ds
+    wavelength, nwav1nm = read_wavelength(bild)
+    scale = 1.0
+    if numpy.max(maxima) < 10:
+        print("The image data will be scaled x10k for processing.")
+        scale = 10000.0
+    return wavelength, nwav1nm, scale, shape
+
+
+def read_wavelength(bild):
     if '.' in bild:
         bild = bild.split('.')[0]
     hdd = read_hdr_flt(bild + '.hdr')
@@ -214,13 +250,10 @@ def check_load_data(bild):
         wavelength = hdd.Wavelength
     if numpy.max(wavelength) < 30:
         wavelength *= 1000
-    if numpy.max(data) < 10:
-        print("The image data will be scaled x10k for processing.")
-        data *= 10000.0
     maxx = numpy.trunc(numpy.max(wavelength))
     minn = numpy.trunc(numpy.min(wavelength))
     nwav1nm = numpy.arange(minn, maxx, 1)
-    return wavelength, nwav1nm, data
+    return wavelength, nwav1nm
 
 
 def compare_wavelengths(wvlib, wvbild):
@@ -921,6 +954,345 @@ def fitting_cvx_fullrange(
             swirposmat, swirdepthmat, astsum, depthsum, flsum, allessum)
 
 
+# # #
+# # #Tiled Fitting Routines
+# # ##########
+# fitting_cvx_fullrange_tiled streams the image in blocks of pixels and processes each block in a process pool
+# (if GDAL_NUM_THREADS > 1). The per-pixel steps of fitting_cvx_fullrange are computed for all spectra of a block
+# at once; spectra that might fail within the per-pixel steps (zero or non-finite values, flat hull segments)
+# are processed by the per-pixel routines, so that the results match fitting_cvx_fullrange.
+
+def interpolation_matrix(wto, wfrom):
+    # interpolate_1nm_spectrum is linear in the data, so it can be applied to many spectra as a single matrix product
+    unit = numpy.eye(len(wfrom))
+    columns = [interpolate_1nm_spectrum(wto, wfrom, unit[i], flag=None) for i in range(len(wfrom))]
+    if any(column is None for column in columns):
+        return None
+    return numpy.array(columns)
+
+
+def upper_hull_batch(wv, spc):
+    # vertices of the upper convex hull of many spectra (rows) at once, using a batched monotone chain;
+    # returns a boolean mask (spectra x wavelengths)
+    npix, n = spc.shape
+    rows = numpy.arange(npix)
+    stack = numpy.zeros([npix, n], dtype=int)
+    stack[:, 1] = 1
+    size = numpy.full(npix, 2)
+    for k in range(2, n):
+        active = rows
+        while len(active) > 0:
+            o = stack[active, size[active] - 2]
+            a = stack[active, size[active] - 1]
+            yo = spc[active, o]
+            cross = (wv[a] - wv[o]) * (spc[active, k] - yo) - (spc[active, a] - yo) * (wv[k] - wv[o])
+            active = active[cross >= 0]  # pop vertices that are not strictly above the new hull edge
+            size[active] -= 1
+            active = active[size[active] >= 2]
+        stack[rows, size] = k
+        size += 1
+    vertices = numpy.zeros([npix, n], dtype=bool)
+    used = numpy.arange(n)[None, :] < size[:, None]
+    vertices[numpy.nonzero(used)[0], stack[used]] = True
+    return vertices
+
+
+def interp_vertices_batch(wv, spc, vertices):
+    # same as numpy.interp(wv, wv[vertices[j]], spc[j, vertices[j]]) for each spectrum j
+    n = len(wv)
+    columns = numpy.arange(n)
+    left = numpy.maximum.accumulate(numpy.where(vertices, columns, 0), axis=1)
+    right = numpy.minimum.accumulate(numpy.where(vertices, columns, n - 1)[:, ::-1], axis=1)[:, ::-1]
+    yleft = numpy.take_along_axis(spc, left, axis=1)
+    yright = numpy.take_along_axis(spc, right, axis=1)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        slope = (yright - yleft) / (wv[right] - wv[left])
+        return numpy.where(vertices, spc, slope * (wv - wv[left]) + yleft)
+
+
+def cvx_hull_batch(daten, wv):
+    # cvx_hull (cont_switch=1) for many spectra (rows) at once;
+    # flat is True for spectra with a flat hull segment, for which spatial.ConvexHull may fail
+    schp = getrange(wv)
+    segments = [
+        generic_1nm_data_feat_grabber(wv[0], schp[1, 0], wv, wv)[0][0],
+        generic_1nm_data_feat_grabber(schp[1, 1], schp[1, 2], wv, wv)[0][0],
+        generic_1nm_data_feat_grabber(schp[1, 1], wv[-1], wv, wv)[0][0]
+    ]
+    flat = numpy.zeros([daten.shape[0]], dtype=bool)
+    huell = []
+    for index in segments:
+        spc = daten[:, index]
+        if len(index) < 3:
+            flat[:] = True
+            huell.append(spc)
+            continue
+        vertices = upper_hull_batch(wv[index], spc)
+        hull = interp_vertices_batch(wv[index], spc, vertices)
+        tolerance = 1e-9 * numpy.max(numpy.abs(spc), axis=1)
+        flat |= (numpy.sum(vertices, axis=1) == 2) & numpy.all(hull - spc <= tolerance[:, None], axis=1)
+        flat |= numpy.ptp(spc, axis=1) <= tolerance  # constant up to rounding, e.g. after interpolation
+        huell.append(hull)
+    wavv = numpy.concatenate([wv[index] for index in segments])
+    huell = numpy.concatenate(huell, axis=1)
+    hullfinal = numpy.zeros_like(daten)
+    for j in range(daten.shape[0]):
+        hullfinal[j] = numpy.interp(wv, wavv, huell[j])
+    rmrel = numpy.nan_to_num(daten / hullfinal)
+    rmabs = numpy.nan_to_num(hullfinal - daten)
+    numpy.place(rmrel, rmrel > 1, 1)
+    numpy.place(rmrel, rmrel < 0, 0)
+    numpy.place(rmabs, rmabs < 0, 0)
+    return rmabs, rmrel, hullfinal, flat
+
+
+def feature_runs(mask):
+    # features (runs of True values) along the rows of a 2d mask, like ndimage.label for each row;
+    # returns row, first and last + 1 column of each feature,
+    # the flat indices of all feature elements and the offset of each feature inside the flat indices
+    edges = numpy.diff(numpy.pad(mask, ((0, 0), (1, 1))).astype(numpy.int8), axis=1)
+    rows, starts = numpy.nonzero(edges == 1)
+    stops = numpy.nonzero(edges == -1)[1]
+    index = numpy.flatnonzero(mask)
+    offsets = numpy.cumsum(stops - starts) - (stops - starts)
+    return rows, starts, stops, index, offsets
+
+
+def scrut_weigh3_batch(rm_abs, rm_rel, wav, vnir_thr, swir_thr):
+    # scrut_weigh3 for many spectra (rows) at once; valid is False for spectra, for which scrut_weigh3 fails
+    valid = numpy.sum(rm_rel, axis=1) != 0
+    r_abs_mod = rm_abs.copy()
+    r_rel = rm_rel.copy()
+    rows, starts, stops, index, offsets = feature_runs(rm_abs != 0)
+    if len(starts) > 0:
+        maxi = numpy.maximum.reduceat(r_abs_mod.ravel()[index], offsets)
+        threshold = numpy.where(wav[starts] < 1000, vnir_thr * 10000, swir_thr * 10000)
+        wasserband = ((wav >= 1290) & (wav <= 1450)) | ((wav >= 1750) & (wav <= 2010))
+        wasserband = numpy.concatenate([[0], numpy.cumsum(wasserband)])
+        dropped = (wasserband[stops] - wasserband[starts] > 0) | (maxi <= threshold)
+        dropped = index[numpy.repeat(dropped, stops - starts)]
+        r_abs_mod.ravel()[dropped] = 0
+        r_rel.ravel()[dropped] = 1
+    r_rel = 1 - r_rel
+    vnir = wav < 1250
+    if not numpy.any(vnir):
+        valid[:] = False
+        vnir[:] = True  # results are not used
+    vnirmax = numpy.max(r_abs_mod[:, vnir], axis=1)
+    posvnirmax = wav[vnir][numpy.argmax(r_abs_mod[:, vnir], axis=1)]
+    swirmax = numpy.zeros_like(vnirmax)
+    posswirmax = numpy.zeros_like(vnirmax)
+    if numpy.max(wav) >= 1250:
+        swir = wav >= 1250
+        swirmax = numpy.max(r_abs_mod[:, swir], axis=1)
+        posswirmax = wav[swir][numpy.argmax(r_abs_mod[:, swir], axis=1)]
+    return r_abs_mod, r_rel, vnirmax, swirmax, posvnirmax, posswirmax, valid
+
+
+def weighting_lib2_batch(rm_rel, wav):
+    # weighting_lib2 for many spectra (rows) at once; valid is False for spectra, for which weighting_lib2 fails
+    w = rm_rel.copy()
+    valid = numpy.sum(w, axis=1) != 0
+    astsum = numpy.zeros([w.shape[0]])
+    depthsum = numpy.zeros([w.shape[0]])
+    flsum = numpy.zeros([w.shape[0]])
+    allessum = numpy.zeros([w.shape[0]])
+    fwhm = wav - numpy.roll(wav, 1)
+    fwhm[0] = fwhm[1]
+    rows, starts, stops, index, offsets = feature_runs((w != 0) & valid[:, None])
+    if len(starts) == 0:
+        return w, astsum, depthsum, flsum, allessum, valid
+    lenvec = stops - starts
+    values = w.ravel()[index]
+    depthvec = numpy.maximum.reduceat(values, offsets)
+    flvec = numpy.add.reduceat(fwhm[index % w.shape[1]] * values, offsets)
+    ast = depthvec / lenvec
+    first = numpy.flatnonzero(numpy.diff(rows, prepend=-1))  # first feature of each spectrum
+    owners = rows[first]
+    astsum[owners] = numpy.add.reduceat(ast, first)
+    ast /= astsum[rows]
+    depthsum[owners] = numpy.add.reduceat(depthvec, first)
+    flsum[owners] = numpy.add.reduceat(flvec, first)
+    flvec /= flsum[rows]
+    depthvec /= depthsum[rows]
+    alles = (ast + flvec + depthvec) / 3.0
+    allessum[owners] = numpy.add.reduceat(alles, first)
+    alles /= allessum[rows]
+    w.ravel()[index] = values * numpy.repeat(alles, lenvec)
+    return w, astsum, depthsum, flsum, allessum, valid
+
+
+def corr_batch(libdat_rel_weighted, w_rel_scale):
+    # corr for many spectra (rows) at once, as a single matrix product; returns library entries x spectra
+    lib = libdat_rel_weighted - libdat_rel_weighted.mean(axis=1, keepdims=True)
+    spc = w_rel_scale - w_rel_scale.mean(axis=1, keepdims=True)
+    fact = lib.shape[1] - 1
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        correlate = numpy.dot(lib, spc.T) / fact
+        correlate /= numpy.sqrt(numpy.sum(spc * spc, axis=1) / fact)[None, :]
+        correlate /= numpy.sqrt(numpy.sum(lib * lib, axis=1) / fact)[:, None]
+    numpy.clip(correlate, -1, 1, out=correlate)
+    correlate = numpy.nan_to_num(correlate)
+    correlate[~numpy.isfinite(correlate)] = 0
+    numpy.place(correlate, correlate <= 0, 0)
+    return correlate
+
+
+def fit_pixel_cvx_fullrange(spectrum, wfrom, wto, libdat_rel_weighted, libdat_abs, vnir_thr, swir_thr):
+    # feature fitting and bvls for a single spectrum, as in fitting_cvx_fullrange;
+    # returns correlat, bvlss, bvlserr, vnirpos, vnirdepth, swirpos, swirdepth, astsum, depthsum, flsum, allessum
+    lshape = libdat_rel_weighted.shape
+    correlat = numpy.zeros([lshape[0]])
+    bvlss = numpy.zeros([lshape[0]])
+    output = interpolate_1nm_spectrum(wto, wfrom, spectrum, flag=None)
+    if numpy.sum(output == 0):
+        return (correlat, bvlss, 1) + (-1,) * 8
+    bvlserr = 9999
+    fitting = [0] * 8
+    absolutee = None
+    try:
+        rm_abs_dat, rm_rel_dat, hull_dat = cvx_hull(output, wto, cont_switch=1)
+        absolutee, relativee, fitting[1], fitting[3], fitting[0], fitting[2] = scrut_weigh3(
+            rm_abs_dat, rm_rel_dat, wto, vnir_thr, swir_thr)
+        w_rel_scale, w_rel_chm_scale, fitting[4], fitting[5], fitting[6], fitting[7] = weighting_lib2(relativee, wto)
+        correlat = corr(libdat_rel_weighted, w_rel_scale)
+        correlat[~numpy.isfinite(correlat)] = 0
+        numpy.place(correlat, correlat <= 0, 0)
+    except Exception:
+        pass
+    if absolutee is not None:
+        try:
+            bvlss, bvlserr = unmixxx(libdat_abs, absolutee, correlat, thresh=0.5)
+        except Exception:
+            bvlserr = 9999
+    return (correlat, bvlss, bvlserr) + tuple(fitting)
+
+
+def fit_block_cvx_fullrange(data, wfrom, wto, matrix, libdat_rel_weighted, libdat_abs, vnir_thr, swir_thr):
+    # feature fitting and bvls for a block of spectra (bands x pixels), see fitting_cvx_fullrange_tiled;
+    # returns correlat, bvlss, bvlserr, vnirposmat, vnirdepthmat, swirposmat, swirdepthmat,
+    # astsum, depthsum, flsum, allessum
+    lshape = libdat_rel_weighted.shape
+    npix = data.shape[1]
+    correlat = numpy.zeros([lshape[0], npix])
+    bvlss = numpy.zeros([lshape[0], npix])
+    bvlserr = numpy.ones([npix])
+    fitting = numpy.zeros([8, npix])  # vnirpos, vnirdepth, swirpos, swirdepth, astsum, depthsum, flsum, allessum
+    spectra = data.T
+
+    # spectra with zero or non-finite values are processed per pixel, because the zero check of the interpolated
+    # spectrum is sensitive to rounding
+    legacy = numpy.any((spectra == 0) | ~numpy.isfinite(spectra), axis=1)
+    if matrix is None or getrange(wto).shape[1] != 4:
+        legacy[:] = True
+    fast = numpy.flatnonzero(~legacy)
+    output = numpy.dot(spectra[fast], matrix) if len(fast) > 0 else numpy.zeros([0, len(wto)])
+
+    zero = numpy.any(output == 0, axis=1)
+    fitting[:, fast[zero]] = -1
+    fast = fast[~zero]
+    output = output[~zero]
+
+    if len(fast) > 0:
+        rm_abs_dat, rm_rel_dat, hull_dat, flat = cvx_hull_batch(output, wto)
+        legacy[fast[flat]] = True
+        fast = fast[~flat]
+        absolutee, relativee, vnirdepth, swirdepth, vnirpos, swirpos, valid = scrut_weigh3_batch(
+            rm_abs_dat[~flat], rm_rel_dat[~flat], wto, vnir_thr, swir_thr)
+        bvlserr[fast[~valid]] = 9999
+        absolutee = absolutee[valid]
+        fast = fast[valid]
+        fitting[:4, fast] = vnirpos[valid], vnirdepth[valid], swirpos[valid], swirdepth[valid]
+        w_rel_scale, astsum, depthsum, flsum, allessum, weighted = weighting_lib2_batch(relativee[valid], wto)
+        fitting[4:, fast[weighted]] = astsum[weighted], depthsum[weighted], flsum[weighted], allessum[weighted]
+        correlat[:, fast[weighted]] = corr_batch(libdat_rel_weighted, w_rel_scale[weighted])
+        for j, absolute in zip(fast, absolutee):
+            try:
+                bvlss[:, j], bvlserr[j] = unmixxx(libdat_abs, absolute, correlat[:, j], thresh=0.5)
+            except Exception:
+                bvlserr[j] = 9999
+
+    for j in numpy.flatnonzero(legacy):
+        result = fit_pixel_cvx_fullrange(spectra[j], wfrom, wto, libdat_rel_weighted, libdat_abs, vnir_thr, swir_thr)
+        correlat[:, j], bvlss[:, j], bvlserr[j] = result[:3]
+        fitting[:, j] = result[3:]
+
+    return (correlat, bvlss, bvlserr) + tuple(fitting)
+
+
+def fitting_cvx_fullrange_tiled(
+    wfrom,
+    wto,
+    data,
+    libdat_rel_weighted,
+    libdat_rel_chm_weighted,
+    libdat_abs, vnir_thr=0.00,
+    swir_thr=0.00,
+    lib_flag=0,
+    mix_minerals=6,
+    fit_threshold=0.5,
+    scale=1.0,
+    parallelism=None
+):
+    # same results as fitting_cvx_fullrange, but data is either the image (bands x lines x samples)
+    # or the filename of the image, which is then read block-wise; data is multiplied by scale (see check_data);
+    # blocks are processed in a process pool, if parallelism (default is GDAL_NUM_THREADS) is greater than 1
+    print('...feature fitting and bvls...')
+    if isinstance(data, str):
+        ds = gdal.Open(data)
+        shape = (ds.RasterCount, ds.RasterYSize, ds.RasterXSize)
+        del ds
+    else:
+        shape = data.shape
+    if parallelism is None:
+        parallelism = Utils.parallelism()
+    lshape = libdat_rel_weighted.shape
+    npix = shape[1] * shape[2]
+    results = (numpy.zeros([lshape[0], npix]), numpy.zeros([lshape[0], npix])) + tuple(
+        numpy.zeros([npix]) for i in range(9))
+    lines = max(1, FIT_BLOCK_PIXELS // shape[2])
+    blocks = [RasterBlockInfo(QgsRectangle(), 0, yoff, shape[2], min(lines, shape[1] - yoff))
+              for yoff in range(0, shape[1], lines)]
+
+    def createSlot():
+        if isinstance(data, str):
+            return gdal.Open(data)
+        return None
+
+    def readBlock(slot, block: RasterBlockInfo):
+        if slot is None:
+            array = data[:, block.yOffset: block.yOffset + block.height].astype(float)
+        else:
+            array = slot.ReadAsArray(0, block.yOffset, block.width, block.height).astype(float)
+        if scale != 1.0:
+            array *= scale
+        return array.reshape(shape[0], block.height * block.width)
+
+    def writeBlock(block: RasterBlockInfo, result):
+        start = block.yOffset * block.width
+        stop = start + block.height * block.width
+        for array, values in zip(results, result):
+            array[..., start:stop] = values
+
+    # the library and the interpolation matrix are passed once to each worker process, not with each block
+    initargs = (wfrom, wto, interpolation_matrix(wto, wfrom), libdat_rel_weighted, libdat_abs, vnir_thr, swir_thr)
+    processor = BlockProcessor(parallelism, useProcesses=True, initializer=init_fit_block, initargs=initargs)
+    processor.run(blocks, readBlock, fit_block, writeBlock, createSlot)
+    return results
+
+
+FIT_BLOCK_ARGS = None  # arguments of fit_block_cvx_fullrange shared by all blocks, see init_fit_block
+
+
+def init_fit_block(*args):
+    global FIT_BLOCK_ARGS
+    FIT_BLOCK_ARGS = args
+
+
+def fit_block(data):
+    return fit_block_cvx_fullrange(data, *FIT_BLOCK_ARGS)
+
+
 # def fitting_cvx_fullrange_lo(wfrom, wto, data, libdat_rel_weighted, libdat_rel_chm_weighted, libdat_abs, vnir_thr,
 #                              swir_thr, lib_flag, mix_minerals, fit_threshold):
 #     dshape2 = data.shape
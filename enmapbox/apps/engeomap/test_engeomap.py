@@ -2,8 +2,10 @@ import os.path
 import unittest
 from pathlib import Path
 
+import numpy as np
 from osgeo import gdal
 
+from engeomap import engeomap_aux_funcul as auxfunul
 from engeomap.enmapboxintegration import EnGeoMAP
 from engeomap.userinterfaces import EnGeoMAPGUI, Worker
 from enmapbox import initAll
@@ -80,6 +82,43 @@ class EnGeoMAPTests(EnMAPBoxTestCase):
             for f in files:
                 os.remove(f)
 
+    def test_fitting_cvx_fullrange_tiled(self):
+        np.random.seed(42)
+        wavelength = np.arange(420, 2450, 10.)
+        wto = np.arange(420, 2440, 1.)
+
+        def absorption(center, width, depth):
+            return 1 - depth * np.exp(-0.5 * ((wavelength - center) / width) ** 2)
+
+        background = 3000 + wavelength
+        library = np.array([
+            background * absorption(900, 60, 0.3),
+            background * absorption(2200, 20, 0.4),
+            background * absorption(2330, 25, 0.3) * absorption(1000, 80, 0.1),
+        ])
+        cvxabs_mod, cvxrel_mod, libdat_rel_weighted, libdat_rel_chm_weighted, vnirmax, swirmax = \
+            auxfunul.treat_library_cvx_full_range(wavelength, library, wto)
+
+        fractions = np.random.dirichlet(np.ones(len(library)), 12)
+        spectra = fractions.dot(library) + np.random.normal(0, 5, (12, len(wavelength)))
+        spectra[3] = 0  # zero pixel
+        spectra[7] = 1000  # constant pixel
+        data = spectra.T.reshape(len(wavelength), 3, 4)
+
+        legacy = auxfunul.fitting_cvx_fullrange(
+            wavelength, wto, data.copy(), libdat_rel_weighted, libdat_rel_chm_weighted, cvxabs_mod
+        )
+        tiled = auxfunul.fitting_cvx_fullrange_tiled(
+            wavelength, wto, data, libdat_rel_weighted, libdat_rel_chm_weighted, cvxabs_mod, parallelism=1
+        )
+        self.assertEqual(len(legacy), len(tiled))
+        for i, (a, b) in enumerate(zip(legacy, tiled)):
+            if i == 2:  # bvlserr is only comparable where the legacy implementation defines it
+                valid = np.isfinite(a)
+                self.assertTrue(np.any(valid))
+                a, b = a[valid], b[valid]
+            np.testing.assert_allclose(a, b, rtol=1e-6, atol=1e-6)
+
 
 if __name__ == "__main__":
     unittest.main(buffer=False)
@@ -6,6 +6,7 @@
 import builtins
 import csv
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from ensomap import hys
 import numpy as np
@@ -215,7 +216,12 @@ class data:
         self.bs[-1] = block_size_last
         self.bp = np.arange(self.bn, dtype='i4') * block_size
 
-    def read(self, BLOCK=None, tile=None):
+    def read(self, BLOCK=None, tile=None, band_range=None):
+        # band_range = (first band, last band + 1) restricts the bands read from a hyperspectral image
+        first_band = 0
+        last_band = self.bands
+        if band_range is not None and type(self) is hys.cube:
+            first_band, last_band = band_range
         f = open(self.fname, 'rb')
         # get size corresponding to the type of the data
         if self.meta.get('data type') == '1':
@@ -277,26 +283,26 @@ class data:
         # case interleave is 'bsq'
         if self.meta.get('interleave').upper() == 'BSQ':
             # im  = np.zeros((ydim, self.samples, self.bands), dtype=dtype)
-            im = np.zeros((self.bands, ydim, self.samples), dtype=dtype)
-            for k in range(self.bands):
+            im = np.zeros((last_band - first_band, ydim, self.samples), dtype=dtype)
+            for k in range(first_band, last_band):
                 pt = off + tsize * (ypos * self.samples + k * self.lines * self.samples)
                 f.seek(pt, 0)
                 imk = np.fromfile(f, dtype=dtype, count=ydim * self.samples)
                 # im[:,:,k] = np.reshape(imk, (ydim, self.samples))
-                im[k, :, :] = np.reshape(imk, (ydim, self.samples))
+                im[k - first_band, :, :] = np.reshape(imk, (ydim, self.samples))
 
         elif self.meta.get('interleave').upper() == 'BIL':
             f.seek(pt, 0)
             im = np.fromfile(f, dtype=dtype, count=ydim * self.samples * self.bands)
             im = np.reshape(im, (ydim, self.bands, self.samples))
             # im = np.swapaxes(im, 1, 2)
-            im = np.swapaxes(im, 0, 1)
+            im = np.swapaxes(im, 0, 1)[first_band:last_band]
         elif self.meta.get('interleave').upper() == 'BIP':
             f.seek(pt, 0)
             im = np.fromfile(f, dtype=dtype, count=ydim * self.samples * self.bands)
             im = np.reshape(im, (ydim, self.samples, self.bands))
             im = np.swapaxes(im, 1, 2)
-            im = np.swapaxes(im, 0, 1)
+            im = np.swapaxes(im, 0, 1)[first_band:last_band]
         f.close()
         # transform image
         if type(self) is hys.cube or type(self) is hys.SpectralLibrary:
@@ -324,6 +330,17 @@ class data:
         # return the image
         return im
 
+    def read_tiles(self, band_range=None):
+        # iterate over all tiles (see tile_data) and yield (tile, image),
+        # the next tile is read in the background while the current tile is processed
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(self.read, tile=0, band_range=band_range)
+            for k in range(self.bn):
+                im = future.result()
+                if k + 1 < self.bn:
+                    future = executor.submit(self.read, tile=k + 1, band_range=band_range)
+                yield k, im
+
     def import_header(self, src):
         meta = {}  # initialization of the meta dictionary
         meta["description"] = "File generated by EnSoMAP"
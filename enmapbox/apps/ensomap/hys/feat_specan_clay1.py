@@ -28,17 +28,18 @@ def check_bands(ubands, wvl):
     return True, "Has been calculated!\n"
 
 
-@nb.jit(nb.float32[:, :](nb.float32[:, :, :], nb.float32[:], nb.int32[:], nb.int32[:, :]), nopython=True, fastmath=True)
+@nb.jit(nb.float32[:, :](nb.float32[:, :, :], nb.float32[:], nb.int32[:], nb.int32[:, :]), nopython=True, fastmath=True,
+        parallel=True, cache=True)
 def process(cube, wvl, ind, mask):
     ny = cube.shape[1]
     nx = cube.shape[2]
     nc = ind[1] - ind[0]
     out = np.zeros((ny, nx), dtype=np.float32)
     x = np.zeros((nc), dtype=np.float32)
-    y = np.zeros((nc), dtype=np.float32)
     for kc in range(nc):
         x[kc] = wvl[kc + ind[0]]
-    for ky in range(ny):
+    for ky in nb.prange(ny):
+        y = np.zeros((nc), dtype=np.float32)
         for kx in range(nx):
             if mask is not None:
                 if mask[ky, kx] == 0:
@@ -32,12 +32,13 @@ def check_bands(ubands, wvl):
     return True, "Has been calculated!\n"
 
 
-@nb.jit(nb.float32[:, :](nb.float32[:, :, :], nb.float32[:], nb.int32[:], nb.int32[:, :]), nopython=True, fastmath=True)
+@nb.jit(nb.float32[:, :](nb.float32[:, :, :], nb.float32[:], nb.int32[:], nb.int32[:, :]), nopython=True, fastmath=True,
+        parallel=True, cache=True)
 def process(cube, wvl, ind, mask):
     ny = cube.shape[1]
     nx = cube.shape[2]
     out = np.zeros((ny, nx), dtype=np.float32)
-    for ky in range(ny):
+    for ky in nb.prange(ny):
         for kx in range(nx):
             if mask is not None:
                 if mask[ky, kx] == 0:
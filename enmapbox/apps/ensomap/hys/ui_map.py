@@ -36,6 +36,15 @@ def _get_prop(module, wid):
     return prop
 
 
+def _get_band_range(soil, cube, n_bands):
+    # return (first band, last band + 1) used by the selected soil features,
+    # band indices of the soil features need to be shifted by the first band
+    bands = [ind for item in soil.values() if item['wid'].isChecked() for ind in item['bands']]
+    if len(bands) == 0 or type(cube) is not hys.cube:
+        return 0, n_bands
+    return int(min(bands)), int(max(bands)) + 1
+
+
 class ui_map:
 
     def __init__(self, parent=None):
@@ -357,15 +366,18 @@ class ui_map:
         if self.map_mask is not None:
             self.map_mask.tile_data()
 
+        # only read the range of bands used by the selected soil features
+        first_band, last_band = _get_band_range(self.map_soil, self.map_cube, len(wvl))
+        wvl_tile = wvl[first_band:last_band]
+
         # intialize the loop
         t1 = time.time()
         self.gui.gui['map_prog_bar'].setMinimum(0)
         self.gui.gui['map_prog_bar'].setMaximum(self.map_cube.bn)
 
-        # loop of tiles
-        for k in range(self.map_cube.bn):
+        # loop of tiles (the soil features are processed in parallel over the lines of a tile)
+        for k, im in self.map_cube.read_tiles(band_range=(first_band, last_band)):
             self.gui.gui['map_prog_bar'].setValue(k + 1)
-            im = self.map_cube.read(tile=k)
             mk = np.ones((im.shape[1], im.shape[2]), dtype=np.int32)
             if self.map_mask is not None:
                 mk = self.map_mask.read(tile=k)
@@ -373,8 +385,8 @@ class ui_map:
             for key, item in self.map_soil.items():
                 if item['wid'].isChecked() is False:
                     continue
-                ind = np.asarray(item['bands'])
-                prod = item['mod'].process(im, wvl, ind, mk)
+                ind = np.asarray(item['bands'], dtype=np.int32) - np.int32(first_band)
+                prod = item['mod'].process(im, wvl_tile, ind, mk)
                 item['data'].write(np.asarray(prod), tile=k)
         msg = "Processing complete in %8.2f seconds" % (time.time() - t1)
         hys.display_information(self, msg)
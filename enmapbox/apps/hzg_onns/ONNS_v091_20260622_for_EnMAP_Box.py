@@ -11,7 +11,6 @@ import numpy as np
 # import gdal, osr
 from netCDF4 import Dataset as nc
 # import matplotlib.pyplot as plt
-from scipy.spatial.distance import mahalanobis
 from scipy.stats import chi2
 
 np.seterr(divide='ignore', invalid='ignore')  # MH: Ignore RuntimeWarnings
@@ -723,11 +722,7 @@ def sensor_band_adapter(
 
             nn3 = nnhs.nnhs(os.path.join(path_to_NN, netz))
 
-            out1 = np.zeros([Rrs_in.shape[0], 11])
-
-            for ll in range(rrs.shape[0]):
-                input = np.hstack([rrs[ll, 1:]])
-                out1[ll, :] = nn3.ff_nnhs(input)
+            out1 = nn3.ff_nnhs_batch(rrs[:, 1:])
 
             Rrs_ONNS_new = np.zeros(out1.shape)
 
@@ -737,11 +732,7 @@ def sensor_band_adapter(
 
             nn3 = nnhs.nnhs(os.path.join(path_to_NN, netz))
 
-            out1 = np.zeros([Rrs_in.shape[0], 11])
-
-            for ll in range(rrs.shape[0]):
-                input = np.hstack([rrs[ll, 1:]])
-                out1[ll, :] = nn3.ff_nnhs(input)
+            out1 = nn3.ff_nnhs_batch(rrs[:, 1:])
 
             Rrs_ONNS_new = np.zeros(out1.shape)
 
@@ -760,11 +751,7 @@ def sensor_band_adapter(
 
             nn3 = nnhs.nnhs(os.path.join(path_to_NN, netz))
 
-            out1 = np.zeros([Rrs_in.shape[0], 11])
-
-            for ll in range(rrs.shape[0]):
-                input = np.hstack([rrs[ll, :]])
-                out1[ll, :] = nn3.ff_nnhs(input)
+            out1 = nn3.ff_nnhs_batch(rrs)
 
             Rrs_ONNS_new = np.zeros(out1.shape)
 
@@ -775,11 +762,7 @@ def sensor_band_adapter(
 
             nn3 = nnhs.nnhs(os.path.join(path_to_NN, netz))
 
-            out1 = np.zeros([Rrs_in.shape[0], 11])
-
-            for ll in range(rrs.shape[0]):
-                input = np.hstack([rrs[ll, :]])
-                out1[ll, :] = nn3.ff_nnhs(input)
+            out1 = nn3.ff_nnhs_batch(rrs)
 
             Rrs_ONNS_new = np.zeros(out1.shape)
 
@@ -831,13 +814,7 @@ def sensor_band_adapter(
 
         nn3 = nnhs.nnhs(os.path.join(path_to_NN, netz))
 
-        a = rrs[:, :]
-
-        out1 = np.zeros(Rrs_ONNS_new.shape)
-
-        for ll in range(rrs.shape[0]):
-            input = np.hstack([a[ll, :]])
-            out1[ll, :] = nn3.ff_nnhs(input)
+        out1 = nn3.ff_nnhs_batch(rrs)
 
         Rrs_ONNS_new[:, :] = 10 ** out1[:, :] - 0.001
 
@@ -864,7 +841,7 @@ def classify_clustering_fuzzy(
     # Read scene or data.
 
     weights = (0.1, 0.5, 1, 1, 1, 1, 1, 1, 0.8, 0.8, 0.2)  # MH: Wheighting of influence of singel wave bands
-    weights = np.array([np.float(x) for x in weights])
+    weights = np.array([float(x) for x in weights])
 
     #
     # read parameters from log-file of Clustering!
@@ -954,21 +931,21 @@ def classify_clustering_fuzzy(
 
         if scaled:
 
-            dist[:, i] = np.apply_along_axis(lambda x: np.sum(weights * (x - new_means[0:(Nvar), i]) ** 2 / diagVI), 1,
-                                             d_all[:, 0:(Nvar)])  # pseudo-mahalanobis with weights!
+            delta = d_all[:, 0:(Nvar)] - new_means[0:(Nvar), i]
+            dist[:, i] = np.sum(weights * delta ** 2 / diagVI, axis=1)  # pseudo-mahalanobis with weights!
 
         else:
 
-            dist[:, i] = np.apply_along_axis(lambda x: mahalanobis(u=x, v=new_means[0:(Nvar), i], VI=VI) ** 2, 1,
-                                             d_all[:, 0:(Nvar)])
+            delta = d_all[:, 0:(Nvar)] - new_means[0:(Nvar), i]
+            dist[:, i] = np.einsum('ij,jk,ik->i', delta, VI, delta)  # squared mahalanobis distance
 
         m[:, i] = 1 - chi2.cdf(x=dist[:, i], df=Nvar)
 
-    total_membership = np.apply_along_axis(lambda x: np.sum(x), 1, m)
+    total_membership = np.sum(m, axis=1)
 
-    maxMemb = np.apply_along_axis(lambda x: np.array(list(range(1, Ncluster + 1)))[x == np.max(x)][0], 1, m)
+    maxMemb = np.argmax(m, axis=1) + 1  # MH: first OWT with maximum membership
 
-    id = np.apply_along_axis(lambda x: np.max(x), 1, m) > 10 ** -9
+    id = np.max(m, axis=1) > 10 ** -9
 
     maxMemb[np.logical_not(id)] = 0
 
@@ -979,7 +956,7 @@ def classify_clustering_fuzzy(
     id = m2 < 10 ** -4  # MH: this weight threshold is from Moore et al. 2001, if it is 10**-5, more pixel are valid
     m2[id] = 0
 
-    total_membership = np.apply_along_axis(lambda x: np.sum(x), 1, m2)  # MH: total membership can be above 1
+    total_membership = np.sum(m2, axis=1)  # MH: total membership can be above 1
 
     # maxMemb   = np.apply_along_axis(lambda x: np.array(range(1, Nclass + 1))[x == np.max(x)][0], 1, m)
 
@@ -1052,18 +1029,9 @@ def ONNS(path_to_NN, Rrs_ONNS, m2):
 
             nn2 = nnhs.nnhs(os.path.join(path_to_NN, NNname))
 
-            out1 = np.zeros((np.sum(ID), nn2.noutp)) * np.nan
-
             a = rrs[ID, :]  # MH: log-transformed Rrs + 0.001
 
-            for ll in range(np.sum(ID)):
-                input = np.hstack([a[ll, :]])
-                out1[ll, :] = nn2.ff_nnhs(input)
-
-            for k in range(nn2.noutp):
-                total_out[ID, i, k] = out1[:, k]
-
-            del out1  # MH: clear workspace
+            total_out[ID, i, :] = nn2.ff_nnhs_batch(a)
 
         #
         # Combine NN results with memberships per water class and write to nc-product.
@@ -1078,8 +1046,7 @@ def ONNS(path_to_NN, Rrs_ONNS, m2):
 
                 a = total_out[:, :, i]
 
-                bbb = np.zeros(rrs.shape[0], )
-                bbb = np.apply_along_axis(lambda x: np.sum(x), 1, m2 * a)
+                bbb = np.sum(m2 * a, axis=1)
 
                 bbb = 10 ** bbb - 0.001  # MH: Transform from log10(X + 0.001)
 
@@ -1093,8 +1060,7 @@ def ONNS(path_to_NN, Rrs_ONNS, m2):
 
                 a = total_out[:, :, i]
 
-                bbb = np.zeros(rrs.shape[0], )
-                bbb = np.apply_along_axis(lambda x: np.sum(x), 1, m2 * a)
+                bbb = np.sum(m2 * a, axis=1)
 
                 if i == 0:  # MH: first variable (FU) is not logarithmized
 
@@ -1110,8 +1076,7 @@ def ONNS(path_to_NN, Rrs_ONNS, m2):
 
                 a = total_out[:, :, i]
 
-                bbb = np.zeros(rrs.shape[0], )
-                bbb = np.apply_along_axis(lambda x: np.sum(x), 1, m2 * a)
+                bbb = np.sum(m2 * a, axis=1)
 
                 bbb = 10 ** bbb - 0.001  # MH: Transform from log10(X + 0.001)
 
@@ -1144,10 +1109,7 @@ def background_NN(path_to_NN, Rrs_ONNS):  # MH: alternative NNs that are applied
 
     lambda_ONNS = [400, 412.5, 442.5, 490, 510, 560, 620, 665, 755, 777.5, 865]
 
-    lambda_Rrs_max = np.empty([index_Rrs_max.shape[0], ])
-
-    for i in range(0, index_Rrs_max.shape[0]):
-        lambda_Rrs_max[i] = lambda_ONNS[index_Rrs_max[i]]
+    lambda_Rrs_max = np.array(lambda_ONNS)[index_Rrs_max]
 
     total_out_bNN = np.zeros((rrs.shape[0], 13))  # MH: 13 is number of total output off all 3 networks
 
@@ -1168,14 +1130,11 @@ def background_NN(path_to_NN, Rrs_ONNS):  # MH: alternative NNs that are applied
     nn2 = nnhs.nnhs(os.path.join(path_to_NN, netz2))
     nn3 = nnhs.nnhs(os.path.join(path_to_NN, netz3))
 
-    for ll in range(len(ID)):
-        input = np.hstack([rrs[ID[ll], :]])
+    out1[ID, :] = nn1.ff_nnhs_batch(rrs[ID, :])
+    out2[ID, :] = nn2.ff_nnhs_batch(rrs[ID, :])
+    out3[ID, :] = nn3.ff_nnhs_batch(rrs[ID, :])
 
-        out1[ID[ll], :] = nn1.ff_nnhs(input)
-        out2[ID[ll], :] = nn2.ff_nnhs(input)
-        out3[ID[ll], :] = nn3.ff_nnhs(input)
-
-        #
+    #
     # Case 2 --> maximum of Rrs >= 490 nm
 
     ID = np.where(Case is False)[0]  # MH: List with Case 2 cases
@@ -1188,14 +1147,11 @@ def background_NN(path_to_NN, Rrs_ONNS):  # MH: alternative NNs that are applied
     nn2 = nnhs.nnhs(os.path.join(path_to_NN, netz2))
     nn3 = nnhs.nnhs(os.path.join(path_to_NN, netz3))
 
-    for ll in range(len(ID)):
-        input = np.hstack([rrs[ID[ll], :]])
+    out1[ID, :] = nn1.ff_nnhs_batch(rrs[ID, :])
+    out2[ID, :] = nn2.ff_nnhs_batch(rrs[ID, :])
+    out3[ID, :] = nn3.ff_nnhs_batch(rrs[ID, :])
 
-        out1[ID[ll], :] = nn1.ff_nnhs(input)
-        out2[ID[ll], :] = nn2.ff_nnhs(input)
-        out3[ID[ll], :] = nn3.ff_nnhs(input)
-
-        #
+    #
     # back-log-transform of total results
 
     for k in range(3):
@@ -1266,23 +1222,16 @@ def apply_BIAS_NN(
             ID = m2[:, i] > 0
 
             nn2 = nnhs.nnhs(os.path.join(path_to_NN, NNname))
-            out1 = np.zeros((np.sum(ID), nn2.noutp)) * np.nan
 
             a = input_to_BIAS[ID, :]
 
-            for ll in range(np.sum(ID)):
-                input = np.hstack([a[ll, :]])
-                out1[ll, :] = nn2.ff_nnhs(input)
-
-            for k in range(nn2.noutp):
-                total_out[ID, i, k] = out1[:, k]
+            total_out[ID, i, :] = nn2.ff_nnhs_batch(a)
 
         for i in range(len(Variables)):
 
             a = total_out[:, :, i]
 
-            b = np.zeros(m2.shape[0], )
-            b = np.apply_along_axis(lambda x: np.sum(x), 1, m2 * a)  # MH: wheighted estimate of BIAS nets
+            b = np.sum(m2 * a, axis=1)  # MH: wheighted estimate of BIAS nets
 
             if i == 7:  # MH: must be FU, which is an integer
                 b = np.round(b)
@@ -1303,15 +1252,9 @@ def merge_products(total_membership, total_out_weighted, total_out_bNN, Case):
 
     flag_Case_bNN = np.zeros(total_out_weighted.shape[0])
 
-    for i in range(len(flag_Case_bNN)):
-
-        if (Case[i] and total_membership[i] < 0.3):
-
-            flag_Case_bNN[i] = 1
-
-        elif not Case[i] and total_membership[i] < 0.3:
+    flag_Case_bNN[Case & (total_membership < 0.3)] = 1
 
-            flag_Case_bNN[i] = 2
+    flag_Case_bNN[~Case & (total_membership < 0.3)] = 2
 
     total_out_merged = np.around(total_out_merged, decimals=4)
 
@@ -6,9 +6,15 @@ import numpy as np
 class nnhs():
     log = []
 
+    ChunkSize = 65536  # MH: number of spectra per batch forward pass, limits the memory of the hidden layers
+    CacheVersion = 1  # version of the binary cache format, see load_cache/save_cache
+
     def __init__(self, nnhs_file):
         self.nnhs_file = nnhs_file
         self.name = os.path.basename(nnhs_file)
+        if self.load_cache():
+            self.oorange = np.zeros(self.ninp, dtype=int)
+            return
         try:
             fp = open(nnhs_file, 'r')
         except IOError:
@@ -47,25 +53,72 @@ class nnhs():
             z = fp.readline()
         planes = fp.readline().split('=')[1].split()  # str2num(r)
         self.nplanes = int(planes[0])
-        self.size = map(int, planes[1:])
+        self.size = list(map(int, planes[1:]))
         self.bias = []  # cell(1,self.nplanes-1)
         for npl in range(self.nplanes - 1):  # =1: self.nplanes-1
             c = fp.readline().split()  # fscanf(fp,'%s',3)
-            h = np.zeros((int(c[2])))
-            for i in range(int(c[2])):
-                h[i] = float(fp.readline())
+            h = np.array([float(fp.readline()) for i in range(int(c[2]))])
             self.bias.append(h)  # fscanf(fp,'%g',self.size(npl+1))
 
         self.wgt = []  # cell(1,self.nplanes-1)
         for npl in range(self.nplanes - 1):  # =1: self.nplanes-1
             c = fp.readline().split()  # fscanf(fp,'%s',3)
-            h = np.zeros((int(c[3]), int(c[2])))
-            for i in range(int(c[3])):
-                for j in range(int(c[2])):
-                    h[i, j] = fp.readline()
-            self.wgt.append(h)  # fscanf(fp,'%g',self.size(npl+1))
+            h = np.array([float(fp.readline()) for i in range(int(c[3]) * int(c[2]))])
+            self.wgt.append(h.reshape((int(c[3]), int(c[2]))))  # fscanf(fp,'%g',self.size(npl+1))
         fp.close()
-        self.oorange = np.zeros(self.ninp, dtype=np.int)
+        self.oorange = np.zeros(self.ninp, dtype=int)
+        self.save_cache()
+
+    def cache_file(self):
+        # parsed nets are cached in binary format next to the .net file
+        return os.path.splitext(self.nnhs_file)[0] + '.npz'
+
+    def load_cache(self):
+        # returns True, if the net was loaded from an up-to-date binary cache
+        cache_file = self.cache_file()
+        try:
+            if os.path.getmtime(cache_file) < os.path.getmtime(self.nnhs_file):
+                return False
+            with np.load(cache_file, allow_pickle=False) as data:
+                if int(data['version']) != self.CacheVersion:
+                    return False
+                self.problem = str(data['problem'])
+                self.input = data['input'].tolist()
+                self.invar = data['invar'].tolist()
+                self.output = data['output'].tolist()
+                self.outvar = data['outvar'].tolist()
+                self.ninp = int(data['ninp'])
+                self.inrange = data['inrange']
+                self.noutp = int(data['noutp'])
+                self.outrange = data['outrange']
+                self.nplanes = int(data['nplanes'])
+                self.size = data['size'].tolist()
+                self.bias = [data[f'bias{npl}'] for npl in range(self.nplanes - 1)]
+                self.wgt = [data[f'wgt{npl}'] for npl in range(self.nplanes - 1)]
+        except (OSError, ValueError, KeyError):
+            return False  # no (valid) cache available
+        return True
+
+    def save_cache(self):
+        # the cache is optional, e.g. the net folder may not be writable
+        cache_file = self.cache_file()
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        arrays = dict(
+            version=self.CacheVersion, problem=self.problem, input=np.array(self.input, dtype=str),
+            invar=np.array(self.invar, dtype=str), output=np.array(self.output, dtype=str),
+            outvar=np.array(self.outvar, dtype=str), ninp=self.ninp, inrange=self.inrange, noutp=self.noutp,
+            outrange=self.outrange, nplanes=self.nplanes, size=np.array(self.size, dtype=int)
+        )
+        for npl in range(self.nplanes - 1):
+            arrays[f'bias{npl}'] = self.bias[npl]
+            arrays[f'wgt{npl}'] = self.wgt[npl]
+        try:
+            with open(tmp_file, 'wb') as fp:
+                np.savez(fp, **arrays)
+            os.replace(tmp_file, cache_file)  # atomic, in case of concurrent processor runs
+        except OSError:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
 
     def ff_nnhs(self, inp):
         act = (inp - self.inrange[0, :]) / (self.inrange[1, :] - self.inrange[0, :])
@@ -81,6 +134,19 @@ class nnhs():
         res = act * (self.outrange[1, :] - self.outrange[0, :]) + self.outrange[0, :]
         return res
 
+    def ff_nnhs_batch(self, inp):
+        # vectorised forward pass for a (n, ninp) matrix of inputs, returns a (n, noutp) matrix of outputs
+        inp = np.asarray(inp, dtype=float)
+        res = np.empty((inp.shape[0], self.noutp))
+        for start in range(0, inp.shape[0], self.ChunkSize):
+            act = (inp[start:start + self.ChunkSize] - self.inrange[0, :]) / (self.inrange[1, :] - self.inrange[0, :])
+            for npl in range(self.nplanes - 1):
+                sum = np.dot(act, self.wgt[npl].T) + self.bias[npl]
+                np.clip(sum, -10., 10., out=sum)
+                act = 1. / (1. + np.exp(-sum))
+            res[start:start + self.ChunkSize] = act * (self.outrange[1, :] - self.outrange[0, :]) + self.outrange[0, :]
+        return res
+
     def chk_inp(self, input):
         oor = False
         for i in range(self.ninp):
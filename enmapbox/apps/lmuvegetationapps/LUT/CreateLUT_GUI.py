@@ -1102,7 +1102,8 @@ class LUT:
                                       cbc=self.dict_vals['cbc'], LAIu=self.dict_vals['LAIu'],
                                       cd=self.dict_vals['cd'], sd=self.dict_vals['sd'], h=self.dict_vals['h'],
                                       prgbar_widget=self.main.prg_widget, qgis_app=self.main.qgis_app,
-                                      depends=self.depends, depends_cp_cbc=self.depends_cp_cbc)
+                                      depends=self.depends, depends_cp_cbc=self.depends_cp_cbc,
+                                      resume=True)  # continue a canceled LUT creation with the same settings
 
         # except ValueError as e:
         #     self.abort(message="An error occurred while creating the LUT: %s" % str(e))
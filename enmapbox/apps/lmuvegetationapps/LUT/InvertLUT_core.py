@@ -29,12 +29,15 @@
 # relation to the measured reflectances; The median of the n-best fits is considered the valid result
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from matplotlib import pyplot as plt
+from scipy.spatial import cKDTree
 
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.utils import Utils
 
 
 # class RTMInversion is the core class of the inversion
@@ -70,11 +73,24 @@ class RTMInversion:
         self.ns = None  # how many different parameter variations from the statistical distribution of the LUT
         self.tts_LUT, self.tto_LUT, self.psi_LUT, self.nangles_LUT = (None, None, None, None)
 
+        # Batched inversion:
+        # how many pixels are inverted at once (at most); bounds the size of the cost matrices, see _chunk_size
+        self.chunk_size = 1000
+        self.nn_search = "brute"  # "brute": full cost matrix per chunk; "tree": KD-tree index (RMSE and MAE only)
+        self.parallelism = None  # how many chunks are inverted in parallel; if None, GDAL_NUM_THREADS is used
+
     def inversion_setup(self, image, image_out, LUT_path, ctype, nbfits, nbfits_type, noisetype, noiselevel,
                         wl_image, exclude_bands, out_mode, geo_image=None, geo_fixed=None, spatial_geo=False,
-                        nodat=None, mask_image=None):
+                        nodat=None, mask_image=None, chunk_size=1000, nn_search="brute", parallelism=None):
 
         self.ctype = ctype
+        self.chunk_size = chunk_size
+        self.nn_search = nn_search
+        self.parallelism = parallelism
+        if self.chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer, got {}".format(self.chunk_size))
+        if self.nn_search not in ("brute", "tree"):
+            raise ValueError("nn_search must be 'brute' or 'tree', got '{}'".format(self.nn_search))
         self.nbfits = nbfits
         self.nbfits_type = nbfits_type
         self.noisetype = noisetype
@@ -122,7 +138,7 @@ class RTMInversion:
         reader = RasterReader(image)
 
         # in_matrix = dataset.readAsArray().astype(dtype=dtype)  # read the data
-        in_matrix = np.arry(reader.array())
+        in_matrix = np.array(reader.array())
 
         if exclude_bands is not None:  # if bands are to be excluded from the input image, do so now
             in_matrix = np.delete(in_matrix, exclude_bands, 0)
@@ -237,6 +253,58 @@ class RTMInversion:
 
         return delta
 
+    @staticmethod
+    def _costmatrix(image_ref, model_ref, ctype, model_sq=None):
+        # Batched version of _costfun: image_ref holds a chunk of pixels [nbands, npixel], model_ref the LUT
+        # [nbands, nlut]; returns the cost matrix [npixel, nlut]. Costs are only used for ranking the LUT-members, so
+        # RMSE is returned as the (monotonic) squared euclidean distance ||a-b||^2 = a^2 + b^2 - 2ab, which reduces
+        # the work to a single matrix multiplication
+        if ctype == 1:  # RMSE
+            if model_sq is None:
+                model_sq = np.sum(model_ref ** 2, axis=0)
+            image_sq = np.sum(image_ref ** 2, axis=0)
+            delta = image_ref.T @ model_ref
+            delta *= -2
+            delta += image_sq[:, np.newaxis]
+            delta += model_sq[np.newaxis, :]
+            np.maximum(delta, 0, out=delta)  # remove negative values caused by rounding errors
+        elif ctype in (2, 3):  # MAE and mNSE
+            # accumulate band by band to keep the memory at [npixel, nlut]
+            delta = np.zeros(shape=(image_ref.shape[1], model_ref.shape[1]))
+            for band in range(image_ref.shape[0]):
+                delta += np.abs(image_ref[band, :, np.newaxis] - model_ref[band, np.newaxis, :])
+            if ctype == 3:  # mNSE
+                denominator = np.sum(np.abs(image_ref - np.mean(image_ref, axis=0)), axis=0)
+                delta = 1.0 - delta / denominator[:, np.newaxis]
+        else:
+            delta = None
+            exit("wrong cost function type. Expected 1, 2 or 3; got %i instead" % ctype)
+
+        return delta
+
+    def _nbest(self, image_ref, lut, lut_sq=None, tree=None):
+        # find the indices of the n best fitting LUT-members [npixel, nbfits] for a chunk of pixels [nbands, npixel]
+        if tree is not None:
+            p = 2 if self.ctype == 1 else 1  # euclidean distance for RMSE, manhattan distance for MAE
+            _, nbest_subset = tree.query(image_ref.T, k=self.nbfits, p=p)
+            return np.reshape(nbest_subset, (image_ref.shape[1], self.nbfits))
+
+        estimates = self._costmatrix(image_ref=image_ref, model_ref=lut, ctype=self.ctype, model_sq=lut_sq)
+        if self.nbfits >= estimates.shape[1]:
+            return np.broadcast_to(np.arange(estimates.shape[1]), estimates.shape)
+        # the order inside the subset does not matter for the median, so no sorting is needed
+        return np.argpartition(estimates, self.nbfits, axis=1)[:, :self.nbfits]
+
+    def _chunk_size(self, nlut, parallelism, brute):
+        # Each chunk in flight holds a cost matrix [npixel, nlut] (float64) and the result of argpartition (int64),
+        # i.e. 16 bytes per pixel and LUT-member, plus a float64 temporary for MAE and mNSE. The peak memory of
+        # parallelism * chunk_size * nlut * 16 bytes is kept inside the ENMAPBOX_MEMORY_BUDGET (see Utils.memoryBudget)
+        # by reducing the chunk size, self.chunk_size is only used as an upper limit
+        if not brute:
+            return self.chunk_size  # the KD-tree query only holds [npixel, nbfits] per chunk
+        bytes_per_pixel = nlut * (16 if self.ctype == 1 else 24)
+        return max(1, min(self.chunk_size, Utils.memoryBudget() // (parallelism * bytes_per_pixel)))
+
     def get_lutmeta(self, file):
         with open(file, 'r') as metafile:
             metacontent = metafile.readlines()
@@ -317,6 +385,7 @@ class RTMInversion:
         npixel_valid = sum([len(whichLUT_coords[i][0]) for i in range(len(self.whichLUT_unique))])
 
         self.out_matrix = np.empty(shape=(self.npara, self.nrows, self.ncols))  # create empty array for outputs
+        parallelism = Utils.parallelism() if self.parallelism is None else self.parallelism
 
         # Iterate over all LUT ensembles (the coordinates are known from loop above)
         for i_ilut, ilut in enumerate(self.whichLUT_unique):
@@ -330,44 +399,51 @@ class RTMInversion:
             lut_params = lut[:self.npara, :]  # extract parameters - they are at the beginning rows of lut
             lut = np.delete(lut, self.exclude_bands_model, axis=0)  # delete exclude_bands_model - members
             lut = self.add_noise(ref_array=lut, noise_type=self.noisetype, sigma=self.noiselevel)  # add noise
+            lut = lut.astype(np.float64)
 
-            samples_size = len(whichLUT_coords[i_ilut][0])  # how many pixels in the current iLUT (whichLUT member)
+            rows, cols = whichLUT_coords[i_ilut]
+            samples_size = len(rows)  # how many pixels in the current iLUT (whichLUT member)
             result = np.zeros(shape=(self.npara, samples_size))
 
-            # Iterate over each pixel sample (whichLUT)
-            for isample in range(samples_size):
-                # Get reflectance data of the current sample (all pixels at once)
-                mydata = self.image[:, whichLUT_coords[i_ilut][0][isample], whichLUT_coords[i_ilut][1][isample]]
-
-                # calculate distances between sample and all LUT-members of iLUT
-                estimates = self._costfun(image_ref=mydata[:, np.newaxis], model_ref=lut, ctype=self.ctype)
-                pix_current += 1
-                if isample % 1000 == 0:  # update the progress bar every 1000 pixels
+            # The nearest-neighbour search is prepared once per iLUT: either a KD-tree index (only for metrics that
+            # are a distance in the spectral space) or the squared norms of the LUT-members for the RMSE expansion
+            tree, lut_sq = None, None
+            if self.nn_search == "tree" and self.ctype in (1, 2):
+                tree = cKDTree(lut.T)
+            elif self.ctype == 1:
+                lut_sq = np.sum(lut ** 2, axis=0)
+
+            def invert_chunk(chunk):
+                # Get reflectance data of the current chunk of pixels [nbands, npixel]
+                mydata = self.image[:, rows[chunk], cols[chunk]].astype(np.float64)
+                nbest_subset = self._nbest(image_ref=mydata, lut=lut, lut_sq=lut_sq, tree=tree)
+                # Obtain the final result for each sample: The median of the subset
+                return np.median(lut_params[:, nbest_subset], axis=2)
+
+            chunk_size = self._chunk_size(nlut=lut.shape[1], parallelism=parallelism, brute=tree is None)
+            chunks = [slice(start, min(start + chunk_size, samples_size))
+                      for start in range(0, samples_size, chunk_size)]
+
+            # Chunks are inverted in a thread pool (numpy releases the GIL), results are collected in chunk order
+            pool = ThreadPoolExecutor(max_workers=parallelism)
+            try:
+                for chunk, chunk_result in zip(chunks, pool.map(invert_chunk, chunks)):
+                    result[:, chunk] = chunk_result
+                    pix_current += chunk.stop - chunk.start
                     if prg_widget:
-                        pix_limit = pix_current + 999
-                        if pix_limit > npixel_valid:
-                            pix_limit = npixel_valid
                         prg_widget.gui.lblCaption_r.setText('Inverting pixels {:d}-{:d} of {:d}'
-                                                            .format(pix_current, pix_limit, npixel_valid))
+                                                            .format(pix_current - (chunk.stop - chunk.start) + 1,
+                                                                    pix_current, npixel_valid))
                         prg_widget.gui.prgBar.setValue(pix_current * 100 // npixel_valid)
                         qgis_app.processEvents()
                     else:
                         print("LUT_unique #{:d} of {:d}: Checking sample {:d} of {:d}"
-                              .format(i_ilut, len(self.whichLUT_unique), isample, samples_size))
-
-                # nbest_subset is a subset of LUT for the n best performing entries
-                nbest_subset = np.argpartition(estimates, self.nbfits)[0:self.nbfits]
-                # sort in order of distance: closest match is nbest_subset[0]
-                nbest_subset = nbest_subset[np.argsort(estimates[nbest_subset])]
-
-                # Obtain the final result for this sample: The median of the subset
-                result[:, isample] = np.median(lut_params[:, nbest_subset], axis=1)
-
-                # Visualize: turn this on and specify WHEN to visualize if necessary
-                # self._visualize(image_ref == mydata, model_ref=nbest_subset[0])
+                              .format(i_ilut, len(self.whichLUT_unique), chunk.stop, samples_size))
+            finally:  # cancel chunks not yet started, e.g. if the inversion was canceled
+                pool.shutdown(wait=True, cancel_futures=True)
 
             # Place all results for this whichLUT run in the out_matrix
-            self.out_matrix[:, whichLUT_coords[i_ilut][0], whichLUT_coords[i_ilut][1]] = result
+            self.out_matrix[:, rows, cols] = result
 
     def write_image(self):
         # write output to file(s), use the same grid as the input image
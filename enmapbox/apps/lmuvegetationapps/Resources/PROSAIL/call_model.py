@@ -27,13 +27,19 @@
 
 """
 
+import hashlib
+import json
 import os
 import time
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from scipy.stats import truncnorm
 
+from enmapboxprocessing.blockprocessor import BlockProcessor
+from enmapboxprocessing.utils import Utils
+
 import lmuvegetationapps.Resources.PROSAIL.INFORM as INFORM_v
 import lmuvegetationapps.Resources.PROSAIL.SAIL as SAIL_v
 import lmuvegetationapps.Resources.PROSAIL.prospect as prospect_v
@@ -347,18 +353,33 @@ class InitModel:
 
     def initialize_vectorized(self, LUT_dir, LUT_name, ns, max_per_file=5000, soil=None,
                               prgbar_widget=None, qgis_app=None, depends=False, depends_cp_cbc=False,
-                              testmode=False, **paras):
+                              testmode=False, progress_callback=None, parallelism=None, seed=None, resume=False,
+                              **paras):
         # This is the most important function for initializing PROSAIL
         # It calls instances of PROSAIL and provides blocks of the para_grid
+        # The splits of all geo ensembles are independent work units, which are run in a process pool of size
+        # parallelism (if None, GDAL_NUM_THREADS is used; 1 runs all splits sequentially in this process).
+        # All random draws happen in create_grid before the work units are dispatched, so the LUT is identical
+        # for a fixed seed, no matter how many processes are used.
+        # resume=True skips splits whose .npy file already exists, so that an interrupted run can be continued.
+        # This only happens if the interrupted run used the same settings, parameters and seed (see _resume_state);
+        # if seed is None, the seed of the interrupted run is reused. Otherwise, all splits are created again.
+        # progress_callback(progress, message) is called with progress in [0...100] before waiting for each split;
+        # it may raise a ValueError to cancel the LUT creation
         self.soil = soil
+        resume_filename = None
+        if not testmode:
+            resume_filename = "%s_00resume.json" % (LUT_dir + LUT_name)
+            resume_key = self._resume_key(LUT_name, ns, max_per_file, soil, depends, depends_cp_cbc, paras)
+            resume, seed = self._resume_state(resume_filename, resume_key, seed, resume)
+        if seed is not None:
+            np.random.seed(seed)
         if len(paras["tts"]) > 1 or len(paras["tto"]) > 1 or len(paras["psi"]) > 1:
             self.geo_mode = "sort"  # LUT-Files are (firstly) sorted by geometry
         else:
             self.geo_mode = "no_geo"
 
         self.max_filelength = max_per_file  # defines the number of PROSAIL runs in one file ("split"), default=5000
-        npara = len(self.para_names)  # how many parameters are stored in the LUT
-        # (at maximum! Does NOT depend on the version of PROSPECT / SAIL used)
         setup = SetupMultiple(ns=ns, paras=paras, depends=depends,
                               depends_cp_cbc=depends_cp_cbc)  # Prepare for setting up PROSAIL
         para_grid, mask = setup.create_grid()  # Now create the para_grid
@@ -386,10 +407,8 @@ class InitModel:
             sensor_init_success = self.s2s_I.init_sensor()
             if not sensor_init_success:
                 exit("Could not convert spectra to sensor resolution!")
-            nbands = self.s2s_I.n_wl_sensor
             wl_sensor = self.s2s_I.wl_sensor
         else:
-            nbands = len(lambd)
             wl_sensor = lambd
 
         # for debugging or time estimation
@@ -398,10 +417,6 @@ class InitModel:
             _ = self.run_model(paras=dict(zip(self.para_names, para_grid.T))).T  # simplistic form of running PROSAIL
             return time.time() - start
 
-        # Initialize iterators
-        struct_ensemble = 0
-        n_struct_ensembles = 1
-
         #  Prepare content for .lut-metafile:
         # Geometries are either logical (len == 3) or fixed (len == 1) or not supplied
         if len(paras["tts"]) == 3:
@@ -477,63 +492,117 @@ class InitModel:
             prgbar_widget.gui.lblCaption_l.setText("Creating LUT")
             qgis_app.processEvents()
 
+        if progress_callback is None:
+            progress_callback = self._default_progress_callback(prgbar_widget=prgbar_widget, qgis_app=qgis_app)
+
+        # Collect the work units: one per split of each geo ensemble
+        work_units = list()
         for geo_ensemble in range(n_ensembles_geo):  # iterate through all ensembles of geometries
-            rest = crun_pergeo
             for split in range(n_ensembles_split):  # iterate through all "splits" (max_per_file)
-
-                if rest >= max_per_file:  # if there are more runs left than max_per_file allows...
-                    save_array = np.empty((nbands + npara, max_per_file))  # build an empty array
-                    nruns = max_per_file  # runs is max
-                else:
-                    nruns = rest  # otherwise, nruns is what's left
-                    save_array = np.empty((nbands + npara, rest))
-
                 run = geo_ensemble * crun_pergeo + split * max_per_file  # current run (first of the current split)
-
-                if prgbar_widget:
-                    if prgbar_widget.gui.lblCancel.text() == "-1":
-                        prgbar_widget.gui.lblCancel.setText("")
-                        prgbar_widget.gui.cmdCancel.setDisabled(False)
-                        raise ValueError("LUT creation cancelled!")
-
-                    prgbar_widget.gui.lblCaption_r.setText('Ensemble Geo {:d} of {:d} | Split {:d} of {:d}'.
-                                                           format(geo_ensemble + 1, n_ensembles_geo, split + 1,
-                                                                  n_ensembles_split))
-                    qgis_app.processEvents()
-
-                else:
-                    print(
-                        "LUT ensemble struct #{:d} of {:d}; ensemble geo #{:d} of {:d}; split #{:d} of {:d}; "
-                        "total #{:d} of {:d}"
-                        .format(struct_ensemble, n_struct_ensembles - 1, geo_ensemble,
-                                n_ensembles_geo - 1, split, n_ensembles_split - 1, run, crun_max))
-
-                if prgbar_widget:
-                    prgbar_widget.gui.prgBar.setValue(int(run * 100 / crun_max))  # set value of the progress bar
-                    qgis_app.processEvents()
-
-                # Execute the model and fill the results into the prepared array
-                # The double transpose of the matrix (.T) fits the paras in the necessary shape run_model expects
-                # The first "npara" rows are reserved for the parameter-values
-                # The rest is reserved for the spectral results of PROSAIL
-                save_array[npara:, :] = self.run_model(
-                    paras=dict(zip(self.para_names, para_grid[run:run + nruns, :].T))
-                ).T
-                save_array[:npara, :] = para_grid[run:run + nruns, :].T
-                if mask is not None:
-                    save_array = save_array[:, mask]
-                    # TODO: adapt "n_total"/"ns" to number of final samples in the LUT is mask was applied
-
-                rest -= max_per_file  # calculate what's left for next iteration
-
-                # Save each split to a new file (.npy)
-                np.save("{}_{:d}_{:d}".format(LUT_dir + LUT_name, geo_ensemble, split), save_array)
-
+                nruns = min(max_per_file, crun_pergeo - split * max_per_file)  # the last split takes what's left
+                filename = "{}_{:d}_{:d}.npy".format(LUT_dir + LUT_name, geo_ensemble, split)
+                if resume and os.path.exists(filename):
+                    continue  # split was already created by an earlier (interrupted) run
+                work_units.append((filename, run, nruns, geo_ensemble, split))
+
+        n_units_done = n_ensembles_geo * n_ensembles_split - len(work_units)
+        n_units = n_ensembles_geo * n_ensembles_split
+
+        def report(geo_ensemble, split):
+            progress_callback(n_units_done * 100 // n_units,
+                              'Ensemble Geo {:d} of {:d} | Split {:d} of {:d}'
+                              .format(geo_ensemble + 1, n_ensembles_geo, split + 1, n_ensembles_split))
+
+        if parallelism is None:
+            parallelism = Utils.parallelism()
+
+        if parallelism == 1 or len(work_units) <= 1:
+            for filename, run, nruns, geo_ensemble, split in work_units:
+                report(geo_ensemble, split)
+                _run_split(self, filename, para_grid[run:run + nruns, :],
+                           None if mask is None else mask[run:run + nruns])
+                n_units_done += 1
+        else:
+            # spawned worker processes with a Python interpreter (QGIS may be the running executable), the model is
+            # passed once per worker; if no interpreter is found, the splits run in threads
+            processor = BlockProcessor(parallelism, True, initializer=_init_worker, initargs=(self,))
+            pool = processor.createProcessPool()
+            if pool is None:
+                pool = ThreadPoolExecutor(parallelism, initializer=_init_worker, initargs=(self,))
+            try:
+                futures = list()
+                for filename, run, nruns, geo_ensemble, split in work_units:
+                    future = pool.submit(_run_split_in_worker, filename, para_grid[run:run + nruns, :],
+                                         None if mask is None else mask[run:run + nruns])
+                    futures.append((future, geo_ensemble, split))
+                for future, geo_ensemble, split in futures:  # wait for the splits in order
+                    report(geo_ensemble, split)
+                    future.result()
+                    n_units_done += 1
+            finally:  # cancel splits not yet started, e.g. if the LUT creation was canceled
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        self._write_resume_state(resume_filename, resume_key, seed, complete=True)
+        progress_callback(100, 'File {:d} of {:d}'.format(crun_max, crun_max))
         if prgbar_widget:
-            prgbar_widget.gui.lblCaption_r.setText('File {:d} of {:d}'.format(crun_max, crun_max))
-            prgbar_widget.gui.prgBar.setValue(100)
             prgbar_widget.gui.close()
 
+    def _resume_key(self, LUT_name, ns, max_per_file, soil, depends, depends_cp_cbc, paras):
+        # Fingerprint of everything that defines the content of the LUT, except the seed
+        key = [LUT_name, ns, max_per_file, depends, depends_cp_cbc, self.lop, self.canopy_arch, self.int_boost,
+               self.s2s, self.nodat, None if soil is None else np.asarray(soil, dtype=float).tolist(),
+               [[float(value) for value in paras[para_key]] for para_key in sorted(paras)]]
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def _resume_state(self, filename, key, seed, resume):
+        # Decide whether an interrupted LUT creation can be resumed, and return (resume, seed).
+        # Resuming requires an incomplete earlier run with the same key and seed; if seed is None, the seed of the
+        # earlier run is reused. If a new LUT is created and seed is None, a seed is drawn and stored, so that the
+        # new run can be resumed itself.
+        if resume:
+            state = None
+            if os.path.exists(filename):
+                try:
+                    with open(filename) as file:
+                        state = json.load(file)
+                except (OSError, ValueError):
+                    pass
+            if state is None or state.get('complete', True):
+                resume = False  # nothing to resume
+            elif state.get('key') != key or (seed is not None and seed != state.get('seed')):
+                warnings.warn("LUT settings, parameters or seed differ from the interrupted run; "
+                              "the LUT is created from scratch")
+                resume = False
+            else:
+                seed = state['seed']
+        if seed is None:
+            seed = int(np.random.randint(0, 2 ** 31 - 1))
+        self._write_resume_state(filename, key, seed, complete=False)
+        return resume, seed
+
+    @staticmethod
+    def _write_resume_state(filename, key, seed, complete):
+        with open(filename, "w") as file:
+            json.dump({'key': key, 'seed': seed, 'complete': complete}, file)
+
+    @staticmethod
+    def _default_progress_callback(prgbar_widget=None, qgis_app=None):
+        # Report progress to the progress bar widget (if this script is run in the EnMAP-box) or to the console
+        def progress_callback(progress, message):
+            if prgbar_widget:
+                if prgbar_widget.gui.lblCancel.text() == "-1":
+                    prgbar_widget.gui.lblCancel.setText("")
+                    prgbar_widget.gui.cmdCancel.setDisabled(False)
+                    raise ValueError("LUT creation cancelled!")
+                prgbar_widget.gui.lblCaption_r.setText(message)
+                prgbar_widget.gui.prgBar.setValue(int(progress))  # set value of the progress bar
+                qgis_app.processEvents()
+            else:
+                print("LUT creation {:d}%: {}".format(int(progress), message))
+
+        return progress_callback
+
     def initialize_single(self, **paras):
         # Initialize a single run of PROSAIL (simplification for building of para_grid)
         self.soil = paras["soil"]
@@ -579,3 +648,42 @@ class InitModel:
             return result
         else:
             return self.s2s_I.run_srf(result)  # if a sensor is chosen, run the Spectral Response Function now
+
+
+WORKER_MODEL = None  # model of the worker processes, see _init_worker
+
+
+def _init_worker(model):
+    # Initializer of the worker processes of InitModel.initialize_vectorized
+    global WORKER_MODEL
+    WORKER_MODEL = model
+
+
+def _run_split_in_worker(filename, para_block, mask_block=None):
+    return _run_split(WORKER_MODEL, filename, para_block, mask_block)
+
+
+def _run_split(model, filename, para_block, mask_block=None):
+    # Work unit of InitModel.initialize_vectorized: run PROSAIL for one split and save it to a .npy file.
+    npara = len(model.para_names)  # how many parameters are stored in the LUT
+    # (at maximum! Does NOT depend on the version of PROSPECT / SAIL used)
+
+    # Execute the model and fill the results into the prepared array
+    # The transpose of the para_block fits the paras in the necessary shape run_model expects
+    # The first "npara" rows are reserved for the parameter-values
+    # The rest is reserved for the spectral results of PROSAIL
+    spectra = model.run_model(paras=dict(zip(model.para_names, para_block.T))).T
+    save_array = np.empty((spectra.shape[0] + npara, para_block.shape[0]))
+    save_array[npara:, :] = spectra
+    save_array[:npara, :] = para_block.T
+    if mask_block is not None:
+        save_array = save_array[:, mask_block]
+        # TODO: adapt "n_total"/"ns" to number of final samples in the LUT is mask was applied
+
+    # Save each split to a new file (.npy); write to a temporary file first, so that an interrupted run never leaves
+    # an incomplete split behind, which would be skipped when resuming
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as file:
+        np.save(file, save_array)
+    os.replace(tmp_filename, filename)
+    return filename
@@ -1,4 +1,3 @@
-import warnings
 from contextlib import suppress
 from typing import Optional
 
@@ -6,12 +5,13 @@ from pyqtgraph import PlotWidget
 
 from enmapbox.qgispluginsupport.qps.utils import SpatialExtent
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.bandstatisticsservice import BandStatisticsTask
 from qgis.PyQt.QtGui import QMouseEvent, QColor
 from qgis.PyQt.QtWidgets import QToolButton, QMainWindow, QTableWidget, QComboBox, QCheckBox, \
     QLabel
 from qgis.PyQt.uic import loadUi
-from qgis.core import QgsMapLayerProxyModel, QgsRasterLayer, QgsRasterDataProvider, QgsRasterBandStats, \
-    QgsRasterHistogram, QgsMapSettings, QgsRasterRenderer, Qgis
+from qgis.core import QgsMapLayerProxyModel, QgsRasterLayer, QgsMapSettings, QgsRasterRenderer, QgsApplication, \
+    QgsMessageLog, Qgis
 from qgis.gui import QgsRasterBandComboBox, QgsMapLayerComboBox, QgsFilterLineEdit, QgsSpinBox, QgsMapCanvas
 
 
@@ -46,6 +46,7 @@ class BandStatisticsDialog(QMainWindow):
         self.enmapBox = EnMAPBox.instance()
 
         self.mMapCanvas: Optional[QgsMapCanvas] = None
+        self.mTask: Optional[BandStatisticsTask] = None
         self.mLayer.setProject(self.enmapBox.project())
         self.mLayer.setFilters(QgsMapLayerProxyModel.RasterLayer)
         self.mHistogramBinCount.setClearValue(self.mHistogramBinCount.value())
@@ -182,53 +183,75 @@ class BandStatisticsDialog(QMainWindow):
         layer: QgsRasterLayer = self.mLayer.currentLayer()
         if layer is None:
             return
-        provider: QgsRasterDataProvider = layer.dataProvider()
         extent = self.currentExtent()
         sampleSize = self.currentSampleSize()
-        binCount = self.mHistogramBinCount.value()
 
+        bandList = list()
         for row in range(self.mTable.rowCount()):
             w: QgsRasterBandComboBox = self.mTable.cellWidget(row, 0)
             bandNo = w.currentBand()
             if bandNo == -1:
-                # clear and return
-                for column in [2, 3, 4, 5]:
-                    w: QLabel = self.mTable.cellWidget(row, column)
-                    w.setText('')
-                plotWidget: HistogramPlotWidget = self.mTable.cellWidget(row, 1)
-                plotWidget.clear()
+                self.clearRow(row)
                 continue
+            bandList.append(bandNo)
+
+        if len(bandList) == 0:
+            return
 
-            # calculate stats
-            with warnings.catch_warnings():
-                warnings.filterwarnings(
-                    'ignore',
-                    message=r'QgsRasterInterface\.bandStatistics\(\) is deprecated',
-                    category=DeprecationWarning,
-                )
-                stats: QgsRasterBandStats = provider.bandStatistics(bandNo, Qgis.RasterBandStatistic.All,
-                                                                    extent,
-                                                                    sampleSize)
+        # calculate stats for all bands in a single pass in the background, stale requests are canceled
+        if self.mTask is not None:
+            with suppress(RuntimeError):  # underlying C++ object may already be deleted
+                self.mTask.cancel()
+        task = BandStatisticsTask(layer, bandList, extent, sampleSize)
+        task.taskCompleted.connect(lambda: self.onTaskCompleted(task))
+        task.taskTerminated.connect(lambda: self.onTaskTerminated(task))
+        self.mTask = task
+        QgsApplication.taskManager().addTask(task)
+
+    def onTaskTerminated(self, task: BandStatisticsTask):
+        if task is not self.mTask:
+            return  # canceled in favor of a newer request
+        self.mTask = None
+        if task.error is not None:
+            QgsMessageLog.logMessage(
+                f'band statistics failed: {type(task.error).__name__}: {task.error}', tag='Band Statistics',
+                level=Qgis.Critical
+            )
+
+    def onTaskCompleted(self, task: BandStatisticsTask):
+        if task is not self.mTask:
+            return  # stale result
+        self.mTask = None
+
+        binCount = self.mHistogramBinCount.value()
+        statistics = dict(zip(task.bandList, task.statistics))
+        for row in range(self.mTable.rowCount()):
+            w: QgsRasterBandComboBox = self.mTable.cellWidget(row, 0)
+            bandNo = w.currentBand()
+            if bandNo not in statistics:
+                self.clearRow(row)
+                continue
+            stats = statistics[bandNo]
 
             if self.mHistogramMinimum.isNull():
-                minimum = stats.minimumValue
+                minimum = stats.minimum
             else:
                 try:
                     minimum = float(self.mHistogramMinimum.text())
                 except Exception:
-                    self.mHistogramMinimum.setText(stats.minimumValue)
-                    minimum = stats.minimumValue
+                    self.mHistogramMinimum.setText(str(stats.minimum))
+                    minimum = stats.minimum
 
             if self.mHistogramMaximum.isNull():
-                maximum = stats.maximumValue
+                maximum = stats.maximum
             else:
                 try:
                     maximum = float(self.mHistogramMaximum.text())
                 except Exception:
-                    self.mHistogramMaximum.setText(stats.maximumValue)
-                    maximum = stats.maximumValue
+                    self.mHistogramMaximum.setText(str(stats.maximum))
+                    maximum = stats.maximum
 
-            histogram: QgsRasterHistogram = provider.histogram(bandNo, binCount, minimum, maximum, extent, sampleSize)
+            histogram = stats.histogram(binCount, minimum, maximum)
 
             # set stats
             def smartRound(value: float) -> float:
@@ -239,7 +262,7 @@ class BandStatisticsDialog(QMainWindow):
                 else:
                     return round(value, 1)
 
-            for column, value in enumerate([stats.minimumValue, stats.maximumValue, stats.mean, stats.stdDev], 2):
+            for column, value in enumerate([stats.minimum, stats.maximum, stats.mean, stats.stdDev], 2):
                 w: QLabel = self.mTable.cellWidget(row, column)
                 w.setText(str(smartRound(value)))
 
@@ -248,13 +271,20 @@ class BandStatisticsDialog(QMainWindow):
             plotWidget.clear()
             plotWidget.getAxis('bottom').setPen('#000000')
             plotWidget.getAxis('left').setPen('#000000')
-            y = histogram.histogramVector
+            y = histogram
             x = list(range(binCount + 1))
             color = QColor(0, 153, 255)
             plot = plotWidget.plot(x, y, stepMode='center', fillLevel=0, brush=color)
             plot.setPen(color=color, width=1)
             plotWidget.autoRange()
 
+    def clearRow(self, row: int):
+        for column in [2, 3, 4, 5]:
+            w: QLabel = self.mTable.cellWidget(row, column)
+            w.setText('')
+        plotWidget: HistogramPlotWidget = self.mTable.cellWidget(row, 1)
+        plotWidget.clear()
+
     def onLiveUpdate(self):
         if not self.mLiveUpdate.isChecked():
             return
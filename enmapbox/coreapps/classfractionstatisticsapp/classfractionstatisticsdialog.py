@@ -9,6 +9,7 @@ from classfractionstatisticsapp.classfractionrenderer import ClassFractionRender
 from enmapbox.qgispluginsupport.qps.layerproperties import rendererFromXml
 from enmapbox.qgispluginsupport.qps.utils import SpatialExtent
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.bandstatisticsservice import BandStatisticsService
 from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.utils import Utils
 from qgis.PyQt.QtCore import Qt
@@ -17,7 +18,7 @@ from qgis.PyQt.QtWidgets import (
     QToolButton, QMainWindow, QCheckBox, QTableWidget, QSpinBox, QComboBox, QApplication, QMessageBox
 )
 from qgis.PyQt.uic import loadUi
-from qgis.core import QgsRasterLayer, QgsRasterDataProvider, QgsRasterHistogram, QgsMapLayerProxyModel, QgsMapSettings
+from qgis.core import QgsRasterLayer, QgsMapLayerProxyModel, QgsMapSettings
 from qgis.gui import QgsMapCanvas, QgsMapLayerComboBox, QgsColorButton
 
 
@@ -224,7 +225,12 @@ class ClassFractionStatisticsDialog(QMainWindow):
         extent = self.currentExtent()
         sampleSize = self.currentSampleSize()
 
-        for checked, bandNo, color, name, plotWidget in self.currentItemValues():
+        # calculate (and cache) statistics for all checked bands in a single pass
+        itemValues = self.currentItemValues()
+        bandList = [bandNo for checked, bandNo, color, name, plotWidget in itemValues if checked]
+        statistics = dict(zip(bandList, BandStatisticsService.bandStatistics(layer, bandList, extent, sampleSize)))
+
+        for checked, bandNo, color, name, plotWidget in itemValues:
             # clear current plot
             plotWidget.clear()
             plotWidget.getAxis('bottom').setPen('#000000')
@@ -232,14 +238,10 @@ class ClassFractionStatisticsDialog(QMainWindow):
 
             # make new plot
             if checked:
-                provider: QgsRasterDataProvider = layer.dataProvider()
                 minimum = self.mHistogramMinimum.value()
                 maximum = self.mHistogramMaximum.value()
                 binCount = maximum - minimum
-                rasterHistogram: QgsRasterHistogram = provider.histogram(
-                    bandNo, binCount, minimum / 100., maximum / 100., extent, sampleSize
-                )
-                y = rasterHistogram.histogramVector
+                y = statistics[bandNo].histogram(binCount, minimum / 100., maximum / 100.)
                 x = range(binCount + 1)
                 plot = plotWidget.plot(x, y, stepMode='center', fillLevel=0, brush=color)
                 plot.setPen(color=color, width=1)
@@ -4,11 +4,11 @@ from typing import Optional, List
 
 import numpy as np
 import plotly.graph_objects as go
-from scipy.stats._crosstab import crosstab
 
 from enmapbox.qgispluginsupport.qps.utils import SpatialExtent, SpatialPoint
 from enmapbox.typeguard import typechecked
 from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.transitioncounter import TransitionCounter
 from enmapboxprocessing.typing import Category
 from enmapboxprocessing.utils import Utils
 from landcoverchangestatisticsapp.enums import ExtentType, AccuracyType, AreaUnitsType
@@ -22,7 +22,9 @@ from qgis.PyQt.QtGui import QColor
 from qgis.PyQt.QtWidgets import QStatusBar
 from qgis.PyQt.QtWidgets import QToolButton, QMainWindow, QCheckBox
 from qgis.PyQt.uic import loadUi
-from qgis.core import QgsRectangle, QgsPalettedRasterRenderer, QgsRasterLayer, QgsMapSettings, QgsUnitTypes
+from qgis.core import (
+    QgsRectangle, QgsPalettedRasterRenderer, QgsRasterLayer, QgsMapSettings, QgsUnitTypes, QgsProcessingFeedback
+)
 from qgis.gui import QgsMapCanvas
 
 
@@ -200,46 +202,19 @@ class LandCoverChangeSankeyPlotBuilder():
         self.linkOpacity = options.get('linkOpacity', 75)
         self.title = options.get('title', None)
 
-    def readData(self, extent: QgsRectangle, sampleSize: int):
+    def readData(self, extent: QgsRectangle, sampleSize: int, feedback: QgsProcessingFeedback = None):
         if extent == self.currentExtent and sampleSize == self.currentSampleSize:
             return  # only read data if necessary
         self.currentExtent = extent
         self.currentSampleSize = sampleSize
 
-        self.categoriess = list()
-        self.categorySizess = list()
-        self.categoryRelSizess = list()
-        self.linkSizess = list()
-
-        width, height = RasterReader(self.grid).samplingWidthAndHeight(1, extent, sampleSize)
-
-        def readLayer(layer):
-            reader = RasterReader(layer)
-            array = np.array(reader.arrayFromBoundingBoxAndSize(extent, width, height, [1])[0], float)
-            categories = Utils().categoriesFromRenderer(reader.layer.renderer(), reader.layer)
-            categorySizes = crosstab(array.flatten(), levels=[[c.value for c in categories]]).count
-            categoryRelSizes = categorySizes / np.sum(categorySizes)
-            return array, categories, categorySizes, categoryRelSizes
-
-        array2 = categories2 = categorySizes2 = categoryRelSizes2 = None
-        for i, (layer, nextLayer) in enumerate(zip(self.layers, self.layers[1:])):
-            if i == 0:
-                array, categories, categorySizes, categoryRelSizes = readLayer(layer)
-            else:
-                array, categories, categorySizes, categoryRelSizes = (
-                    array2, categories2, categorySizes2, categoryRelSizes2
-                )
-            array2, categories2, categorySizes2, categoryRelSizes2 = readLayer(nextLayer)
-
-            levels = [[c.value for c in categories], [c.value for c in categories2]]
-            linkSizes = crosstab(array.flatten(), array2.flatten(), levels=levels).count
-            self.linkSizess.append(linkSizes)
-            self.categoriess.append(categories)
-            self.categorySizess.append(categorySizes)
-            self.categoryRelSizess.append(categoryRelSizes)
-        self.categoriess.append(categories2)
-        self.categorySizess.append(categorySizes2)
-        self.categoryRelSizess.append(categoryRelSizes2)
+        readers = [RasterReader(layer) for layer in self.layers]
+        self.categoriess = [Utils().categoriesFromRenderer(reader.layer.renderer(), reader.layer) for reader in readers]
+        counter = TransitionCounter([[c.value for c in categories] for categories in self.categoriess])
+        counter.readLayers(readers, extent, sampleSize, RasterReader(self.grid), feedback)
+        self.categorySizess = counter.categorySizess
+        self.categoryRelSizess = [categorySizes / np.sum(categorySizes) for categorySizes in counter.categorySizess]
+        self.linkSizess = counter.linkSizess
 
     def readLocationData(self, location: SpatialPoint):
         if location == self.currentLocation:
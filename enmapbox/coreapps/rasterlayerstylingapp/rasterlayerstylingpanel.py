@@ -1,6 +1,6 @@
 from contextlib import suppress
-from math import nan, inf
-from typing import Optional
+from math import nan, inf, isnan
+from typing import Dict, List, Optional
 
 from osgeo import gdal
 from qgis.PyQt import uic
@@ -8,7 +8,8 @@ from qgis.PyQt.QtWidgets import QDoubleSpinBox, QComboBox, QCheckBox, QToolButto
     QLineEdit, QTableWidget, QSpinBox
 from qgis.core import QgsRasterLayer, QgsSingleBandGrayRenderer, QgsRectangle, QgsMapLayer, \
     QgsContrastEnhancement, QgsRasterRenderer, QgsMultiBandColorRenderer, QgsSingleBandPseudoColorRenderer, \
-    QgsMapLayerProxyModel, QgsRasterDataProvider, QgsRasterShader, QgsProject, QgsRasterTransparency
+    QgsMapLayerProxyModel, QgsRasterDataProvider, QgsRasterShader, QgsProject, QgsRasterTransparency, QgsApplication, \
+    QgsMessageLog, Qgis
 from qgis.gui import (
     QgsDockWidget, QgsMapLayerComboBox, QgsCollapsibleGroupBox, QgsColorRampButton, QgsRangeSlider
 )
@@ -20,6 +21,7 @@ from enmapbox.qgispluginsupport.qps.utils import SpatialExtent
 from enmapbox.typeguard import typechecked
 from enmapbox.utils import BlockSignals
 from enmapboxprocessing.algorithm.createspectralindicesalgorithm import CreateSpectralIndicesAlgorithm
+from enmapboxprocessing.bandstatisticsservice import BandStatistics, BandStatisticsTask
 from enmapboxprocessing.rasterreader import RasterReader, metadataCache, setMetadataCache, buildMetadataCache
 from enmapboxprocessing.rasterwriter import RasterWriter
 from enmapboxprocessing.utils import Utils
@@ -86,6 +88,7 @@ class RasterLayerStylingPanel(QgsDockWidget):
         self.mLayer.setFilters(QgsMapLayerProxyModel.RasterLayer)
         self.mLayer.setExcludedProviders(['wms'])
         self.cache = dict()
+        self.mTask: Optional[BandStatisticsTask] = None
 
         self.visibilityChanged.connect(self.onPanelVisibilityChanged)
 
@@ -613,47 +616,83 @@ class RasterLayerStylingPanel(QgsDockWidget):
         if extent is None:
             return
 
-        def setCumulativeCut(bandNo: int, mBandMin: QLineEdit, mBandMax: QLineEdit):
-            vmin, vmax = layer.dataProvider().cumulativeCut(
-                bandNo, self.mP1.value() / 100., self.mP2.value() / 100., extent,
-                self.currentSampleSize(self.mAccuracy.currentIndex())
-            )
-            if vmin is nan or vmax is nan:
-                vmin = vmax = 0
-
-            with BlockSignals(mBandMin, mBandMax):
-                mBandMin.setText(str(vmin))
-                mBandMax.setText(str(vmax))
-
         if self.mRenderer.currentIndex() == self.RgbRendererTab:
-            if self.mMinMaxPercentile.isChecked():
-                for mBand in [self.mRedBand, self.mGreenBand, self.mBlueBand]:
-                    setCumulativeCut(mBand.mBandNo.currentBand(), mBand.mMin, mBand.mMax)
-            elif self.mMinMaxUser.isChecked():
-                pass
-            else:
-                raise ValueError()
+            mBands = [self.mRedBand, self.mGreenBand, self.mBlueBand]
         elif self.mRenderer.currentIndex() == self.GrayRendererTab:
-            if self.mMinMaxPercentile.isChecked():
-                setCumulativeCut(self.mGrayBand.mBandNo.currentBand(), self.mGrayBand.mMin, self.mGrayBand.mMax)
-            elif self.mMinMaxUser.isChecked():
-                pass
-            else:
-                raise ValueError()
+            mBands = [self.mGrayBand]
         elif self.mRenderer.currentIndex() == self.PseudoRendererTab:
-            if self.mMinMaxPercentile.isChecked():
-                setCumulativeCut(self.mPseudoBand.mBandNo.currentBand(), self.mPseudoBand.mMin, self.mPseudoBand.mMax)
-            elif self.mMinMaxUser.isChecked():
-                pass
-            else:
-                raise ValueError()
+            mBands = [self.mPseudoBand]
         elif self.mRenderer.currentIndex() >= self.DefaultRendererTab:
+            mBands = []
+        else:
+            raise ValueError()
+
+        if self.mMinMaxPercentile.isChecked():
+            # calculate (and cache) statistics for all bands in a single pass in the background,
+            # stale requests are canceled
+            # (invalid band numbers, e.g. -1 for no band selected, fall back to a zero range)
+            bandList = [mBand.mBandNo.currentBand() for mBand in mBands]
+            validBandList = [bandNo for bandNo in bandList if 1 <= bandNo <= layer.bandCount()]
+            if self.mTask is not None:
+                with suppress(RuntimeError):  # underlying C++ object may already be deleted
+                    self.mTask.cancel()
+                self.mTask = None
+            if len(validBandList) == 0:
+                self.setMinMax(mBands, bandList, dict())
+            else:
+                task = BandStatisticsTask(
+                    layer, validBandList, extent, self.currentSampleSize(self.mAccuracy.currentIndex())
+                )
+                task.taskCompleted.connect(lambda: self.onTaskCompleted(task, layer, mBands, bandList))
+                task.taskTerminated.connect(lambda: self.onTaskTerminated(task))
+                self.mTask = task
+                QgsApplication.taskManager().addTask(task)
+                return  # the renderer is updated when the task has completed
+        elif self.mMinMaxUser.isChecked():
             pass
         else:
             raise ValueError()
 
         self.updateRenderer()
 
+    def onTaskTerminated(self, task: BandStatisticsTask):
+        if task is not self.mTask:
+            return  # canceled in favor of a newer request
+        self.mTask = None
+        if task.error is not None:
+            QgsMessageLog.logMessage(
+                f'band statistics failed: {type(task.error).__name__}: {task.error}', tag='Raster Layer Styling',
+                level=Qgis.Critical
+            )
+
+    def onTaskCompleted(
+            self, task: BandStatisticsTask, layer: QgsRasterLayer, mBands: List[RasterLayerStylingBandWidget],
+            bandList: List[int]
+    ):
+        if task is not self.mTask:
+            return  # stale result
+        self.mTask = None
+        if layer is not self.mLayer.currentLayer():
+            return  # layer changed in the meantime
+        self.setMinMax(mBands, bandList, dict(zip(task.bandList, task.statistics)))
+        self.updateRenderer()
+
+    def setMinMax(
+            self, mBands: List[RasterLayerStylingBandWidget], bandList: List[int],
+            statistics: Dict[int, BandStatistics]
+    ):
+        for mBand, bandNo in zip(mBands, bandList):
+            if bandNo in statistics:
+                vmin, vmax = statistics[bandNo].cumulativeCut(self.mP1.value() / 100., self.mP2.value() / 100.)
+            else:
+                vmin = vmax = nan
+            if isnan(vmin) or isnan(vmax):
+                vmin = vmax = 0
+
+            with BlockSignals(mBand.mMin, mBand.mMax):
+                mBand.mMin.setText(str(vmin))
+                mBand.mMax.setText(str(vmax))
+
     def updateRenderer(self):
         layer: QgsRasterLayer = self.mLayer.currentLayer()
         if layer is None:
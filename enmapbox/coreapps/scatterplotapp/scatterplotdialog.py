@@ -1,6 +1,6 @@
 import warnings
 from contextlib import suppress
-from math import ceil, sqrt, floor
+from math import floor
 from os.path import join, exists
 from secrets import token_hex
 from typing import Optional, Tuple, Dict
@@ -8,22 +8,21 @@ from typing import Optional, Tuple, Dict
 import numpy as np
 from osgeo import gdal
 from pyqtgraph import PlotWidget, ImageItem, mkPen
-from scipy.stats import binned_statistic_2d, pearsonr
 
 from enmapbox.qgispluginsupport.qps.plotstyling.plotstyling import MarkerSymbolComboBox, MarkerSymbol
 from enmapbox.qgispluginsupport.qps.processing.algorithmdialog import AlgorithmDialog
 from enmapbox.qgispluginsupport.qps.utils import SpatialExtent
 from enmapbox.typeguard import typechecked
 from enmapboxprocessing.algorithm.rasterizevectoralgorithm import RasterizeVectorAlgorithm
-from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.rasterwriter import RasterWriter
 from enmapboxprocessing.utils import Utils
-from qgis.PyQt.QtCore import QRectF, QPointF, Qt
+from scatterplotapp.scatterplottask import ScatterPlotTask, ScatterPlotDensity
+from qgis.PyQt.QtCore import QRectF, QPointF, Qt, QTimer
 from qgis.PyQt.QtGui import QMouseEvent, QColor
 from qgis.PyQt.QtWidgets import QToolButton, QMainWindow, QComboBox, QCheckBox, QDoubleSpinBox, QPlainTextEdit, QSpinBox
 from qgis.PyQt.uic import loadUi
 from qgis.core import QgsMapLayerProxyModel, QgsRasterLayer, QgsMapSettings, QgsStyle, QgsColorRamp, \
-    QgsFieldProxyModel, QgsMapLayer
+    QgsFieldProxyModel, QgsMapLayer, QgsApplication, QgsMessageLog, Qgis
 from qgis.gui import QgsMapLayerComboBox, QgsMapCanvas, QgsRasterBandComboBox, QgsColorButton, QgsColorRampButton, \
     QgsFilterLineEdit, QgsFieldComboBox
 
@@ -87,6 +86,7 @@ class ScatterPlotDialog(QMainWindow):
     DensityColoring, ScatterColoring = 0, 1
     EstimatedAccuracy, ActualAccuracy = 0, 1
     WholeRasterExtent, CurrentCanvasExtent = 0, 1
+    LiveUpdateDelay = 100  # milliseconds
 
     def __init__(self, *args, **kwds):
         QMainWindow.__init__(self, *args, **kwds)
@@ -117,6 +117,12 @@ class ScatterPlotDialog(QMainWindow):
 
         # init data
         self.cache: Dict[str, QgsRasterLayer] = dict()
+        self.mTask: Optional[ScatterPlotTask] = None
+        self.mRequestId = 0
+        self.mLiveUpdateTimer = QTimer(self)
+        self.mLiveUpdateTimer.setSingleShot(True)
+        self.mLiveUpdateTimer.setInterval(self.LiveUpdateDelay)
+        self.mLiveUpdateTimer.timeout.connect(self.onApplyClicked)
 
         # connect signals
         self.mLayerX.layerChanged.connect(self.onLayerXChanged)
@@ -199,7 +205,8 @@ class ScatterPlotDialog(QMainWindow):
         else:
             raise ValueError()
 
-    def parseRange(self, textLower: str, textUpper: str, array: np.ndarray) -> Tuple[float, float]:
+    def parseRange(self, textLower: str, textUpper: str) -> Tuple[Optional[float], Optional[float]]:
+        """Return user defined range. Undefined bounds are None and will be derived from the data."""
 
         def tofloat(text: str) -> Optional[float]:
             try:
@@ -207,15 +214,7 @@ class ScatterPlotDialog(QMainWindow):
             except Exception:
                 return None
 
-        lower = tofloat(textLower)
-        upper = tofloat(textUpper)
-
-        if lower is None:
-            lower = np.min(array)
-        if upper is None:
-            upper = np.max(array)
-
-        return float(lower), float(upper)
+        return tofloat(textLower), tofloat(textUpper)
 
     def currentSampleSize(self) -> int:
         if self.mAccuracy.currentIndex() == self.EstimatedAccuracy:
@@ -341,50 +340,69 @@ class ScatterPlotDialog(QMainWindow):
             return
 
         # derive sampling extent
-        readerX = RasterReader(layerX)
-        readerY = RasterReader(layerY)
         extent = self.currentExtent()
-        extent = extent.intersect(readerX.extent())
-
-        # derive sampling size
-        width = extent.width() / readerX.rasterUnitsPerPixelX()
-        height = extent.height() / readerX.rasterUnitsPerPixelY()
-        width = max(min(int(round(width)), readerX.width()), 1)  # 1 <= width <= layerWidth
-        height = max(min(int(round(height)), readerX.height()), 1)  # 1 <= height <= layerHeight
-
-        sampleSize = self.currentSampleSize()
-        if sampleSize != 0:
-            sampleFraction = sqrt(min(sampleSize / (width * height), 1))
-            width = ceil(width * sampleFraction)
-            height = ceil(height * sampleFraction)
-
-        # read data
-        arrayX = readerX.arrayFromBoundingBoxAndSize(extent, width, height, [bandNoX])[0]
-        arrayY = readerY.arrayFromBoundingBoxAndSize(extent, width, height, [bandNoY])[0]
-
-        validX = readerX.maskArray([arrayX], [bandNoX])[0]
-        validY = readerY.maskArray([arrayY], [bandNoY])[0]
-        valid = np.all([validX, validY], axis=0)
-
-        x = arrayX[valid]
-        y = arrayY[valid]
+        extent = extent.intersect(layerX.extent())
 
-        if self.mSwapAxes.isChecked() and yIsVector:
-            x, y = y, x
-
-        # calculate 2d histogram
+        # derive 2d histogram bins
         bins = self.mScatterPlot.getPlotItem().getViewBox().size()
         bins = floor(bins.width() * 0.9), floor(
             bins.height() * 0.9)  # used slightly coarser binning to avoid rendering artefacts (see issue #1407)
+        if min(bins) < 1:
+            return
 
-        if x.size == 0:
+        range = (self.parseRange(self.mMinimumX.value(), self.mMaximumX.value()),
+                 self.parseRange(self.mMinimumY.value(), self.mMaximumY.value()))
+
+        keepPoints = self.mColoringType.currentIndex() == self.ScatterColoring and \
+            self.mColoringSymbol.markerSymbol() != MarkerSymbol.No_Symbol
+
+        # read and bin the data in the background, stale requests are canceled
+        self.cancelTask()
+        self.mRequestId += 1
+        task = ScatterPlotTask(
+            self.mRequestId, layerX, bandNoX, layerY, bandNoY, extent, self.currentSampleSize(), bins, range,
+            self.mSwapAxes.isChecked() and yIsVector, keepPoints
+        )
+        task.sigResultChanged.connect(self.onTaskResultChanged)
+        task.taskCompleted.connect(lambda: self.onTaskCompleted(task))
+        task.taskTerminated.connect(lambda: self.onTaskTerminated(task))
+        self.mTask = task
+        QgsApplication.taskManager().addTask(task)
+
+    def cancelTask(self):
+        if self.mTask is not None:
+            with suppress(RuntimeError):  # underlying C++ object may already be deleted
+                self.mTask.cancel()
+            self.mTask = None
+
+    def onTaskResultChanged(self, requestId: int, density: ScatterPlotDensity):
+        if requestId != self.mRequestId:
+            return  # stale result
+        self.plotDensity(density)
+
+    def onTaskCompleted(self, task: ScatterPlotTask):
+        if task.requestId != self.mRequestId:
+            return  # stale result
+        self.mTask = None
+        if task.density is None:
             self.mScatterPlot.clear()
             self.mScatterPlot.setRange(QRectF(0, 0, 1, 1))
-            # self.mScatterPlot.autoRange()
             return
+        self.plotDensity(task.density)
+
+    def onTaskTerminated(self, task: ScatterPlotTask):
+        if task.requestId != self.mRequestId:
+            return  # canceled in favor of a newer request
+        self.mTask = None
+        self.mScatterPlot.clear()
+        if task.error is not None:
+            QgsMessageLog.logMessage(
+                f'scatter plot failed: {type(task.error).__name__}: {task.error}', tag='Scatter Plot',
+                level=Qgis.Critical
+            )
 
-        range = [self.parseRange(self.mMinimumX.value(), self.mMaximumX.value(), x),
-                 self.parseRange(self.mMinimumY.value(), self.mMaximumY.value(), y)]
+    def plotDensity(self, density: ScatterPlotDensity):
+        range = density.range
 
         # update range
         if self.mMinimumX.isNull():
@@ -404,14 +422,12 @@ class ScatterPlotDialog(QMainWindow):
             self.mMaximumY.clearValue()
             self.mMaximumY.deselect()
 
-        try:  # use try-except to resolve issue #1408
-            counts, x_edge, y_edge, binnumber = binned_statistic_2d(x, y, x, 'count', bins, range, True)
-        except Exception:
+        counts = density.counts
+        background = counts == 0
+        if np.all(background):
             self.mScatterPlot.clear()
             return
 
-        background = counts == 0
-
         # stretch counts
         lower, upper = np.percentile(counts[counts != 0], [self.mDensityP1.value(), self.mDensityP2.value()])
         span = upper - lower
@@ -451,10 +467,11 @@ class ScatterPlotDialog(QMainWindow):
             self.mScatterPlot.addItem(imageItem)
         elif self.mColoringType.currentIndex() == self.ScatterColoring:
             symbol = self.mColoringSymbol.markerSymbol()
-            if symbol == MarkerSymbol.No_Symbol:
+            if symbol == MarkerSymbol.No_Symbol or not density.keepPoints:
                 self.mScatterPlot.addItem(imageItem)
             else:
                 color = self.mColoringColor.color()
+                x, y = density.xy()
                 plotItem = self.mScatterPlot.plot(x, y)
                 plotItem.setSymbol(symbol.value)
                 plotItem.setSymbolBrush(color)
@@ -471,16 +488,14 @@ class ScatterPlotDialog(QMainWindow):
             plotItem.setPen(mkPen(color=self.mOneToOneLineColor.color(), style=Qt.SolidLine))
 
         if self.mFittedLine.isChecked():
-            z = np.polyfit(x, y, 1)
-            p = np.poly1d(z)
+            slope, intercept, r2, rmse = density.linearFit()
+            p = np.poly1d([slope, intercept])
             x_ = range[0]
             y_ = p(x_)
             plotItem = self.mScatterPlot.plot(x_, y_)
             plotItem.setPen(mkPen(color=self.mFittedLineColor.color(), style=Qt.SolidLine))
 
-            r2 = round(pearsonr(x, y)[0] ** 2, 4)
-            rmse = round(np.sqrt(np.mean((x - y) ** 2)), 4)
-            text = f'f(x) = {str(p).strip()} | r^2 = {r2} | rmse = {rmse}'
+            text = f'f(x) = {str(p).strip()} | r^2 = {round(r2, 4)} | rmse = {round(rmse, 4)}'
             self.mFittedLineReport.setPlainText(text)
 
         self.mScatterPlot.autoRange()
@@ -489,7 +504,7 @@ class ScatterPlotDialog(QMainWindow):
         if not self.mLiveUpdate.isChecked():
             return
 
-        self.onApplyClicked()
+        self.mLiveUpdateTimer.start()  # coalesce bursts of update requests into a single request
 
 
 @typechecked
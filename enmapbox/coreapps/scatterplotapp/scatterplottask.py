@@ -0,0 +1,224 @@
+from math import ceil, sqrt, floor
+from time import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from enmapbox.typeguard import typechecked
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.utils import Utils
+from qgis.PyQt.QtCore import pyqtSignal
+from qgis.core import QgsTask, QgsRasterLayer, QgsRectangle
+
+
+@typechecked
+class ScatterPlotDensity(object):
+    """
+    Incremental 2d histogram of (x, y) pairs, together with the running sums needed for a linear fit.
+
+    Points outside the histogram range are not binned, but are used for the fit.
+    """
+
+    def __init__(self, bins: Tuple[int, int], range: Tuple[Tuple[float, float], Tuple[float, float]], keepPoints=False):
+        self.bins = bins
+        self.range = range
+        self.counts = np.zeros(bins, np.int64)
+        self.n = 0
+        self.sums = np.zeros(6)  # x, y, xx, yy, xy, (x - y)^2
+        self.keepPoints = keepPoints
+        self.points = list()
+
+    def update(self, x: np.ndarray, y: np.ndarray):
+        if x.size == 0:
+            return
+        x = x.astype(np.float64)
+        y = y.astype(np.float64)
+        indices = list()
+        valid = np.ones(x.shape, bool)
+        for values, (lower, upper), nbins in zip([x, y], self.range, self.bins):
+            span = upper - lower
+            if span == 0:
+                span = 1
+            index = np.floor((values - lower) / span * nbins).astype(np.int64)
+            index[values == upper] = nbins - 1  # right edge is part of the last bin
+            valid &= (values >= lower) & (values <= upper)
+            indices.append(index)
+        keys = indices[0][valid] * self.bins[1] + indices[1][valid]
+        self.counts += np.bincount(keys, minlength=self.counts.size).reshape(self.bins)
+
+        self.n += x.size
+        self.sums += [np.sum(x), np.sum(y), np.sum(x * x), np.sum(y * y), np.sum(x * y), np.sum((x - y) ** 2)]
+        if self.keepPoints:
+            self.points.append((x, y))
+
+    def xy(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return all points, if kept."""
+        if len(self.points) == 0:
+            return np.array([]), np.array([])
+        return np.concatenate([x for x, y in self.points]), np.concatenate([y for x, y in self.points])
+
+    def linearFit(self) -> Tuple[float, float, float, float]:
+        """Return slope, intercept, squared Pearson correlation and RMSE between x and y."""
+        sx, sy, sxx, syy, sxy, sdd = self.sums
+        n = self.n
+        varX = n * sxx - sx ** 2
+        varY = n * syy - sy ** 2
+        cov = n * sxy - sx * sy
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = cov / varX
+            intercept = (sy - slope * sx) / n
+            r2 = cov ** 2 / (varX * varY)
+            rmse = np.sqrt(sdd / n)
+        return float(slope), float(intercept), float(r2), float(rmse)
+
+    def copy(self) -> 'ScatterPlotDensity':
+        density = ScatterPlotDensity(self.bins, self.range, self.keepPoints)
+        density.counts = self.counts.copy()
+        density.n = self.n
+        density.sums = self.sums.copy()
+        density.points = list(self.points)
+        return density
+
+
+class ScatterPlotTask(QgsTask):
+    """
+    Read two raster bands and accumulate their scatter plot density in the background.
+
+    A coarse subsample is read first and is reported as a first preview (if it contains valid data).
+    If the value range is not given, it is derived from a min/max pass over the sampling grid.
+    The sampling grid is then streamed strip by strip, and intermediate results are reported regularly via
+    sigResultChanged, until the final result is reported via taskCompleted.
+    If the task fails, the error is stored in ScatterPlotTask.error.
+    """
+    sigResultChanged = pyqtSignal(int, object)  # request id, ScatterPlotDensity
+
+    PreviewSize = 10000  # number of pixels in the coarse subsample
+    ReportInterval = 0.25  # minimum number of seconds between intermediate results
+
+    def __init__(
+            self, requestId: int, layerX: QgsRasterLayer, bandNoX: int, layerY: QgsRasterLayer, bandNoY: int,
+            extent: QgsRectangle, sampleSize: int, bins: Tuple[int, int],
+            range: Tuple[Tuple[Optional[float], Optional[float]], Tuple[Optional[float], Optional[float]]],
+            swapAxes=False, keepPoints=False
+    ):
+        super().__init__('Calculate scatter plot', QgsTask.Silent | QgsTask.CanCancel | QgsTask.CancelWithoutPrompt)
+        self.requestId = requestId
+        self.layerX = layerX.clone()  # layers are used inside the worker thread
+        self.layerY = layerY.clone()
+        self.bandNoX = bandNoX
+        self.bandNoY = bandNoY
+        self.extent = QgsRectangle(extent)
+        self.sampleSize = sampleSize
+        self.bins = bins
+        self.range = range
+        self.swapAxes = swapAxes
+        self.keepPoints = keepPoints
+        self.density: Optional[ScatterPlotDensity] = None
+        self.error: Optional[Exception] = None
+
+    def samplingSize(self, readerX: RasterReader) -> Tuple[int, int]:
+        width = self.extent.width() / readerX.rasterUnitsPerPixelX()
+        height = self.extent.height() / readerX.rasterUnitsPerPixelY()
+        width = max(min(int(round(width)), readerX.width()), 1)  # 1 <= width <= layerWidth
+        height = max(min(int(round(height)), readerX.height()), 1)  # 1 <= height <= layerHeight
+        if self.sampleSize != 0:
+            sampleFraction = sqrt(min(self.sampleSize / (width * height), 1))
+            width = ceil(width * sampleFraction)
+            height = ceil(height * sampleFraction)
+        return width, height
+
+    def readXY(
+            self, readerX: RasterReader, readerY: RasterReader, boundingBox: QgsRectangle, width: int, height: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        arrayX = readerX.arrayFromBoundingBoxAndSize(boundingBox, width, height, [self.bandNoX])[0]
+        arrayY = readerY.arrayFromBoundingBoxAndSize(boundingBox, width, height, [self.bandNoY])[0]
+        validX = readerX.maskArray([arrayX], [self.bandNoX])[0]
+        validY = readerY.maskArray([arrayY], [self.bandNoY])[0]
+        valid = np.logical_and(validX, validY)
+        x = arrayX[valid]
+        y = arrayY[valid]
+        if self.swapAxes:
+            x, y = y, x
+        return x, y
+
+    def deriveRange(self, x: np.ndarray, y: np.ndarray):
+        """Return the value range, where undefined bounds are derived from the data."""
+        valueRange = list()
+        for (lower, upper), values in zip(self.range, [x, y]):
+            if lower is None:
+                lower = float(np.min(values))
+            if upper is None:
+                upper = float(np.max(values))
+            valueRange.append((lower, upper))
+        return tuple(valueRange)
+
+    def readStrips(self, readerX: RasterReader, readerY: RasterReader, width: int, height: int):
+        """Yield (x, y, progress) for each strip of the sampling grid, with progress in [0, 1]."""
+        stripHeight = max(1, min(height, Utils.memoryBudget() // (width * 32)))
+        pixelSizeY = self.extent.height() / height
+        for yOffset in range(0, height, stripHeight):
+            stripHeight_ = min(stripHeight, height - yOffset)
+            boundingBox = QgsRectangle(
+                self.extent.xMinimum(), self.extent.yMaximum() - (yOffset + stripHeight_) * pixelSizeY,
+                self.extent.xMaximum(), self.extent.yMaximum() - yOffset * pixelSizeY
+            )
+            x, y = self.readXY(readerX, readerY, boundingBox, width, stripHeight_)
+            yield x, y, (yOffset + stripHeight_) / height
+
+    def run(self) -> bool:
+        try:
+            readerX = RasterReader(self.layerX)
+            readerY = RasterReader(self.layerY)
+            width, height = self.samplingSize(readerX)
+
+            # coarse subsample for a quick preview
+            fraction = sqrt(min(self.PreviewSize / (width * height), 1))
+            previewWidth, previewHeight = max(1, floor(width * fraction)), max(1, floor(height * fraction))
+            x, y = self.readXY(readerX, readerY, self.extent, previewWidth, previewHeight)
+            isComplete = (previewWidth, previewHeight) == (width, height)
+            valueRange = self.range
+            if x.size > 0:
+                valueRange = self.deriveRange(x, y)
+                density = ScatterPlotDensity(self.bins, valueRange, self.keepPoints)
+                density.update(x, y)
+                if isComplete:
+                    self.density = density
+                    return True
+                self.sigResultChanged.emit(self.requestId, density.copy())
+            elif isComplete:
+                return True  # no valid data
+
+            # derive the value range (if not given) from all values,
+            # the preview may miss the extremes or may not contain any valid data at all
+            progressOffset = 0
+            if any(bound is None for bounds in self.range for bound in bounds):
+                minima = np.full(2, np.inf)
+                maxima = np.full(2, -np.inf)
+                for x, y, progress in self.readStrips(readerX, readerY, width, height):
+                    if self.isCanceled():
+                        return False
+                    if x.size > 0:
+                        minima = np.minimum(minima, [np.min(x), np.min(y)])
+                        maxima = np.maximum(maxima, [np.max(x), np.max(y)])
+                    self.setProgress(progress * 50)
+                if not np.all(np.isfinite(minima)):
+                    return True  # no valid data
+                valueRange = self.deriveRange(np.array([minima[0], maxima[0]]), np.array([minima[1], maxima[1]]))
+                progressOffset = 50
+
+            # stream the sampling grid strip by strip
+            density = ScatterPlotDensity(self.bins, valueRange, self.keepPoints)
+            lastReport = time()
+            for x, y, progress in self.readStrips(readerX, readerY, width, height):
+                if self.isCanceled():
+                    return False
+                density.update(x, y)
+                self.setProgress(progressOffset + progress * (100 - progressOffset))
+                if time() - lastReport > self.ReportInterval and density.n > 0:
+                    self.sigResultChanged.emit(self.requestId, density.copy())
+                    lastReport = time()
+            self.density = density
+        except Exception as error:
+            self.error = error
+            return False
+        return True
@@ -368,7 +368,7 @@ class ProfileAnalyticsDockWidget(QDockWidget):
                 reader = RasterReader(layer)
                 if self.mRasterProfileType.currentIndex() == self.ZProfileType:
                     name = f'{layer.name()} [column {pixel.x() + 1}, row {pixel.y() + 1}]'
-                    yValues = reader.arrayFromPixelOffsetAndSize(pixel.x(), pixel.y(), 1, 1)
+                    yValues = reader.cachedArrayFromPixelOffsetAndSize(pixel.x(), pixel.y(), 1, 1)
                     yMaskValues = reader.maskArray(np.array(yValues))
                     if self.mXUnit.currentIndex() == self.NumberUnits:
                         xUnit = 'band numbers'
@@ -384,13 +384,13 @@ class ProfileAnalyticsDockWidget(QDockWidget):
                         raise ValueError()
                 elif self.mRasterProfileType.currentIndex() == self.XProfileType:
                     name = f'{layer.name()} [band {bandNo}, row {pixel.y() + 1}]'
-                    yValues = np.array(reader.arrayFromPixelOffsetAndSize(0, pixel.y(), reader.width(), 1, [bandNo]))
+                    yValues = reader.cachedArrayFromPixelOffsetAndSize(0, pixel.y(), reader.width(), 1, [bandNo])
                     yMaskValues = np.array(reader.maskArray(np.array(yValues), [bandNo]))
                     xValues = list(range(1, reader.width() + 1))
                     xUnit = 'column numbers'
                 elif self.mRasterProfileType.currentIndex() == self.YProfileType:
                     name = f'{layer.name()} [band {bandNo}, column {pixel.x() + 1}]'
-                    yValues = np.array(reader.arrayFromPixelOffsetAndSize(pixel.x(), 0, 1, reader.height(), [bandNo]))
+                    yValues = reader.cachedArrayFromPixelOffsetAndSize(pixel.x(), 0, 1, reader.height(), [bandNo])
                     yMaskValues = np.array(reader.maskArray(np.array(yValues), [bandNo]))
                     xValues = list(range(1, reader.height() + 1))
                     xUnit = 'row numbers'
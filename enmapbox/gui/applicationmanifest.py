@@ -0,0 +1,272 @@
+"""
+Cached description of EnMAP-Box application packages, which allows to register menu entries and processing
+algorithms of an application without importing its package.
+"""
+import json
+import os
+from os.path import dirname, exists, join
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+from enmapbox import __version__
+from qgis.PyQt.QtCore import QBuffer, QByteArray, QIODevice
+from qgis.PyQt.QtGui import QIcon, QPixmap
+from qgis.PyQt.QtWidgets import QAction, QMenu
+from qgis import core as qgisCore
+from qgis.core import QgsApplication, QgsProcessingAlgorithm, QgsProcessingException, QgsProcessingParameters, \
+    QgsProcessingOutputDefinition
+
+
+class ApplicationManifest(object):
+    """
+    Manifests of EnMAP-Box application packages, stored as a single JSON file.
+
+    A manifest describes the applications (name, version, licence, icon), the menu entries and the processing
+    algorithms of an application package. It is valid as long as the manifest format, the EnMAP-Box version and the
+    modification times of the package files do not change.
+    """
+    Version = 2  # manifest format; since version 2, algorithms include parameter and output definitions
+
+    def __init__(self, filename: Union[str, Path] = None):
+        if filename is None:
+            filename = join(QgsApplication.qgisSettingsDirPath(), 'enmapbox', 'cache', 'applicationmanifest.json')
+        self.filename = str(filename)
+        self.mEntries: Optional[Dict[str, Dict]] = None
+
+    def entries(self) -> Dict[str, Dict]:
+        if self.mEntries is None:
+            self.mEntries = dict()
+            if exists(self.filename):
+                try:
+                    with open(self.filename, encoding='utf-8') as file:
+                        self.mEntries = json.load(file)
+                except (OSError, ValueError):
+                    pass  # ignore corrupted manifest files
+        return self.mEntries
+
+    @staticmethod
+    def fingerprint(appFolder: Union[str, Path]) -> str:
+        """Return a fingerprint of the package, which changes when any of its files changes."""
+        mtime = 0.
+        for root, dirnames, filenames in os.walk(appFolder):
+            dirnames[:] = [dirname for dirname in dirnames if dirname != '__pycache__']
+            for filename in filenames:
+                mtime = max(mtime, os.stat(join(root, filename)).st_mtime)
+        return f'{ApplicationManifest.Version}:{__version__}:{mtime}'
+
+    def entry(self, appFolder: Union[str, Path]) -> Optional[Dict]:
+        """Return the manifest of an application package, or None if it is missing or outdated."""
+        entry = self.entries().get(str(appFolder))
+        if entry is None or entry.get('fingerprint') != self.fingerprint(appFolder):
+            return None
+        return entry
+
+    def setEntry(self, appFolder: Union[str, Path], entry: Dict):
+        entry['fingerprint'] = self.fingerprint(appFolder)
+        if self.entries().get(str(appFolder)) == entry:
+            return
+        self.entries()[str(appFolder)] = entry
+        try:
+            os.makedirs(dirname(self.filename), exist_ok=True)
+            with open(self.filename, 'w', encoding='utf-8') as file:
+                json.dump(self.entries(), file, indent=1)
+        except OSError:
+            pass  # the manifest is an optional cache
+
+    @staticmethod
+    def iconToString(icon: Optional[QIcon]) -> Optional[str]:
+        if not isinstance(icon, QIcon) or icon.isNull():
+            return None
+        array = QByteArray()
+        buffer = QBuffer(array)
+        buffer.open(QIODevice.WriteOnly)
+        icon.pixmap(32, 32).save(buffer, 'PNG')
+        buffer.close()
+        return bytes(array.toBase64()).decode()
+
+    @staticmethod
+    def iconFromString(text: Optional[str]) -> QIcon:
+        if text is None:
+            return QIcon()
+        pixmap = QPixmap()
+        pixmap.loadFromData(QByteArray.fromBase64(text.encode()))
+        return QIcon(pixmap)
+
+    @classmethod
+    def actionToDict(cls, action: QAction) -> Dict:
+        """Describe a menu action, including all actions of its submenu."""
+        menu = action.menu()
+        return {
+            'text': action.text(),
+            'toolTip': action.toolTip(),
+            'enabled': action.isEnabled(),
+            'separator': action.isSeparator(),
+            'icon': cls.iconToString(action.icon()),
+            'actions': None if menu is None else [cls.actionToDict(a) for a in menu.actions()]
+        }
+
+    @classmethod
+    def actionFromDict(
+            cls, item: Dict, parentMenu: QMenu, before: Optional[QAction], path: List[str],
+            onTriggered: Callable[[List[str], str], None]
+    ) -> QAction:
+        """
+        Create a placeholder for a described menu action inside the parent menu.
+        Triggering a placeholder calls onTriggered with the menu path and the text of the triggered action.
+        """
+        if item['separator']:
+            action = QAction(parentMenu)
+            action.setSeparator(True)
+        elif item['actions'] is not None:
+            menu = QMenu(item['text'], parentMenu)
+            for child in item['actions']:
+                cls.actionFromDict(child, menu, None, path + [item['text']], onTriggered)
+            action = menu.menuAction()
+        else:
+            action = QAction(item['text'], parentMenu)
+            action.triggered.connect(lambda *args, text=item['text']: onTriggered(path, text))
+        action.setToolTip(item['toolTip'])
+        action.setEnabled(item['enabled'])
+        action.setIcon(cls.iconFromString(item['icon']))
+        parentMenu.insertAction(before, action)
+        return action
+
+    @classmethod
+    def algorithmToDict(cls, algorithm: QgsProcessingAlgorithm) -> Dict:
+        """
+        Describe a processing algorithm, including its parameter and output definitions.
+        Parameters and outputs are None, if they can not be restored from the description.
+        """
+        try:
+            instance = algorithm.create({})
+        except Exception:
+            instance = None
+        if instance is None:
+            parameters = outputs = None
+        else:
+            parameters = [cls.parameterToDict(parameter) for parameter in instance.parameterDefinitions()]
+            outputs = [cls.outputToDict(output) for output in instance.outputDefinitions()]
+            if None in parameters or None in outputs:
+                parameters = outputs = None
+        return {
+            'name': algorithm.name(),
+            'displayName': algorithm.displayName(),
+            'group': algorithm.group(),
+            'groupId': algorithm.groupId(),
+            'shortDescription': algorithm.shortDescription(),
+            'shortHelpString': '' if instance is None else instance.shortHelpString(),
+            'tags': algorithm.tags(),
+            'flags': int(algorithm.flags()),
+            'icon': cls.iconToString(algorithm.icon()),
+            'customWidget': cls.overrides(algorithm, 'createCustomParametersWidget'),
+            'parameters': parameters,
+            'outputs': outputs
+        }
+
+    @staticmethod
+    def overrides(algorithm: QgsProcessingAlgorithm, name: str) -> bool:
+        """Return True, if the algorithm class overrides a QgsProcessingAlgorithm method."""
+        mro = type(algorithm).__mro__
+        return any(name in vars(c) for c in mro[:mro.index(QgsProcessingAlgorithm)])
+
+    @staticmethod
+    def parameterToDict(parameter) -> Optional[Dict]:
+        """Describe a parameter definition, or return None if it can not be restored from JSON."""
+        try:
+            definition = json.loads(json.dumps(parameter.toVariantMap()))
+        except (TypeError, ValueError):
+            return None
+        if QgsProcessingParameters.parameterFromVariantMap(definition) is None:
+            return None
+        return definition
+
+    @staticmethod
+    def outputToDict(output: QgsProcessingOutputDefinition) -> Optional[Dict]:
+        """Describe an output definition, or return None if its class is not part of the QGIS API."""
+        className = type(output).__name__
+        if not isinstance(getattr(qgisCore, className, None), type):
+            return None
+        return {'class': className, 'name': output.name(), 'description': output.description()}
+
+    @staticmethod
+    def outputFromDict(definition: Dict) -> QgsProcessingOutputDefinition:
+        return getattr(qgisCore, definition['class'])(definition['name'], definition['description'])
+
+
+class LazyProcessingAlgorithm(QgsProcessingAlgorithm):
+    """
+    Placeholder for a processing algorithm of an EnMAP-Box application that is not loaded yet.
+
+    Name, group, icon, parameters and outputs are restored from the manifest, without importing the application
+    package. The application is loaded when the algorithm is prepared for running (or checks its parameter values,
+    or creates its custom parameters widget). These calls are delegated to the real algorithm.
+    """
+
+    def __init__(self, definition: Dict, loader: Callable[[str], Optional[QgsProcessingAlgorithm]]):
+        super().__init__()
+        self.mDefinition = definition
+        self.mLoader = loader
+        self.mAlgorithm: Optional[QgsProcessingAlgorithm] = None
+
+    def createInstance(self):
+        return LazyProcessingAlgorithm(self.mDefinition, self.mLoader)
+
+    def name(self) -> str:
+        return self.mDefinition['name']
+
+    def displayName(self) -> str:
+        return self.mDefinition['displayName']
+
+    def group(self) -> str:
+        return self.mDefinition['group']
+
+    def groupId(self) -> str:
+        return self.mDefinition['groupId']
+
+    def shortDescription(self) -> str:
+        return self.mDefinition['shortDescription']
+
+    def shortHelpString(self) -> str:
+        return self.mDefinition['shortHelpString']
+
+    def tags(self) -> List[str]:
+        return self.mDefinition['tags']
+
+    def flags(self):
+        return QgsProcessingAlgorithm.Flags(self.mDefinition['flags'])
+
+    def icon(self) -> QIcon:
+        return ApplicationManifest.iconFromString(self.mDefinition['icon'])
+
+    def initAlgorithm(self, configuration: Dict = None):
+        for definition in self.mDefinition['parameters']:
+            # outputs of destination parameters are part of the output definitions
+            self.addParameter(QgsProcessingParameters.parameterFromVariantMap(definition), False)
+        for definition in self.mDefinition['outputs']:
+            self.addOutput(ApplicationManifest.outputFromDict(definition))
+
+    def algorithm(self) -> QgsProcessingAlgorithm:
+        """Return the real algorithm, the application package is loaded on first call."""
+        if self.mAlgorithm is None:
+            algorithm = self.mLoader(self.name())
+            if algorithm is None:
+                raise QgsProcessingException(f'Unable to load algorithm: {self.name()}')
+            self.mAlgorithm = algorithm.create({})
+        return self.mAlgorithm
+
+    def createCustomParametersWidget(self, parent=None):
+        if not self.mDefinition['customWidget']:
+            return None
+        return self.algorithm().createCustomParametersWidget(parent)
+
+    def checkParameterValues(self, parameters: Dict, context):
+        return self.algorithm().checkParameterValues(parameters, context)
+
+    def prepareAlgorithm(self, parameters: Dict, context, feedback) -> bool:
+        return self.algorithm().prepareAlgorithm(parameters, context, feedback)
+
+    def processAlgorithm(self, parameters: Dict, context, feedback) -> Dict:
+        return self.algorithm().processAlgorithm(parameters, context, feedback)
+
+    def postProcessAlgorithm(self, context, feedback) -> Dict:
+        return self.algorithm().postProcessAlgorithm(context, feedback)
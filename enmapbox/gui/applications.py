@@ -27,16 +27,18 @@ import sys
 import traceback
 import typing
 from pathlib import Path
-from typing import Optional, List, OrderedDict, Union, Dict
+from typing import Optional, List, OrderedDict, Union, Dict, Set, Tuple
 
 from enmapbox import messageLog
 from enmapbox.algorithmprovider import EnMAPBoxProcessingProvider
+from enmapbox.gui.applicationmanifest import ApplicationManifest, LazyProcessingAlgorithm
 from enmapbox.gui.contextmenuprovider import EnMAPBoxContextMenuProvider
 from enmapbox.gui.contextmenus import EnMAPBoxContextMenuRegistry
 from enmapbox.gui.enmapboxgui import EnMAPBox
+from qgis.PyQt import sip
 from qgis.PyQt.QtCore import QObject, pyqtSignal
 from qgis.PyQt.QtGui import QIcon
-from qgis.PyQt.QtWidgets import QAction, QMenu
+from qgis.PyQt.QtWidgets import QAction, QMenu, QDockWidget, QToolBar
 from qgis.PyQt.QtXml import QDomDocument, QDomElement
 from qgis.core import QgsProcessingAlgorithm
 from qgis.gui import QgisInterface
@@ -204,9 +206,25 @@ class ApplicationWrapper(QObject):
         self.loading_time: Optional[datetime.timedelta] = None
 
 
+class LazyApplicationWrapper(QObject):
+    """
+    Stores information about an EnMAPBoxApplication package that is registered from its manifest, but not loaded yet
+    """
+
+    def __init__(self, appFolder: Path, manifest: Dict, parent=None):
+        super(LazyApplicationWrapper, self).__init__(parent)
+        self.appFolder: Path = appFolder
+        self.manifest: Dict = manifest
+        self.menuItems: List[Tuple[QMenu, QAction]] = []  # (parent menu, placeholder action)
+        self.processingAlgorithms: List[QgsProcessingAlgorithm] = []
+
+
 class ApplicationRegistry(QObject):
     """
-    Registry to load and remove EnMAPBox Applications
+    Registry to load and remove EnMAPBox Applications.
+
+    With lazy loading enabled, applications that only provide menu entries and processing algorithms are registered
+    from a cached manifest, and their packages are imported when a menu entry or algorithm is used for the first time.
     """
 
     sigLoadingInfo = pyqtSignal(str)
@@ -214,7 +232,8 @@ class ApplicationRegistry(QObject):
 
     def __init__(self, enmapBox: EnMAPBox, parent=None,
                  whitelist: Optional[List[str]] = None,
-                 blackList: Optional[List[str]] = None):
+                 blackList: Optional[List[str]] = None,
+                 lazyLoading: bool = False):
         super(ApplicationRegistry, self).__init__(parent)
         self.appPackageRootFolders = []
 
@@ -235,6 +254,15 @@ class ApplicationRegistry(QObject):
 
         self.mAppInitializationMessages = collections.OrderedDict()
 
+        self.mLazyLoading: bool = lazyLoading
+        self.mManifest = ApplicationManifest()
+        self.mLazyAppWrapper: OrderedDict[str, LazyApplicationWrapper] = collections.OrderedDict()
+        self.mLazyAlgorithms: Dict[str, str] = dict()  # algorithm name -> application package name
+        self.mLoadingTimes: OrderedDict[str, Tuple[str, float]] = collections.OrderedDict()
+
+    def setLazyLoading(self, lazyLoading: bool):
+        self.mLazyLoading = lazyLoading
+
     def setWhitelist(self, whitelist: List[str]):
         self.mBlacklist = None
         self.mWhitelist = whitelist
@@ -251,7 +279,8 @@ class ApplicationRegistry(QObject):
 
     def applications(self) -> List[EnMAPBoxApplication]:
         """
-        Returns the EnMAPBoxApplications
+        Returns the loaded EnMAPBoxApplications. Lazily registered applications are not included,
+        see loadLazyApplications().
         :return: [list-of-EnMAPBoxApplications]
         """
         return [w.app for w in self.applicationWrapper()]
@@ -359,80 +388,344 @@ class ApplicationRegistry(QObject):
             return any([self.addApplicationFolder(f) for f in app_folders])
         else:
             app_folder = app_folders[0]
-            basename = os.path.basename(app_folder)
-            try:
-
-                appPkgName = app_folder.name
-                appPkgRoot = app_folder.parent
-                pkgFile = os.path.join(app_folder, '__init__.py')
+            appPkgName = app_folder.name
+            t0 = datetime.datetime.now()
 
+            if self.isLazyLoadingEnabled():
+                manifest = self.mManifest.entry(app_folder)
                 blacklist = os.environ.get('EMB_APP_BLACKLIST', '').split(',')
-                if appPkgName in blacklist:
-                    raise Exception(f'Skipped loading EnMAPBoxApplication "{appPkgName}"')
+                if manifest is not None and manifest['lazy'] and appPkgName not in blacklist:
+                    if self.addLazyApplication(app_folder, manifest):
+                        dt = datetime.datetime.now() - t0
+                        self.mLoadingTimes[appPkgName] = ('lazy', dt.total_seconds())
+                        print('Register EnMAPBoxApplication(s) from "{}" manifest ... {} sec.'.format(
+                            appPkgName, dt.total_seconds()))
+                        return True
+
+            success = self.loadApplicationPackage(app_folder)
+            dt = datetime.datetime.now() - t0
+            self.mLoadingTimes[appPkgName] = ('loaded' if success else 'failed', dt.total_seconds())
+            return success
+
+    def loadApplicationPackage(self, app_folder: Path) -> bool:
+        """
+        Imports an EnMAP-Box application package and adds the applications returned by its enmapboxApplicationFactory.
+        With lazy loading enabled, the manifest of the package is updated.
+        :param app_folder: directory with an __init__.py which defines a .enmapboxApplicationFactory()
+        :return: bool, True if any EnMAPBoxApplication was added
+        """
+        basename = os.path.basename(app_folder)
+        try:
+
+            appPkgName = app_folder.name
+            appPkgRoot = app_folder.parent
+            pkgFile = os.path.join(app_folder, '__init__.py')
 
-                print('Load EnMAPBoxApplication(s) from "{}" ... '.format(appPkgName), end='')
-                t0 = datetime.datetime.now()
-                if not os.path.isfile(pkgFile):
-                    raise Exception('File does not exist: "{}"'.format(pkgFile))
+            blacklist = os.environ.get('EMB_APP_BLACKLIST', '').split(',')
+            if appPkgName in blacklist:
+                raise Exception(f'Skipped loading EnMAPBoxApplication "{appPkgName}"')
 
-                site.addsitedir(str(appPkgRoot))
+            print('Load EnMAPBoxApplication(s) from "{}" ... '.format(appPkgName), end='')
+            t0 = datetime.datetime.now()
+            if not os.path.isfile(pkgFile):
+                raise Exception('File does not exist: "{}"'.format(pkgFile))
 
-                # do not use __import__
-                # appModule = __import__(appPkgName)
+            site.addsitedir(str(appPkgRoot))
 
-                appModule = importlib.import_module(appPkgName)
+            # do not use __import__
+            # appModule = __import__(appPkgName)
 
-                factory = [o[1] for o in
-                           inspect.getmembers(appModule, inspect.isfunction)
-                           if o[0] == 'enmapboxApplicationFactory']
+            appModule = importlib.import_module(appPkgName)
 
-                if len(factory) == 0:
-                    raise Exception('Missing definition of enmapboxApplicationFactory() in {}'.format(pkgFile))
+            factory = [o[1] for o in
+                       inspect.getmembers(appModule, inspect.isfunction)
+                       if o[0] == 'enmapboxApplicationFactory']
 
-                factory = factory[0]
+            if len(factory) == 0:
+                raise Exception('Missing definition of enmapboxApplicationFactory() in {}'.format(pkgFile))
 
-                # create the app
-                apps = factory(self.mEnMAPBox)
-                if not isinstance(apps, list):
-                    apps = [apps]
+            factory = factory[0]
 
-                if len(apps) == 0:
-                    self.mAppInitializationMessages[basename] = None
-                    return False
+            # remember the GUI state, to find out what the applications add to it
+            guiState = self.guiState() if self.isLazyLoadingEnabled() else None
 
-                foundValidApps = False
+            # create the app
+            apps = factory(self.mEnMAPBox)
+            if not isinstance(apps, list):
+                apps = [apps]
+
+            if len(apps) == 0:
+                self.mAppInitializationMessages[basename] = None
+                return False
 
-                for app in apps:
+            addedApps = []
 
-                    # DEBUG
+            for app in apps:
 
-                    if not isinstance(app, EnMAPBoxApplication):
-                        raise Exception('Not an EnMAPBoxApplication instance: {}'.format(app.__module__))
-                    else:
-                        if self.addApplication(app):
-                            foundValidApps = True
+                # DEBUG
 
-                if foundValidApps:
-                    # return True if app  factory returned a valid EnMAPBoxApplication
-                    self.mAppInitializationMessages[basename] = True
+                if not isinstance(app, EnMAPBoxApplication):
+                    raise Exception('Not an EnMAPBoxApplication instance: {}'.format(app.__module__))
                 else:
-                    # return False if app factory did not return any EnMAPBoxApplication
-                    self.mAppInitializationMessages[basename] = False
-
-                dt = datetime.datetime.now() - t0
-                print('{} sec.'.format(dt.total_seconds()))
-                return foundValidApps
-
-            except Exception as ex:
-                exc_type, exc_value, exc_traceback = sys.exc_info()
-                tbLines = traceback.format_tb(exc_traceback)
-                traceback.print_exc()  # AR: also print the traceback to the console for better PyCharm debugging
-                tbLines = ''.join(tbLines)
-                info = '{}:{}\nTraceback:\n{}'.format(ex.__class__.__name__, ex, tbLines)
-                # return Error with Traceback
-                self.mAppInitializationMessages[basename] = info
-                print(info, file=sys.stderr)
-                return False
+                    if self.addApplication(app):
+                        addedApps.append(app)
+
+            foundValidApps = len(addedApps) > 0
+            if foundValidApps:
+                # return True if app  factory returned a valid EnMAPBoxApplication
+                self.mAppInitializationMessages[basename] = True
+            else:
+                # return False if app factory did not return any EnMAPBoxApplication
+                self.mAppInitializationMessages[basename] = False
+
+            if guiState is not None:
+                self.mManifest.setEntry(app_folder, self.createManifest(apps, addedApps, guiState))
+
+            dt = datetime.datetime.now() - t0
+            print('{} sec.'.format(dt.total_seconds()))
+            return foundValidApps
+
+        except Exception as ex:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            tbLines = traceback.format_tb(exc_traceback)
+            traceback.print_exc()  # AR: also print the traceback to the console for better PyCharm debugging
+            tbLines = ''.join(tbLines)
+            info = '{}:{}\nTraceback:\n{}'.format(ex.__class__.__name__, ex, tbLines)
+            # return Error with Traceback
+            self.mAppInitializationMessages[basename] = info
+            print(info, file=sys.stderr)
+            return False
+
+    def isLazyLoadingEnabled(self) -> bool:
+        return self.mLazyLoading and isinstance(self.mEnMAPBox, EnMAPBox)
+
+    def isAllowedApplication(self, name: str) -> bool:
+        """
+        Checks the application name against the whitelist or blacklist
+        """
+        if isinstance(self.mWhitelist, list):
+            return name in self.mWhitelist or name.lower() in self.mWhitelist
+        elif isinstance(self.mBlacklist, list):
+            return not (name in self.mBlacklist or name.lower() in self.mBlacklist)
+        return True
+
+    def menuActions(self, menu: QMenu = None) -> List[QAction]:
+        """
+        Returns all actions of the EnMAP-Box menu bar (or of a menu), including the actions of all submenus
+        """
+        actions = self.mEnMAPBox.ui.menuBar().actions() if menu is None else menu.actions()
+        result = []
+        for action in actions:
+            result.append(action)
+            if action.menu() is not None:
+                result.extend(self.menuActions(action.menu()))
+        return result
+
+    def findMenu(self, path: List[str]) -> Optional[QMenu]:
+        """
+        Returns the EnMAP-Box menu at the given path of menu titles, e.g. ['Applications', 'Classification']
+        """
+        menu = None
+        actions = self.mEnMAPBox.ui.menuBar().actions()
+        for title in path:
+            menu = [a.menu() for a in actions if a.menu() is not None and a.menu().title() == title]
+            if len(menu) == 0:
+                return None
+            menu = menu[0]
+            actions = menu.actions()
+        return menu
+
+    def guiState(self) -> Tuple[Set[int], Set[int], int]:
+        """
+        Returns the addresses of all menu and toolbar actions and the number of dock widgets of the EnMAP-Box
+        """
+        ui = self.mEnMAPBox.ui
+        menuActions = {sip.unwrapinstance(a) for a in self.menuActions()}
+        toolbarActions = {sip.unwrapinstance(a) for toolbar in ui.findChildren(QToolBar) for a in toolbar.actions()}
+        return menuActions, toolbarActions, len(ui.findChildren(QDockWidget))
+
+    def newMenuItems(self, knownActions: Set[int]) -> Optional[List[Dict]]:
+        """
+        Describes all menu items that are not in knownActions.
+        Returns None, if new items can not be described, e.g. new menus inside the menu bar.
+        """
+        items = []
+
+        def collect(menu: QMenu, path: List[str]):
+            actions = menu.actions()
+            for i, action in enumerate(actions):
+                if sip.unwrapinstance(action) in knownActions:
+                    if action.menu() is not None:
+                        collect(action.menu(), path + [action.menu().title()])
+                else:
+                    before = [a.text() for a in actions[i + 1:] if sip.unwrapinstance(a) in knownActions]
+                    items.append({
+                        'path': path,
+                        'before': before[0] if len(before) > 0 else None,
+                        'item': ApplicationManifest.actionToDict(action)
+                    })
+
+        for action in self.mEnMAPBox.ui.menuBar().actions():
+            if sip.unwrapinstance(action) not in knownActions or action.menu() is None:
+                return None
+            collect(action.menu(), [action.menu().title()])
+        return items
+
+    def createManifest(
+            self, apps: List[EnMAPBoxApplication], addedApps: List[EnMAPBoxApplication],
+            guiState: Tuple[Set[int], Set[int], int]
+    ) -> Dict:
+        """
+        Describes the applications of a package, their menu items and processing algorithms.
+        An application package can be loaded lazily, if its applications add nothing but menu items and processing
+        algorithms.
+        """
+        knownMenuActions, knownToolbarActions, dockCount = guiState
+        _, toolbarActions, dockCount2 = self.guiState()
+        menuItems = self.newMenuItems(knownMenuActions)
+        algorithms = [ApplicationManifest.algorithmToDict(alg)
+                      for app in addedApps
+                      for w in self.applicationWrapper(app)
+                      for alg in w.processingAlgorithms]
+
+        import enmapbox.algorithmprovider
+        hasProvider = isinstance(enmapbox.algorithmprovider.instance(), EnMAPBoxProcessingProvider)
+
+        def overrides(app: EnMAPBoxApplication, name: str) -> bool:
+            return getattr(type(app), name) is not getattr(EnMAPBoxApplication, name)
+
+        lazy = all([
+            hasProvider,
+            all(alg['parameters'] is not None for alg in algorithms),
+            len(apps) == len(addedApps),
+            menuItems is not None,
+            len(menuItems or []) + len(algorithms) > 0,
+            toolbarActions.issubset(knownToolbarActions),
+            dockCount == dockCount2,
+            not any(overrides(app, name)
+                    for app in apps for name in ['contextMenuProvider', 'projectSettings', 'setProjectSettings'])
+        ])
+        return {
+            'lazy': lazy,
+            'apps': [{'name': app.name, 'version': app.version, 'licence': app.licence,
+                      'icon': ApplicationManifest.iconToString(app.icon())} for app in apps],
+            'menuItems': menuItems or [],
+            'algorithms': algorithms
+        }
+
+    def addLazyApplication(self, app_folder: Path, manifest: Dict) -> bool:
+        """
+        Registers the menu items and processing algorithms of an application package from its manifest,
+        without importing the package.
+        :return: bool, True if the package was registered
+        """
+        appPkgName = app_folder.name
+        if not all(self.isAllowedApplication(app['name']) for app in manifest['apps']):
+            return False
+
+        import enmapbox.algorithmprovider
+        provider = enmapbox.algorithmprovider.instance()
+        if not isinstance(provider, EnMAPBoxProcessingProvider):
+            return False
+
+        self.sigLoadingInfo.emit(f'Register {appPkgName} ...')
+        wrapper = LazyApplicationWrapper(app_folder, manifest)
+
+        def onTriggered(path: List[str], text: str):
+            self.onLazyMenuActionTriggered(appPkgName, path, text)
+
+        for entry in manifest['menuItems']:
+            parentMenu = self.findMenu(entry['path'])
+            if parentMenu is None:
+                messageLog(f'Unable to find menu {"/".join(entry["path"])} for {appPkgName}')
+                continue
+            before = [a for a in parentMenu.actions() if a.text() == entry['before']]
+            before = before[0] if len(before) > 0 else None
+            action = ApplicationManifest.actionFromDict(entry['item'], parentMenu, before, entry['path'], onTriggered)
+            wrapper.menuItems.append((parentMenu, action))
+
+        # register the wrapper first, the provider initializes the placeholders when adding them
+        self.mLazyAppWrapper[appPkgName] = wrapper
+        algorithms = [LazyProcessingAlgorithm(definition, self.lazyProcessingAlgorithm)
+                      for definition in manifest['algorithms']
+                      if provider.algorithm(definition['name']) is None]
+        for alg in algorithms:
+            self.mLazyAlgorithms[alg.name()] = appPkgName
+        wrapper.processingAlgorithms.extend(algorithms)
+        provider.addAlgorithms(algorithms)
+        return True
+
+    def lazyApplications(self) -> List[str]:
+        """
+        Returns the names of application packages that are registered from their manifest, but not loaded yet
+        """
+        return list(self.mLazyAppWrapper.keys())
+
+    def loadLazyApplication(self, appPkgName: str) -> bool:
+        """
+        Loads a lazily registered application package and replaces its placeholder menu items
+        :return: bool, True if any EnMAPBoxApplication was added
+        """
+        wrapper = self.mLazyAppWrapper.pop(appPkgName, None)
+        if wrapper is None:
+            return False
+
+        for parentMenu, action in wrapper.menuItems:
+            parentMenu.removeAction(action)
+            if action.menu() is not None:
+                action.menu().deleteLater()
+            else:
+                action.deleteLater()
+
+        t0 = datetime.datetime.now()
+        success = self.loadApplicationPackage(wrapper.appFolder)
+        dt = datetime.datetime.now() - t0
+        self.mLoadingTimes[appPkgName] = ('loaded on demand' if success else 'failed', dt.total_seconds())
+        return success
+
+    def loadLazyApplications(self):
+        """
+        Loads all lazily registered application packages
+        """
+        for appPkgName in self.lazyApplications():
+            self.loadLazyApplication(appPkgName)
+
+    def onLazyMenuActionTriggered(self, appPkgName: str, path: List[str], text: str):
+        self.loadLazyApplication(appPkgName)
+
+        # trigger the real menu action
+        menu = self.findMenu(path)
+        if menu is None:
+            return
+        actions = [a for a in menu.actions() if a.text() == text and a.menu() is None]
+        if len(actions) > 0:
+            actions[0].trigger()
+
+    def lazyProcessingAlgorithm(self, name: str) -> Optional[QgsProcessingAlgorithm]:
+        """
+        Returns the real processing algorithm for a lazily registered algorithm and loads its application package
+        """
+        appPkgName = self.mLazyAlgorithms.get(name)
+        if appPkgName is None:
+            return None
+        self.loadLazyApplication(appPkgName)
+        for wrapper in self.mAppWrapper.values():
+            for alg in wrapper.processingAlgorithms:
+                if alg.name() == name:
+                    return alg
+        return None
+
+    def loadingTimesReport(self) -> str:
+        """
+        Returns a report of the start-up times of all application packages, slowest first
+        """
+        lines = ['EnMAPBoxApplication start-up times:']
+        loadingTimes = sorted(self.mLoadingTimes.items(), key=lambda item: -item[1][1])
+        for appPkgName, (mode, seconds) in loadingTimes:
+            lines.append(f'  {appPkgName:<40} {mode:<18} {seconds:8.3f} sec.')
+        total = sum(seconds for mode, seconds in self.mLoadingTimes.values())
+        lines.append(f'  {"total":<40} {"":<18} {total:8.3f} sec.')
+        return '\n'.join(lines)
 
     def addApplications(self, apps) -> list:
         """
@@ -447,12 +740,8 @@ class ApplicationRegistry(QObject):
         Adds a single EnMAP-Box application, i.a. a class that implemented the EnMAPBoxApplication Interface
         :param app: EnMAPBoxApplication
         """
-        if isinstance(self.mWhitelist, list):
-            if not (app.name in self.mWhitelist or app.name.lower() in self.mWhitelist):
-                return False
-        elif isinstance(self.mBlacklist, list):
-            if app.name in self.mBlacklist or app.name.lower() in self.mBlacklist:
-                return False
+        if not self.isAllowedApplication(app.name):
+            return False
 
         t0 = datetime.datetime.now()
         appWrapper = ApplicationWrapper(app)
@@ -511,7 +800,8 @@ class ApplicationRegistry(QObject):
             provider = enmapbox.algorithmprovider.instance()
 
             if isinstance(provider, EnMAPBoxProcessingProvider):
-                provider.addAlgorithms(processingAlgorithms)
+                # lazily registered algorithms are already added, and delegate to the real algorithms
+                provider.addAlgorithms([alg for alg in processingAlgorithms if alg.name() not in self.mLazyAlgorithms])
             else:
                 print('Can not find EnMAPBoxAlgorithmProvider')
 
@@ -0,0 +1,176 @@
+"""
+Background ingestion of data sources: provider probing in a bounded thread pool and a persistent probe cache.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from os.path import dirname, join
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Tuple, Union
+
+from qgis.PyQt.QtCore import pyqtSignal
+from qgis.core import QgsApplication, QgsMapLayerFactory, QgsProviderRegistry, QgsProviderSublayerDetails, QgsTask
+from ...qgispluginsupport.qps.subdatasets import subLayerDetails
+
+
+class DataSourceProbeCache(object):
+    """
+    Persistent cache of provider probe results, i.e. the sublayer details that are returned by subLayerDetails.
+
+    Results are cached for local files only and are keyed by file path, modification time and size.
+    The cache is stored as a single JSON file and only written when changed, see save.
+    """
+    _instance: Optional['DataSourceProbeCache'] = None
+
+    def __init__(self, filename: Union[str, Path] = None):
+        if filename is None:
+            filename = join(QgsApplication.qgisSettingsDirPath(), 'enmapbox', 'cache', 'datasourceprobes.json')
+        self.filename = str(filename)
+        self.mEntries: Optional[Dict[str, Dict]] = None
+        self.mModified = False
+        self.mLock = Lock()
+
+    @classmethod
+    def instance(cls) -> 'DataSourceProbeCache':
+        """Return the cache shared by all data source managers."""
+        if cls._instance is None:
+            cls._instance = DataSourceProbeCache()
+        return cls._instance
+
+    def entries(self) -> Dict[str, Dict]:
+        with self.mLock:
+            if self.mEntries is None:
+                self.mEntries = dict()
+                if os.path.exists(self.filename):
+                    try:
+                        with open(self.filename, encoding='utf-8') as file:
+                            self.mEntries = json.load(file)
+                    except (OSError, ValueError):
+                        pass  # ignore corrupted cache files
+            return self.mEntries
+
+    @staticmethod
+    def fingerprint(path: str) -> Optional[Tuple[int, int]]:
+        """Return (modification time, size) of a local file, or None for all other sources."""
+        try:
+            stat = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(path):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def detailsToDict(details: QgsProviderSublayerDetails) -> Dict:
+        return {
+            'providerKey': details.providerKey(),
+            'type': QgsMapLayerFactory.typeToString(details.type()),
+            'uri': details.uri(),
+            'name': details.name(),
+            'description': details.description(),
+            'path': details.path(),
+            'layerNumber': details.layerNumber(),
+            'driverName': details.driverName(),
+            'featureCount': details.featureCount(),
+            'wkbType': int(details.wkbType()),
+            'geometryColumnName': details.geometryColumnName(),
+        }
+
+    @staticmethod
+    def detailsFromDict(item: Dict) -> QgsProviderSublayerDetails:
+        details = QgsProviderSublayerDetails()
+        details.setProviderKey(item['providerKey'])
+        details.setType(QgsMapLayerFactory.typeFromString(item['type'])[0])
+        details.setUri(item['uri'])
+        details.setName(item['name'])
+        details.setDescription(item['description'])
+        details.setPath(item['path'])
+        details.setLayerNumber(item['layerNumber'])
+        details.setDriverName(item['driverName'])
+        details.setFeatureCount(item['featureCount'])
+        details.setWkbType(item['wkbType'])
+        details.setGeometryColumnName(item['geometryColumnName'])
+        return details
+
+    def sublayerDetails(self, path: str) -> Optional[List[QgsProviderSublayerDetails]]:
+        """Return the cached probe result of a source, or None if it is missing or outdated."""
+        fingerprint = self.fingerprint(path)
+        if fingerprint is None:
+            return None
+        entry = self.entries().get(path)
+        if entry is None or tuple(entry['fingerprint']) != fingerprint:
+            return None
+        return [self.detailsFromDict(item) for item in entry['sublayers']]
+
+    def setSublayerDetails(self, path: str, details: List[QgsProviderSublayerDetails]):
+        fingerprint = self.fingerprint(path)
+        if fingerprint is None:
+            return
+        entry = {'fingerprint': list(fingerprint), 'sublayers': [self.detailsToDict(d) for d in details]}
+        entries = self.entries()
+        with self.mLock:
+            if entries.get(path) != entry:
+                entries[path] = entry
+                self.mModified = True
+
+    def probe(self, path: str) -> List[QgsProviderSublayerDetails]:
+        """Return the sublayer details of a source, probed by all registered providers if not cached."""
+        details = self.sublayerDetails(path)
+        if details is None:
+            details = subLayerDetails(path, providers=QgsProviderRegistry.instance().providerList())
+            self.setSublayerDetails(path, details)
+        return details
+
+    def save(self):
+        """Write the cache, if it was modified."""
+        with self.mLock:
+            if not self.mModified:
+                return
+            self.mModified = False
+            entries = {path: entry for path, entry in self.mEntries.items() if os.path.isfile(path)}
+            try:
+                os.makedirs(dirname(self.filename), exist_ok=True)
+                with open(self.filename, 'w', encoding='utf-8') as file:
+                    json.dump(entries, file)
+            except OSError:
+                pass  # the probe cache is optional
+
+
+class DataSourceIngestionTask(QgsTask):
+    """
+    Probes data sources in a bounded thread pool.
+
+    Each probed source is reported via sigSourceProbed, so that data sources can be created progressively
+    in the GUI thread, where probe results are taken from the DataSourceProbeCache.
+    """
+    MaxWorkers = 4
+    sigSourceProbed = pyqtSignal(str)  # source
+
+    def __init__(self, sources: List[str], cache: DataSourceProbeCache = None):
+        super().__init__('Load data sources', QgsTask.Silent | QgsTask.CanCancel | QgsTask.CancelWithoutPrompt)
+        if cache is None:
+            cache = DataSourceProbeCache.instance()
+        self.mSources = sources
+        self.mCache = cache
+        self.mError: Optional[Exception] = None
+
+    def maxWorkers(self) -> int:
+        return max(1, min(self.MaxWorkers, os.cpu_count() or 1, len(self.mSources)))
+
+    def run(self) -> bool:
+        try:
+            with ThreadPoolExecutor(self.maxWorkers()) as executor:
+                futures = {executor.submit(self.mCache.probe, source): source for source in self.mSources}
+                for i, future in enumerate(as_completed(futures)):
+                    if self.isCanceled():
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        return False
+                    # failed probes are reported as well, the factory handles them like unknown sources
+                    future.exception()
+                    self.setProgress(100 * (i + 1) / len(futures))
+                    self.sigSourceProbed.emit(futures[future])
+        except Exception as error:
+            self.mError = error
+            return False
+        return True
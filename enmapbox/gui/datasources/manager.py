@@ -23,20 +23,20 @@ from qgis.PyQt.QtCore import pyqtSignal, QAbstractItemModel, QItemSelectionModel
 from qgis.PyQt.QtGui import QContextMenuEvent, QDesktopServices
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAbstractItemView, QAction, QApplication, QDialog, QMenu, QTreeView, QWidget
-from qgis.core import Qgis, QgsDataItem, QgsLayerItem, QgsLayerTreeGroup, QgsLayerTreeLayer, QgsMapLayer, \
-    QgsMimeDataUtils, QgsProject, QgsProviderSublayerDetails, QgsRasterDataProvider, \
+from qgis.core import Qgis, QgsApplication, QgsDataItem, QgsLayerItem, QgsLayerTreeGroup, QgsLayerTreeLayer, \
+    QgsMapLayer, QgsMimeDataUtils, QgsProject, QgsProviderSublayerDetails, QgsRasterDataProvider, \
     QgsRasterLayer, QgsRasterRenderer, QgsVectorLayer, QgsMapLayerType, QgsIconUtils, QgsLayerDefinition
-from qgis.core import QgsProviderRegistry
 from qgis.gui import QgisInterface, QgsDockWidget, QgsMapCanvas
 from .datasources import DataSource, FileDataSource, LayerItem, ModelDataSource, RasterDataSource, SpatialDataSource, \
     VectorDataSource, VectorTileDataSource
+from .ingestion import DataSourceIngestionTask, DataSourceProbeCache
 from .metadata import RasterBandTreeNode
 from ..dataviews.docks import Dock
 from ..mapcanvas import MapCanvas
 from ..mimedata import extractMapLayers, fromDataSourceList, MDF_URILIST, QGIS_URILIST_MIMETYPE
 from ...qgispluginsupport.qps.projectlayers import SelectProjectLayersDialog
 from ...qgispluginsupport.qps.speclib.core import is_spectral_library
-from ...qgispluginsupport.qps.subdatasets import SubDatasetSelectionDialog, subLayerDetails
+from ...qgispluginsupport.qps.subdatasets import SubDatasetSelectionDialog
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +64,11 @@ class DataSourceManager(TreeModel):
         self.mUpdateTimer.start()
         self.mUpdateState: dict = dict()
 
+        # placeholders of sources that are loaded in the background
+        self.mPendingNode: TreeNode = TreeNode('Loading', icon=QgsApplication.getThemeIcon('mTaskRunning.svg'))
+        self.mPendingSources: Dict[str, TreeNode] = dict()
+        self.mIngestionTasks: List[DataSourceIngestionTask] = []
+
         from enmapbox.gui.enmapboxgui import EnMAPBox
         self.mEnMAPBoxInstance: EnMAPBox = None
 
@@ -98,8 +103,8 @@ class DataSourceManager(TreeModel):
             # add new data from external sources
             from enmapbox.gui.mimedata import MDF_QGIS_LAYERTREEMODELDATA
             if mimeData.hasFormat(MDF_URILIST):
-                for url in mimeData.urls():
-                    toAdd.extend(DataSourceFactory.create(url))
+                # dropped files are probed in the background
+                return self.addDataSourcesAsync(mimeData.urls()) > 0
 
             # add data dragged from QGIS
             elif mimeData.hasFormat(MDF_QGIS_LAYERTREEMODELDATA) or mimeData.hasFormat(QGIS_URILIST_MIMETYPE):
@@ -383,8 +388,72 @@ class DataSourceManager(TreeModel):
         if len(added) > 0:
             self.sigDataSourcesAdded.emit(added)
             self.updateSourceNodes()
+        DataSourceProbeCache.instance().save()
         return added
 
+    def addDataSourcesAsync(self, sources: List[Union[str, Path, QUrl]], show_dialogs: bool = True) -> int:
+        """
+        Adds file sources without blocking the GUI. Sources are probed by the data providers in a background task,
+        and are added one by one as soon as they are probed. Until then, a placeholder node is shown for each source.
+        Returns the number of scheduled sources.
+        """
+        paths = []
+        for source in sources:
+            if isinstance(source, Path):
+                source = source.as_posix()
+            source = DataSourceFactory.srcToString(source)
+            if isinstance(source, str) and source not in self.mPendingSources and source not in paths \
+                    and len(self.findDataSources(source)) == 0:
+                paths.append(source)
+        if len(paths) == 0:
+            return 0
+
+        for path in paths:
+            self.mPendingSources[path] = TreeNode(Path(path).name, toolTip=path)
+        self.mPendingNode.appendChildNodes([self.mPendingSources[path] for path in paths])
+        self.updatePendingNode()
+
+        task = DataSourceIngestionTask(paths)
+        task.sigSourceProbed.connect(lambda path: self.onSourceProbed(path, show_dialogs))
+        task.taskCompleted.connect(lambda: self.onIngestionTaskFinished(task))
+        task.taskTerminated.connect(lambda: self.onIngestionTaskFinished(task))
+        self.mIngestionTasks.append(task)
+        QgsApplication.taskManager().addTask(task)
+        return len(paths)
+
+    def pendingSources(self) -> List[str]:
+        """
+        Returns the sources that are currently loaded in the background
+        """
+        return list(self.mPendingSources.keys())
+
+    def updatePendingNode(self):
+        n = len(self.mPendingSources)
+        self.mPendingNode.setName(f'Loading ({n})')
+        if n > 0 and self.mPendingNode.parentNode() is None:
+            self.rootNode().appendChildNodes([self.mPendingNode])
+        elif n == 0 and self.mPendingNode.parentNode() is not None:
+            self.rootNode().removeChildNodes([self.mPendingNode])
+
+    def onSourceProbed(self, path: str, show_dialogs: bool = True):
+        node = self.mPendingSources.pop(path, None)
+        if node is None:
+            return
+        self.mPendingNode.removeChildNodes([node])
+        self.updatePendingNode()
+        # probe results are taken from the probe cache
+        self.addDataSources(path, show_dialogs=show_dialogs)
+
+    def onIngestionTaskFinished(self, task: DataSourceIngestionTask):
+        if task in self.mIngestionTasks:
+            self.mIngestionTasks.remove(task)
+        # remove placeholders of sources that were not probed, e.g. due to cancellation
+        nodes = [self.mPendingSources.pop(path) for path in task.mSources if path in self.mPendingSources]
+        if len(nodes) > 0:
+            self.mPendingNode.removeChildNodes(nodes)
+            self.updatePendingNode()
+        DataSourceProbeCache.instance().save()
+
 
 class DataSourceManagerProxyModel(QSortFilterProxyModel):
 
@@ -871,9 +940,7 @@ class DataSourceFactory(object):
                     if re.search(r'\.(skops)$', source, re.I):
                         dataItem = QgsDataItem(Qgis.BrowserItemType.Custom, None, name, source, 'special:skops')
                     else:
-                        providers = ['gdal', 'ogr']
-                        providers = QgsProviderRegistry.instance().providerList()
-                        sDetails = subLayerDetails(source, providers=providers)
+                        sDetails = DataSourceProbeCache.instance().probe(source)
                         if len(sDetails) == 1:
                             return DataSourceFactory.create(sDetails[0])
                         elif len(sDetails) > 1:
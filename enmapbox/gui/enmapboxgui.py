@@ -538,7 +538,8 @@ class EnMAPBox(QgisInterface, QObject, QgsExpressionContextGenerator, QgsProcess
 
         debugLog('Load EnMAPBoxApplications...')
         from enmapbox.gui.applications import ApplicationRegistry
-        self.applicationRegistry = ApplicationRegistry(self, parent=self)
+        lazyLoading = str(os.environ.get('EMB_APP_LAZY_LOADING', True)).lower() in ['1', 'true']
+        self.applicationRegistry = ApplicationRegistry(self, parent=self, lazyLoading=lazyLoading)
         self.applicationRegistry.sigLoadingInfo.connect(splash.showMessage)
         self.applicationRegistry.sigLoadingFinished.connect(lambda success, msg:
                                                             splash.showMessage(msg, color=QColor(
@@ -1961,6 +1962,8 @@ class EnMAPBox(QgisInterface, QObject, QgsExpressionContextGenerator, QgsProcess
             else:
                 print('Unable to load EnMAPBoxApplication(s) from path: "{}"'.format(p), file=sys.stderr)
 
+        debugLog(self.applicationRegistry.loadingTimesReport())
+
         errorApps = [app for app, v in self.applicationRegistry.mAppInitializationMessages.items()
                      if v not in [None, True]]
         settings = self.settings()
@@ -1,9 +1,9 @@
-from math import ceil, nan, inf
+from math import nan, inf
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
-from osgeo import gdal
 
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.numpyutils import NumpyUtils
@@ -68,10 +68,12 @@ class AggregateRasterBandsAlgorithm(EnMAPProcessingAlgorithm):
             bandCount = len(functionIndices)
             writer = Driver(filename, feedback=feedback).createLike(reader, Qgis.DataType.Float32, bandCount)
             noDataValue = Utils.defaultNoDataValue(np.float32)
-            lineMemoryUsage = reader.lineMemoryUsage(reader.bandCount() + bandCount, 4)
-            blockSizeY = min(raster.height(), ceil(gdal.GetCacheMax() / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in reader.walkGrid(blockSizeX, blockSizeY, feedback):
+            planner = BlockPlanner(reader, feedback=feedback)
+            planner.addInput(reader)
+            planner.addWorkingMemory(reader.bandCount(), 4)  # float32 copy
+            planner.addWorkingMemory(reader.bandCount(), 1)  # masks
+            planner.addOutput(bandCount, Qgis.DataType.Float32)
+            for block in planner.walkGrid(feedback):
                 array = np.array(reader.arrayFromBlock(block), dtype=np.float32)
                 mask = reader.maskArray(array)
                 invalid = np.logical_not(np.any(mask, axis=0))  # whole pixel is no data (see  #1424)
@@ -1,17 +1,18 @@
-from math import ceil, nan, inf
+from math import nan, inf
 from os import makedirs
 from os.path import join, exists, splitext
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
-from osgeo import gdal
 from qgis.core import QgsProcessingContext, QgsProcessingFeedback, QgsProcessingException, QgsProcessing, \
     QgsRasterLayer, Qgis
 
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.numpyutils import NumpyUtils
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
 from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.rasterwriter import RasterWriter
 from enmapboxprocessing.utils import Utils
@@ -122,29 +123,45 @@ class AggregateRastersAlgorithm(EnMAPProcessingAlgorithm):
                     writer.setWavelength(readers[0].wavelength(bandNo), bandNo)
                 writers.append(writer)
 
-            lineMemoryUsage = gridReader.lineMemoryUsage(len(writers) + len(readers), 4)
-            blockSizeY = min(raster.height(), ceil(gdal.GetCacheMax() / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in gridReader.walkGrid(blockSizeX, blockSizeY, feedback):
-
-                if masks is not None:
-                    externalMasks = list()
-                    for mreader in mreaders:
-                        a = mreader.arrayFromBlock(block)
-                        m = mreader.maskArray(a, defaultNoDataValue=0)
-                        externalMasks.append(m)
-
-                for bandNo in readers[0].bandNumbers():
-                    array = list()
+            processor = self.createBlockProcessor(feedback)
+            planner = BlockPlanner(gridReader, feedback=feedback)
+            planner.addWorkingMemory(len(readers), 4)  # float32 band stack
+            planner.addWorkingMemory(len(readers) * 2, 1)  # masks
+            planner.addWorkingMemory(len(readers), 4)  # intermediate copies used by nan-functions
+            planner.addOutput(len(writers) * bandCount, Qgis.DataType.Float32)
+            planner.setBlocksInFlight(processor.maximumBlocksInFlight())
+            blockSizeX, blockSizeY = planner.blockSize()
+
+            def createSlot():
+                if processor.parallelism == 1:
+                    readers_, mreaders_ = readers, mreaders
+                else:
+                    readers_ = [reader.clone() for reader in readers]
+                    mreaders_ = [mreader.clone() for mreader in mreaders]
+                buffer = np.empty((len(readers), blockSizeY, blockSizeX), np.float32)  # reused for all blocks
+                return readers_, mreaders_, buffer
+
+            def readBlock(slot, block: RasterBlockInfo):
+                readers_, mreaders_, buffer = slot
+                externalMasks = list()
+                for mreader in mreaders_:
+                    a = mreader.arrayFromBlock(block)
+                    m = mreader.maskArray(a, defaultNoDataValue=0)
+                    externalMasks.append(m)
+                return readers_, buffer, block, externalMasks
+
+            def processBlock(data):
+                readers_, buffer, block, externalMasks = data
+                outarrays = np.empty((len(writers), bandCount, block.height, block.width), np.float32)
+                for bandNo in readers_[0].bandNumbers():
+                    array = NumpyUtils.bufferView(buffer, (len(readers_), block.height, block.width))
                     mask = list()
-                    for i, reader in enumerate(readers):
-                        iarray = reader.arrayFromBlock(block, [bandNo])
+                    for i, reader in enumerate(readers_):
+                        iarray = reader.arrayFromBlock(block, [bandNo], out=array[i:i + 1])
                         imask = reader.maskArray(iarray, [bandNo])
                         if masks is not None:
                             imask = np.logical_and(imask, externalMasks[i])
-                        array.append(iarray[0])
                         mask.append(imask[0])
-                    array = np.array(array, np.float32)
                     invalid = np.logical_not(np.any(mask, axis=0))  # whole pixel is no data
                     array[np.logical_not(mask)] = nan
 
@@ -154,13 +171,12 @@ class AggregateRastersAlgorithm(EnMAPProcessingAlgorithm):
                     # Calculate all percentiles at once.
                     q = [i - self.P0 for i in functionIndices if i >= self.P0]
                     for i, outarray in enumerate(NumpyUtils.nanpercentile(array, q)):
-                        writer = writers[functionIndices.index(q[i] + self.P0)]
                         outarray[np.isnan(outarray)] = noDataValue
                         outarray[invalid] = noDataValue
-                        writer.writeArray2d(outarray, bandNo, xOffset=block.xOffset, yOffset=block.yOffset)
+                        outarrays[functionIndices.index(q[i] + self.P0), bandNo - 1] = outarray
 
                     # Calculate all other indices individually.
-                    for functionIndex, writer in zip(functionIndices, writers):
+                    for writerIndex, functionIndex in enumerate(functionIndices):
                         if functionIndex >= self.P0:  # skip percentiles
                             continue
                         elif functionIndex == self.ArithmeticMeanFunction:
@@ -213,8 +229,16 @@ class AggregateRastersAlgorithm(EnMAPProcessingAlgorithm):
                         # explicitely mask pixel with all-no-data (see #1424)
                         outarray[invalid] = noDataValue
 
-                        # write result
-                        writer.writeArray2d(outarray, bandNo, xOffset=block.xOffset, yOffset=block.yOffset)
+                        outarrays[writerIndex, bandNo - 1] = outarray
+                return outarrays
+
+            def writeBlock(block: RasterBlockInfo, outarrays):
+                for writer, outarray in zip(writers, outarrays):
+                    writer.writeArray(outarray, xOffset=block.xOffset, yOffset=block.yOffset)
+
+            processor.run(
+                planner.walkGrid(), readBlock, processBlock, writeBlock, createSlot
+            )
 
             for writer in writers:
                 writer.close()
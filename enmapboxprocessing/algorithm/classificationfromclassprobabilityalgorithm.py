@@ -1,10 +1,10 @@
-from math import ceil
 from random import randint
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
 
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.rasterreader import RasterReader
@@ -65,10 +65,11 @@ class ClassificationFromClassProbabilityAlgorithm(EnMAPProcessingAlgorithm):
 
             reader = RasterReader(probability)
             writer = Driver(filename, feedback=feedback).createLike(reader, Qgis.DataType.Byte, 1)
-            lineMemoryUsage = reader.lineMemoryUsage()
-            blockSizeY = min(probability.height(), ceil(Utils.maximumMemoryUsage() / lineMemoryUsage))
-            blockSizeX = probability.width()
-            for block in reader.walkGrid(blockSizeX, blockSizeY, feedback):
+            planner = BlockPlanner(reader, feedback=feedback)
+            planner.addInput(reader)
+            planner.addWorkingMemory(reader.bandCount(), 1)  # masks
+            planner.addOutput(1, Qgis.DataType.Byte)
+            for block in planner.walkGrid(feedback):
                 array = reader.arrayFromBlock(block)
                 invalid = ~np.all(reader.maskArray(array), 0)
                 array.insert(0, 1. - np.sum(array, 0))  # unclassified fraction
@@ -12,7 +12,10 @@ import numpy as np
 from enmapbox.typeguard import typechecked
 from enmapboxprocessing.algorithm.rasterizecategorizedvectoralgorithm import RasterizeCategorizedVectorAlgorithm
 from enmapboxprocessing.algorithm.translatecategorizedrasteralgorithm import TranslateCategorizedRasterAlgorithm
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
+from enmapboxprocessing.numpyutils import NumpyUtils
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
 from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.reportwriter import HtmlReportWriter, CsvReportWriter, MultiReportWriter
 from enmapboxprocessing.utils import Utils
@@ -159,26 +162,17 @@ class ClassificationPerformanceStratifiedAlgorithm(EnMAPProcessingAlgorithm):
 
             feedback.pushInfo('Read data')
             # Note that we can be sure that all pixel grids match!
-            arrayReference = RasterReader(reference).array()[0]
             categoriesReference = Utils.categoriesFromPalettedRasterRenderer(reference.renderer())
-            arrayPrediction = RasterReader(classification).array()[0]
             categoriesPrediction = Utils().categoriesFromRenderer(classification.renderer(), classification)
-            arrayStratification = RasterReader(stratification).array()[0]
             categoriesStratification = Utils.categoriesFromPalettedRasterRenderer(stratification.renderer())
-            # - get valid reference location
-            valid = np.full_like(arrayReference, False, bool)
-            for c in categoriesReference:
-                np.logical_or(valid, arrayReference == c.value, out=valid)
-            yReference = arrayReference[valid].astype(np.float32)
-            yMap = arrayPrediction[valid].astype(np.float32)
             # - remap class ids by name
-            yMapRemapped = yMap.copy()  # this initial state is correct for matching by order (see #845)
+            predictionRemapping = dict()  # identity is correct for matching by order (see #845)
             classNamesMatching = list()
             for i, cP in enumerate(categoriesPrediction):
                 found = False
                 for cR in categoriesReference:
                     if cR.name == cP.name:
-                        yMapRemapped[yMap == cP.value] = cR.value
+                        predictionRemapping[cP.value] = cR.value
                         found = True
                         classNamesMatching.append([cP.name, cR.name])
                 if not found:
@@ -189,34 +183,26 @@ class ClassificationPerformanceStratifiedAlgorithm(EnMAPProcessingAlgorithm):
                     )
                     classNamesMatching.append([cP.name, categoriesReference[i].name])
 
-            yMap = yMapRemapped
+            # - stream over all blocks and count (stratum, reference, prediction) combinations and strata sizes
+            classValues = [c.value for c in categoriesReference]
+            strataValues = [c.value for c in categoriesStratification]
+            counts, N_h_all = self.confusionCounts(
+                RasterReader(stratification), RasterReader(reference), RasterReader(classification), strataValues,
+                classValues, predictionRemapping, feedback
+            )
+
             # - prepare strata
-            stratum = arrayStratification[valid]
-            h_all = list()
-            N_h_all = list()
-            raw_h_all, raw_N_h_all = np.unique(arrayStratification, return_counts=True)
-            categoriesStratificationValues = [c.value for c in categoriesStratification]
-            for i_h_all, i_N_h_all in zip(raw_h_all.tolist(), raw_N_h_all.tolist()):
-                if i_h_all in categoriesStratificationValues:
-                    h_all.append(i_h_all)
-                    N_h_all.append(i_N_h_all)
-            if len(h_all) != len(categoriesStratification):
+            if np.sum(N_h_all > 0) != len(categoriesStratification):
                 raise ValueError(
-                    f'number of strata weights ({len(h_all)}) must match '
+                    f'number of strata weights ({np.sum(N_h_all > 0)}) must match '
                     f'number of stratification categories ({len(categoriesStratification)})'
                 )
-            h = list()
-            N_h = list()
-            for i, category in enumerate(categoriesStratification):
-                if category.value not in h_all:
-                    continue
-                h.append(category.value)
-                N_h.append(N_h_all[i])
+            h = strataValues
+            N_h = N_h_all.tolist()
 
             feedback.pushInfo('Estimate statistics and create report')
-            classValues = [c.value for c in categoriesReference]
             classNames = [c.name for c in categoriesReference]
-            stats = stratifiedAccuracyAssessment(stratum, yReference, yMap, h, N_h, classValues, classNames)
+            stats = stratifiedAccuracyAssessmentFromCounts(counts, h, N_h, classValues, classNames)
             pixelUnits = QgsUnitTypes.toString(classification.crs().mapUnits())
             pixelArea = classification.rasterUnitsPerPixelX() * classification.rasterUnitsPerPixelY()
 
@@ -236,6 +222,68 @@ class ClassificationPerformanceStratifiedAlgorithm(EnMAPProcessingAlgorithm):
 
         return result
 
+    def confusionCounts(
+            self, stratificationReader: RasterReader, referenceReader: RasterReader, predictionReader: RasterReader,
+            strataValues: List[float], classValues: List[float], predictionRemapping: Dict[float, float],
+            feedback: QgsProcessingFeedback = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (strata + 1, classes, classes + 1) counts of (stratum, reference, prediction) index combinations over
+        all valid reference pixels, and (strata,) stratum sizes, by streaming block-wise over the aligned rasters.
+        Stratum and prediction values that are not a stratum or reference class are counted at the last index.
+        Predicted values are translated via the remapping first.
+        """
+        nStrata = len(strataValues)
+        nClasses = len(classValues)
+        mapping = {value: value for value in classValues}
+        mapping.update(predictionRemapping)
+        predictionValues = list(mapping)
+        predictionTargets = [
+            classValues.index(value) if value in classValues else nClasses for value in mapping.values()
+        ]
+        predictionTargets = np.array(predictionTargets + [nClasses])
+
+        processor = self.createBlockProcessor(feedback)
+        planner = BlockPlanner(predictionReader, feedback=feedback)
+        for reader in [stratificationReader, referenceReader, predictionReader]:
+            planner.addInput(reader, [1])
+        planner.addWorkingMemory(3, 8)  # category indices
+        planner.setBlocksInFlight(processor.maximumBlocksInFlight())
+
+        def createSlot():
+            if processor.parallelism == 1:
+                return stratificationReader, referenceReader, predictionReader
+            return stratificationReader.clone(), referenceReader.clone(), predictionReader.clone()
+
+        def readBlock(slot, block: RasterBlockInfo):
+            readerS, readerR, readerP = slot
+            indicesS = NumpyUtils.categoryIndices(readerS.arrayFromBlock(block, [1])[0], strataValues)
+            sizes = np.bincount(indicesS.ravel(), minlength=nStrata + 1)[:nStrata]
+            indicesR = NumpyUtils.categoryIndices(readerR.arrayFromBlock(block, [1])[0], classValues)
+            valid = indicesR < nClasses
+            if not np.any(valid):  # skip reading predictions for blocks without reference pixels
+                return sizes, None
+            arrayP = readerP.arrayFromBlock(block, [1])[0][valid]
+            indicesP = predictionTargets[NumpyUtils.categoryIndices(arrayP, predictionValues)]
+            codes = (indicesS[valid] * nClasses + indicesR[valid]) * (nClasses + 1) + indicesP
+            counts = np.bincount(codes, minlength=(nStrata + 1) * nClasses * (nClasses + 1))
+            return sizes, counts
+
+        def processBlock(data):
+            return data
+
+        N_h = np.zeros(nStrata, np.int64)
+        counts = np.zeros((nStrata + 1) * nClasses * (nClasses + 1), np.int64)
+
+        def writeBlock(block: RasterBlockInfo, data):
+            blockSizes, blockCounts = data
+            N_h[:] += blockSizes
+            if blockCounts is not None:
+                counts[:] += blockCounts
+
+        processor.run(planner.walkGrid(), readBlock, processBlock, writeBlock, createSlot)
+        return counts.reshape((nStrata + 1, nClasses, nClasses + 1)), N_h
+
     @classmethod
     def writeReport(
             cls, filename: str, stats: 'StratifiedAccuracyAssessmentResult', pixelUnits='pixel', pixelArea=1.,
@@ -387,6 +435,16 @@ def stratifiedAccuracyAssessment(
     return StratifiedAccuracyAssessmentResult(N=float(sum(N_h)), n=len(reference), class_names=classNames, **stats)
 
 
+@typechecked
+def stratifiedAccuracyAssessmentFromCounts(
+        counts: np.ndarray, h: Iterable, N_h: Iterable, classValues, classNames
+):
+    stats = aa_stratified_counts(counts, h, N_h, classValues)
+    return StratifiedAccuracyAssessmentResult(
+        N=float(sum(N_h)), n=int(np.sum(counts)), class_names=classNames, **stats
+    )
+
+
 # Implementation is based on:
 #    Stehman, S. V., 2014.
 #    Estimating area and map accuracy for stratified random sampling when the strata are different from the map classes.
@@ -529,3 +587,136 @@ def aa_estimator_stratified_ratio(
 
     R_SE = np.sqrt(R_VAR)
     return R, R_SE
+
+
+@typechecked
+def aa_stratified_counts(counts: np.ndarray, h: Iterable, N_h: Iterable, classes: Iterable):
+    """
+    Same as aa_stratified, but for a (strata, classes, classes) count matrix of (stratum, reference, map) index
+    combinations, instead of one (stratum, reference, map) triplet per sample.
+    An additional last stratum index and map index may be used for counting samples from other strata and samples
+    with other map values.
+    """
+    h = list(h)
+    N_h = np.array(N_h, dtype=np.float64)
+    classes = list(classes)
+    nStrata = len(h)
+    nClasses = len(classes)
+
+    if len(h) != len(N_h):
+        raise ValueError(
+            f'h and N_h must have the same length, got {len(h)} and {len(N_h)}'
+        )
+    if counts.ndim != 3 or counts.shape[0] not in (nStrata, nStrata + 1) or counts.shape[1] != nClasses \
+            or counts.shape[2] not in (nClasses, nClasses + 1):
+        raise ValueError(
+            f'counts must have shape (strata [+ 1], classes, classes [+ 1]), got {counts.shape}'
+        )
+    n = np.sum(counts)
+    counts = counts[:nStrata].astype(np.float64)
+    n_h = np.sum(counts, axis=(1, 2))
+    missing_strata = [h[i] for i in np.flatnonzero(n_h == 0)]
+    if missing_strata:
+        raise ValueError(
+            f'empty strata detected: {sorted(missing_strata)}'
+        )
+
+    stats = defaultdict(list)
+    stats['classes'] = classes
+
+    # number of samples per stratum (first axis) and (reference, map) class combination, and class marginals
+    counts_rm = counts[:, :, :nClasses]
+    k_diagonal = np.diagonal(counts_rm, axis1=1, axis2=2)
+    k_reference = np.sum(counts, axis=2)
+    k_map = np.sum(counts_rm, axis=1)
+
+    # adjusted confusion matrix area proportions (sums to 1), rows are map classes
+    cmp, _ = aa_estimator_stratified_counts(np.transpose(counts_rm, (0, 2, 1)), n_h, N_h)
+    stats['confusion_matrix_proportions'] = cmp.tolist()
+
+    # adjusted confusion matrix counts
+    stats['confusion_matrix_counts'] = (cmp * n).tolist()
+
+    # overall accuracy
+    oa, oa_se = aa_estimator_stratified_counts(np.sum(k_diagonal, axis=1), n_h, N_h)
+    stats['overall_accuracy'] = float(oa)
+    stats['overall_accuracy_se'] = float(oa_se)
+
+    # area proportion
+    R, R_SE = aa_estimator_stratified_counts(k_reference, n_h, N_h)
+    stats['area_proportion'] = R.tolist()
+    stats['area_proportion_se'] = R_SE.tolist()
+
+    # user's accuracy
+    ua, ua_se = aa_estimator_stratified_ratio_counts(k_map, k_diagonal, k_diagonal, n_h, N_h)
+    stats['users_accuracy'] = ua.tolist()
+    stats['users_accuracy_se'] = ua_se.tolist()
+
+    # producer's accuracy
+    pa, pa_se = aa_estimator_stratified_ratio_counts(k_reference, k_diagonal, k_diagonal, n_h, N_h)
+    stats['producers_accuracy'] = pa.tolist()
+    stats['producers_accuracy_se'] = pa_se.tolist()
+
+    # f1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats['f1'] = (2 * ua * pa / (ua + pa)).tolist()
+        stats['f1_se'] = np.sqrt(np.add(
+            (ua_se * (2 * pa / (ua + pa) - 2 * ua * pa / (ua + pa) ** 2)) ** 2,
+            (pa_se * (2 * ua / (ua + pa) - 2 * ua * pa / (ua + pa) ** 2)) ** 2
+        )).tolist()
+
+    return stats
+
+
+def _binaryVariance(k: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Return sample variances (ddof=1) of binary variables, given the number of ones k among n samples."""
+    return k * (n - k) / (n * (n - 1))
+
+
+@typechecked
+def aa_estimator_stratified_counts(
+        k_y: np.ndarray, n_h: np.ndarray, N_h: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Same as aa_estimator_stratified, for binary y_u given as number of ones per stratum (first axis).
+    Further axes are estimated independently.
+    """
+    shape = (-1,) + (1,) * (k_y.ndim - 1)
+    n_h = n_h.reshape(shape)
+    N_h = N_h.reshape(shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        R = np.sum(N_h * k_y / n_h, axis=0) / np.sum(N_h)
+        f = 1. - n_h / N_h
+        R_VAR = np.sum(N_h ** 2 * f * _binaryVariance(k_y, n_h) / n_h, axis=0) / np.sum(N_h) ** 2
+    R_SE = np.sqrt(R_VAR)
+    return R, R_SE
+
+
+@typechecked
+def aa_estimator_stratified_ratio_counts(
+        k_x: np.ndarray, k_y: np.ndarray, k_xy: np.ndarray, n_h: np.ndarray, N_h: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Same as aa_estimator_stratified_ratio, for binary x_u and y_u given as number of ones per stratum (first axis),
+    and k_xy given as number of samples, where both are one.
+    Further axes are estimated independently.
+    """
+    shape = (-1,) + (1,) * (k_y.ndim - 1)
+    n_h = n_h.reshape(shape)
+    N_h = N_h.reshape(shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        X = np.sum(N_h * k_x / n_h, axis=0)
+        Y = np.sum(N_h * k_y / n_h, axis=0)
+        R = Y / X
+
+        f = 1. - n_h / N_h
+        s2xh = _binaryVariance(k_x, n_h)
+        s2yh = _binaryVariance(k_y, n_h)
+        sxyh = (k_xy - k_x * k_y / n_h) / (n_h - 1)
+        R_VAR = np.sum(N_h ** 2 * f * (s2yh + R ** 2 * s2xh - 2 * R * sxyh) / n_h, axis=0)
+        R_VAR /= X ** 2
+
+    R_VAR = abs(R_VAR)  # fixes an issue with floating-point accuracies that resulted in near zero, but negative values
+
+    R_SE = np.sqrt(R_VAR)
+    return R, R_SE
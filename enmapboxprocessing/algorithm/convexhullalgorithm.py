@@ -1,9 +1,10 @@
-from math import ceil, isnan
+from math import isnan
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
 
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.rasterreader import RasterReader
@@ -93,10 +94,10 @@ class ConvexHullAlgorithm(EnMAPProcessingAlgorithm):
                     filenameContinuumRemoved, feedback=feedback
                 ).createLike(reader, Qgis.Float32)
 
-            lineMemoryUsage = reader.lineMemoryUsage(dataTypeSize=4) * 3
-            blockSizeY = min(raster.height(), ceil(Utils.maximumMemoryUsage() / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in reader.walkGrid(blockSizeX, blockSizeY, feedback):
+            planner = BlockPlanner(reader, feedback=feedback)
+            planner.addInput(reader, bandList, 4)
+            planner.addWorkingMemory(len(bandList), 4 * 2)  # float32 convex hull and continuum removed
+            for block in planner.walkGrid(feedback):
                 array = np.array(reader.arrayFromBlock(block, bandList))
                 invalid = np.logical_not(reader.maskArray(array, bandList))
                 array[invalid] = 0  # filling no data values with zeroes should be fine (fixes #397)
@@ -1,15 +1,15 @@
 import inspect
 import traceback
-from math import ceil
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
 
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
 from enmapboxprocessing.rasterreader import RasterReader
-from enmapboxprocessing.utils import Utils
 from qgis.core import (QgsProcessingContext, QgsProcessingFeedback, Qgis)
 
 
@@ -113,7 +113,6 @@ class ConvolutionFilterAlgorithmBase(EnMAPProcessingAlgorithm):
         else:
             nan_treatment = 'fill'
         filename = self.parameterAsOutputLayer(parameters, self.P_OUTPUT_RASTER, context)
-        maximumMemoryUsage = Utils.maximumMemoryUsage()
 
         with open(filename + '.log', 'w') as logfile:
             from astropy.convolution import convolve, CustomKernel
@@ -134,22 +133,40 @@ class ConvolutionFilterAlgorithmBase(EnMAPProcessingAlgorithm):
             feedback.pushInfo('Convolve raster')
             rasterReader = RasterReader(raster)
             writer = Driver(filename, feedback=feedback).createLike(rasterReader, Qgis.Float32)
-            lineMemoryUsage = rasterReader.lineMemoryUsage(dataTypeSize=Qgis.Float32)
-            lineMemoryUsage *= 2  # output has same size
-            blockSizeY = min(raster.height(), ceil(maximumMemoryUsage / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in rasterReader.walkGrid(blockSizeX, blockSizeY, feedback):
-                feedback.setProgress(block.yOffset / rasterReader.height() * 100)
-                array = rasterReader.arrayFromBlock(block, overlap=overlap)
-                mask = rasterReader.maskArray(array)
+            processor = self.createBlockProcessor(feedback)
+            planner = BlockPlanner(rasterReader, feedback=feedback)
+            planner.addInput(rasterReader)
+            planner.addWorkingMemory(rasterReader.bandCount(), 1)  # masks
+            planner.addWorkingMemory(rasterReader.bandCount(), 8)  # float64 copy used by convolve
+            planner.addOutput(rasterReader.bandCount(), Qgis.DataType.Float64)  # convolve returns float64
+            planner.setOverlap(overlap)
+            planner.setBlocksInFlight(processor.maximumBlocksInFlight())
+            noDataValue = float(np.finfo(np.float32).min)
+
+            def createSlot():
+                return rasterReader if processor.parallelism == 1 else rasterReader.clone()
+
+            def readBlock(reader: RasterReader, block: RasterBlockInfo):
+                array = reader.arrayFromBlock(block, overlap=overlap)
+                mask = reader.maskArray(array)
+                return array, mask
+
+            def processBlock(data):
+                array, mask = data
                 outarray = convolve(
                     array, kernel, fill_value=np.nan, nan_treatment=nan_treatment,
                     normalize_kernel=normalize_kernel, mask=np.logical_not(mask)
                 )
-                noDataValue = float(np.finfo(np.float32).min)
                 outarray[np.isnan(outarray)] = noDataValue
+                return outarray
+
+            def writeBlock(block: RasterBlockInfo, outarray):
                 writer.writeArray(outarray, block.xOffset, block.yOffset, overlap=overlap)
 
+            processor.run(
+                planner.walkGrid(), readBlock, processBlock, writeBlock, createSlot
+            )
+
             writer.setMetadata(rasterReader.metadata())
             writer.setNoDataValue(noDataValue)
             for i in range(rasterReader.bandCount()):
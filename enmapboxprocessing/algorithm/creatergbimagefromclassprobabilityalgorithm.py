@@ -1,9 +1,8 @@
-from math import ceil
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
-from osgeo import gdal
 
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.rasterreader import RasterReader
@@ -63,7 +62,6 @@ class CreateRgbImageFromClassProbabilityAlgorithm(EnMAPProcessingAlgorithm):
         styledLayer = self.parameterAsLayer(parameters, self.P_COLORS_LAYER, context)
         colors = self.parameterAsValues(parameters, self.P_COLORS, context)
         filename = self.parameterAsOutputLayer(parameters, self.P_OUTPUT_RGB, context)
-        maximumMemoryUsage = gdal.GetCacheMax()
 
         categories = None
         if colors is not None:
@@ -83,11 +81,11 @@ class CreateRgbImageFromClassProbabilityAlgorithm(EnMAPProcessingAlgorithm):
         reader = RasterReader(probability)
         driver = Driver(filename, feedback=feedback)
         writer = driver.createLike(reader, Qgis.Byte, 3)
-        lineMemoryUsage = reader.lineMemoryUsage()
-        lineMemoryUsage += reader.lineMemoryUsage(3, Qgis.Float32)
-        blockSizeY = min(reader.height(), ceil(maximumMemoryUsage / lineMemoryUsage))
-        blockSizeX = reader.width()
-        for block in reader.walkGrid(blockSizeX, blockSizeY, feedback):
+        planner = BlockPlanner(reader, feedback=feedback)
+        planner.addInput(reader, [1])  # single band is read at a time
+        planner.addWorkingMemory(3, 4)  # float32 RGB
+        planner.addOutput(3, Qgis.DataType.Byte)
+        for block in planner.walkGrid(feedback):
             arrayRgb = np.zeros((3, block.height, block.width), np.float32)
             for bandNo, category in enumerate(categories, 1):
                 arrayScore = np.clip(reader.arrayFromBlock(block, [bandNo])[0], 0, 1)
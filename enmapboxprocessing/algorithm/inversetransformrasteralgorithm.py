@@ -1,9 +1,8 @@
-from math import ceil
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
-from osgeo import gdal
 
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.rasterreader import RasterReader
@@ -53,7 +52,6 @@ class InverseTransformRasterAlgorithm(EnMAPProcessingAlgorithm):
         raster = self.parameterAsRasterLayer(parameters, self.P_RASTER, context)
         dump = self.parameterAsTransformerDump(parameters, self.P_TRANSFORMER, context)
         filename = self.parameterAsOutputLayer(parameters, self.P_OUTPUT_RASTER, context)
-        maximumMemoryUsage = gdal.GetCacheMax()
 
         with open(filename + '.log', 'w') as logfile:
             feedback, feedback2 = self.createLoggingFeedback(feedback, logfile)
@@ -69,10 +67,12 @@ class InverseTransformRasterAlgorithm(EnMAPProcessingAlgorithm):
             # init result raster
             noDataValue = Utils.defaultNoDataValue(np.float32)
             writer = Driver(filename, feedback=feedback).createLike(reader, Qgis.Float32, bandCount)
-            lineMemoryUsage = reader.lineMemoryUsage() + reader.lineMemoryUsage(bandCount, 4)
-            blockSizeY = min(raster.height(), ceil(maximumMemoryUsage / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in reader.walkGrid(blockSizeX, blockSizeY, feedback):
+            planner = BlockPlanner(reader, feedback=feedback)
+            planner.addInput(reader)
+            planner.addInput(reader)  # copy of valid pixel features
+            planner.addWorkingMemory(bandCount, 8)  # float64 transformed features
+            planner.addOutput(bandCount, Qgis.DataType.Float32)
+            for block in planner.walkGrid(feedback):
                 arrayX = reader.arrayFromBlock(block)
                 valid = np.all(reader.maskArray(arrayX), axis=0)
                 X = list()
@@ -100,7 +100,7 @@ class LandCoverChangeStatisticsAlgorithm(EnMAPProcessingAlgorithm):
                     linkOpacity=linkOpacity,
                     title='Land Cover Change Statistics'
                 ))
-            builder.readData(grid.extent(), 0)
+            builder.readData(grid.extent(), 0, feedback)
             classFilter = deepcopy(builder.categoriess)
             for categories in classFilter:
                 for i, c in enumerate(categories):
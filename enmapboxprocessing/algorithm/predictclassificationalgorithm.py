@@ -1,10 +1,12 @@
-from math import ceil
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
 
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
+from enmapboxprocessing.numpyutils import NumpyUtils
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
 from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.typing import ClassifierDump
 from enmapboxprocessing.utils import Utils
@@ -67,7 +69,6 @@ class PredictClassificationAlgorithm(EnMAPProcessingAlgorithm):
         dump = self.parameterAsClassifierDump(parameters, self.P_CLASSIFIER, context)
         matchByName = self.parameterAsBoolean(parameters, self.P_MATCH_BY_NAME, context)
         filename = self.parameterAsOutputLayer(parameters, self.P_OUTPUT_CLASSIFICATION, context)
-        maximumMemoryUsage = Utils.maximumMemoryUsage()
 
         with open(filename + '.log', 'w') as logfile:
             feedback, feedback2 = self.createLoggingFeedback(feedback, logfile)
@@ -105,16 +106,31 @@ class PredictClassificationAlgorithm(EnMAPProcessingAlgorithm):
 
             dataType = Utils.smallesUIntDataType(max([c.value for c in dump.categories]))
             writer = Driver(filename, feedback=feedback).createLike(rasterReader, dataType, 1)
-            lineMemoryUsage = rasterReader.lineMemoryUsage()
-            blockSizeY = min(raster.height(), ceil(maximumMemoryUsage / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in rasterReader.walkGrid(blockSizeX, blockSizeY, feedback):
-                arrayX = rasterReader.arrayFromBlock(block, bandList)
-                valid = np.all(rasterReader.maskArray(arrayX, bandList), axis=0)
-                X = list()
-                for a in arrayX:
-                    X.append(a[valid])
-                y = dump.classifier.predict(np.transpose(X))
+            processor = self.createBlockProcessor(feedback)
+            planner = BlockPlanner(rasterReader, feedback=feedback)
+            planner.addInput(rasterReader, bandList)
+            planner.addInput(rasterReader, bandList)  # copy of valid pixel features
+            planner.addWorkingMemory(rasterReader.bandCount() if bandList is None else len(bandList), 1)  # masks
+            planner.addOutput(1, dataType)
+            planner.setBlocksInFlight(processor.maximumBlocksInFlight())
+            blockSizeX, blockSizeY = planner.blockSize()
+
+            def createSlot():
+                reader = rasterReader if processor.parallelism == 1 else rasterReader.clone()
+                bufferX = reader.allocateArray(blockSizeX, blockSizeY, bandList)  # reused for all blocks
+                return reader, bufferX
+
+            def readBlock(slot, block: RasterBlockInfo):
+                reader, bufferX = slot
+                outX = NumpyUtils.bufferView(bufferX, (len(bufferX), block.height, block.width))
+                arrayX = reader.arrayFromBlock(block, bandList, out=outX)
+                valid = np.all(reader.maskArray(arrayX, bandList), axis=0)
+                X = arrayX[:, valid].T
+                return X, valid
+
+            def processBlock(data):
+                X, valid = data
+                y = dump.classifier.predict(X)
 
                 # classifier may return 2d array (e.g. CatBoostClassifier) -> need to flatten data
                 if y.ndim == 2 and y.shape[1] == 1:
@@ -122,8 +138,15 @@ class PredictClassificationAlgorithm(EnMAPProcessingAlgorithm):
 
                 arrayY = np.zeros_like(valid, Utils.qgisDataTypeToNumpyDataType(dataType))
                 arrayY[valid] = y
+                return arrayY
+
+            def writeBlock(block: RasterBlockInfo, arrayY):
                 writer.writeArray2d(arrayY, 1, xOffset=block.xOffset, yOffset=block.yOffset)
 
+            processor.run(
+                planner.walkGrid(), readBlock, processBlock, writeBlock, createSlot
+            )
+
             writer.close()
             outraster = QgsRasterLayer(filename)
             renderer = Utils.palettedRasterRendererFromCategories(outraster.dataProvider(), 1, dump.categories)
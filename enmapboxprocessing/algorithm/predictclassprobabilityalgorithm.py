@@ -1,9 +1,8 @@
-from math import ceil
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
-from osgeo import gdal
 
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.rasterreader import RasterReader
@@ -60,7 +59,6 @@ class PredictClassPropabilityAlgorithm(EnMAPProcessingAlgorithm):
         dump = self.parameterAsClassifierDump(parameters, self.P_CLASSIFIER, context)
         matchByName = self.parameterAsBoolean(parameters, self.P_MATCH_BY_NAME, context)
         filename = self.parameterAsOutputLayer(parameters, self.P_OUTPUT_PROBABILITY, context)
-        maximumMemoryUsage = gdal.GetCacheMax()
 
         with open(filename + '.log', 'w') as logfile:
             feedback, feedback2 = self.createLoggingFeedback(feedback, logfile)
@@ -100,10 +98,12 @@ class PredictClassPropabilityAlgorithm(EnMAPProcessingAlgorithm):
             dataType = Qgis.DataType.Float32
             gdalDataType = Utils.qgisDataTypeToNumpyDataType(dataType)
             writer = Driver(filename, feedback=feedback).createLike(rasterReader, dataType, nBands)
-            lineMemoryUsage = rasterReader.lineMemoryUsage() + rasterReader.lineMemoryUsage(nBands, 32 // 4)
-            blockSizeY = min(raster.height(), ceil(maximumMemoryUsage / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in rasterReader.walkGrid(blockSizeX, blockSizeY, feedback):
+            planner = BlockPlanner(rasterReader, feedback=feedback)
+            planner.addInput(rasterReader, bandList)
+            planner.addInput(rasterReader, bandList)  # copy of valid pixel features
+            planner.addWorkingMemory(nBands, 8)  # float64 probabilities
+            planner.addOutput(nBands, dataType)
+            for block in planner.walkGrid(feedback):
                 arrayX = rasterReader.arrayFromBlock(block, bandList)
                 valid = np.all(rasterReader.maskArray(arrayX, bandList), axis=0)
                 X = list()
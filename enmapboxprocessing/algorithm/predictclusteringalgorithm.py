@@ -1,10 +1,10 @@
-from math import ceil
 from random import randint
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
 
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.rasterreader import RasterReader
@@ -64,7 +64,6 @@ class PredictClusteringAlgorithm(EnMAPProcessingAlgorithm):
         dump = self.parameterAsClustererDump(parameters, self.P_CLUSTERER, context)
         matchByName = self.parameterAsBoolean(parameters, self.P_MATCH_BY_NAME, context)
         filename = self.parameterAsOutputLayer(parameters, self.P_OUTPUT_CLASSIFICATION, context)
-        maximumMemoryUsage = Utils.maximumMemoryUsage()
 
         with open(filename + '.log', 'w') as logfile:
             feedback, feedback2 = self.createLoggingFeedback(feedback, logfile)
@@ -105,10 +104,11 @@ class PredictClusteringAlgorithm(EnMAPProcessingAlgorithm):
             numpyDataType = Utils.qgisDataTypeToNumpyDataType(qgisDataType)
             writer = Driver(filename, feedback=feedback).createLike(rasterReader, qgisDataType, 1)
             noDataValue = 0
-            lineMemoryUsage = rasterReader.lineMemoryUsage()
-            blockSizeY = min(raster.height(), ceil(maximumMemoryUsage / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in rasterReader.walkGrid(blockSizeX, blockSizeY, feedback):
+            planner = BlockPlanner(rasterReader, feedback=feedback)
+            planner.addInput(rasterReader, bandList)
+            planner.addInput(rasterReader, bandList)  # copy of valid pixel features
+            planner.addOutput(1, qgisDataType)
+            for block in planner.walkGrid(feedback):
                 arrayX = rasterReader.arrayFromBlock(block, bandList)
                 valid = np.all(rasterReader.maskArray(arrayX, bandList), axis=0)
                 X = list()
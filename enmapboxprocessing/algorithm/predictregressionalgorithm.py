@@ -1,11 +1,13 @@
-from math import ceil
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
 
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
+from enmapboxprocessing.numpyutils import NumpyUtils
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
 from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.typing import RegressorDump
 from enmapboxprocessing.utils import Utils
@@ -60,7 +62,6 @@ class PredictRegressionAlgorithm(EnMAPProcessingAlgorithm):
         dump = self.parameterAsRegressorDump(parameters, self.P_REGRESSOR, context)
         matchByName = self.parameterAsBoolean(parameters, self.P_MATCH_BY_NAME, context)
         filename = self.parameterAsOutputLayer(parameters, self.P_OUTPUT_REGRESSION, context)
-        maximumMemoryUsage = Utils.maximumMemoryUsage()
 
         with open(filename + '.log', 'w') as logfile:
             feedback, feedback2 = self.createLoggingFeedback(feedback, logfile)
@@ -99,22 +100,45 @@ class PredictRegressionAlgorithm(EnMAPProcessingAlgorithm):
             nBands = len(dump.targets)
             writer = Driver(filename, feedback=feedback).createLike(rasterReader, Qgis.DataType.Float32, nBands)
             noDataValue = Utils.defaultNoDataValue(np.float32)
-            lineMemoryUsage = rasterReader.lineMemoryUsage() + rasterReader.lineMemoryUsage(nBands, 4)
-            blockSizeY = min(raster.height(), ceil(maximumMemoryUsage / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in rasterReader.walkGrid(blockSizeX, blockSizeY, feedback):
-                arrayX = rasterReader.arrayFromBlock(block, bandList)
-                valid = np.all(rasterReader.maskArray(arrayX, bandList), axis=0)
-                X = list()
-                for a in arrayX:
-                    X.append(a[valid])
-                y = dump.regressor.predict(np.transpose(X))
+            processor = self.createBlockProcessor(feedback)
+            planner = BlockPlanner(rasterReader, feedback=feedback)
+            planner.addInput(rasterReader, bandList)
+            planner.addInput(rasterReader, bandList)  # copy of valid pixel features
+            planner.addWorkingMemory(rasterReader.bandCount() if bandList is None else len(bandList), 1)  # masks
+            planner.addWorkingMemory(nBands, 8)  # float64 predictions
+            planner.addOutput(nBands, Qgis.DataType.Float32)
+            planner.setBlocksInFlight(processor.maximumBlocksInFlight())
+            blockSizeX, blockSizeY = planner.blockSize()
+
+            def createSlot():
+                reader = rasterReader if processor.parallelism == 1 else rasterReader.clone()
+                bufferX = reader.allocateArray(blockSizeX, blockSizeY, bandList)  # reused for all blocks
+                return reader, bufferX
+
+            def readBlock(slot, block: RasterBlockInfo):
+                reader, bufferX = slot
+                outX = NumpyUtils.bufferView(bufferX, (len(bufferX), block.height, block.width))
+                arrayX = reader.arrayFromBlock(block, bandList, out=outX)
+                valid = np.all(reader.maskArray(arrayX, bandList), axis=0)
+                X = arrayX[:, valid].T
+                return X, valid
+
+            def processBlock(data):
+                X, valid = data
+                y = dump.regressor.predict(X)
                 if y.ndim == 1:
                     y = y.reshape((-1, 1))
                 arrayY = np.full((nBands, *valid.shape), noDataValue, np.float32)
                 for i, aY in enumerate(arrayY):
                     aY[valid] = y[:, i]
-                    writer.writeArray2d(aY, i + 1, xOffset=block.xOffset, yOffset=block.yOffset)
+                return arrayY
+
+            def writeBlock(block: RasterBlockInfo, arrayY):
+                writer.writeArray(arrayY, xOffset=block.xOffset, yOffset=block.yOffset)
+
+            processor.run(
+                planner.walkGrid(), readBlock, processBlock, writeBlock, createSlot
+            )
 
             for bandNo, t in enumerate(dump.targets, 1):
                 writer.setBandName(t.name, bandNo)
@@ -1,10 +1,10 @@
-from math import ceil
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
 
 from enmapbox.typeguard import typechecked
 from enmapboxprocessing.algorithm.translatecategorizedrasteralgorithm import TranslateCategorizedRasterAlgorithm
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.typing import SampleX, SampleY, Categories, checkSampleShape, ClassifierDump
@@ -148,40 +148,16 @@ class PrepareClassificationDatasetFromCategorizedRasterAlgorithm(EnMAPProcessing
                 f'raster and classification must have the same dimensions, '
                 f'got ({raster.width()}, {raster.height()}) and ({classification.width()}, {classification.height()})'
             )
-        maximumMemoryUsage = Utils.maximumMemoryUsage()
         reader = RasterReader(raster)
         classificationReader = RasterReader(classification)
-        lineMemoryUsage = reader.lineMemoryUsage(1)
-        lineMemoryUsage += classificationReader.width() * classificationReader.dataTypeSize()
-        blockSizeY = min(raster.height(), ceil(maximumMemoryUsage / lineMemoryUsage))
-        blockSizeX = raster.width()
-
-        X = list()
-        y = list()
-        locations = list()
-        XMask = list()
-        for block in reader.walkGrid(blockSizeX, blockSizeY, feedback):
-            blockClassification = classificationReader.arrayFromBlock(block, [classBandNo])[0]
-            labeled = np.full_like(blockClassification, False, bool)
-            for c in categories:
-                np.logical_or(labeled, blockClassification == c.value, out=labeled)
-            blockY = blockClassification[labeled]
-            blockX = list()
-            blockXMask = list()
-            for bandNo in range(1, reader.bandCount() + 1):
-                blockBand = reader.arrayFromBlock(block, [bandNo])
-                blockBandMask = reader.maskArray(blockBand, [bandNo])
-                blockX.append(blockBand[0][labeled])
-                blockXMask.append(blockBandMask[0][labeled])
-            blockLocation = np.array([block.xMap()[labeled], block.yMap()[labeled]]).T
-            X.append(blockX)
-            y.append(blockY)
-            locations.append(blockLocation)
-            XMask.append(blockXMask)
-        X = np.concatenate(X, axis=1).T
-        XMask = np.concatenate(XMask, axis=1).T
-        y = np.expand_dims(np.concatenate(y), 1)
-        locations = np.concatenate(locations, axis=1)
+        X, XMask, y, rows, columns = cls.sampleLabeledPixels(
+            reader, classificationReader, classBandNo, [c.value for c in categories], feedback
+        )
+        y = np.expand_dims(y, 1)
+        locations = np.array([
+            reader.extent().xMinimum() + (columns + 0.5) * reader.rasterUnitsPerPixelX(),
+            reader.extent().yMaximum() - (rows + 0.5) * reader.rasterUnitsPerPixelY()
+        ]).T
 
         # skip bad bands (see issue #560)
         if excludeBadBands:
@@ -204,3 +180,71 @@ class PrepareClassificationDatasetFromCategorizedRasterAlgorithm(EnMAPProcessing
         locations = locations[valid]
         checkSampleShape(X, y)
         return X, y, goodBandNumbers, locations
+
+    @classmethod
+    def sampleLabeledPixels(
+            cls, reader: RasterReader, classificationReader: RasterReader, classBandNo: int, values: List,
+            feedback: QgsProcessingFeedback = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sample feature data and masks for all pixels labeled with one of the given values.
+
+        First, the (single band) classification is scanned for labeled pixel locations.
+        Second, only the windows of the feature raster that contain labeled pixels are read.
+        Returns X, XMask, y, rows and columns, with samples in row-major pixel order.
+        """
+
+        # scan classification for labeled pixel locations
+        planner = BlockPlanner(classificationReader)
+        planner.addInput(classificationReader, [classBandNo])
+        planner.addWorkingMemory(1, 1)  # labeled mask
+        rows = list()
+        columns = list()
+        y = list()
+        for block in planner.walkGrid(feedback):
+            blockClassification = classificationReader.arrayFromBlock(block, [classBandNo])[0]
+            blockRows, blockColumns = np.nonzero(np.isin(blockClassification, values))
+            y.append(blockClassification[blockRows, blockColumns])
+            rows.append(blockRows + block.yOffset)
+            columns.append(blockColumns + block.xOffset)
+        rows = np.concatenate(rows)
+        columns = np.concatenate(columns)
+        y = np.concatenate(y)
+        order = np.lexsort((columns, rows))
+        rows = rows[order]
+        columns = columns[order]
+        y = y[order]
+
+        # read feature data only for windows with labeled pixels
+        sampleSize = len(y)
+        bandCount = reader.bandCount()
+        X = None
+        XMask = np.zeros((sampleSize, bandCount), bool)
+        planner = BlockPlanner(reader)
+        planner.addInput(reader)
+        planner.addWorkingMemory(bandCount, 1)  # masks
+        for block in planner.walkGrid(feedback):
+            start, stop = np.searchsorted(rows, [block.yOffset, block.yOffset + block.height])
+            indices = np.arange(start, stop)
+            indices = indices[(columns[indices] >= block.xOffset) & (columns[indices] < block.xOffset + block.width)]
+            if len(indices) == 0:
+                continue
+            windowRows = rows[indices]
+            windowColumns = columns[indices]
+            xOffset = int(windowColumns.min())
+            yOffset = int(windowRows.min())
+            width = int(windowColumns.max()) - xOffset + 1
+            height = int(windowRows.max()) - yOffset + 1
+            array = reader.arrayFromPixelOffsetAndSize(xOffset, yOffset, width, height)
+            marray = reader.maskArray(array)
+            if X is None:
+                X = np.empty((sampleSize, bandCount), np.result_type(*array))
+            windowRows -= yOffset
+            windowColumns -= xOffset
+            for i, (a, m) in enumerate(zip(array, marray)):
+                X[indices, i] = a[windowRows, windowColumns]
+                XMask[indices, i] = m[windowRows, windowColumns]
+
+        if X is None:  # no labeled pixels
+            X = np.zeros((0, bandCount), Utils.qgisDataTypeToNumpyDataType(reader.dataType()))
+        return X, XMask, y, rows, columns
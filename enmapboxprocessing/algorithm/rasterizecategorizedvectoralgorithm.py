@@ -1,19 +1,18 @@
 from typing import Dict, Any, List, Tuple
 
-from osgeo import gdal
+import numpy as np
+from osgeo import gdal, ogr
 
-import qgis.processing
 from enmapbox.typeguard import typechecked
-from enmapboxprocessing.algorithm.creategridalgorithm import CreateGridAlgorithm
 from enmapboxprocessing.algorithm.rasterizevectoralgorithm import RasterizeVectorAlgorithm
-from enmapboxprocessing.algorithm.rastermathalgorithm.rastermathalgorithm import RasterMathAlgorithm
-from enmapboxprocessing.algorithm.translaterasteralgorithm import TranslateRasterAlgorithm
+from enmapboxprocessing.blockplanner import BlockPlanner
+from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
-from enmapboxprocessing.rasterwriter import RasterWriter
+from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.typing import HexColor, Category
 from enmapboxprocessing.utils import Utils
 from qgis.PyQt.QtCore import QMetaType
-from qgis.core import (QgsProcessingContext, QgsProcessingFeedback, QgsVectorLayer, QgsRectangle,
+from qgis.core import (Qgis, QgsProcessingContext, QgsProcessingFeedback, QgsVectorLayer, QgsRectangle,
                        QgsCoordinateReferenceSystem, QgsVectorFileWriter,
                        QgsProject, QgsField, QgsCoordinateTransform, QgsRasterLayer, QgsProcessingException,
                        QgsMapLayer)
@@ -28,6 +27,7 @@ class RasterizeCategorizedVectorAlgorithm(EnMAPProcessingAlgorithm):
     P_MAJORITY_VOTING, _MAJORITY_VOTING = 'majorityVoting', 'Majority voting'
     P_OUTPUT_CATEGORIZED_RASTER, _OUTPUT_CATEGORIZED_RASTER = 'outputRasterizedCategories', \
         'Output categorized raster layer'
+    SuperSampling = 10
 
     def displayName(self):
         return 'Rasterize categorized vector layer'
@@ -98,82 +98,8 @@ class RasterizeCategorizedVectorAlgorithm(EnMAPProcessingAlgorithm):
                 }
                 self.runAlg(alg, parameters, None, feedback2, context, True)
             else:
-                # create x10 grid
-                alg = CreateGridAlgorithm()
-                parameters = {
-                    alg.P_CRS: grid.crs(),
-                    alg.P_EXTENT: grid.extent(),
-                    alg.P_WIDTH: grid.width() * 10,
-                    alg.P_HEIGHT: grid.height() * 10,
-                    alg.P_UNIT: alg.PixelUnits,
-                    alg.P_OUTPUT_GRID: Utils.tmpFilename(filename, 'grid.x10.vrt')
-                }
-                gridX10 = qgis.processing.run(alg, parameters, None, feedback2, context, True)[alg.P_OUTPUT_GRID]
-
-                # burn classes at x10 grid
-                feedback.pushInfo('Burn classes at x10 finer resolution')
-                alg = RasterizeVectorAlgorithm()
-                parameters = {
-                    alg.P_GRID: gridX10,
-                    alg.P_VECTOR: tmpVector,
-                    alg.P_DATA_TYPE: self.O_DATA_TYPE.index(Utils.qgisDataTypeName(dataType)),
-                    alg.P_BURN_ATTRIBUTE: fieldName,
-                    alg.P_OUTPUT_RASTER: Utils.tmpFilename(filename, 'classification.x10.tif')
-                }
-                classificationX10 = qgis.processing.run(alg, parameters, None, feedback2, context, True)[
-                    alg.P_OUTPUT_RASTER]
-                ds = gdal.Open(classificationX10, gdal.OF_UPDATE)
-                writer = RasterWriter(ds)
-                writer.setNoDataValue(0)
-                writer.close()
-                del writer, ds
-
-                # select classes via majority voting
-                feedback.pushInfo('Apply class majority voting')
-                alg = TranslateRasterAlgorithm()
-                parameters = {
-                    alg.P_GRID: grid,
-                    alg.P_RASTER: classificationX10,
-                    alg.P_RESAMPLE_ALG: alg.ModeResampleAlg,
-                    alg.P_OUTPUT_RASTER: Utils.tmpFilename(filename, 'classification.vrt')
-                }
-                classification = qgis.processing.run(alg, parameters, None, feedback2, context, True)[
-                    alg.P_OUTPUT_RASTER]
-
-                # calculate pixel coverage
-                # - mask at x10 grid
-                feedback.pushInfo('Create pixel mask at x10 finer resolution')
-                alg = RasterMathAlgorithm()
-                parameters = {
-                    alg.P_R1: classificationX10,
-                    alg.P_CODE: 'R1 != 0',
-                    alg.P_OUTPUT_RASTER: Utils.tmpFilename(filename, 'mask.x10.tif')
-                }
-                maskX10 = qgis.processing.run(alg, parameters, None, feedback2, context, True)[alg.P_OUTPUT_RASTER]
-                # - aggregate mask to coverage fraction
-                feedback.pushInfo('Aggregate pixel mask to coverage fraction at final resolution')
-                alg = TranslateRasterAlgorithm()
-                parameters = {
-                    alg.P_GRID: grid,
-                    alg.P_RASTER: maskX10,
-                    alg.P_RESAMPLE_ALG: alg.AverageResampleAlg,
-                    alg.P_DATA_TYPE: alg.Float32,
-                    alg.P_OUTPUT_RASTER: Utils.tmpFilename(filename, 'coverage.vrt')
-                }
-                coverage = qgis.processing.run(alg, parameters, None, feedback2, context, True)[alg.P_OUTPUT_RASTER]
-
-                # mask classification pixel with low coverage
-                # - mask at x10 grid
-                feedback.pushInfo('Mask pixel with low coverage')
-                alg = RasterMathAlgorithm()
-                parameters = {
-                    alg.P_R1: classification,
-                    alg.P_R2: coverage,
-                    alg.P_CODE: f'R1 * (R2 >= {minCoverage})',
-                    alg.P_OUTPUT_RASTER: filename
-                }
-                classification = qgis.processing.run(alg, parameters, None, feedback2, context, True)[
-                    alg.P_OUTPUT_RASTER]
+                feedback.pushInfo('Burn classes at x10 finer resolution and apply class majority voting')
+                self.rasterizeWithMajorityVoting(tmpVector, fieldName, grid, minCoverage, dataType, filename, feedback)
 
             # setup renderer
             layer = QgsRasterLayer(filename)
@@ -189,6 +115,80 @@ class RasterizeCategorizedVectorAlgorithm(EnMAPProcessingAlgorithm):
 
         return result
 
+    @classmethod
+    def rasterizeWithMajorityVoting(
+            cls, vector: QgsVectorLayer, fieldName: str, grid: QgsRasterLayer, minCoverage: float,
+            dataType: Qgis.DataType, filename: str, feedback: QgsProcessingFeedback = None
+    ):
+        """
+        Rasterize category ids block-wise at x10 finer resolution into memory, and reduce each block to the target
+        resolution via majority voting, masking pixels with a coverage below the given fraction.
+        """
+        factor = cls.SuperSampling
+        reader = RasterReader(grid)
+        writer = Driver(filename, feedback=feedback).createLike(reader, dataType, 1)
+        vectorFilename, layerName = Utils.splitQgsVectorLayerSourceString(vector.source())
+        ogrDataSource: ogr.DataSource = ogr.Open(vectorFilename)
+        if layerName is None:
+            ogrLayer: ogr.Layer = ogrDataSource.GetLayer(0)
+        else:
+            ogrLayer: ogr.Layer = ogrDataSource.GetLayerByName(layerName)
+
+        # each target pixel needs factor x factor sub-pixels, plus temporary arrays for the voting
+        planner = BlockPlanner(reader, feedback=feedback)
+        planner.addWorkingMemory(factor ** 2, 32)
+        planner.addOutput(1, dataType)
+        resolutionX = reader.rasterUnitsPerPixelX() / factor
+        resolutionY = reader.rasterUnitsPerPixelY() / factor
+        for block in planner.walkGrid(feedback):
+            gdalDataset: gdal.Dataset = gdal.GetDriverByName('MEM').Create(
+                '', block.width * factor, block.height * factor, 1, Utils.qgisDataTypeToGdalDataType(dataType)
+            )
+            gdalDataset.SetGeoTransform((
+                block.extent.xMinimum(), resolutionX, 0, block.extent.yMaximum(), 0, -resolutionY
+            ))
+            ogrLayer.SetSpatialFilterRect(
+                block.extent.xMinimum(), block.extent.yMinimum(), block.extent.xMaximum(), block.extent.yMaximum()
+            )
+            gdal.RasterizeLayer(gdalDataset, [1], ogrLayer, options=[f'ATTRIBUTE={fieldName}'])
+            array = gdalDataset.ReadAsArray()
+            classes, coverage = cls.majorityVoting(array, factor)
+            classes[coverage < np.float32(minCoverage)] = 0
+            writer.writeArray2d(classes, 1, block.xOffset, block.yOffset)
+        ogrLayer.SetSpatialFilter(None)
+        writer.close()
+
+    @staticmethod
+    def majorityVoting(array: np.ndarray, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reduce a super-sampled class id array by the given factor.
+        Return the majority class (0 is no data) and the covered fraction (non-zero sub-pixels) of each target pixel.
+
+        Ties are resolved like GDAL's mode resampling:
+        the class that is first to reach the maximum count, when scanning the sub-pixels row by row, wins.
+        """
+        height, width = array.shape[0] // factor, array.shape[1] // factor
+        n = factor ** 2
+        values = array.reshape(height, factor, width, factor).transpose(0, 2, 1, 3).reshape(height * width, n)
+
+        # running count of each sub-pixel value (number of equal values up to this sub-pixel in scan order)
+        order = np.argsort(values, axis=1, kind='stable')
+        sortedValues = np.take_along_axis(values, order, 1)
+        indices = np.broadcast_to(np.arange(n), sortedValues.shape)
+        isFirst = np.ones_like(sortedValues, dtype=bool)
+        isFirst[:, 1:] = sortedValues[:, 1:] != sortedValues[:, :-1]
+        firstIndices = np.maximum.accumulate(np.where(isFirst, indices, 0), axis=1)
+        runningCounts = np.empty_like(order)
+        np.put_along_axis(runningCounts, order, indices - firstIndices + 1, 1)
+        runningCounts[values == 0] = 0
+
+        # the first sub-pixel that reaches the maximum count decides the class
+        maximumCounts = runningCounts.max(axis=1)
+        winner = np.argmax(runningCounts == maximumCounts[:, None], axis=1)
+        classes = values[np.arange(len(values)), winner].reshape(height, width)
+        coverage = (np.count_nonzero(values, axis=1) / n).astype(np.float32).reshape(height, width)
+        return classes, coverage
+
     @classmethod
     def categoriesToField(
             cls, vector: QgsVectorLayer, fieldName: str, extent: QgsRectangle, crs: QgsCoordinateReferenceSystem,
@@ -3,10 +3,13 @@ from typing import List, Tuple, Dict, Any
 
 import numpy as np
 
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.enmapalgorithm import Group, EnMAPProcessingAlgorithm
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
 from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.utils import Utils
-from qgis.core import Qgis, QgsProcessingContext, QgsProcessingFeedback
+from enmapboxprocessing.zonalaggregator import ZonalAggregator
+from qgis.core import QgsProcessingContext, QgsProcessingFeedback
 from enmapbox.typeguard import typechecked
 
 
@@ -14,8 +17,22 @@ from enmapbox.typeguard import typechecked
 class RasterLayerZonalAggregationAlgorithm(EnMAPProcessingAlgorithm):
     P_RASTER, _RASTER = 'raster', 'Raster layer'
     P_CATEGORIZED_RASTER, _CATEGORIZED_RASTER = 'categorizedRaster', 'Categorized raster layer'
+    P_FUNCTION, _FUNCTION = 'function', 'Aggregation functions'
     P_OUTPUT_TABLE, _OUTPUT_TABLE = 'outputTable', 'Output table'
 
+    O_FUNCTION = [
+        'arithmetic mean', 'standard deviation', 'variance', 'minimum', 'median', 'maximum', 'sum', 'count', 'range'
+    ]
+    (
+        ArithmeticMeanFunction, StandardDeviationFunction, VarianceFunction, MinimumFunction, MedianFunction,
+        MaximumFunction, SumFunction, CountFunction, RangeFunction
+    ) = range(len(O_FUNCTION))
+    P0 = len(O_FUNCTION)
+    O_FUNCTION.extend([f'{i}-th percentile' for i in range(101)])
+
+    HistogramBins = 256
+    HistogramSampleSize = 256 * 256
+
     def displayName(self) -> str:
         return 'Raster layer zonal aggregation'
 
@@ -29,12 +46,21 @@ class RasterLayerZonalAggregationAlgorithm(EnMAPProcessingAlgorithm):
         return [
             (self._RASTER, 'Raster layer to be aggregated.'),
             (self._CATEGORIZED_RASTER, 'Categorized raster layer specifying the zones.'),
+            (self._FUNCTION, 'Aggregation functions to be used. '
+                             'If more than one function is selected, '
+                             'the function name is appended to each band column name. '
+                             'Median and percentiles are approximated from zonal histograms with '
+                             f'{self.HistogramBins} bins per band, '
+                             'spanning the band value range estimated from a raster subsample.'),
             (self._OUTPUT_TABLE, self.TableFileDestination)
         ]
 
     def initAlgorithm(self, configuration: Dict[str, Any] = None):
         self.addParameterRasterLayer(self.P_RASTER, self._RASTER)
         self.addParameterRasterLayer(self.P_CATEGORIZED_RASTER, self._CATEGORIZED_RASTER)
+        self.addParameterEnum(
+            self.P_FUNCTION, self._FUNCTION, self.O_FUNCTION, True, [self.ArithmeticMeanFunction], True, True
+        )
         self.addParameterVectorDestination(self.P_OUTPUT_TABLE, self._OUTPUT_TABLE)
 
     def processAlgorithm(
@@ -42,46 +68,104 @@ class RasterLayerZonalAggregationAlgorithm(EnMAPProcessingAlgorithm):
     ) -> Dict[str, Any]:
         raster = self.parameterAsRasterLayer(parameters, self.P_RASTER, context)
         zoneRaster = self.parameterAsRasterLayer(parameters, self.P_CATEGORIZED_RASTER, context)
+        functionIndices = self.parameterAsEnums(parameters, self.P_FUNCTION, context)
         filename = self.parameterAsOutputLayer(parameters, self.P_OUTPUT_TABLE, context)
 
+        if len(functionIndices) == 0:
+            functionIndices = [self.ArithmeticMeanFunction]
+
         with open(filename + '.log', 'w') as logfile:
             feedback, feedback2 = self.createLoggingFeedback(feedback, logfile)
             self.tic(feedback, parameters, context)
 
             categories, classBandNo = Utils.categoriesFromRasterLayer(zoneRaster)
 
-            categorySum = dict()
-            categoryN = dict()
-            for category in categories:
-                for bandNo in range(1, raster.bandCount() + 1):
-                    categorySum[(category.value, bandNo)] = 0.
-                    categoryN[(category.value, bandNo)] = 0
-
             rasterReader = RasterReader(raster)
             zoneReader = RasterReader(zoneRaster)
-            lineMemoryUsage = rasterReader.lineMemoryUsage(1, Qgis.Float32)
-            blockSizeY = min(raster.height(), ceil(Utils.maximumMemoryUsage() / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in rasterReader.walkGrid(blockSizeX, blockSizeY, feedback):
-                feedback.setProgress(block.yOffset / rasterReader.height() * 100)
-                arrayZones = zoneReader.arrayFromBlock(block, [classBandNo])[0]
-                for bandNo in range(1, raster.bandCount() + 1):
-                    arrayFeatures = rasterReader.arrayFromBlock(block, [bandNo])
-                    arrayMask = rasterReader.maskArray(arrayFeatures, [bandNo])[0]
-                    features = arrayFeatures[0][arrayMask]
-                    zones = arrayZones[arrayMask]
-                    for category in categories:
-                        zoneIndices = zones == category.value
-                        categoryN[(category.value, bandNo)] += np.sum(zoneIndices)
-                        categorySum[(category.value, bandNo)] += np.sum(features[zoneIndices])
+
+            quantileFunctionIndices = [
+                functionIndex for functionIndex in functionIndices
+                if functionIndex >= self.P0 or functionIndex == self.MedianFunction
+            ]
+            quantiles = [
+                50 if functionIndex == self.MedianFunction else functionIndex - self.P0
+                for functionIndex in quantileFunctionIndices
+            ]
+            if len(quantiles) > 0:
+                histogramRanges = self.histogramRanges(rasterReader)
+            else:
+                histogramRanges = None
+            aggregator = ZonalAggregator(
+                [c.value for c in categories], rasterReader.bandCount(), histogramRanges, self.HistogramBins
+            )
+
+            # read all bands of a block at once, and accumulate all statistics in a single pass
+            processor = self.createBlockProcessor(feedback)
+            planner = BlockPlanner(rasterReader, feedback=feedback)
+            planner.addInput(rasterReader)
+            planner.addInput(zoneReader, [classBandNo])
+            planner.addWorkingMemory(rasterReader.bandCount(), 1)  # masks
+            planner.addWorkingMemory(rasterReader.bandCount(), 16)  # keys and values of valid pixels
+            planner.setBlocksInFlight(processor.maximumBlocksInFlight())
+
+            def createSlot():
+                if processor.parallelism == 1:
+                    return rasterReader, zoneReader
+                return rasterReader.clone(), zoneReader.clone()
+
+            def readBlock(slot, block: RasterBlockInfo):
+                reader, reader2 = slot
+                array = reader.arrayFromBlock(block)
+                marray = reader.maskArray(array)
+                zones = reader2.arrayFromBlock(block, [classBandNo])[0]
+                return zones, array, marray
+
+            def processBlock(data):
+                return data
+
+            def writeBlock(block: RasterBlockInfo, data):
+                aggregator.update(*data)
+
+            processor.run(planner.walkGrid(), readBlock, processBlock, writeBlock, createSlot)
+
+            # calculate aggregations
+            values = dict()
+            if len(quantiles) > 0:
+                values.update(zip(quantileFunctionIndices, aggregator.quantiles(quantiles)))
+            with np.errstate(invalid='ignore'):
+                emptyZones = aggregator.count == 0
+                for functionIndex in functionIndices:
+                    if functionIndex == self.ArithmeticMeanFunction:
+                        values[functionIndex] = aggregator.mean()
+                    elif functionIndex == self.StandardDeviationFunction:
+                        values[functionIndex] = aggregator.standardDeviation()
+                    elif functionIndex == self.VarianceFunction:
+                        values[functionIndex] = aggregator.variance()
+                    elif functionIndex == self.MinimumFunction:
+                        values[functionIndex] = np.where(emptyZones, np.nan, aggregator.minimum)
+                    elif functionIndex == self.MaximumFunction:
+                        values[functionIndex] = np.where(emptyZones, np.nan, aggregator.maximum)
+                    elif functionIndex == self.SumFunction:
+                        values[functionIndex] = aggregator.sum
+                    elif functionIndex == self.CountFunction:
+                        values[functionIndex] = aggregator.count
+                    elif functionIndex == self.RangeFunction:
+                        values[functionIndex] = np.where(emptyZones, np.nan, aggregator.maximum - aggregator.minimum)
 
             # prepare output tabele
-            header = ['Zone Name', 'Zone Value'] + [f'Band {bandNo}' for bandNo in range(1, raster.bandCount() + 1)]
+            header = ['Zone Name', 'Zone Value']
+            for bandNo in range(1, raster.bandCount() + 1):
+                for functionIndex in functionIndices:
+                    if len(functionIndices) == 1:
+                        header.append(f'Band {bandNo}')
+                    else:
+                        header.append(f'Band {bandNo} {self.O_FUNCTION[functionIndex]}')
             table = [header]
-            for category in categories:
+            for zoneIndex, category in enumerate(categories):
                 row = [category.name, category.value]
-                for bandNo in range(1, raster.bandCount() + 1):
-                    row.append(categorySum[(category.value, bandNo)] / categoryN[(category.value, bandNo)])
+                for bandIndex in range(raster.bandCount()):
+                    for functionIndex in functionIndices:
+                        row.append(values[functionIndex][bandIndex, zoneIndex])
                 table.append(row)
 
             # we always create a CSV file
@@ -95,5 +179,23 @@ class RasterLayerZonalAggregationAlgorithm(EnMAPProcessingAlgorithm):
             self.runAlg("native:savefeatures", parameters, None, feedback, context, True)
 
             result = {self.P_OUTPUT_TABLE: filename}
+            self.toc(feedback, result)
 
         return result
+
+    @classmethod
+    def histogramRanges(cls, reader: RasterReader) -> List[Tuple[float, float]]:
+        """Return (min, max) value range for each band, estimated from a subsample of the raster."""
+        step = max(1, ceil((reader.width() * reader.height() / cls.HistogramSampleSize) ** 0.5))
+        width = max(1, reader.width() // step)
+        height = max(1, reader.height() // step)
+        array = reader.arrayFromBoundingBoxAndSize(reader.extent(), width, height)
+        marray = reader.maskArray(array)
+        ranges = list()
+        for bandArray, bandMask in zip(array, marray):
+            values = bandArray[bandMask]
+            if len(values) == 0:
+                ranges.append((0., 1.))
+            else:
+                ranges.append((float(np.min(values)), float(np.max(values))))
+        return ranges
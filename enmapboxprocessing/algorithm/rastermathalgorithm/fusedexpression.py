@@ -0,0 +1,180 @@
+import ast
+from typing import Dict, List, Optional, Any
+from warnings import warn
+
+import numpy as np
+from osgeo import gdal
+
+from enmapbox.typeguard import typechecked
+
+
+@typechecked
+class FusedExpression(object):
+    """
+    Element-wise raster math expression, e.g. (R1At850nm - R1At650nm) / (R1At850nm + R1At650nm),
+    that is evaluated without allocating full-block temporaries for each sub-expression.
+
+    The evaluation backend is configured by ENMAPBOX_RASTERMATH_BACKEND:
+    numexpr (fused evaluation via the numexpr package, if installed),
+    chunked (plain NumPy evaluation in cache-sized chunks of rows),
+    numpy (plain NumPy evaluation on the whole block, i.e. no fused evaluation),
+    or auto (numexpr if installed, chunked otherwise; the default).
+    """
+    NumpyBackend = 'numpy'
+    ChunkedBackend = 'chunked'
+    NumexprBackend = 'numexpr'
+    AutoBackend = 'auto'
+    ChunkBytes = 1024 ** 2  # bytes of input data per chunk, fitting into the CPU cache
+
+    Operators = (
+        ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.BitAnd, ast.BitOr, ast.BitXor,
+        ast.USub, ast.UAdd, ast.Invert, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE
+    )
+    NumexprFunctions = {
+        'where': 'where', 'sqrt': 'sqrt', 'exp': 'exp', 'expm1': 'expm1', 'log': 'log', 'log10': 'log10',
+        'log1p': 'log1p', 'sin': 'sin', 'cos': 'cos', 'tan': 'tan', 'arcsin': 'arcsin', 'arccos': 'arccos',
+        'arctan': 'arctan', 'arctan2': 'arctan2', 'sinh': 'sinh', 'cosh': 'cosh', 'tanh': 'tanh',
+        'arcsinh': 'arcsinh', 'arccosh': 'arccosh', 'arctanh': 'arctanh', 'abs': 'abs', 'absolute': 'abs'
+    }
+    NumexprOperators = (
+        ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.Pow, ast.BitAnd, ast.BitOr, ast.BitXor, ast.USub,
+        ast.Invert, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE
+    )
+
+    def __init__(self, expression: str, names: List[str], numexprExpression: Optional[str]):
+        self.expression = expression
+        self.names = names
+        self.numexprExpression = numexprExpression
+        self.code = compile(expression, '<string>', 'eval')
+
+    @classmethod
+    def fromExpression(cls, expression: str) -> Optional['FusedExpression']:
+        """Return a fused expression, or None if the expression is not purely element-wise."""
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError:
+            return None
+        names = list()
+        numexprCompatible = True
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Load)):
+                continue
+            elif isinstance(node, cls.Operators):
+                numexprCompatible &= isinstance(node, cls.NumexprOperators)
+            elif isinstance(node, ast.Compare):
+                if len(node.ops) != 1:
+                    return None  # chained comparisons are not element-wise
+            elif isinstance(node, ast.Constant):
+                if not isinstance(node.value, (int, float)):
+                    return None
+            elif isinstance(node, ast.Call):
+                function = node.func
+                if not isinstance(function, ast.Attribute) or not isinstance(function.value, ast.Name):
+                    return None
+                if function.value.id not in ['np', 'numpy'] or len(node.keywords) != 0:
+                    return None
+                if function.attr != 'where' and not isinstance(getattr(np, function.attr, None), np.ufunc):
+                    return None
+                numexprCompatible &= function.attr in cls.NumexprFunctions
+            elif isinstance(node, ast.Attribute):
+                if not isinstance(node.value, ast.Name) or node.value.id not in ['np', 'numpy']:
+                    return None  # attributes are only allowed for numpy functions
+            elif isinstance(node, ast.Name):
+                if node.id not in ['np', 'numpy'] and node.id not in names:
+                    names.append(node.id)
+            else:
+                return None
+        if len(names) == 0:
+            return None
+
+        numexprExpression = None
+        if numexprCompatible:
+            numexprExpression = ast.unparse(NumexprTransformer().visit(tree))
+        return FusedExpression(expression.strip(), names, numexprExpression)
+
+    @classmethod
+    def backend(cls) -> str:
+        """Return the configured backend."""
+        backend = gdal.GetConfigOption('ENMAPBOX_RASTERMATH_BACKEND', cls.AutoBackend).strip().lower()
+        if backend not in [cls.NumpyBackend, cls.ChunkedBackend, cls.NumexprBackend, cls.AutoBackend]:
+            warn(f'invalid ENMAPBOX_RASTERMATH_BACKEND value: {backend}')
+            backend = cls.AutoBackend
+        if backend in [cls.NumexprBackend, cls.AutoBackend]:
+            try:
+                import numexpr  # noqa: F401
+                backend = cls.NumexprBackend
+            except ImportError:
+                backend = cls.ChunkedBackend
+        return backend
+
+    def evaluate(self, namespace: Dict[str, Any], backend: str = None) -> Optional[np.ndarray]:
+        """
+        Evaluate the expression on the 3d arrays of the namespace.
+        Return None, if the expression can't be evaluated fused, e.g. because inputs aren't 3d arrays of equal size.
+        """
+        if backend is None:
+            backend = self.backend()
+        if backend == self.NumpyBackend:
+            return None
+
+        values = dict()
+        shape = None
+        for name in self.names:
+            value = namespace.get(name)
+            if isinstance(value, np.ndarray):
+                if value.ndim != 3 or (shape is not None and value.shape[1:] != shape):
+                    return None
+                shape = value.shape[1:]
+            elif not isinstance(value, (int, float, np.number)):
+                return None
+            values[name] = value
+        if shape is None:
+            return None
+
+        if backend == self.NumexprBackend and self.numexprExpression is not None:
+            try:
+                return self.evaluateNumexpr(values)
+            except Exception:
+                pass  # e.g. unsupported data types; fall back to chunked evaluation
+        return self.evaluateChunked(values, shape[0])
+
+    def evaluateNumexpr(self, values: Dict[str, Any]) -> np.ndarray:
+        import numexpr
+
+        # derive the result data type from NumPy, because numexpr upcasts float32 data mixed with Python floats
+        sample = {name: value[:, :1, :1] if isinstance(value, np.ndarray) else value for name, value in values.items()}
+        dtype = self.evaluateNumpy(sample).dtype
+        result = numexpr.evaluate(self.numexprExpression, local_dict=values, global_dict={})
+        return result.astype(dtype, copy=False)
+
+    def evaluateChunked(self, values: Dict[str, Any], height: int) -> Optional[np.ndarray]:
+        rowBytes = sum([value[:, :1].nbytes for value in values.values() if isinstance(value, np.ndarray)])
+        chunkHeight = max(1, self.ChunkBytes // max(1, rowBytes))
+        result = None
+        for y0 in range(0, height, chunkHeight):
+            y1 = min(y0 + chunkHeight, height)
+            chunk = self.evaluateNumpy(
+                {name: value[:, y0:y1] if isinstance(value, np.ndarray) else value for name, value in values.items()}
+            )
+            if result is None:
+                if not isinstance(chunk, np.ndarray) or chunk.ndim != 3 or chunk.shape[1] != y1 - y0:
+                    return None
+                result = np.empty((chunk.shape[0], height, chunk.shape[2]), chunk.dtype)
+            result[:, y0:y1] = chunk
+        return result
+
+    def evaluateNumpy(self, values: Dict[str, Any]) -> Any:
+        namespace = dict(values)
+        namespace['np'] = np
+        namespace['numpy'] = np
+        # nosec B307 # User-defined raster math code execution by design; equivalent to the QGIS Python Console.
+        return eval(self.code, namespace)  # nosec B307
+
+
+class NumexprTransformer(ast.NodeTransformer):
+    """Translate NumPy function calls into numexpr function calls, e.g. np.sqrt(x) -> sqrt(x)."""
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        node.func = ast.Name(id=FusedExpression.NumexprFunctions[node.func.attr], ctx=ast.Load())
+        return node
@@ -1,6 +1,6 @@
 import traceback
 import warnings
-from collections import OrderedDict, defaultdict
+from collections import OrderedDict
 from math import ceil
 from os.path import basename, splitext, join, dirname
 from re import finditer, Match
@@ -13,6 +13,7 @@ from osgeo import gdal
 
 from enmapbox.typeguard import typechecked
 from enmapboxprocessing.algorithm.rasterizevectoralgorithm import RasterizeVectorAlgorithm
+from enmapboxprocessing.algorithm.rastermathalgorithm.rastermathplan import RasterMathPlan
 from enmapboxprocessing.algorithm.translaterasteralgorithm import TranslateRasterAlgorithm
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
@@ -286,6 +287,7 @@ class RasterMathAlgorithm(EnMAPProcessingAlgorithm):
             # init output raster layer
             writers = self.makeWriter(
                 code, filename, grid, readers, readers2, floatInput, noDataValue, feedback)
+            feedback.pushDebugInfo(str(self.executionPlan(code, readers, writers)))
 
             # get block size
             lineMemoryUsage = 0
@@ -405,12 +407,30 @@ class RasterMathAlgorithm(EnMAPProcessingAlgorithm):
 
         return writers
 
+    def executionPlan(
+            self, code: str, readers: Dict[str, RasterReader], writers: Dict[str, Union[RasterWriter, Mock]]
+    ) -> RasterMathPlan:
+        """Return the execution plan for the given code, readers and writers; plans are derived only once per run."""
+        if not hasattr(self, 'mPlans'):
+            self.mPlans = dict()
+        key = code, tuple((name, id(reader)) for name, reader in readers.items()), tuple(writers)
+        if key not in self.mPlans:
+            rasterListNames = list()
+            for rasterName in self.inputRasterListNames():
+                if rasterName not in readers:
+                    break
+                rasterListNames.append(rasterName)
+            self.mPlans[key] = RasterMathPlan(code, readers, writers, self.P_OUTPUT_RASTER, rasterListNames)
+        return self.mPlans[key]
+
     def processBlock(
         self, code: str, block: RasterBlockInfo, readers: Dict[str, RasterReader],
         readers2: Dict[str, RasterReader], writers: Dict[str, Union[RasterWriter, Mock]],
         floatInput: bool, noDataValue: Optional[float], overlap: int, feedback: ProcessingFeedback, dryRun=False
     ) -> Dict[str, np.ndarray]:
 
+        plan = self.executionPlan(code, readers, writers)
+
         # add modules
         namespace = dict()
         namespace['np'] = np
@@ -425,171 +445,53 @@ class RasterMathAlgorithm(EnMAPProcessingAlgorithm):
         namespace['dryRun'] = dryRun
 
         # add data arrays and readers
-        atIdentifiers = list()  # collect all @identifiers that need to be substitution with valid identifier
         for rasterName in readers:
             reader = readers[rasterName]  # used for querying metadata etc.
             reader2 = readers2[rasterName]  # used for reading the resampled data
 
-            # only read all the data if really required, maybe we just need single bands indicated by the usage of'@'
-            needAllData = False
-
-            # - check if we use the actual array
-            match_: Match
-            for line in code.splitlines():
-                if line.startswith('#'):
-                    continue
-                line += '    '  # add some space for avoiding index errors when checking
-                for match_ in finditer(rasterName, line):
-                    if line[match_.end()] in '@.':
-                        continue  # not using the actual array, but only a single band or the reader
-                needAllData = True
-
-            # - check if we use the actual mask array
-            match_: Match
-            for line in code.splitlines():
-                if line.startswith('#'):
-                    continue
-                line += '    '  # add some space for avoiding index errors when checking
-                for match_ in finditer(rasterName + 'Mask', line):
-                    if line[match_.end()] in '@':
-                        continue  # not using the actual mask array, but only a single band
-                needAllData = True
-
-            if needAllData:
-                # check if the raster is a rasterized vector ...
-                isRasterizedVector = reader.bandName(reader.bandCount()) == 'None'
-                if isRasterizedVector:  # ... if so, we just assign the 0/1 mask, instead of all burned fields
-                    array = np.array(reader2.arrayFromBlock(block, [reader.bandCount()], overlap))
-                    namespace[rasterName] = array
-                    namespace[rasterName + 'Mask'] = array == 1
+            array = marray = None
+            if rasterName in plan.rasterizedVectors:
+                # if the raster is a rasterized vector, we just assign the 0/1 mask, instead of all burned fields
+                vectorArray = np.array(reader2.arrayFromBlock(block, [reader.bandCount()], overlap))
+                namespace[rasterName] = vectorArray
+                namespace[rasterName + 'Mask'] = vectorArray == 1
+            elif rasterName in plan.fullRasters:
+                array = self.readArray(reader, reader2, block, None, overlap, noDataValue)
+                marray = np.array(reader2.maskArray(array, None))
+                namespace[rasterName] = array
+                namespace[rasterName + 'Mask'] = marray
+
+            # add single band data, each band is read only once
+            if len(plan.readBands[rasterName]) > 0:
+                if array is None:
+                    bandList = plan.readBands[rasterName]
+                    array = self.readArray(reader, reader2, block, bandList, overlap, noDataValue)
+                    marray = np.array(reader2.maskArray(array, bandList))
                 else:
-                    array = np.array(reader2.arrayFromBlock(block, None, overlap))
-
-                    # replace no data values (see #479)
-                    if noDataValue is not None:
-                        for bandNo, arr in enumerate(array, 1):
-                            if reader.noDataValue(bandNo) is not None:
-                                arr[arr == reader.noDataValue(bandNo)] = noDataValue
-
-                    namespace[rasterName] = array
-                    namespace[rasterName + 'Mask'] = np.array(reader2.maskArray(array, None))
-
-            #  find single band usages indicated by '@'
-            atBands: Dict[Tuple, List[str]] = defaultdict(list)
-            match_: Match
-
-            for line in code.splitlines():
-                if line.startswith('#'):
-                    continue
-                line += '    '  # add some space for avoiding index errors when checking
-                matches = list()
-                matches.extend(finditer(rasterName + '@"[^"]+"', line))
-                matches.extend(finditer(rasterName + '@[0-9:|^]+', line))
-                matches.extend(finditer(rasterName + 'Mask@"[^"]+"', line))
-                matches.extend(finditer(rasterName + 'Mask@[0-9:|^]+', line))
-
-                for match_ in matches:
-                    text = line[match_.start(): match_.end()]
-                    atIdentifiers.append(text)  # need to make the @identifier a valid identifier later
-                    if line[match_.end(): match_.end() + 2] == 'nm':  # waveband mode
-                        unit = 'nm'
-                    else:
-                        unit = ''
-                    if line[match_.end() - 1] == '"':  # band name mode
-                        bandName = text.split('"')[1]
-                        bandNos = (reader.findBandName(bandName),)
-                    else:  # band number mode
-                        subtext = text.split('@')[1]
-                        groups = subtext.split('|')
-                        bandsToUse = list()
-                        bandsToExclude = list()
-                        for group in groups:
-                            if ':' in group:
-                                a, b = group.split(':')
-                            else:
-                                a, b = group, None
-                            toBeExcluded = a.startswith('^')
-                            if toBeExcluded:
-                                a = a[1:]
-                            a = int(a)
-                            if unit == 'nm':
-                                a = reader.findWavelength(a)
-                                if b is not None:
-                                    b = reader.findWavelength(b)
-                            if b is None:
-                                b = a + 1
-                            b = int(b)
-                            if toBeExcluded:
-                                bandsToExclude.extend(range(a, b))
-                            else:
-                                bandsToUse.extend(range(a, b))
-                        if len(bandsToUse) == 0:
-                            bandsToUse = range(1, reader.bandCount() + 1)
-                        bandNos = tuple(set(bandsToUse).difference(bandsToExclude))
-
-                    identifier = text.replace('Mask@', '@') + unit
-                    atBands[bandNos].append(identifier)  # collect all identifiers for each band
-
-            # add single band data
-            for bandNos, identifiers in atBands.items():
-                array = np.array(reader2.arrayFromBlock(block, list(bandNos), overlap))
-
-                # replace no data values (see #479)
-                if noDataValue is not None:
-                    for i, arr in enumerate(array):
-                        if reader.noDataValue(bandNos[i]) is not None:
-                            arr[arr == reader.noDataValue(bandNos[i])] = noDataValue
-
-                marray = np.array(reader2.maskArray(array, list(bandNos)))
-                for identifier in identifiers:
-                    tmp = identifier.split('@')
-                    namespace[Utils.makeIdentifier(tmp[0] + 'At' + tmp[1])] = array
-                    namespace[Utils.makeIdentifier(tmp[0] + 'MaskAt' + tmp[1])] = marray
+                    bandList = list(reader.bandNumbers())
+                indexOfBand = {bandNo: index for index, bandNo in enumerate(bandList)}
+                for bandNos, identifiers in plan.atBands[rasterName].items():
+                    indices = [indexOfBand[bandNo] for bandNo in bandNos]
+                    for identifier in identifiers:
+                        tmp = identifier.split('@')
+                        namespace[Utils.makeIdentifier(tmp[0] + 'At' + tmp[1])] = array[indices]
+                        namespace[Utils.makeIdentifier(tmp[0] + 'MaskAt' + tmp[1])] = marray[indices]
 
             namespace[rasterName + '_'] = reader
 
         namespace['RS'] = list()
         namespace['RS_'] = list()
         namespace['RSMask'] = list()
-        for rasterName in self.inputRasterListNames():
+        for rasterName in plan.rasterListNames:
+            namespace['RS_'].append(namespace[rasterName + '_'])
             if rasterName in namespace:
                 namespace['RS'].append(namespace[rasterName])
-                namespace['RS_'].append(namespace[rasterName + '_'])
                 namespace['RSMask'].append(namespace[rasterName + 'Mask'])
-            else:
-                break
 
         # add writers
         for rasterName, writer in writers.items():
             namespace[rasterName + '_'] = writer
 
-        # inject writer objects
-        for rasterName in writers:
-            code = code.replace(rasterName + '.set', rasterName + '_.set', )
-
-        # inject reader objects
-        for rasterName in readers:
-            for method in RasterReader.__dict__:
-                code = code.replace(rasterName + '.' + method, rasterName + '_.' + method)
-
-        # strip empty lines
-        code = code.strip()
-
-        # remove all comments
-        code = '\n'.join([line for line in code.splitlines() if not line.strip().startswith('#')])
-
-        # substitute all @"<band name>" identifier with valid identifier
-        for atIdentifier in set(atIdentifiers):
-            code = code.replace(atIdentifier, Utils.makeIdentifier(atIdentifier.replace('@', 'At')))
-
-        # enable single line expressions
-        isSingleLineCode = '\n' not in code
-        if isSingleLineCode:
-            code = self.P_OUTPUT_RASTER + ' = ' + code  # make it a statement
-
-        # replace @
-        code = code.replace('@', 'At')
-
         # cast inputs to float32
         if floatInput:
             for key, value in namespace.items():
@@ -601,17 +503,24 @@ class RasterMathAlgorithm(EnMAPProcessingAlgorithm):
 
         # execute code
         try:
-            code = code.replace(r'\n', '\n')  # convert raw new lines (only required when executed via qgis_process)
-
-            # nosec B102 # User-defined raster math code execution by design; equivalent to the QGIS Python Console.
-            exec(code, namespace)  # nosec B102
+            result = None
+            if plan.fusedExpression is not None and not dryRun:
+                result = plan.fusedExpression.evaluate(namespace)
+            if result is None:
+                # nosec B102 # User-defined raster math code execution by design; equivalent to the QGIS Python Console.
+                exec(plan.compiledCode(), namespace)  # nosec B102
+            else:
+                namespace[self.P_OUTPUT_RASTER] = result
         except Exception as error:
             traceback.print_exc()
             text = traceback.format_exc()
-            text = text[text.index('File "<string>"'):]
+            if 'File "<string>"' in text:
+                text = text[text.index('File "<string>"'):]
             feedback.reportError(text)
             raise QgsProcessingException(str(error))
 
+        isSingleLineCode = plan.isSingleLineCode
+
         # prepare output data
         results = dict()
         for key, value in namespace.items():  # skip all input arrays
@@ -651,5 +560,21 @@ class RasterMathAlgorithm(EnMAPProcessingAlgorithm):
 
         return results
 
+    @staticmethod
+    def readArray(
+            reader: RasterReader, reader2: RasterReader, block: RasterBlockInfo, bandList: Optional[List[int]],
+            overlap: int, noDataValue: Optional[float]
+    ) -> np.ndarray:
+        array = np.array(reader2.arrayFromBlock(block, bandList, overlap))
+        if bandList is None:
+            bandList = list(reader.bandNumbers())
+
+        # replace no data values (see #479)
+        if noDataValue is not None:
+            for bandNo, arr in zip(bandList, array):
+                if reader.noDataValue(bandNo) is not None:
+                    arr[arr == reader.noDataValue(bandNo)] = noDataValue
+        return array
+
     def isTemporaryVariable(self, name) -> bool:
         return name.startswith('_') or name.endswith('_') or name.startswith('tmp') or name.startswith('temp')
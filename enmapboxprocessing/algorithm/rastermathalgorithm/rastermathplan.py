@@ -0,0 +1,182 @@
+from collections import defaultdict
+from re import finditer, match, search, Match
+from typing import Dict, List, Tuple, Optional, Iterable
+from types import CodeType
+
+from enmapbox.typeguard import typechecked
+from enmapboxprocessing.algorithm.rastermathalgorithm.fusedexpression import FusedExpression
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.utils import Utils
+
+
+@typechecked
+class RasterMathPlan(object):
+    """
+    Execution plan of a raster math code, derived once per run and shared by all blocks.
+
+    The plan states which input rasters are needed as a whole, which single band (@) subsets are referenced,
+    which bands need to be read per raster (each band is read only once per block),
+    and holds the rewritten code, which is compiled on first use.
+    Use str(plan) to inspect the plan.
+    """
+
+    def __init__(
+            self, code: str, readers: Dict[str, RasterReader], writerNames: Iterable[str], outputName: str,
+            rasterListNames: List[str]
+    ):
+        self.readers = readers
+        self.writerNames = list(writerNames)
+        self.rasterListNames = [name for name in rasterListNames if name in readers]
+
+        self.fullRasters: List[str] = list()  # rasters used as a whole
+        self.rasterizedVectors: List[str] = list()  # rasters that are rasterized vectors (only the 0/1 mask is used)
+        self.atBands: Dict[str, Dict[Tuple[int, ...], List[str]]] = dict()  # single band usages (@) per raster
+        self.readBands: Dict[str, List[int]] = dict()  # bands to be read per raster for the single band usages
+
+        lines = [line for line in code.splitlines() if not line.startswith('#')]
+        useRasterList = any([search(r'(?<!\w)RS(Mask)?(?!\w)', line) for line in lines])
+        atIdentifiers = list()  # collect all @identifiers that need to be substitution with valid identifier
+        for rasterName, reader in readers.items():
+            # check if we use the actual array or mask array
+            if self.usesData(rasterName, lines) or (useRasterList and rasterName in self.rasterListNames):
+                self.fullRasters.append(rasterName)
+                if reader.bandName(reader.bandCount()) == 'None':
+                    self.rasterizedVectors.append(rasterName)
+
+            #  find single band usages indicated by '@'
+            atBands: Dict[Tuple, List[str]] = defaultdict(list)
+            for line in lines:
+                line += '    '  # add some space for avoiding index errors when checking
+                matches = list()
+                matches.extend(finditer(rasterName + '@"[^"]+"', line))
+                matches.extend(finditer(rasterName + '@[0-9:|^]+', line))
+                matches.extend(finditer(rasterName + 'Mask@"[^"]+"', line))
+                matches.extend(finditer(rasterName + 'Mask@[0-9:|^]+', line))
+
+                match_: Match
+                for match_ in matches:
+                    text = line[match_.start(): match_.end()]
+                    atIdentifiers.append(text)  # need to make the @identifier a valid identifier later
+                    if line[match_.end(): match_.end() + 2] == 'nm':  # waveband mode
+                        unit = 'nm'
+                    else:
+                        unit = ''
+                    bandNos = self.parseBandNumbers(reader, text, line[match_.end() - 1] == '"', unit)
+                    identifier = text.replace('Mask@', '@') + unit
+                    atBands[bandNos].append(identifier)  # collect all identifiers for each band
+            self.atBands[rasterName] = dict(atBands)
+            self.readBands[rasterName] = sorted(set(bandNo for bandNos in atBands for bandNo in bandNos))
+
+        # inject writer objects
+        for rasterName in self.writerNames:
+            code = code.replace(rasterName + '.set', rasterName + '_.set', )
+
+        # inject reader objects
+        for rasterName in readers:
+            for method in RasterReader.__dict__:
+                code = code.replace(rasterName + '.' + method, rasterName + '_.' + method)
+
+        # strip empty lines
+        code = code.strip()
+
+        # remove all comments
+        code = '\n'.join([line for line in code.splitlines() if not line.strip().startswith('#')])
+
+        # substitute all @"<band name>" identifier with valid identifier
+        for atIdentifier in set(atIdentifiers):
+            code = code.replace(atIdentifier, Utils.makeIdentifier(atIdentifier.replace('@', 'At')))
+
+        # enable single line expressions
+        self.isSingleLineCode = '\n' not in code
+        if self.isSingleLineCode:
+            code = outputName + ' = ' + code  # make it a statement
+
+        # replace @
+        code = code.replace('@', 'At')
+
+        # element-wise single line expressions are evaluated fused
+        self.fusedExpression: Optional[FusedExpression] = None
+        if self.isSingleLineCode:
+            self.fusedExpression = FusedExpression.fromExpression(code[len(outputName + ' = '):])
+
+        self.code = code.replace(r'\n', '\n')  # convert raw new lines (only required when executed via qgis_process)
+        self.mCompiledCode: Optional[CodeType] = None
+
+    @staticmethod
+    def usesData(rasterName: str, lines: List[str]) -> bool:
+        """Return whether the code uses the actual array or mask array of a raster (not only single bands)."""
+        for line in lines:
+            line += '    '  # add some space for avoiding index errors when checking
+            for match_ in finditer(rf'(?<!\w){rasterName}(Mask)?(?!\w)', line):
+                if line[match_.end()] == '@':
+                    continue  # not using the actual array, but only a single band
+                if line[match_.end()] == '.' and match_.group(1) is None:
+                    attribute = match(r'\.(\w+)', line[match_.end():])
+                    if attribute is not None and attribute.group(1) in RasterReader.__dict__:
+                        continue  # not using the actual array, but the reader
+                return True
+        return False
+
+    @staticmethod
+    def parseBandNumbers(reader: RasterReader, text: str, bandNameMode: bool, unit: str) -> Tuple[int, ...]:
+        """Resolve the band numbers of a single band usage, e.g. R1@5, R1@"Band 5", R1@655nm, R1@1:10|^5."""
+        if bandNameMode:
+            bandName = text.split('"')[1]
+            return reader.findBandName(bandName),
+
+        subtext = text.split('@')[1]
+        groups = subtext.split('|')
+        bandsToUse = list()
+        bandsToExclude = list()
+        for group in groups:
+            if ':' in group:
+                a, b = group.split(':')
+            else:
+                a, b = group, None
+            toBeExcluded = a.startswith('^')
+            if toBeExcluded:
+                a = a[1:]
+            a = int(a)
+            if unit == 'nm':
+                a = reader.findWavelength(a)
+                if b is not None:
+                    b = reader.findWavelength(b)
+            if b is None:
+                b = a + 1
+            b = int(b)
+            if toBeExcluded:
+                bandsToExclude.extend(range(a, b))
+            else:
+                bandsToUse.extend(range(a, b))
+        if len(bandsToUse) == 0:
+            bandsToUse = range(1, reader.bandCount() + 1)
+        return tuple(set(bandsToUse).difference(bandsToExclude))
+
+    def compiledCode(self) -> CodeType:
+        """Return the compiled code."""
+        if self.mCompiledCode is None:
+            self.mCompiledCode = compile(self.code, '<string>', 'exec')
+        return self.mCompiledCode
+
+    def __str__(self):
+        lines = ['Raster math execution plan']
+        for rasterName in self.readers:
+            usages = list()
+            if rasterName in self.rasterizedVectors:
+                usages.append('0/1 mask')
+            elif rasterName in self.fullRasters:
+                usages.append('all bands')
+            for bandNos, identifiers in self.atBands[rasterName].items():
+                usages.append(f'{", ".join(sorted(set(identifiers)))} -> bands {list(bandNos)}')
+            if len(self.readBands[rasterName]) > 0 and rasterName not in self.fullRasters:
+                usages.append(f'read bands {self.readBands[rasterName]}')
+            if len(usages) == 0:
+                usages.append('not used')
+            lines.append(f'  {rasterName}: {"; ".join(usages)}')
+        if self.fusedExpression is not None:
+            lines.append(f'  fused expression: {self.fusedExpression.expression}')
+        if len(self.writerNames) > 0:
+            lines.append(f'  writers: {", ".join(self.writerNames)}')
+        lines.append('  code:')
+        lines.extend(['    ' + line for line in self.code.splitlines()])
+        return '\n'.join(lines)
@@ -1,8 +1,10 @@
+from os.path import splitext
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
 
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.algorithm.creategridalgorithm import CreateGridAlgorithm
 from enmapboxprocessing.algorithm.rasterizevectoralgorithm import RasterizeVectorAlgorithm
 from enmapboxprocessing.driver import Driver
@@ -12,9 +14,10 @@ from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.utils import Utils
 from qgis import processing
 from qgis.PyQt.QtCore import QMetaType
-from qgis.core import (QgsProcessingContext, QgsProcessingFeedback, QgsVectorLayer, QgsRasterLayer,
-                       QgsFeature, QgsField, QgsProcessingFeatureSourceDefinition, QgsApplication,
-                       QgsVectorDataProvider, QgsRasterDataProvider, QgsPoint)
+from qgis.core import (Qgis, QgsProcessingContext, QgsProcessingFeedback, QgsVectorLayer, QgsRasterLayer,
+                       QgsFeature, QgsFeatureRequest, QgsField, QgsFields, QgsApplication, QgsVectorDataProvider,
+                       QgsPointXY, QgsCoordinateTransform, QgsCsException, QgsProject, QgsVectorFileWriter,
+                       QgsProcessingException)
 from qgis.core.additions.edit import edit
 
 
@@ -25,6 +28,10 @@ class SampleRasterValuesAlgorithm(EnMAPProcessingAlgorithm):
     P_SKIP_NO_DATA_PIXEL, _SKIP_NO_DATA_PIXEL = 'skipNoDataPixel', 'Skip no data pixel'
     P_COVERAGE_RANGE, _COVERAGE_RANGE = 'coverageRange', 'Pixel coverage (%)'
     P_OUTPUT_POINTS, _OUTPUT_POINTS = 'outputPointsData', 'Output point layer'
+    ChunkSize = 16384  # number of points sampled and written at once
+    IntegerDataTypes = [
+        Qgis.DataType.Byte, Qgis.DataType.Int16, Qgis.DataType.UInt16, Qgis.DataType.Int32, Qgis.DataType.UInt32
+    ]
 
     def displayName(self) -> str:
         return 'Sample raster layer values'
@@ -98,45 +105,164 @@ class SampleRasterValuesAlgorithm(EnMAPProcessingAlgorithm):
         if not Utils.isPointGeometry(vector.geometryType()):
             raise ValueError('vector layer must contain point geometries')
 
-        alg = 'qgis:rastersampling'
-        parameters = {
-            'COLUMN_PREFIX': 'SAMPLE_',
-            'INPUT': QgsProcessingFeatureSourceDefinition(vector.source(), selectedFeaturesOnly),
-            'OUTPUT': filename,
-            'RASTERCOPY': raster
-        }
-        processing.run(alg, parameters, None, feedback2, context, True)
-        sample = QgsVectorLayer(filename)
-
-        # add image X, Y coordinates and find no data pixel
-        rasterProvider = raster.dataProvider()
-        vectorProvider: QgsVectorDataProvider = sample.dataProvider()
-        fields = [QgsField('PIXEL_X', QMetaType.LongLong), QgsField('PIXEL_Y', QMetaType.LongLong)]
-        vectorProvider.addAttributes(fields)
-        sample.updateFields()
-        noDataPixels = list()
-        dataFields = [i for i, field in enumerate(sample.fields()) if field.name().startswith('SAMPLE_')]
-        with edit(sample):
-            feature: QgsFeature
-            for feature in sample.getFeatures():
-                if feature.geometry().isNull():
+        reader = RasterReader(raster)
+        fields = QgsFields(vector.fields())
+        for bandNo in reader.bandNumbers():
+            if reader.dataType(bandNo) in cls.IntegerDataTypes:
+                fields.append(QgsField(f'SAMPLE_{bandNo}', QMetaType.LongLong))
+            else:
+                fields.append(QgsField(f'SAMPLE_{bandNo}', QMetaType.Double))
+        fields.append(QgsField('PIXEL_X', QMetaType.LongLong))
+        fields.append(QgsField('PIXEL_Y', QMetaType.LongLong))
+
+        # collect point locations in raster crs (first part of multi-points is used),
+        # features are streamed, only the feature IDs and coordinates are kept
+        coordinateTransform = QgsCoordinateTransform(vector.crs(), raster.crs(), QgsProject.instance())
+        request = QgsFeatureRequest().setNoAttributes()
+        if selectedFeaturesOnly:
+            request.setFilterFids(vector.selectedFeatureIds())
+        fids = list()
+        coordinates = list()
+        feature: QgsFeature
+        for feature in vector.getFeatures(request):
+            fids.append(feature.id())
+            coordinates.append((np.nan, np.nan))
+            geometry = feature.geometry()
+            if geometry.isNull():
+                continue
+            try:
+                point = coordinateTransform.transform(QgsPointXY(geometry.vertexAt(0)))
+            except QgsCsException:
+                continue
+            coordinates[-1] = point.x(), point.y()
+        fids = np.array(fids, np.int64)
+        coordinates = np.array(coordinates, np.float64).reshape((-1, 2))
+        n = len(fids)
+
+        # convert all locations to pixel indices at once
+        extent = reader.extent()
+        pixelX = np.floor((coordinates[:, 0] - extent.xMinimum()) / reader.rasterUnitsPerPixelX())
+        pixelY = np.floor((extent.yMaximum() - coordinates[:, 1]) / reader.rasterUnitsPerPixelY())
+        del coordinates
+        hasPixel = np.isfinite(pixelX) & np.isfinite(pixelY)
+        inside = hasPixel.copy()
+        inside[hasPixel] = np.logical_and.reduce([
+            pixelX[hasPixel] >= 0, pixelX[hasPixel] < reader.width(),
+            pixelY[hasPixel] >= 0, pixelY[hasPixel] < reader.height()
+        ])
+        pixelX[~hasPixel] = 0
+        pixelY[~hasPixel] = 0
+        pixelX = pixelX.astype(np.int64)
+        pixelY = pixelY.astype(np.int64)
+
+        # sort points by raster block, points outside the raster go last (in input order),
+        # so that chunking over that order reads each block only once
+        blockSizeX, blockSizeY = cls.blockSize(reader)
+        insideIndices = np.where(inside)[0]
+        blockOrder = np.lexsort((pixelX[insideIndices] // blockSizeX, pixelY[insideIndices] // blockSizeY))
+        order = np.concatenate([insideIndices[blockOrder], np.where(~inside)[0]])
+        del insideIndices, blockOrder
+
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = QgsVectorFileWriter.driverForExtension(splitext(filename)[1])
+        options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteFile
+        options.fileEncoding = 'UTF-8'
+        writer = QgsVectorFileWriter.create(
+            filename, fields, vector.wkbType(), vector.crs(), QgsProject.instance().transformContext(), options
+        )
+        if writer.hasError() != QgsVectorFileWriter.NoError:
+            raise QgsProcessingException(f'failed to write vector file: {writer.errorMessage()}')
+
+        # sample and write the points in chunks of the block order
+        bandCount = reader.bandCount()
+        isInteger = [reader.dataType(bandNo) in cls.IntegerDataTypes for bandNo in reader.bandNumbers()]
+        for start in range(0, n, cls.ChunkSize):
+            if feedback.isCanceled():
+                raise AlgorithmCanceledException()
+            feedback.setProgress(start / n * 100)
+            chunk = order[start:start + cls.ChunkSize]
+            values, valid = cls.samplePixels(
+                reader, pixelX[chunk], pixelY[chunk], inside[chunk], (blockSizeX, blockSizeY)
+            )
+            samples = list()
+            for bandValues, bandValid, isIntegerBand in zip(values, valid, isInteger):
+                if isIntegerBand:  # use integer values for integer bands
+                    bandValues = bandValues.astype(np.int64)
+                bandValues = bandValues.astype(object)
+                bandValues[~bandValid] = None
+                samples.append(bandValues)
+            samples = np.array(samples, dtype=object).T.tolist()
+            del values, valid
+
+            request = QgsFeatureRequest().setFilterFids(fids[chunk].tolist())
+            features = {feature.id(): feature for feature in vector.getFeatures(request)}
+            outFeatures = list()
+            for i, sample in zip(chunk, samples):
+                if skipNoDataPixel and hasPixel[i] and sample.count(None) == bandCount:
                     continue
-                point = QgsPoint(feature.geometry().asPoint())
-                imagePoint: QgsPoint = rasterProvider.transformCoordinates(
-                    point, QgsRasterDataProvider.TransformLayerToImage
-                )
-                feature.setAttribute('PIXEL_X', imagePoint.x())
-                feature.setAttribute('PIXEL_Y', imagePoint.y())
-                sample.updateFeature(feature)
-
-                if skipNoDataPixel:
-                    if np.all(np.equal(np.asarray(feature.attributes())[dataFields], None)):
-                        noDataPixels.append(feature.id())
+                if hasPixel[i]:
+                    pixel = [int(pixelX[i]), int(pixelY[i])]
+                else:
+                    pixel = [None, None]
+                feature = features[int(fids[i])]
+                outFeature = QgsFeature(fields)
+                outFeature.setGeometry(feature.geometry())
+                outFeature.setAttributes(feature.attributes() + sample + pixel)
+                outFeatures.append(outFeature)
+            del features
+            if not writer.addFeatures(outFeatures):
+                raise QgsProcessingException(f'failed to write vector file: {writer.errorMessage()}')
+        del writer
+
+        return QgsVectorLayer(filename)
 
-        if skipNoDataPixel:
-            sample.dataProvider().deleteFeatures(noDataPixels)
+    @classmethod
+    def blockSize(cls, reader: RasterReader) -> Tuple[int, int]:
+        """Return the block size used for grouping points, aligned to the native block size of the raster."""
+        planner = BlockPlanner(reader)
+        planner.addInput(reader)
+        planner.addWorkingMemory(reader.bandCount(), 1)  # mask array
+        return planner.blockSize()
 
-        return sample
+    @classmethod
+    def samplePixels(
+            cls, reader: RasterReader, pixelX: np.ndarray, pixelY: np.ndarray, inside: np.ndarray,
+            blockSize: Tuple[int, int] = None, feedback: QgsProcessingFeedback = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return values and validity masks (bands x points) for the given pixel locations.
+        Points are grouped by raster block, and for each block, the bounding window of its points is read once.
+        """
+        n = len(pixelX)
+        values = np.zeros((reader.bandCount(), n), np.float64)
+        valid = np.zeros((reader.bandCount(), n), bool)
+        indices = np.where(inside)[0]
+        if len(indices) == 0:
+            return values, valid
+
+        if blockSize is None:
+            blockSize = cls.blockSize(reader)
+        blockSizeX, blockSizeY = blockSize
+        blockX = pixelX[indices] // blockSizeX
+        blockY = pixelY[indices] // blockSizeY
+        order = np.lexsort((blockX, blockY))
+        indices, blockX, blockY = indices[order], blockX[order], blockY[order]
+        splits = np.where((np.diff(blockX) != 0) | (np.diff(blockY) != 0))[0] + 1
+        groups = np.split(indices, splits)
+        for i, group in enumerate(groups):
+            if feedback is not None:
+                if feedback.isCanceled():
+                    raise AlgorithmCanceledException()
+                feedback.setProgress(i / len(groups) * 100)
+            xs = pixelX[group]
+            ys = pixelY[group]
+            xOffset, yOffset = int(xs.min()), int(ys.min())
+            width, height = int(xs.max()) - xOffset + 1, int(ys.max()) - yOffset + 1
+            array = np.array(reader.arrayFromPixelOffsetAndSize(xOffset, yOffset, width, height))
+            marray = np.array(reader.maskArray(array))
+            values[:, group] = array[:, ys - yOffset, xs - xOffset]
+            valid[:, group] = marray[:, ys - yOffset, xs - xOffset]
+        return values, valid
 
     @classmethod
     def samplePolygons(
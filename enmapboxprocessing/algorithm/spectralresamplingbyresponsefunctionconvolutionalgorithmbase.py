@@ -1,20 +1,22 @@
 import inspect
 from collections import OrderedDict
-from math import ceil, sqrt, pi, exp
+from math import sqrt, pi, exp
 from os.path import splitext
 from typing import Dict, Any, List, Tuple, Union
 from warnings import warn
 
 import numpy as np
-from osgeo import gdal
 
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.geojsonlibrarywriter import GeoJsonLibraryWriter
+from enmapboxprocessing.numpyutils import NumpyUtils
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
 from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.typing import Array3d, Number
-from qgis.core import (QgsProcessingContext, QgsProcessingFeedback, QgsProcessingException)
+from qgis.core import (QgsProcessingContext, QgsProcessingFeedback, QgsProcessingException, Qgis)
 
 RESPONSE_CUTOFF_VALUE = 0.001
 RESPONSE_CUTOFF_DIGITS = 3
@@ -81,7 +83,6 @@ class SpectralResamplingByResponseFunctionConvolutionAlgorithmBase(EnMAPProcessi
         responses = self.parameterAsResponses(parameters, self.P_CODE, context)
         filenameSrf = self.parameterAsFileOutput(parameters, self.P_OUTPUT_LIBRARY, context)
         filename = self.parameterAsOutputLayer(parameters, self.P_OUTPUT_RASTER, context)
-        maximumMemoryUsage = gdal.GetCacheMax()
 
         with open(filename + '.log', 'w') as logfile:
             feedback, feedback2 = self.createLoggingFeedback(feedback, logfile)
@@ -129,19 +130,45 @@ class SpectralResamplingByResponseFunctionConvolutionAlgorithmBase(EnMAPProcessi
             if outputNoDataValue is None:
                 outputNoDataValue = 0
 
+            # compile response functions into a weight matrix, restricted to the source bands covered by any target band
+            weightMatrix = self.responseWeightMatrix(wavelength, responses, feedback)
+            bandList = [int(index) + 1 for index in np.flatnonzero(np.any(weightMatrix != 0, axis=0))]
+            if len(bandList) == 0:
+                bandList = [1]  # nothing is covered; read a single band to produce no data output
+            weightMatrix = weightMatrix[:, [bandNo - 1 for bandNo in bandList]]
+
             writer = Driver(filename, feedback=feedback).createLike(reader, reader.dataType(), outputBandCount)
-            lineMemoryUsage = reader.lineMemoryUsage() * 2
-            blockSizeY = min(raster.height(), ceil(maximumMemoryUsage / lineMemoryUsage))
-            blockSizeX = raster.width()
-            isFirstBlock = True
-            for block in reader.walkGrid(blockSizeX, blockSizeY, feedback):
-                array = reader.arrayFromBlock(block)
-                marray = reader.maskArray(array)
-                outarray = self.resampleData(
-                    array, marray, wavelength, responses, outputNoDataValue, feedback, isFirstBlock
+            processor = self.createBlockProcessor(feedback)
+            planner = BlockPlanner(reader, feedback=feedback)
+            planner.addInput(reader, bandList, dataTypeSize=4)  # float32
+            planner.addWorkingMemory(len(bandList), 1)  # masks
+            planner.addWorkingMemory(len(bandList) * 2, 8)  # float64 masked values and masks for the matrix product
+            planner.addOutput(outputBandCount, Qgis.DataType.Float64)
+            planner.setBlocksInFlight(processor.maximumBlocksInFlight())
+            blockSizeX, blockSizeY = planner.blockSize()
+            blocks = list(planner.walkGrid())
+
+            def createSlot():
+                reader_ = reader if processor.parallelism == 1 else reader.clone()
+                buffer = reader_.allocateArray(blockSizeX, blockSizeY, bandList, np.float32)  # reused for all blocks
+                return reader_, buffer
+
+            def readBlock(slot, block: RasterBlockInfo):
+                reader_, buffer = slot
+                array = reader_.arrayFromBlock(
+                    block, bandList, out=NumpyUtils.bufferView(buffer, (len(bandList), block.height, block.width))
                 )
+                marray = reader_.maskArray(array, bandList)
+                return array, marray
+
+            def processBlock(data):
+                array, marray = data
+                return self.resampleData(array, marray, weightMatrix, outputNoDataValue)
+
+            def writeBlock(block: RasterBlockInfo, outarray):
                 writer.writeArray(outarray, block.xOffset, block.yOffset)
-                isFirstBlock = False
+
+            processor.run(blocks, readBlock, processBlock, writeBlock, createSlot)
 
             outputWavelength = list()
             for name in responses:
@@ -182,40 +209,53 @@ class SpectralResamplingByResponseFunctionConvolutionAlgorithmBase(EnMAPProcessi
         return result
 
     @staticmethod
-    def resampleData(
-        array: Array3d, marray: Array3d, wavelength: List, responses: Dict[str, List[Tuple[int, float]]],
-        noDataValue: float, feedback: QgsProcessingFeedback, isFirstBlock=True
-    ) -> Array3d:
+    def responseWeightMatrix(
+        wavelength: List, responses: Dict[str, List[Tuple[int, float]]], feedback: QgsProcessingFeedback = None
+    ) -> np.ndarray:
+        """
+        Return response function weights as (target bands x source bands) matrix.
+        Source bands not covered by a target band response function get a weight of zero.
+        """
         wavelength = [int(round(v)) for v in wavelength]
-        outarray = list()
-        for name in responses:
+        weightMatrix = np.zeros((len(responses), len(wavelength)), np.float64)
+        for targetIndex, name in enumerate(responses):
             weightsByWavelength = dict(responses[name])
-            indices = list()
-            weights = list()
-            for index, wl in enumerate(wavelength):
+            for sourceIndex, wl in enumerate(wavelength):
                 weight = weightsByWavelength.get(wl)
                 if weight is not None:
-                    indices.append(index)
-                    weights.append(weight)
-            if len(indices) == 0:
-                if isFirstBlock:
-                    message = f'no source bands ({min(wavelength)} to {max(wavelength)} nanometers) ' \
-                              f'are covert by target band "{name}" ' \
-                              f'({min(weightsByWavelength.keys())} to {max(weightsByWavelength.keys())} nanometers), ' \
-                              f'which will result in output band filled with no data values'
-                    warn(message)
+                    weightMatrix[targetIndex, sourceIndex] = weight
+            if not np.any(weightMatrix[targetIndex] != 0):
+                message = f'no source bands ({min(wavelength)} to {max(wavelength)} nanometers) ' \
+                          f'are covert by target band "{name}" ' \
+                          f'({min(weightsByWavelength.keys())} to {max(weightsByWavelength.keys())} nanometers), ' \
+                          f'which will result in output band filled with no data values'
+                warn(message)
+                if feedback is not None:
                     feedback.pushWarning(message)
-                outarray.append(np.full_like(array[0], noDataValue, dtype=array[0].dtype))
-            else:
-                tmparray = np.asarray(array, np.float32)[indices]
-                tmpmarray = np.asarray(marray)[indices]
-                warray = np.array(weights).reshape((-1, 1, 1)) * np.ones_like(tmparray)
-                for tmparr, warr, marr in zip(tmparray, warray, tmpmarray):
-                    invalid = np.logical_not(marr)
-                    tmparr[invalid] = np.nan
-                    warr[invalid] = np.nan
-                outarr = np.nansum(tmparray * warray, 0) / np.nansum(warray, 0)
-                outarr[np.isnan(outarr)] = noDataValue
-                outarray.append(outarr)
-
-        return outarray
+        return weightMatrix
+
+    @staticmethod
+    def resampleData(array: Array3d, marray: Array3d, weightMatrix: np.ndarray, noDataValue: float) -> np.ndarray:
+        """
+        Resample data by the given (target bands x source bands) weight matrix.
+        Weights are renormalised for each pixel, so that invalid source values are ignored.
+        Pixels without any valid covered source value are set to no data.
+        """
+        array = np.asarray(array)
+        sourceBandCount, height, width = array.shape
+        marray = np.reshape(marray, (sourceBandCount, height * width))
+
+        # numerators and denominators are calculated by a single matrix product:
+        #   weightMatrix @ [values * mask | mask]
+        stack = np.empty((sourceBandCount, 2, height * width), np.float64)
+        stack[:, 0] = np.where(marray, np.reshape(array, (sourceBandCount, height * width)), 0)
+        stack[:, 1] = marray
+        product = np.reshape(weightMatrix @ np.reshape(stack, (sourceBandCount, -1)), (-1, 2, height * width))
+        numerator = product[:, 0]
+        denominator = product[:, 1]
+
+        invalid = denominator == 0
+        denominator[invalid] = 1
+        outarray = numerator / denominator
+        outarray[invalid] = noDataValue
+        return np.reshape(outarray, (-1, height, width))
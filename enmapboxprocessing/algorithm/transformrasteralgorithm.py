@@ -1,10 +1,9 @@
-from math import ceil
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
-from osgeo import gdal
 
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.blockplanner import BlockPlanner
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.enmapalgorithm import EnMAPProcessingAlgorithm, Group
 from enmapboxprocessing.rasterreader import RasterReader
@@ -58,7 +57,6 @@ class TransformRasterAlgorithm(EnMAPProcessingAlgorithm):
         dump = self.parameterAsTransformerDump(parameters, self.P_TRANSFORMER, context)
         matchByName = self.parameterAsBoolean(parameters, self.P_MATCH_BY_NAME, context)
         filename = self.parameterAsOutputLayer(parameters, self.P_OUTPUT_RASTER, context)
-        maximumMemoryUsage = gdal.GetCacheMax()
 
         with open(filename + '.log', 'w') as logfile:
             feedback, feedback2 = self.createLoggingFeedback(feedback, logfile)
@@ -106,10 +104,12 @@ class TransformRasterAlgorithm(EnMAPProcessingAlgorithm):
             # init result raster
             noDataValue = Utils.defaultNoDataValue(np.float32)
             writer = Driver(filename, feedback=feedback).createLike(reader, Qgis.Float32, bandCount)
-            lineMemoryUsage = reader.lineMemoryUsage() + reader.lineMemoryUsage(bandCount, 4)
-            blockSizeY = min(raster.height(), ceil(maximumMemoryUsage / lineMemoryUsage))
-            blockSizeX = raster.width()
-            for block in reader.walkGrid(blockSizeX, blockSizeY, feedback):
+            planner = BlockPlanner(reader, feedback=feedback)
+            planner.addInput(reader, bandList)
+            planner.addInput(reader, bandList)  # copy of valid pixel features
+            planner.addWorkingMemory(bandCount, 8)  # float64 transformed features
+            planner.addOutput(bandCount, Qgis.DataType.Float32)
+            for block in planner.walkGrid(feedback):
                 arrayX = reader.arrayFromBlock(block, bandList)
                 valid = np.all(reader.maskArray(arrayX, bandList), axis=0)
                 X = list()
@@ -0,0 +1,351 @@
+import hashlib
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass
+from os import makedirs, remove, scandir, utime
+from os.path import exists, getmtime, join
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from warnings import warn
+
+import numpy as np
+from osgeo import gdal
+
+from enmapbox.typeguard import typechecked
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.utils import Utils
+from qgis.core import QgsApplication, QgsProcessingFeedback, QgsRasterLayer, QgsRectangle, QgsTask
+
+
+@typechecked
+@dataclass
+class BandStatistics(object):
+    """
+    Band statistics together with a fine histogram, from which histograms with arbitrary binning and cumulative
+    cut values are derived.
+    """
+    count: int
+    minimum: float
+    maximum: float
+    mean: float
+    stdDev: float
+    histogramMinimum: float
+    histogramBinWidth: float
+    histogramCounts: np.ndarray
+
+    def _cumulatedCounts(self) -> Tuple[np.ndarray, np.ndarray]:
+        edges = self.histogramMinimum + np.arange(len(self.histogramCounts) + 1) * self.histogramBinWidth
+        cumulated = np.concatenate([[0], np.cumsum(self.histogramCounts)])
+        return edges, cumulated
+
+    def histogram(self, binCount: int, minimum: float = None, maximum: float = None) -> np.ndarray:
+        """
+        Return counts for equally sized bins between minimum and maximum (defaults to the value range).
+        Counts are approximated by linear interpolation of the cumulated fine histogram.
+        """
+        if minimum is None:
+            minimum = self.minimum
+        if maximum is None:
+            maximum = self.maximum
+        edges, cumulated = self._cumulatedCounts()
+        return np.diff(np.interp(np.linspace(minimum, maximum, binCount + 1), edges, cumulated))
+
+    def cumulativeCut(self, lower: float, upper: float) -> Tuple[float, float]:
+        """Return values at the given cumulative count fractions, e.g. 0.02 and 0.98."""
+        if self.count == 0:
+            return np.nan, np.nan
+        edges, cumulated = self._cumulatedCounts()
+        values = np.interp(np.array([lower, upper]) * self.count, cumulated, edges)
+        values = np.clip(values, self.minimum, self.maximum)
+        return float(values[0]), float(values[1])
+
+
+@typechecked
+class BandStatisticsAccumulator(object):
+    """
+    Accumulate statistics and histograms for multiple bands, block by block.
+
+    The value range is unknown in advance, so each band uses an adaptive histogram with a fixed number of bins:
+    whenever new values fall outside the covered range, neighbouring bins are merged and the covered range is doubled.
+    """
+
+    def __init__(self, bandCount: int, binCount: int = 4096):
+        if binCount % 2 != 0:
+            raise ValueError(f'bin count must be even, got {binCount}')
+        self.binCount = binCount
+        self.count = np.zeros(bandCount, np.int64)
+        self.sum = np.zeros(bandCount)
+        self.sumOfSquares = np.zeros(bandCount)
+        self.minimum = np.full(bandCount, np.inf)
+        self.maximum = np.full(bandCount, -np.inf)
+        self.histogramMinimum = np.full(bandCount, np.nan)
+        self.histogramBinWidth = np.full(bandCount, np.nan)
+        self.histogramCounts = np.zeros((bandCount, binCount), np.int64)
+
+    def update(self, array: np.ndarray, marray: np.ndarray):
+        """Accumulate band data (3d) and masks (3d) of a block."""
+        for i, (bandArray, bandMask) in enumerate(zip(array, marray)):
+            values = bandArray[bandMask].astype(np.float64)
+            values = values[np.isfinite(values)]
+            if values.size == 0:
+                continue
+            vmin = float(np.min(values))
+            vmax = float(np.max(values))
+            self.count[i] += values.size
+            self.sum[i] += np.sum(values)
+            self.sumOfSquares[i] += np.sum(values ** 2)
+            self.minimum[i] = min(self.minimum[i], vmin)
+            self.maximum[i] = max(self.maximum[i], vmax)
+            self._updateHistogram(i, values, vmin, vmax)
+
+    def _updateHistogram(self, i: int, values: np.ndarray, vmin: float, vmax: float):
+        n = self.binCount
+        if np.isnan(self.histogramMinimum[i]):
+            self.histogramMinimum[i] = vmin
+            self.histogramBinWidth[i] = max((vmax - vmin) / n, abs(vmin) * 1e-9, 1e-12)
+        while vmin < self.histogramMinimum[i] or vmax >= self.histogramMinimum[i] + n * self.histogramBinWidth[i]:
+            merged = self.histogramCounts[i].reshape((n // 2, 2)).sum(axis=1)
+            if vmin < self.histogramMinimum[i]:  # extend to lower values
+                self.histogramCounts[i] = np.concatenate([np.zeros(n // 2, np.int64), merged])
+                self.histogramMinimum[i] -= n * self.histogramBinWidth[i]
+            else:  # extend to upper values
+                self.histogramCounts[i] = np.concatenate([merged, np.zeros(n // 2, np.int64)])
+            self.histogramBinWidth[i] *= 2
+        bins = np.floor((values - self.histogramMinimum[i]) / self.histogramBinWidth[i]).astype(np.int64)
+        self.histogramCounts[i] += np.bincount(np.clip(bins, 0, n - 1), minlength=n)
+
+    def statistics(self) -> List[BandStatistics]:
+        result = list()
+        for i in range(len(self.count)):
+            count = int(self.count[i])
+            if count == 0:
+                result.append(BandStatistics(0, np.nan, np.nan, np.nan, np.nan, 0., 1., self.histogramCounts[i]))
+                continue
+            mean = self.sum[i] / count
+            variance = max(self.sumOfSquares[i] / count - mean ** 2, 0.)
+            result.append(BandStatistics(
+                count, float(self.minimum[i]), float(self.maximum[i]), float(mean), float(np.sqrt(variance)),
+                float(self.histogramMinimum[i]), float(self.histogramBinWidth[i]), self.histogramCounts[i].copy()
+            ))
+        return result
+
+
+@typechecked
+class BandStatisticsService(object):
+    """
+    Band statistics and histograms for many bands, calculated in a single block-wise read.
+
+    Results are keyed by (source, band, extent, sample size, modification time, no data settings) and cached in
+    memory.
+    Results for the whole extent of file-based sources are also cached persistently inside the cache folder.
+    The cache folder is configured by ENMAPBOX_STATISTICS_CACHE (defaults to a folder inside the QGIS profile);
+    set it to an empty string to disable the persistent cache.
+    The size of the cache folder is limited by ENMAPBOX_STATISTICS_CACHE_SIZE, given in megabytes
+    (defaults to 64 megabytes); least recently used files are removed first.
+    """
+    _memoryCache: Dict[str, BandStatistics] = OrderedDict()
+    _memoryCacheSize = 1000  # number of cached band statistics
+    _lock = Lock()
+
+    @staticmethod
+    def cacheFolder() -> Optional[str]:
+        default = join(QgsApplication.qgisSettingsDirPath(), 'enmapbox', 'cache', 'bandstatistics')
+        folder = gdal.GetConfigOption('ENMAPBOX_STATISTICS_CACHE', default)
+        if folder == '':
+            return None
+        return folder
+
+    @staticmethod
+    def cacheFolderMaximumBytes() -> int:
+        """Return the size limit of the cache folder."""
+        value = gdal.GetConfigOption('ENMAPBOX_STATISTICS_CACHE_SIZE', '64').strip()
+        try:
+            return int(float(value) * 1024 ** 2)
+        except ValueError:
+            warn(f'invalid ENMAPBOX_STATISTICS_CACHE_SIZE value: {value}')
+            return 64 * 1024 ** 2
+
+    @classmethod
+    def cacheKey(cls, reader: RasterReader, bandNo: int, extent: QgsRectangle, sampleSize: int) -> str:
+        source = reader.source()
+        mtime = getmtime(source) if exists(source) else None
+        extent = extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()
+        noData = (
+            reader.useSourceNoDataValue(bandNo),
+            tuple((r.min(), r.max(), r.includeMinimum(), r.includeMaximum()) for r in reader.userNoDataValues(bandNo))
+        )
+        return repr((source, bandNo, extent, sampleSize, mtime, noData))
+
+    @classmethod
+    def _cacheFilename(cls, key: str) -> Optional[str]:
+        folder = cls.cacheFolder()
+        if folder is None:
+            return None
+        return join(folder, hashlib.sha1(key.encode()).hexdigest() + '.npz')
+
+    @classmethod
+    def _readCache(cls, key: str, persistent: bool) -> Optional[BandStatistics]:
+        with cls._lock:
+            if key in cls._memoryCache:
+                cls._memoryCache.move_to_end(key)
+                return cls._memoryCache[key]
+        if not persistent:
+            return None
+        filename = cls._cacheFilename(key)
+        if filename is None or not exists(filename):
+            return None
+        try:
+            with np.load(filename) as data:
+                count, minimum, maximum, mean, stdDev, histogramMinimum, histogramBinWidth = data['values'].tolist()
+                statistics = BandStatistics(
+                    int(count), minimum, maximum, mean, stdDev, histogramMinimum, histogramBinWidth,
+                    data['histogramCounts']
+                )
+        except Exception:
+            return None  # ignore corrupted cache files
+        with suppress(OSError):
+            utime(filename)  # mark as recently used
+        cls._addToMemoryCache(key, statistics)
+        return statistics
+
+    @classmethod
+    def _addToMemoryCache(cls, key: str, statistics: BandStatistics):
+        with cls._lock:
+            cls._memoryCache[key] = statistics
+            while len(cls._memoryCache) > cls._memoryCacheSize:
+                cls._memoryCache.popitem(last=False)
+
+    @classmethod
+    def _writeCache(cls, key: str, statistics: BandStatistics, persistent: bool):
+        cls._addToMemoryCache(key, statistics)
+        if not persistent:
+            return
+        filename = cls._cacheFilename(key)
+        if filename is None:
+            return
+        values = [
+            statistics.count, statistics.minimum, statistics.maximum, statistics.mean, statistics.stdDev,
+            statistics.histogramMinimum, statistics.histogramBinWidth
+        ]
+        try:
+            makedirs(cls.cacheFolder(), exist_ok=True)
+            with open(filename, 'wb') as file:
+                np.savez(file, values=np.array(values, np.float64), histogramCounts=statistics.histogramCounts)
+        except OSError:
+            return  # the persistent cache is optional
+        cls._evictCacheFolder()
+
+    @classmethod
+    def _evictCacheFolder(cls):
+        """Remove least recently used files, until the cache folder is within its size limit."""
+        folder = cls.cacheFolder()
+        try:
+            entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                       for entry in scandir(folder) if entry.name.endswith('.npz')]
+        except OSError:
+            return
+        size = sum(entrySize for _, entrySize, _ in entries)
+        maximumBytes = cls.cacheFolderMaximumBytes()
+        for _, entrySize, filename in sorted(entries):
+            if size <= maximumBytes:
+                break
+            with suppress(OSError):
+                remove(filename)
+                size -= entrySize
+
+    @classmethod
+    def clearCache(cls):
+        """Clear the in-memory cache."""
+        with cls._lock:
+            cls._memoryCache.clear()
+
+    @classmethod
+    def bandStatistics(
+            cls, layer: QgsRasterLayer, bandList: List[int], extent: QgsRectangle = None, sampleSize: int = 0,
+            feedback: QgsProcessingFeedback = None
+    ) -> List[Optional[BandStatistics]]:
+        """
+        Return statistics for each band. Bands not found in the cache are calculated in a single block-wise read.
+        If a sample size is given, statistics are calculated on a regular sampling grid of approximately that size.
+        Returns None for all bands, if canceled.
+        """
+        reader = RasterReader(layer)
+        if extent is None:
+            extent = reader.extent()
+        persistent = exists(reader.source()) and extent == reader.extent()
+        keys = [cls.cacheKey(reader, bandNo, extent, sampleSize) for bandNo in bandList]
+        result = [cls._readCache(key, persistent) for key in keys]
+
+        missingBandList = sorted({bandNo for bandNo, statistics in zip(bandList, result) if statistics is None})
+        if len(missingBandList) == 0:
+            return result
+
+        # read all missing bands at once, strip by strip
+        accumulator = BandStatisticsAccumulator(len(missingBandList))
+        width, height = reader.samplingWidthAndHeight(missingBandList[0], extent, sampleSize)
+        lineMemoryUsage = width * len(missingBandList) * 16  # data and masks
+        stripHeight = max(1, min(height, Utils.memoryBudget() // lineMemoryUsage))
+        pixelSizeY = extent.height() / height
+        for yOffset in range(0, height, stripHeight):
+            if feedback is not None:
+                if feedback.isCanceled():
+                    return [None] * len(bandList)
+                feedback.setProgress(yOffset / height * 100)
+            stripHeight_ = min(stripHeight, height - yOffset)
+            boundingBox = QgsRectangle(
+                extent.xMinimum(), extent.yMaximum() - (yOffset + stripHeight_) * pixelSizeY,
+                extent.xMaximum(), extent.yMaximum() - yOffset * pixelSizeY
+            )
+            array = reader.arrayFromBoundingBoxAndSize(boundingBox, width, stripHeight_, missingBandList)
+            accumulator.update(array, reader.maskArray(array, missingBandList))
+
+        calculated = dict(zip(missingBandList, accumulator.statistics()))
+        for i, (key, bandNo) in enumerate(zip(keys, bandList)):
+            if result[i] is None:
+                result[i] = calculated[bandNo]
+                cls._writeCache(key, result[i], persistent)
+        return result
+
+
+class BandStatisticsTask(QgsTask):
+    """Calculate band statistics in the background, see BandStatisticsService.bandStatistics."""
+
+    def __init__(
+            self, layer: QgsRasterLayer, bandList: List[int], extent: QgsRectangle = None, sampleSize: int = 0
+    ):
+        super().__init__(
+            'Calculate band statistics', QgsTask.Silent | QgsTask.CanCancel | QgsTask.CancelWithoutPrompt
+        )
+        self.layer = layer.clone()  # the layer is used inside the worker thread
+        self.bandList = bandList
+        self.extent = None if extent is None else QgsRectangle(extent)
+        self.sampleSize = sampleSize
+        self.statistics: Optional[List[BandStatistics]] = None
+        self.error: Optional[Exception] = None
+
+    def run(self) -> bool:
+        try:
+            statistics = BandStatisticsService.bandStatistics(
+                self.layer, self.bandList, self.extent, self.sampleSize, TaskFeedback(self)
+            )
+        except Exception as error:
+            self.error = error
+            return False
+        if any(s is None for s in statistics):
+            return False  # canceled
+        self.statistics = statistics
+        return True
+
+
+class TaskFeedback(QgsProcessingFeedback):
+    """Processing feedback that reports progress to, and is canceled together with, a task."""
+
+    def __init__(self, task: QgsTask):
+        super().__init__()
+        self.task = task
+
+    def isCanceled(self) -> bool:
+        return self.task.isCanceled()
+
+    def setProgress(self, progress: float):
+        self.task.setProgress(progress)
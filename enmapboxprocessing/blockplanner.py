@@ -0,0 +1,120 @@
+from math import ceil, floor
+from typing import Iterator, List, Optional, Tuple
+
+from enmapbox.typeguard import typechecked
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.utils import Utils
+from qgis.core import Qgis, QgsProcessingFeedback
+
+
+@typechecked
+class BlockPlanner(object):
+    """
+    Plan the block size for block-wise processing on a raster grid.
+
+    The block size is derived from the memory needed for all input, output and intermediate (working) data of a
+    single pixel, the number of blocks held in memory at the same time, and the memory budget
+    (see Utils.memoryBudget).
+    Blocks are aligned to the native GDAL block size of the grid raster, i.e. full-width strips for striped rasters,
+    and strips of whole tile rows (or tile-aligned chunks, if a tile row exceeds the budget) for tiled rasters.
+    """
+
+    def __init__(self, grid: RasterReader, memoryBudget: int = None, feedback: QgsProcessingFeedback = None):
+        if memoryBudget is None:
+            memoryBudget = Utils.memoryBudget()
+        self.grid = grid
+        self.memoryBudget = memoryBudget
+        self.feedback = feedback
+        self.pixelMemoryUsage = 0
+        self.blocksInFlight = 1
+        self.overlap = 0
+        self._blockSize: Optional[Tuple[int, int]] = None
+
+    def addInput(self, reader: RasterReader, bandList: List[int] = None, dataTypeSize: int = None):
+        """Add memory for reading the given raster bands. Optionally, specify the data type size of the read data."""
+        if bandList is None:
+            bandList = list(reader.bandNumbers())
+        if dataTypeSize is None:
+            dataTypeSize = max([reader.dataTypeSize(bandNo) for bandNo in bandList], default=0)
+        self.addWorkingMemory(len(bandList), dataTypeSize)
+
+    def addOutput(self, nBands: int, dataType: Qgis.DataType):
+        """Add memory for output data."""
+        dataTypeSize = Utils.qgisDataTypeToNumpyDataType(dataType)().itemsize
+        self.addWorkingMemory(nBands, dataTypeSize)
+
+    def addWorkingMemory(self, nBands: int, dataTypeSize: int):
+        """Add memory for intermediate data, e.g. a float32 copy of all input bands, or masks."""
+        self.pixelMemoryUsage += nBands * dataTypeSize
+        self._blockSize = None
+
+    def setBlocksInFlight(self, blocksInFlight: int):
+        """Set number of blocks held in memory at the same time, e.g. BlockProcessor.maximumBlocksInFlight()."""
+        self.blocksInFlight = blocksInFlight
+        self._blockSize = None
+
+    def setOverlap(self, overlap: Optional[int]):
+        """Set number of pixels each block is extended by on each side."""
+        self.overlap = 0 if overlap is None else overlap
+        self._blockSize = None
+
+    def nativeBlockSize(self) -> Tuple[int, int]:
+        """Return native GDAL block size of the grid raster."""
+        if self.grid.gdalDataset is None or self.grid.gdalDataset.RasterCount == 0:
+            return self.grid.width(), 1
+        blockSizeX, blockSizeY = self.grid.gdalBand(1).GetBlockSize()
+        return min(blockSizeX, self.grid.width()), min(blockSizeY, self.grid.height())
+
+    def peakMemoryUsage(self, blockSizeX: int, blockSizeY: int) -> int:
+        """Return estimated peak memory usage in bytes for the given block size."""
+        pixel = (blockSizeX + 2 * self.overlap) * (blockSizeY + 2 * self.overlap)
+        return int(pixel * self.pixelMemoryUsage * self.blocksInFlight)
+
+    def blockSize(self) -> Tuple[int, int]:
+        """Return planned block size."""
+        if self._blockSize is not None:
+            return self._blockSize
+
+        width = self.grid.width()
+        height = self.grid.height()
+        nativeX, nativeY = self.nativeBlockSize()
+        pixelMemoryUsage = max(1, self.pixelMemoryUsage) * self.blocksInFlight
+
+        def maximumHeight(blockSizeX: int) -> int:
+            # largest block height that fits into the budget, accounting for overlapping pixels
+            linesPerBudget = self.memoryBudget / pixelMemoryUsage / (blockSizeX + 2 * self.overlap)
+            return floor(linesPerBudget) - 2 * self.overlap
+
+        blockSizeX = width
+        blockSizeY = maximumHeight(blockSizeX)
+        if blockSizeY >= nativeY:
+            # full-width strips with whole native block rows
+            blockSizeY = min(height, blockSizeY // nativeY * nativeY)
+        elif nativeX < width:
+            # tiled raster: a single tile row exceeds the budget, use tile-aligned chunks of a single tile row
+            blockSizeY = nativeY
+            chunkPixel = self.memoryBudget / pixelMemoryUsage / (blockSizeY + 2 * self.overlap)
+            blockSizeX = max(nativeX, floor((chunkPixel - 2 * self.overlap) / nativeX) * nativeX)
+            blockSizeX = min(width, blockSizeX)
+        else:
+            # striped raster: a single native strip exceeds the budget
+            blockSizeY = max(1, blockSizeY)
+
+        self._blockSize = blockSizeX, blockSizeY
+
+        if self.feedback is not None:
+            nBlocks = ceil(width / blockSizeX) * ceil(height / blockSizeY)
+            self.feedback.pushInfo(
+                f'Process {nBlocks} block(s) of {blockSizeX}x{blockSizeY} pixel '
+                f'(native block size {nativeX}x{nativeY}), '
+                f'estimated peak memory usage {self.peakMemoryUsage(blockSizeX, blockSizeY) / 1024 ** 2:.1f} MB '
+                f'(memory budget {self.memoryBudget / 1024 ** 2:.1f} MB)'
+            )
+
+        return self._blockSize
+
+    def walkGrid(self, feedback: QgsProcessingFeedback = None) -> Iterator[RasterBlockInfo]:
+        """Iterate block-wise over the grid raster, using the planned block size."""
+        blockSizeX, blockSizeY = self.blockSize()
+        return self.grid.walkGrid(blockSizeX, blockSizeY, feedback)
@@ -0,0 +1,178 @@
+import multiprocessing
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, Executor
+from os.path import basename, dirname, isfile, join
+from typing import Any, Callable, Deque, Iterable, List, Optional, Tuple
+
+from enmapbox.typeguard import typechecked
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
+from enmapboxprocessing.utils import Utils
+from qgis.core import QgsProcessingFeedback
+
+
+@typechecked
+class BlockProcessor(object):
+    """
+    Block-wise processing engine.
+
+    Each block is processed in three steps:
+
+    1. readBlock(slot, block) -> data: runs inside a reader thread pool
+    2. processBlock(data) -> result: runs inside a compute thread pool (or process pool, if useProcesses=True)
+    3. writeBlock(block, result): runs inside the calling thread, in block order
+
+    A slot is a user defined object created via createSlot(), e.g. a tuple of cloned RasterReader objects and
+    reusable output buffers. Each slot is used by a single block at a time, and is released after the block was
+    written. Because all writes happen inside the calling thread, RasterWriter objects need not be thread-safe.
+
+    With a parallelism of 1, all steps run sequentially inside the calling thread.
+
+    Process pools use the spawn start method with a Python interpreter (see pythonExecutable), because
+    sys.executable may be the QGIS application, and forking a multithreaded Qt application isn't safe.
+    If no Python interpreter is found, blocks are processed inside the compute thread pool instead.
+    Large constant inputs of processBlock should be passed once via initializer(*initargs), which runs once per
+    worker process (or once inside the calling process, if no process pool is used),
+    instead of pickling them with each block.
+    """
+
+    def __init__(
+            self, parallelism: int = None, useProcesses=False, feedback: QgsProcessingFeedback = None,
+            initializer: Callable = None, initargs: Tuple = ()
+    ):
+        if parallelism is None:
+            parallelism = Utils.parallelism()
+        if parallelism < 1:
+            raise ValueError(f'parallelism must be a positive integer, got {parallelism}')
+        self.parallelism = parallelism
+        self.useProcesses = useProcesses
+        self.feedback = feedback
+        self.initializer = initializer
+        self.initargs = initargs
+
+    @staticmethod
+    def pythonExecutable() -> Optional[str]:
+        """Return the Python interpreter used for worker processes, or None if not found."""
+        if basename(sys.executable).lower().startswith('python'):
+            return sys.executable
+        # inside QGIS, sys.executable is the QGIS application, look for the interpreter of the QGIS Python
+        candidates = [
+            join(sys.exec_prefix, 'python.exe'),  # Windows
+            join(sys.exec_prefix, 'bin', f'python{sys.version_info.major}.{sys.version_info.minor}'),
+            join(sys.exec_prefix, 'bin', f'python{sys.version_info.major}'),
+            join(dirname(sys.executable), 'bin', f'python{sys.version_info.major}'),  # macOS app bundle
+        ]
+        for candidate in candidates:
+            if isfile(candidate):
+                return candidate
+        return None
+
+    def createProcessPool(self) -> Optional[ProcessPoolExecutor]:
+        """Return a process pool, or None if no Python interpreter is available for the worker processes."""
+        executable = self.pythonExecutable()
+        if executable is None:
+            return None
+        context = multiprocessing.get_context('spawn')
+        context.set_executable(executable)
+        return ProcessPoolExecutor(
+            self.parallelism, mp_context=context, initializer=self.initializer, initargs=self.initargs
+        )
+
+    def maximumBlocksInFlight(self) -> int:
+        """Return maximum number of blocks held in memory at the same time."""
+        if self.parallelism == 1:
+            return 1
+        return 2 * self.parallelism
+
+    def run(
+            self, blocks: Iterable[RasterBlockInfo], readBlock: Callable[[Any, RasterBlockInfo], Any],
+            processBlock: Callable[[Any], Any], writeBlock: Callable[[RasterBlockInfo, Any], None],
+            createSlot: Callable[[], Any] = None
+    ):
+        """Process all blocks."""
+        blocks = list(blocks)
+        if createSlot is None:
+            def createSlot():
+                return None
+
+        computePool: Optional[Executor] = None
+        if self.parallelism > 1 and self.useProcesses:
+            computePool = self.createProcessPool()
+        if computePool is None and self.initializer is not None:
+            self.initializer(*self.initargs)  # blocks are processed inside this process
+
+        if self.parallelism == 1:
+            slot = createSlot()
+            for i, block in enumerate(blocks):
+                if self.isCanceled():
+                    break
+                writeBlock(block, processBlock(readBlock(slot, block)))
+                self.setProgress(i + 1, len(blocks))
+            return
+
+        readPool = ThreadPoolExecutor(self.parallelism, 'BlockReader')
+        if computePool is None:
+            computePool = ThreadPoolExecutor(self.parallelism, 'BlockProcessor')
+
+        pending: Deque[Tuple[RasterBlockInfo, Any, Future]] = deque()
+        freeSlots: List[Any] = list()
+        numberOfWrittenBlocks = 0
+        try:
+            for block in blocks:
+                if self.isCanceled():
+                    break
+                if len(pending) >= self.maximumBlocksInFlight():
+                    freeSlots.append(self._writeNext(pending, writeBlock))
+                    numberOfWrittenBlocks += 1
+                    self.setProgress(numberOfWrittenBlocks, len(blocks))
+                if len(freeSlots) > 0:
+                    slot = freeSlots.pop()
+                else:
+                    slot = createSlot()
+                future = self._submit(readPool, computePool, readBlock, processBlock, slot, block)
+                pending.append((block, slot, future))
+
+            while len(pending) > 0 and not self.isCanceled():
+                self._writeNext(pending, writeBlock)
+                numberOfWrittenBlocks += 1
+                self.setProgress(numberOfWrittenBlocks, len(blocks))
+        finally:
+            readPool.shutdown(wait=True, cancel_futures=True)
+            computePool.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(
+            self, readPool: Executor, computePool: Executor, readBlock: Callable, processBlock: Callable, slot: Any,
+            block: RasterBlockInfo
+    ) -> Future:
+        result = Future()
+
+        def onProcessed(future: Future):
+            error = future.exception()
+            if error is None:
+                result.set_result(future.result())
+            else:
+                result.set_exception(error)
+
+        def onRead(future: Future):
+            try:
+                data = future.result()
+                computePool.submit(processBlock, data).add_done_callback(onProcessed)
+            except BaseException as error:
+                result.set_exception(error)
+
+        readPool.submit(readBlock, slot, block).add_done_callback(onRead)
+        return result
+
+    def _writeNext(self, pending: Deque, writeBlock: Callable) -> Any:
+        block, slot, future = pending.popleft()
+        writeBlock(block, future.result())
+        return slot
+
+    def isCanceled(self) -> bool:
+        if self.feedback is None:
+            return False
+        return self.feedback.isCanceled()
+
+    def setProgress(self, numberOfWrittenBlocks: int, numberOfBlocks: int):
+        if self.feedback is not None:
+            self.feedback.setProgress(numberOfWrittenBlocks / numberOfBlocks * 100)
@@ -11,6 +11,7 @@ from osgeo import gdal
 
 import qgis.processing
 from enmapbox.typeguard import typechecked
+from enmapboxprocessing.blockprocessor import BlockProcessor
 from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.glossary import injectGlossaryLinks
 from enmapboxprocessing.parameter.processingparameterrasterdestination import ProcessingParameterRasterDestination
@@ -83,12 +84,15 @@ class EnMAPProcessingAlgorithm(QgsProcessingAlgorithm):
     EnviFormat = Driver.EnviFormat
     DefaultEnviCreationOptions = Driver.DefaultEnviBsqCreationOptions
     DefaultEnviCreationProfile = EnviFormat + ' ' + ' '.join(DefaultEnviCreationOptions)
+    parallelism: Optional[int] = None  # number of parallel block workers; if None, GDAL_NUM_THREADS is used
 
     def icon(self):
         return QIcon(':/enmapbox/gui/ui/icons/enmapbox.svg')
 
     def createInstance(self):
-        return type(self)()
+        alg = type(self)()
+        alg.parallelism = self.parallelism
+        return alg
 
     def group(self) -> str:
         raise NotImplementedError()
@@ -1050,6 +1054,10 @@ class EnMAPProcessingAlgorithm(QgsProcessingAlgorithm):
             p = self.parameterDefinition(name)
             p.setFlags(p.flags() | QgsProcessingParameterDefinition.Flag.FlagHidden)
 
+    def createBlockProcessor(self, feedback: QgsProcessingFeedback = None, useProcesses=False) -> BlockProcessor:
+        """Return block processing engine, configured with the algorithm parallelism."""
+        return BlockProcessor(self.parallelism, useProcesses, feedback)
+
     def createLoggingFeedback(
             cls, feedback: QgsProcessingFeedback, logfile: TextIO
     ) -> Tuple[ProcessingFeedback, ProcessingFeedback]:
@@ -1,4 +1,4 @@
-from typing import List, Tuple
+from typing import List, Tuple, Sequence
 
 import numpy as np
 
@@ -73,3 +73,28 @@ class NumpyUtils(object):
             )
         shape_ = shape[0], a.shape[0] // shape[0], shape[1], a.shape[1] // shape[1]
         return a.reshape(shape_).sum(-1).sum(1)
+
+    @staticmethod
+    def bufferView(buffer: np.ndarray, shape: Sequence[int]) -> np.ndarray:
+        """Return a C-contiguous view of given shape into the leading elements of a reusable buffer."""
+        if not buffer.flags.c_contiguous:
+            raise ValueError('buffer must be C-contiguous')
+        size = int(np.prod(shape))
+        if size > buffer.size:
+            raise ValueError(
+                f'buffer too small, requires {size} elements, got {buffer.size}'
+            )
+        return buffer.reshape(-1)[:size].reshape(shape)
+
+    @staticmethod
+    def categoryIndices(a: np.ndarray, values: Sequence[float]) -> np.ndarray:
+        """Map category values to dense indices into values. Other values are mapped to len(values)."""
+        if len(values) == 0:
+            return np.zeros(a.shape, np.int64)
+        values = np.array(values, np.float64)
+        order = np.argsort(values)
+        sortedValues = values[order]
+        positions = np.clip(np.searchsorted(sortedValues, a), 0, len(values) - 1)
+        indices = order[positions]
+        indices[sortedValues[positions] != a] = len(values)
+        return indices
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from os.path import exists, getmtime
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from warnings import warn
+
+import numpy as np
+from osgeo import gdal
+
+from enmapbox.typeguard import typechecked
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.typing import Array3d
+
+
+@typechecked
+class RasterBlockCache(object):
+    """
+    Process-wide LRU cache of decoded raster tiles, shared by all RasterReader instances.
+
+    The raster grid is divided into tiles of TileSize x TileSize pixels, and tiles are cached per
+    (source, band, tile column, tile row). Repeated queries at neighbouring pixels, e.g. profiles under a moving cursor,
+    are served from memory.
+    The byte budget is configured by ENMAPBOX_BLOCK_CACHE, given in megabytes or as percentage of usable physical RAM
+    (defaults to 256 megabytes).
+    Tiles of a source are invalidated when the file modification time changes, or explicitly via invalidate.
+    """
+    TileSize = 64
+
+    _tiles: Dict[Tuple, np.ndarray] = OrderedDict()
+    _bytes = 0
+    _mtimes: Dict[str, Optional[float]] = dict()
+    _lock = Lock()
+
+    @staticmethod
+    def maximumBytes() -> int:
+        """Return the byte budget."""
+        value = gdal.GetConfigOption('ENMAPBOX_BLOCK_CACHE', '256').strip()
+        try:
+            if value.endswith('%'):
+                return int(gdal.GetUsablePhysicalRAM() * float(value[:-1]) / 100)
+            return int(float(value) * 1024 ** 2)
+        except ValueError:
+            warn(f'invalid ENMAPBOX_BLOCK_CACHE value: {value}')
+            return 256 * 1024 ** 2
+
+    @classmethod
+    def cachedBytes(cls) -> int:
+        """Return the number of cached bytes."""
+        return cls._bytes
+
+    @classmethod
+    def invalidate(cls, source: str = None):
+        """Remove all tiles of the given source, or all tiles if no source is given."""
+        with cls._lock:
+            if source is None:
+                cls._tiles.clear()
+                cls._mtimes.clear()
+                cls._bytes = 0
+                return
+            for key in [key for key in cls._tiles if key[0] == source]:
+                cls._bytes -= cls._tiles.pop(key).nbytes
+            cls._mtimes.pop(source, None)
+
+    @classmethod
+    def _checkSource(cls, source: str):
+        """Invalidate the source, if the file was modified since its tiles were cached."""
+        mtime = getmtime(source) if exists(source) else None
+        if source in cls._mtimes and cls._mtimes[source] != mtime:
+            cls.invalidate(source)
+        cls._mtimes[source] = mtime
+
+    @classmethod
+    def _evict(cls):
+        maximumBytes = cls.maximumBytes()
+        while cls._bytes > maximumBytes and len(cls._tiles) > 0:
+            _, tile = cls._tiles.popitem(last=False)
+            cls._bytes -= tile.nbytes
+
+    @classmethod
+    def array(
+            cls, reader: RasterReader, xOffset: int, yOffset: int, width: int, height: int,
+            bandList: List[int] = None
+    ) -> Array3d:
+        """Return data for given pixel offset and size as a 3d array, assembled from cached tiles."""
+        if bandList is None:
+            bandList = reader.bandNumbers()
+        if xOffset < 0 or yOffset < 0 or xOffset + width > reader.width() or yOffset + height > reader.height():
+            raise ValueError('pixel offset and size must be inside the raster')
+        source = reader.source()
+        cls._checkSource(source)
+
+        size = cls.TileSize
+        tileXs = range(xOffset // size, (xOffset + width - 1) // size + 1)
+        tileYs = range(yOffset // size, (yOffset + height - 1) // size + 1)
+        result = None
+        for tileY in tileYs:
+            for tileX in tileXs:
+                tiles = cls._tilesFor(reader, source, bandList, tileX, tileY)
+                if result is None:
+                    result = np.empty((len(bandList), height, width), tiles[0].dtype)
+
+                # copy the overlapping part of the tiles
+                x0 = max(xOffset, tileX * size)
+                x1 = min(xOffset + width, (tileX + 1) * size)
+                y0 = max(yOffset, tileY * size)
+                y1 = min(yOffset + height, (tileY + 1) * size)
+                for index, tile in enumerate(tiles):
+                    result[index, y0 - yOffset:y1 - yOffset, x0 - xOffset:x1 - xOffset] = \
+                        tile[y0 - tileY * size:y1 - tileY * size, x0 - tileX * size:x1 - tileX * size]
+        return result
+
+    @classmethod
+    def _tilesFor(
+            cls, reader: RasterReader, source: str, bandList: List[int], tileX: int, tileY: int
+    ) -> List[np.ndarray]:
+        """Return the tiles of the given bands, missing tiles are read with a single multi-band read."""
+        keys = [(source, bandNo, tileX, tileY) for bandNo in bandList]
+        with cls._lock:
+            tiles = [cls._tiles.get(key) for key in keys]
+            for key, tile in zip(keys, tiles):
+                if tile is not None:
+                    cls._tiles.move_to_end(key)
+
+        missingBandList = [bandNo for bandNo, tile in zip(bandList, tiles) if tile is None]
+        if len(missingBandList) > 0:
+            size = cls.TileSize
+            x0 = tileX * size
+            y0 = tileY * size
+            tileWidth = min(size, reader.width() - x0)
+            tileHeight = min(size, reader.height() - y0)
+            array = reader.arrayFromPixelOffsetAndSize(x0, y0, tileWidth, tileHeight, missingBandList)
+            missingTiles = dict(zip(missingBandList, [np.array(a) for a in array]))
+            with cls._lock:
+                for bandNo, tile in missingTiles.items():
+                    key = (source, bandNo, tileX, tileY)
+                    if key not in cls._tiles:
+                        cls._bytes += tile.nbytes
+                    else:
+                        cls._bytes += tile.nbytes - cls._tiles[key].nbytes
+                    cls._tiles[key] = tile
+                cls._evict()
+            tiles = [missingTiles[bandNo] if tile is None else tile for bandNo, tile in zip(bandList, tiles)]
+        return tiles
@@ -4,22 +4,22 @@ from os.path import exists
 from typing import Iterable, List, Union, Optional, Tuple, Iterator, Dict
 
 import numpy as np
-from osgeo import gdal
+from osgeo import gdal, ogr
 
-import qgis.processing
 from enmapbox.qgispluginsupport.qps.utils import SpatialPoint
 from enmapbox.typeguard import typechecked
 from enmapboxprocessing.gridwalker import GridWalker
 from enmapboxprocessing.numpyutils import NumpyUtils
 from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
-from enmapboxprocessing.typing import (RasterSource, Array3d, Metadata, MetadataValue, MetadataDomain, Array2d)
+from enmapboxprocessing.typing import (RasterSource, Array3d, Metadata, MetadataValue, MetadataDomain, Array2d,
+                                       NumpyDataType)
 from enmapboxprocessing.utils import Utils
 from qgis.PyQt.QtCore import QSizeF, QDateTime, QDate, QPoint
 from qgis.PyQt.QtGui import QColor
 from qgis.core import (QgsRasterLayer, QgsRasterDataProvider, QgsCoordinateReferenceSystem, QgsRectangle,
                        QgsRasterRange, QgsPoint, QgsRasterBlockFeedback, QgsRasterBlock, QgsPointXY,
-                       QgsProcessingFeedback, QgsRasterBandStats, Qgis, QgsGeometry, QgsVectorLayer, QgsWkbTypes,
-                       QgsFeature, QgsRasterPipe, QgsRasterProjector, QgsMapLayer, QgsProcessing)
+                       QgsProcessingFeedback, QgsRasterBandStats, Qgis, QgsGeometry, QgsWkbTypes, QgsRasterPipe,
+                       QgsRasterProjector, QgsMapLayer, QgsSpatialIndex, QgsFeature)
 
 
 @typechecked
@@ -29,6 +29,7 @@ class RasterReader(object):
 
     disableStac = True  # see issue #1259
     disableQgisPam = True
+    useGdalFastPath = True  # read multiple bands with a single GDAL call, if possible
 
     def __init__(
             self, source: RasterSource, openWithGdal: bool = None,
@@ -254,23 +255,42 @@ class RasterReader(object):
             raise ValueError()
         self.pipe = pipe
         self.projector = projector
+        self.pipeCrs = crs
+
+    def clone(self) -> 'RasterReader':
+        """
+        Return a reader with a cloned data provider and a separate GDAL dataset handle,
+        e.g. for reading blocks concurrently from another thread.
+        Note that layer-level metadata is not available for the cloned reader.
+        """
+        reader = RasterReader(self.provider.clone(), self.gdalDataset is not None, self.pipeCrs)
+        if self.maskReader is not None:
+            reader.maskReader = self.maskReader.clone()
+        return reader
 
     def arrayFromBlock(
             self, block: RasterBlockInfo, bandList: List[int] = None, overlap: int = None,
-            feedback: QgsRasterBlockFeedback = None
+            feedback: QgsRasterBlockFeedback = None, out: np.ndarray = None, dtype: NumpyDataType = None
     ):
         """Return data for given block."""
         return self.arrayFromBoundingBoxAndSize(
-            block.extent, block.width, block.height, bandList, overlap, feedback
+            block.extent, block.width, block.height, bandList, overlap, feedback, out, dtype
         )
 
     def arrayFromBoundingBoxAndSize(
             self, boundingBox: QgsRectangle, width: int, height: int, bandList: List[int] = None,
-            overlap: int = None, feedback: QgsRasterBlockFeedback = None
+            overlap: int = None, feedback: QgsRasterBlockFeedback = None, out: np.ndarray = None,
+            dtype: NumpyDataType = None
     ) -> Array3d:
-        """Return data for given bounding box and size."""
+        """
+        Return data for given bounding box and size.
+
+        If an output buffer (out) or a data type (dtype) is given, data is returned as a single C-contiguous
+        3d array of shape (bands, height, width), otherwise as a list of 2d arrays.
+        The output buffer can be reused between calls, see also allocateArray.
+        """
         if bandList is None:
-            bandList = range(1, self.provider.bandCount() + 1)
+            bandList = list(range(1, self.provider.bandCount() + 1))
         if overlap is not None:
             xres = boundingBox.width() / width
             yres = boundingBox.height() / height
@@ -282,20 +302,127 @@ class RasterReader(object):
             )
             width = width + 2 * overlap
             height = height + 2 * overlap
-        arrays = list()
         for bandNo in bandList:
             if not 0 < bandNo <= self.bandCount():
                 raise ValueError(
                     f'bandNo must be between 1 and {self.bandCount()}, got {bandNo}'
                 )
+
+        if out is not None:
+            shape = (len(bandList), height, width)
+            if out.shape != shape:
+                raise ValueError(f'out must have shape {shape}, got {out.shape}')
+            if not out.flags.c_contiguous:
+                raise ValueError('out must be C-contiguous')
+            if dtype is not None and np.dtype(dtype) != out.dtype:
+                raise ValueError(f'dtype ({np.dtype(dtype)}) not matching out.dtype ({out.dtype})')
+
+        # use GDAL fast path if possible
+        window = self.gdalReadWindow(boundingBox, width, height, bandList)
+        if window is not None:
+            xOffset, yOffset = window
+            sourceDtype = Utils.qgisDataTypeToNumpyDataType(self.provider.dataType(bandList[0]))
+            if out is None:
+                array = np.empty((len(bandList), height, width), sourceDtype)
+            elif np.can_cast(sourceDtype, out.dtype, 'safe'):
+                array = out  # let GDAL fill the output buffer directly
+            else:
+                array = np.empty((len(bandList), height, width), sourceDtype)  # use numpy casting rules
+            self.gdalDataset.ReadAsArray(
+                xOffset, yOffset, width, height, buf_obj=array, band_list=list(bandList)
+            )
+            if out is not None:
+                if array is not out:
+                    out[:] = array
+                return out
+            if dtype is not None:
+                return array.astype(dtype, copy=False)
+            return list(array)
+
+        if out is None and dtype is not None:
+            out = self.allocateArray(width, height, bandList, dtype)
+        arrays = list()
+        for i, bandNo in enumerate(bandList):
             block: QgsRasterBlock = self.projector.block(bandNo, boundingBox, width, height, feedback)
             array = Utils.qgsRasterBlockToNumpyArray(block=block)
-            arrays.append(array)
+            if out is None:
+                arrays.append(array)
+            else:
+                out[i] = array
+        if out is not None:
+            return out
         return arrays
 
+    def allocateArray(
+            self, width: int, height: int, bandList: List[int] = None, dtype: NumpyDataType = None,
+            overlap: int = None
+    ) -> np.ndarray:
+        """
+        Return an uninitialized C-contiguous 3d array of shape (bands, height, width),
+        suitable as a reusable output buffer.
+        """
+        if bandList is None:
+            bandList = list(range(1, self.provider.bandCount() + 1))
+        if dtype is None:
+            dtype = Utils.qgisDataTypeToNumpyDataType(self.provider.dataType(bandList[0]))
+        if overlap is not None:
+            width = width + 2 * overlap
+            height = height + 2 * overlap
+        return np.empty((len(bandList), height, width), dtype)
+
+    def gdalReadWindow(
+            self, boundingBox: QgsRectangle, width: int, height: int, bandList: List[int]
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Return the pixel offset, if the given bounding box and size can be read directly from the GDAL dataset,
+        i.e. without reprojection, resampling, data scaling or user no data values. Otherwise, return None.
+        """
+        if self.gdalDataset is None or self.pipe is not None or not self.useGdalFastPath:
+            return None
+        if len(bandList) == 0:
+            return None
+        if self.gdalDataset.RasterCount != self.bandCount():
+            return None  # handle case where GDAL band count != QGIS band count
+
+        # check data type, scaling and no data handling
+        dataType = self.provider.dataType(bandList[0])
+        for bandNo in bandList:
+            if self.provider.dataType(bandNo) != dataType:
+                return None
+            if self.provider.sourceDataType(bandNo) != dataType:
+                return None
+            if self.provider.bandScale(bandNo) != 1 or self.provider.bandOffset(bandNo) != 0:
+                return None
+            if len(self.provider.userNoDataValues(bandNo)) > 0:
+                return None
+        if Utils.qgisDataTypeToGdalDataType(dataType) != self.gdalDataset.GetRasterBand(bandList[0]).DataType:
+            return None
+
+        # check that bounding box matches the pixel grid
+        tolerance = 1e-3
+        extent = self.extent()
+        xres = self.rasterUnitsPerPixelX()
+        yres = self.rasterUnitsPerPixelY()
+        if abs(boundingBox.width() / width - xres) > tolerance * xres:
+            return None
+        if abs(boundingBox.height() / height - yres) > tolerance * yres:
+            return None
+        xOffset = (boundingBox.xMinimum() - extent.xMinimum()) / xres
+        yOffset = (extent.yMaximum() - boundingBox.yMaximum()) / yres
+        if abs(xOffset - round(xOffset)) > tolerance or abs(yOffset - round(yOffset)) > tolerance:
+            return None
+        xOffset = int(round(xOffset))
+        yOffset = int(round(yOffset))
+
+        # check that window is inside the raster
+        if xOffset < 0 or yOffset < 0 or xOffset + width > self.width() or yOffset + height > self.height():
+            return None
+
+        return xOffset, yOffset
+
     def arrayFromPixelOffsetAndSize(
             self, xOffset: int, yOffset: int, width: int, height: int, bandList: List[int] = None, overlap: int = None,
-            feedback: QgsRasterBlockFeedback = None
+            feedback: QgsRasterBlockFeedback = None, out: np.ndarray = None, dtype: NumpyDataType = None
     ) -> Array3d:
         """Return data for given pixel offset and size."""
         if self.crs().isValid():
@@ -314,14 +441,24 @@ class RasterReader(object):
             p1 = QgsPointXY(xOffset, - yOffset)
             p2 = QgsPointXY(xOffset + width, -(yOffset + height))
         boundingBox = QgsRectangle(p1, p2)
-        return self.arrayFromBoundingBoxAndSize(boundingBox, width, height, bandList, overlap, feedback)
+        return self.arrayFromBoundingBoxAndSize(boundingBox, width, height, bandList, overlap, feedback, out, dtype)
+
+    def cachedArrayFromPixelOffsetAndSize(
+            self, xOffset: int, yOffset: int, width: int, height: int, bandList: List[int] = None
+    ) -> Array3d:
+        """
+        Return data for given pixel offset and size, served from the tile cache shared by all readers.
+        Use this for repeated small queries, e.g. pixel profiles under a moving cursor. See RasterBlockCache.
+        """
+        from enmapboxprocessing.rasterblockcache import RasterBlockCache
+        return RasterBlockCache.array(self, xOffset, yOffset, width, height, bandList)
 
     def array(
             self, xOffset: int = None, yOffset: int = None, width: int = None, height: int = None,
             bandList: List[int] = None, boundingBox: QgsRectangle = None, overlap: int = None,
-            feedback: QgsRasterBlockFeedback = None
+            feedback: QgsRasterBlockFeedback = None, out: np.ndarray = None, dtype: NumpyDataType = None
     ) -> Array3d:
-        """Return data."""
+        """Return data. See arrayFromBoundingBoxAndSize for details on out and dtype."""
         if boundingBox is None:
             if xOffset is None and width is None:
                 xOffset = 0
@@ -329,7 +466,9 @@ class RasterReader(object):
             if yOffset is None and height is None:
                 yOffset = 0
                 height = self.provider.ySize()
-            array = self.arrayFromPixelOffsetAndSize(xOffset, yOffset, width, height, bandList, overlap, feedback)
+            array = self.arrayFromPixelOffsetAndSize(
+                xOffset, yOffset, width, height, bandList, overlap, feedback, out, dtype
+            )
         else:
             rasterUnitsPerPixelX = self.provider.extent().width() / self.provider.xSize()
             rasterUnitsPerPixelY = self.provider.extent().height() / self.provider.ySize()
@@ -337,7 +476,9 @@ class RasterReader(object):
                 width = int(round(boundingBox.width() / rasterUnitsPerPixelX))
             if height is None:
                 height = int(round(boundingBox.height() / rasterUnitsPerPixelY))
-            array = self.arrayFromBoundingBoxAndSize(boundingBox, width, height, bandList, overlap, feedback)
+            array = self.arrayFromBoundingBoxAndSize(
+                boundingBox, width, height, bandList, overlap, feedback, out, dtype
+            )
         return array
 
     def maskArray(
@@ -354,8 +495,7 @@ class RasterReader(object):
                 f'got {len(bandList)} and {len(array)}'
             )
         maskArray = list()
-        for i, a in enumerate(array):
-            bandNo = i + 1
+        for bandNo, a in zip(bandList, array):
             m = np.full_like(a, True, dtype=bool)
             if maskNoDataValue:
                 if self.provider.sourceHasNoDataValue(bandNo) and self.provider.useSourceNoDataValue(bandNo):
@@ -431,48 +571,161 @@ class RasterReader(object):
         return extent
 
     def geometryCoverage(self, geometry: QgsGeometry, fractions=True) -> Tuple[np.ndarray, QgsRectangle]:
-        if geometry.type() != QgsWkbTypes.GeometryType.PolygonGeometry:
-            raise ValueError(
-                f'expected polygon geometry, got geometry type {geometry.type()}'
-            )
-
-        # make memory layer from geometry
-        layer = QgsVectorLayer(f'Polygon?crs={self.crs().authid()}', 'polygon', 'memory')
-        feature = QgsFeature()
-        feature.setGeometry(QgsGeometry(geometry))
-        layer.dataProvider().addFeatures([feature])
-        layer.updateExtents()
-
-        # rasterize polygon
+        """Return pixel coverage array for the pixel grid extent of a polygon geometry, given in raster CRS."""
+        self._checkPolygonGeometries([geometry])
         extent = self.extentByGeometry(geometry)
+        xoff = round((extent.xMinimum() - self.extent().xMinimum()) / self.rasterUnitsPerPixelX())
+        yoff = round((self.extent().yMaximum() - extent.yMaximum()) / self.rasterUnitsPerPixelY())
         xsize = max(1, round(extent.width() / self.rasterUnitsPerPixelX()))
         ysize = max(1, round(extent.height() / self.rasterUnitsPerPixelY()))
+        oversampling = 10 if fractions else 1
 
-        if fractions:
-            xsize2 = xsize * 10
-            ysize2 = ysize * 10
-        else:
-            xsize2 = xsize
-            ysize2 = ysize
-
-        alg = 'gdal:rasterize'
-        parameters = {
-            'INPUT': layer,
-            'INIT': 0,
-            'BURN': 1,
-            'UNITS': 0, 'WIDTH': xsize2, 'HEIGHT': ysize2,
-            'EXTENT': extent,
-            'DATA_TYPE': 5,
-            'OUTPUT': QgsProcessing.TEMPORARY_OUTPUT
-        }
-        result = qgis.processing.run(alg, parameters)
-
-        # read mask and calculate fractions
-        maskArray = RasterReader(result['OUTPUT']).array()[0]
-        fractionArray = NumpyUtils.rebinMean(maskArray, (ysize, xsize))
-
+        ogrDataSource = self._geometryIdsDataSource([geometry])
+        idArray = self._rasterizeGeometryIds(ogrDataSource, xoff, yoff, xsize, ysize, oversampling)
+        fractionArray = NumpyUtils.rebinMean((idArray != 0).astype(np.float32), (ysize, xsize))
         return fractionArray, extent
 
+    def geometriesCoverage(
+            self, geometries: List[QgsGeometry], oversampling: int = 10
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Return fractional pixel coverage for many polygon geometries, given in raster CRS, in one pass.
+
+        For each geometry, a tuple of flat pixel indices (row * width + column) and covered pixel fractions is
+        returned. Fractions are approximated by rasterizing the geometries into an in-memory grid with
+        oversampling x oversampling subpixels per pixel, burning geometry IDs.
+        Overlapping geometries are rasterized in separate passes.
+        """
+        self._checkPolygonGeometries(geometries)
+        if oversampling < 1:
+            raise ValueError(f'oversampling must be a positive integer, got {oversampling}')
+
+        geometryIndices = list()
+        pixelIndices = list()
+        fractions = list()
+        for group in self._nonOverlappingGeometryGroups(geometries):
+            # only rasterize the pixel window covered by the group
+            boundingBox = QgsRectangle(geometries[group[0]].boundingBox())
+            for index in group[1:]:
+                boundingBox.combineExtentWith(geometries[index].boundingBox())
+            boundingBox = boundingBox.intersect(self.extent())
+            if boundingBox.isEmpty():
+                continue
+            xoff = int(np.floor((boundingBox.xMinimum() - self.extent().xMinimum()) / self.rasterUnitsPerPixelX()))
+            yoff = int(np.floor((self.extent().yMaximum() - boundingBox.yMaximum()) / self.rasterUnitsPerPixelY()))
+            xend = int(np.ceil((boundingBox.xMaximum() - self.extent().xMinimum()) / self.rasterUnitsPerPixelX()))
+            yend = int(np.ceil((self.extent().yMaximum() - boundingBox.yMinimum()) / self.rasterUnitsPerPixelY()))
+            xoff, yoff = max(xoff, 0), max(yoff, 0)
+            xsize = max(1, min(xend, self.width()) - xoff)
+            ysize = max(1, min(yend, self.height()) - yoff)
+
+            # rasterize in strips of pixel rows to keep the memory bounded (about 16 mio subpixels),
+            # the in-memory layer is created once per group and filtered to the geometries inside each strip
+            ogrDataSource = self._geometryIdsDataSource([geometries[index] for index in group])
+            stripHeight = max(1, 2 ** 24 // (xsize * oversampling ** 2))
+            for stripYOffset in range(yoff, yoff + ysize, stripHeight):
+                stripYSize = min(stripHeight, yoff + ysize - stripYOffset)
+                idArray = self._rasterizeGeometryIds(
+                    ogrDataSource, xoff, stripYOffset, xsize, stripYSize, oversampling
+                )
+
+                # count subpixels for each (geometry, pixel) combination
+                idArray = idArray.reshape((stripYSize, oversampling, xsize, oversampling))
+                localPixelIndex = np.arange(stripYSize * xsize).reshape((stripYSize, 1, xsize, 1))
+                localPixelIndex = np.broadcast_to(localPixelIndex, idArray.shape)
+                valid = idArray != 0
+                keys = (idArray[valid].astype(np.int64) - 1) * (stripYSize * xsize) + localPixelIndex[valid]
+                keys, counts = np.unique(keys, return_counts=True)
+                groupIndex, localPixelIndex = np.divmod(keys, stripYSize * xsize)
+                rows, columns = np.divmod(localPixelIndex, xsize)
+                geometryIndices.append(np.array(group, dtype=np.int64)[groupIndex])
+                pixelIndices.append((rows + stripYOffset) * self.width() + columns + xoff)
+                fractions.append((counts / oversampling ** 2).astype(np.float32))
+
+        # split results by geometry
+        if len(geometryIndices) == 0:
+            return [(np.zeros((0,), np.int64), np.zeros((0,), np.float32)) for _ in geometries]
+        geometryIndices = np.concatenate(geometryIndices)
+        pixelIndices = np.concatenate(pixelIndices)
+        fractions = np.concatenate(fractions)
+        order = np.lexsort((pixelIndices, geometryIndices))
+        geometryIndices = geometryIndices[order]
+        pixelIndices = pixelIndices[order]
+        fractions = fractions[order]
+        bounds = np.searchsorted(geometryIndices, np.arange(len(geometries) + 1))
+        return [
+            (pixelIndices[start:stop], fractions[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+
+    def _checkPolygonGeometries(self, geometries: List[QgsGeometry]):
+        for geometry in geometries:
+            if geometry.type() != QgsWkbTypes.GeometryType.PolygonGeometry:
+                raise ValueError(
+                    f'expected polygon geometry, got geometry type {geometry.type()}'
+                )
+
+    def _nonOverlappingGeometryGroups(self, geometries: List[QgsGeometry]) -> List[List[int]]:
+        """Group geometries, so that the geometries inside a group don't overlap (but may touch)."""
+        groups: List[List[int]] = list()
+        indices: List[QgsSpatialIndex] = list()
+        for index, geometry in enumerate(geometries):
+            for group, spatialIndex in zip(groups, indices):
+                candidates = spatialIndex.intersects(geometry.boundingBox())
+                if not any(
+                        geometry.intersects(geometries[candidate]) and not geometry.touches(geometries[candidate])
+                        for candidate in candidates
+                ):
+                    break
+            else:
+                group = list()
+                spatialIndex = QgsSpatialIndex()
+                groups.append(group)
+                indices.append(spatialIndex)
+            feature = QgsFeature(index)
+            feature.setGeometry(geometry)
+            spatialIndex.addFeature(feature)
+            group.append(index)
+        return groups
+
+    def _geometryIdsDataSource(self, geometries: List[QgsGeometry]) -> ogr.DataSource:
+        """Return an OGR in-memory layer with the geometries and their IDs (list index + 1)."""
+        ogrDataSource = ogr.GetDriverByName('Memory').CreateDataSource('')
+        ogrLayer = ogrDataSource.CreateLayer('geometries', None, ogr.wkbUnknown)
+        ogrLayer.CreateField(ogr.FieldDefn('id', ogr.OFTInteger))
+        for geometryId, geometry in enumerate(geometries, 1):
+            ogrFeature = ogr.Feature(ogrLayer.GetLayerDefn())
+            ogrFeature.SetField('id', geometryId)
+            ogrFeature.SetGeometry(ogr.CreateGeometryFromWkb(bytes(geometry.asWkb())))
+            ogrLayer.CreateFeature(ogrFeature)
+        return ogrDataSource
+
+    def _rasterizeGeometryIds(
+            self, ogrDataSource: ogr.DataSource, xoff: int, yoff: int, width: int, height: int, oversampling: int
+    ) -> np.ndarray:
+        """
+        Rasterize the geometries of an in-memory layer (see _geometryIdsDataSource) into a GDAL in-memory raster and
+        return geometry IDs (0 is background) for the given pixel window, with oversampling x oversampling subpixels
+        per pixel. Only geometries intersecting the window are rasterized.
+        """
+        xmin = self.extent().xMinimum() + xoff * self.rasterUnitsPerPixelX()
+        ymax = self.extent().yMaximum() - yoff * self.rasterUnitsPerPixelY()
+        xmax = xmin + width * self.rasterUnitsPerPixelX()
+        ymin = ymax - height * self.rasterUnitsPerPixelY()
+        ogrLayer: ogr.Layer = ogrDataSource.GetLayer(0)
+        ogrLayer.SetSpatialFilterRect(xmin, ymin, xmax, ymax)
+
+        resolutionX = self.rasterUnitsPerPixelX() / oversampling
+        resolutionY = self.rasterUnitsPerPixelY() / oversampling
+        gdalDataset: gdal.Dataset = gdal.GetDriverByName('MEM').Create(
+            '', width * oversampling, height * oversampling, 1, gdal.GDT_Int32
+        )
+        gdalDataset.SetGeoTransform((xmin, resolutionX, 0, ymax, 0, -resolutionY))
+        try:
+            gdal.RasterizeLayer(gdalDataset, [1], ogrLayer, options=['ATTRIBUTE=id'])
+        finally:
+            ogrLayer.SetSpatialFilter(None)
+        return gdalDataset.ReadAsArray()
+
     def sampleWeightedValues(
             self, extent: QgsRectangle, weightsArray: Array2d, bandNo: int
     ) -> Tuple[np.ndarray, np.ndarray]:
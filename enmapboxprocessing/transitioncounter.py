@@ -0,0 +1,79 @@
+from math import ceil
+from typing import List
+
+import numpy as np
+
+from enmapbox.typeguard import typechecked
+from enmapboxprocessing.numpyutils import NumpyUtils
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.utils import Utils
+from qgis.core import QgsProcessingFeedback, QgsRectangle
+
+
+@typechecked
+class TransitionCounter(object):
+    """
+    Block-wise counting of class sizes and of class transitions between consecutive categorized layers.
+
+    Category values are mapped to dense indices, and the transitions of each consecutive layer pair are counted
+    with np.bincount on combined (from, to) indices.
+    Memory is bounded by a single block of all layers, independent of the raster size.
+    """
+
+    def __init__(self, categoryValuess: List[List[float]]):
+        if len(categoryValuess) < 2:
+            raise ValueError('at least two layers are required')
+        self.categoryValuess = categoryValuess
+        self.pixelCount = 0
+        self.categorySizess = [np.zeros(len(values), np.int64) for values in categoryValuess]
+        self.linkSizess = [
+            np.zeros((len(values1), len(values2)), np.int64)
+            for values1, values2 in zip(categoryValuess, categoryValuess[1:])
+        ]
+
+    def update(self, arrays: List[np.ndarray]):
+        """Accumulate counts for a block, given as one 2d array per layer."""
+        if len(arrays) != len(self.categoryValuess):
+            raise ValueError(
+                f'number of arrays must match number of layers, got {len(arrays)} and {len(self.categoryValuess)}'
+            )
+        indicess = [NumpyUtils.categoryIndices(array, values) for array, values in zip(arrays, self.categoryValuess)]
+        self.pixelCount += arrays[0].size
+        for indices, categorySizes in zip(indicess, self.categorySizess):
+            n = len(categorySizes)
+            categorySizes += np.bincount(indices.ravel(), minlength=n + 1)[:n]
+        for indices1, indices2, linkSizes in zip(indicess, indicess[1:], self.linkSizess):
+            n1, n2 = linkSizes.shape
+            valid = np.logical_and(indices1 < n1, indices2 < n2)
+            codes = indices1[valid] * n2 + indices2[valid]
+            linkSizes += np.bincount(codes, minlength=n1 * n2).reshape((n1, n2))
+
+    def readLayers(
+            self, readers: List[RasterReader], extent: QgsRectangle, sampleSize: int = 0, grid: RasterReader = None,
+            feedback: QgsProcessingFeedback = None
+    ):
+        """
+        Accumulate counts for the given extent, strip by strip.
+        If a sample size is given, reading stops at a regular sampling grid of approximately that size.
+        The sampling grid is derived from the grid raster, which defaults to the first layer.
+        """
+        if grid is None:
+            grid = readers[0]
+        width, height = grid.samplingWidthAndHeight(1, extent, sampleSize)
+        lineMemoryUsage = width * len(readers) * 16  # data and category indices
+        stripHeight = max(1, min(height, Utils.memoryBudget() // lineMemoryUsage))
+        pixelSizeY = extent.height() / height
+        numberOfStrips = ceil(height / stripHeight)
+        for i, yOffset in enumerate(range(0, height, stripHeight)):
+            if feedback is not None:
+                if feedback.isCanceled():
+                    break
+                feedback.setProgress(i / numberOfStrips * 100)
+            stripHeight_ = min(stripHeight, height - yOffset)
+            boundingBox = QgsRectangle(
+                extent.xMinimum(), extent.yMaximum() - (yOffset + stripHeight_) * pixelSizeY,
+                extent.xMaximum(), extent.yMaximum() - yOffset * pixelSizeY
+            )
+            arrays = [reader.arrayFromBoundingBoxAndSize(boundingBox, width, stripHeight_, [1])[0]
+                      for reader in readers]
+            self.update(arrays)
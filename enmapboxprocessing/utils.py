@@ -3,7 +3,7 @@ import re
 import uuid
 from ast import literal_eval
 from contextlib import suppress
-from os import makedirs, mkdir
+from os import makedirs, mkdir, cpu_count
 from os.path import join, dirname, basename, exists, splitext
 from random import randint
 from typing import Tuple, Optional, Callable, Any, Dict, Union, List
@@ -40,6 +40,33 @@ class Utils(object):
         """Return maximum memory usage in bytes."""
         return gdal.GetCacheMax()
 
+    @staticmethod
+    def memoryBudget() -> int:
+        """
+        Return memory budget in bytes for holding processing blocks, as configured by ENMAPBOX_MEMORY_BUDGET.
+        The budget is given in megabytes or as percentage of usable physical RAM, e.g. '25%' (defaults to '10%').
+        Note that the budget is independent of the GDAL block cache size.
+        """
+        value = gdal.GetConfigOption('ENMAPBOX_MEMORY_BUDGET', '10%').strip()
+        try:
+            if value.endswith('%'):
+                return max(1, int(gdal.GetUsablePhysicalRAM() * float(value[:-1]) / 100))
+            return max(1, int(float(value) * 1024 ** 2))
+        except ValueError:
+            warn(f'invalid ENMAPBOX_MEMORY_BUDGET value: {value}')
+            return max(1, int(gdal.GetUsablePhysicalRAM() / 10))
+
+    @staticmethod
+    def parallelism() -> int:
+        """Return number of parallel workers for block-wise processing, as configured by GDAL_NUM_THREADS."""
+        value = gdal.GetConfigOption('GDAL_NUM_THREADS', '1')
+        if value.upper() == 'ALL_CPUS':
+            return max(1, cpu_count() or 1)
+        try:
+            return max(1, int(value))
+        except ValueError:
+            return 1
+
     @staticmethod
     def qgisDataTypeToNumpyDataType(dataType: Qgis.DataType) -> NumpyDataType:
         if dataType == Qgis.DataType.Float32:
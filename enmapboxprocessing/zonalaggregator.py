@@ -0,0 +1,155 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from enmapbox.typeguard import typechecked
+from enmapboxprocessing.typing import Array3d
+
+
+@typechecked
+class ZonalAggregator(object):
+    """
+    Single-pass accumulation of zonal statistics for all bands of a raster.
+
+    Zone values are mapped to dense zone indices, and count, sum, sum of squares, minimum and maximum are accumulated
+    per zone and band with scatter reductions (np.bincount and np.minimum.at/np.maximum.at).
+    If histogram ranges are given, per zone and band histograms are accumulated as well, which allows to approximate
+    quantiles. Values outside a histogram range are counted in the first or last bin.
+    Histograms are stored as a dense (bands, zones, bins) int64 array, if it has at most DenseHistogramSize elements.
+    Otherwise, only the non-empty bins are stored, as sorted flat bin indices and counts.
+    """
+    DenseHistogramSize = 2 ** 24  # maximal number of dense histogram elements (128 MB)
+
+    def __init__(
+            self, zoneValues: List[float], bandCount: int,
+            histogramRanges: Optional[List[Tuple[float, float]]] = None, histogramBins: int = 256
+    ):
+        if histogramRanges is not None and len(histogramRanges) != bandCount:
+            raise ValueError(
+                f'number of histogram ranges must match the number of bands, '
+                f'got {len(histogramRanges)} and {bandCount}'
+            )
+        self.zoneValues = np.array(zoneValues, dtype=np.float64)
+        self.zoneOrder = np.argsort(self.zoneValues)
+        self.sortedZoneValues = self.zoneValues[self.zoneOrder]
+        self.bandCount = bandCount
+        self.histogramBins = histogramBins
+
+        shape = (bandCount, len(zoneValues))
+        self.count = np.zeros(shape, np.int64)
+        self.sum = np.zeros(shape, np.float64)
+        self.sumOfSquares = np.zeros(shape, np.float64)
+        self.minimum = np.full(shape, np.inf, np.float64)
+        self.maximum = np.full(shape, -np.inf, np.float64)
+
+        self.histogramRanges = None
+        self.histogram = None
+        self.histogramKeys = np.zeros(0, np.int64)
+        self.histogramCounts = np.zeros(0, np.int64)
+        if histogramRanges is not None:
+            self.histogramRanges = np.array(histogramRanges, dtype=np.float64)
+            if bandCount * len(zoneValues) * histogramBins <= self.DenseHistogramSize:
+                self.histogram = np.zeros(shape + (histogramBins,), np.int64)
+
+    def zoneIndices(self, zones: np.ndarray) -> np.ndarray:
+        """Map zone values to dense zone indices. Values that are not a zone are mapped to -1."""
+        positions = np.clip(np.searchsorted(self.sortedZoneValues, zones), 0, len(self.sortedZoneValues) - 1)
+        indices = self.zoneOrder[positions]
+        indices[self.sortedZoneValues[positions] != zones] = -1
+        return indices
+
+    def update(self, zones: np.ndarray, array: Array3d, marray: Array3d):
+        """Accumulate statistics for a block of zone values (2d) and band data and masks (3d)."""
+        if len(self.zoneValues) == 0:
+            return
+        zoneCount = len(self.zoneValues)
+        zoneIndices = self.zoneIndices(np.asarray(zones))
+        array = np.asarray(array)
+        valid = np.logical_and(np.asarray(marray, dtype=bool), zoneIndices >= 0)
+        if not np.any(valid):
+            return
+
+        # flat index of (band, zone) for all valid values
+        bandIndices = np.broadcast_to(np.arange(self.bandCount).reshape((-1, 1, 1)), array.shape)
+        keys = bandIndices[valid] * zoneCount + np.broadcast_to(zoneIndices, array.shape)[valid]
+        values = array[valid].astype(np.float64)
+
+        size = self.bandCount * zoneCount
+        self.count += np.bincount(keys, minlength=size).reshape(self.count.shape)
+        self.sum += np.bincount(keys, values, minlength=size).reshape(self.sum.shape)
+        self.sumOfSquares += np.bincount(keys, values ** 2, minlength=size).reshape(self.sumOfSquares.shape)
+        np.minimum.at(self.minimum.reshape(-1), keys, values)
+        np.maximum.at(self.maximum.reshape(-1), keys, values)
+
+        if self.histogramRanges is not None:
+            lower, upper = self.histogramRanges[keys // zoneCount].T
+            binWidth = (upper - lower) / self.histogramBins
+            binWidth[binWidth == 0] = 1
+            bins = np.clip(np.floor((values - lower) / binWidth), 0, self.histogramBins - 1).astype(np.int64)
+            histogramKeys, counts = np.unique(keys * self.histogramBins + bins, return_counts=True)
+            if self.histogram is not None:
+                self.histogram.reshape(-1)[histogramKeys] += counts
+            else:
+                # merge into the sorted non-empty bins
+                keys, inverse = np.unique(np.concatenate([self.histogramKeys, histogramKeys]), return_inverse=True)
+                self.histogramCounts = np.bincount(
+                    inverse.ravel(), np.concatenate([self.histogramCounts, counts]), len(keys)
+                ).astype(np.int64)
+                self.histogramKeys = keys
+
+    def mean(self) -> np.ndarray:
+        """Return (bands, zones) mean values; NaN for empty zones."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.sum / self.count
+
+    def variance(self) -> np.ndarray:
+        """Return (bands, zones) population variance; NaN for empty zones."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = self.sumOfSquares / self.count - self.mean() ** 2
+        return np.maximum(variance, 0)  # remove negative values caused by rounding errors; keeps NaN
+
+    def standardDeviation(self) -> np.ndarray:
+        """Return (bands, zones) population standard deviation; NaN for empty zones."""
+        return np.sqrt(self.variance())
+
+    def histogramEntries(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return sorted flat (band, zone, bin) indices and counts of all non-empty histogram bins."""
+        if self.histogram is None:
+            return self.histogramKeys, self.histogramCounts
+        keys = np.flatnonzero(self.histogram)
+        return keys, self.histogram.reshape(-1)[keys]
+
+    def quantiles(self, q: List[float]) -> List[np.ndarray]:
+        """Return (bands, zones) quantiles (in percent), approximated by linear interpolation inside histogram bins."""
+        if self.histogramRanges is None:
+            raise ValueError('quantiles require histogram ranges')
+        keys, counts = self.histogramEntries()
+        shape = self.count.shape
+        if len(keys) == 0:
+            return [np.full(shape, np.nan) for qi in q]
+
+        # non-empty bins of a (band, zone) histogram are consecutive entries
+        histogramIndices = keys // self.histogramBins
+        first = np.searchsorted(histogramIndices, np.arange(self.count.size))
+        last = np.maximum(np.searchsorted(histogramIndices, np.arange(self.count.size), 'right') - 1, first)
+        last = np.minimum(last, len(keys) - 1)
+        cumulated = np.cumsum(counts)
+        countBeforeHistogram = np.concatenate([[0], cumulated])[first]
+        lower = np.repeat(self.histogramRanges[:, 0], shape[1])
+        upper = np.repeat(self.histogramRanges[:, 1], shape[1])
+        binWidth = (upper - lower) / self.histogramBins
+        result = list()
+        for qi in q:
+            target = qi / 100. * self.count.reshape(-1)
+            # first non-empty bin, where the cumulated count reaches the target
+            positions = np.clip(np.searchsorted(cumulated, countBeforeHistogram + target), first, last)
+            countInBin = counts[positions]
+            countBefore = cumulated[positions] - countInBin - countBeforeHistogram
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fraction = np.clip((target - countBefore) / countInBin, 0, 1)
+            bins = keys[positions] % self.histogramBins
+            values = (lower + (bins + np.nan_to_num(fraction)) * binWidth).reshape(shape)
+            values = np.clip(values, self.minimum, self.maximum)  # exact for 0-th and 100-th percentile
+            values[self.count == 0] = np.nan
+            result.append(values)
+        return result
@@ -0,0 +1,53 @@
+"""
+Compare the import time of the PROSAIL spectral constants stored as Python source (legacy dataSpec.py with literal
+coefficient arrays) with the binary, lazily loaded dataSpec.npy store.
+"""
+import importlib
+import sys
+import tempfile
+from os.path import dirname, join
+from time import perf_counter
+
+import enmapbox
+
+sys.path.insert(0, join(dirname(enmapbox.__file__), 'apps'))
+
+from lmuvegetationapps.Resources.PROSAIL import dataSpec  # noqa: E402
+
+
+def writeLegacyModule(folder: str):
+    # recreate the legacy source module from the binary store
+    lines = ['import numpy as np', 'lambd = np.arange(400, 2501)']
+    for name in dataSpec._names:
+        values = getattr(dataSpec, name).ravel().tolist()
+        lines.append(f'{name} = np.array({values})')
+    with open(join(folder, 'dataSpecLegacy.py'), 'w') as file:
+        file.write('\n'.join(lines))
+
+
+def importTime(moduleName: str, access: bool = False) -> float:
+    sys.modules.pop(moduleName, None)
+    t0 = perf_counter()
+    module = importlib.import_module(moduleName)
+    if access:
+        module.PD_k_Cab  # first access loads all constants
+    return perf_counter() - t0
+
+
+def benchmark():
+    folder = tempfile.mkdtemp()
+    writeLegacyModule(folder)
+    sys.path.insert(0, folder)
+    importlib.invalidate_caches()
+
+    legacyCold = importTime('dataSpecLegacy')  # parse and compile, writes the .pyc
+    legacyWarm = importTime('dataSpecLegacy')  # load from .pyc
+    name = 'lmuvegetationapps.Resources.PROSAIL.dataSpec'
+    binaryImport = importTime(name)
+    binaryAccess = importTime(name, access=True)
+    print(f'legacy source: first import {legacyCold * 1000:.1f}ms, cached import {legacyWarm * 1000:.1f}ms')
+    print(f'binary store: import {binaryImport * 1000:.1f}ms, import and first access {binaryAccess * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,50 @@
+"""
+Compare the per-pixel EnGeoMAP feature fitting with the tiled feature fitting (batched continuum removal,
+correlation as matrix product, blocks processed in a process pool).
+"""
+from time import perf_counter
+
+import numpy as np
+
+from engeomap import engeomap_aux_funcul as auxfunul
+
+height, width = 20, 100
+parallelism = 4
+
+
+def benchmark():
+    np.random.seed(42)
+    wavelength = np.arange(420, 2450, 10.)
+    wto = np.arange(420, 2440, 1.)
+    background = 3000 + wavelength
+    centers = np.random.uniform(500, 2400, (20, 2))
+
+    def absorption(center, width, depth):
+        return 1 - depth * np.exp(-0.5 * ((wavelength - center) / width) ** 2)
+
+    library = np.array([background * absorption(a, 30, 0.3) * absorption(b, 50, 0.2) for a, b in centers])
+    cvxabs_mod, cvxrel_mod, libdat_rel_weighted, libdat_rel_chm_weighted, vnirmax, swirmax = \
+        auxfunul.treat_library_cvx_full_range(wavelength, library, wto)
+    fractions = np.random.dirichlet(np.ones(len(library)), height * width)
+    spectra = fractions.dot(library) + np.random.normal(0, 5, (height * width, len(wavelength)))
+    data = spectra.T.reshape(len(wavelength), height, width)
+
+    t0 = perf_counter()
+    legacy = auxfunul.fitting_cvx_fullrange(
+        wavelength, wto, data, libdat_rel_weighted, libdat_rel_chm_weighted, cvxabs_mod
+    )
+    durationLegacy = perf_counter() - t0
+    print(f'{height * width} pixels: per-pixel {durationLegacy:.1f}s')
+
+    for n in [1, parallelism]:
+        t0 = perf_counter()
+        tiled = auxfunul.fitting_cvx_fullrange_tiled(
+            wavelength, wto, data, libdat_rel_weighted, libdat_rel_chm_weighted, cvxabs_mod, parallelism=n
+        )
+        duration = perf_counter() - t0
+        assert np.allclose(legacy[0], tiled[0], atol=1e-6)
+        print(f'tiled (parallelism={n}) {duration:.1f}s (speedup x{durationLegacy / duration:.1f})')
+
+
+if __name__ == '__main__':
+    benchmark()
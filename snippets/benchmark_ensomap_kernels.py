@@ -0,0 +1,42 @@
+"""
+Compare the EnSoMAP soil feature kernels running on a single thread with running in parallel over all lines of a tile.
+"""
+from time import perf_counter
+
+import numba as nb
+import numpy as np
+
+from ensomap.hys import feat_specan_clay1, feat_specan_oc1, feat_specind_ndgi
+
+lines, samples, bands = 512, 1000, 224
+repeats = 3
+
+
+def timeit(function) -> float:
+    function()  # warm up
+    t0 = perf_counter()
+    for i in range(repeats):
+        function()
+    return (perf_counter() - t0) / repeats
+
+
+def benchmark():
+    np.random.seed(42)
+    wvl = np.linspace(0.42, 2.45, bands, dtype=np.float32)
+    cube = np.random.uniform(0.05, 0.5, (bands, lines, samples)).astype(np.float32)
+    mask = np.ones((lines, samples), dtype=np.int32)
+    ind = np.array([180, 205], dtype=np.int32)
+    numberOfThreads = nb.get_num_threads()
+    for module in [feat_specan_clay1, feat_specan_oc1, feat_specind_ndgi]:
+        nb.set_num_threads(1)
+        durationSerial = timeit(lambda: module.process(cube, wvl, ind, mask))
+        nb.set_num_threads(numberOfThreads)
+        durationParallel = timeit(lambda: module.process(cube, wvl, ind, mask))
+        print(
+            f'{module.__name__}: 1 thread {durationSerial * 1000:.1f}ms, {numberOfThreads} threads '
+            f'{durationParallel * 1000:.1f}ms (speedup x{durationSerial / durationParallel:.1f})'
+        )
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,46 @@
+"""
+Compare the per-spectrum forward pass of the ONNS neural nets with the batch forward pass,
+and parsing the .net file with loading the binary .npz cache.
+"""
+import os
+from time import perf_counter
+
+import numpy as np
+
+from enmapbox.apps.hzg_onns import nnhs
+
+netname = 'C2X_OLCI_20161013_Conc_WC01_23x76x55x36_58.5.net'
+n = 10000
+
+
+def benchmark():
+    filename = os.path.join(os.path.dirname(nnhs.__file__), 'nets', netname)
+    cacheFilename = os.path.splitext(filename)[0] + '.npz'
+    if os.path.exists(cacheFilename):
+        os.remove(cacheFilename)
+
+    t0 = perf_counter()
+    nn = nnhs.nnhs(filename)
+    durationParse = perf_counter() - t0
+    t0 = perf_counter()
+    nnhs.nnhs(filename)
+    durationCache = perf_counter() - t0
+    print(f'parse .net {durationParse * 1000:.1f}ms, load .npz cache {durationCache * 1000:.1f}ms')
+
+    np.random.seed(42)
+    inp = np.random.uniform(nn.inrange[0], nn.inrange[1], (n, nn.ninp))
+    t0 = perf_counter()
+    out1 = np.array([nn.ff_nnhs(inp[i]) for i in range(n)])
+    durationLoop = perf_counter() - t0
+    t0 = perf_counter()
+    out2 = nn.ff_nnhs_batch(inp)
+    durationBatch = perf_counter() - t0
+    assert np.allclose(out1, out2)
+    print(
+        f'{n} spectra: loop {durationLoop * 1000:.1f}ms, batch {durationBatch * 1000:.1f}ms '
+        f'(speedup x{durationLoop / durationBatch:.1f})'
+    )
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,51 @@
+"""
+Compare plain NumPy evaluation of typical spectral indices with the fused evaluation backends
+(chunked NumPy and numexpr, if installed) used by the Raster Math algorithm.
+"""
+from time import perf_counter
+
+import numpy as np
+
+from enmapboxprocessing.algorithm.rastermathalgorithm.fusedexpression import FusedExpression
+
+height, width = 2000, 2000
+repeats = 5
+
+expressions = {
+    'NDVI': '(N - R) / (N + R)',
+    'EVI': '2.5 * (N - R) / (N + 6 * R - 7.5 * B + 1)',
+    'SAVI': '1.5 * (N - R) / (N + R + 0.5)',
+    'NDWI': '(G - N) / (G + N)',
+    'masked NDVI': 'np.where((N + R) > 0, (N - R) / (N + R), -1)',
+}
+
+
+def timeit(function) -> float:
+    function()  # warm up
+    t0 = perf_counter()
+    for i in range(repeats):
+        function()
+    return (perf_counter() - t0) / repeats
+
+
+def benchmark():
+    np.random.seed(42)
+    namespace = {name: np.random.uniform(0, 1, (1, height, width)).astype(np.float32) for name in 'BGRN'}
+    backends = [FusedExpression.ChunkedBackend]
+    if FusedExpression.backend() == FusedExpression.NumexprBackend:
+        backends.append(FusedExpression.NumexprBackend)
+    else:
+        print('numexpr is not installed, skip numexpr backend')
+
+    for indexName, text in expressions.items():
+        expression = FusedExpression.fromExpression(text)
+        durationNumpy = timeit(lambda: expression.evaluateNumpy(namespace))
+        info = f'{indexName}: numpy {durationNumpy * 1000:.1f}ms'
+        for backend in backends:
+            duration = timeit(lambda: expression.evaluate(namespace, backend))
+            info += f', {backend} {duration * 1000:.1f}ms (speedup x{durationNumpy / duration:.1f})'
+        print(info)
+
+
+if __name__ == '__main__':
+    benchmark()
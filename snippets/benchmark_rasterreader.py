@@ -0,0 +1,51 @@
+"""
+Compare block reading via the QGIS raster data provider (one call per band) with the
+GDAL fast path (one call for all bands) on BSQ, BIL and BIP interleaved ENVI files.
+"""
+import tempfile
+from os.path import join
+from time import perf_counter
+
+import numpy as np
+
+from enmapbox.testing import start_app
+from enmapboxprocessing.driver import Driver
+from enmapboxprocessing.rasterreader import RasterReader
+
+start_app()
+
+nBands, height, width = 224, 1000, 1000
+blockHeight = 100
+
+
+def readAllBlocks(reader: RasterReader) -> float:
+    t0 = perf_counter()
+    for block in reader.walkGrid(reader.width(), blockHeight):
+        reader.arrayFromBlock(block)
+    return perf_counter() - t0
+
+
+def benchmark():
+    folder = tempfile.mkdtemp()
+    array = np.random.randint(0, 10000, (nBands, height, width), np.int16)
+    for options in [
+        Driver.DefaultEnviBsqCreationOptions, Driver.DefaultEnviBilCreationOptions,
+        Driver.DefaultEnviBipCreationOptions
+    ]:
+        interleave = options[0].split('=')[1]
+        filename = join(folder, f'{interleave.lower()}.bsq')
+        Driver(filename, Driver.EnviFormat, options).createFromArray(array).close()
+
+        reader = RasterReader(filename)
+        reader.useGdalFastPath = False
+        durationProvider = readAllBlocks(reader)
+        reader.useGdalFastPath = True
+        durationGdal = readAllBlocks(reader)
+        print(
+            f'{interleave}: provider {durationProvider:.2f}s, GDAL fast path {durationGdal:.2f}s '
+            f'(speedup x{durationProvider / durationGdal:.1f})'
+        )
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,52 @@
+"""
+Measure the throughput (pixels/s) of spectral response function resampling from EnMAP to Sentinel-2.
+"""
+import tempfile
+from os.path import join
+from time import perf_counter
+
+import numpy as np
+
+from enmapbox.testing import start_app
+from enmapboxprocessing.algorithm.spectralresamplingtosentinel2algorithm import \
+    SpectralResamplingToSentinel2aAlgorithm
+from enmapboxprocessing.algorithm.testcase import TestCase
+from enmapboxprocessing.driver import Driver
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxtestdata import enmap
+
+start_app()
+
+tiles = 5, 5  # number of enmap test image copies in y and x direction
+
+
+def createLargeEnmapRaster(filename: str):
+    reader = RasterReader(enmap)
+    array = np.tile(reader.array(), (1,) + tiles)
+    writer = Driver(filename).createFromArray(array, None, reader.crs())
+    for bandNo in reader.bandNumbers():
+        writer.setWavelength(reader.wavelength(bandNo), bandNo)
+        writer.setNoDataValue(reader.noDataValue(bandNo), bandNo)
+    writer.close()
+    return array.shape
+
+
+def benchmark():
+    folder = tempfile.mkdtemp()
+    filename = join(folder, 'enmap.tif')
+    _, height, width = createLargeEnmapRaster(filename)
+
+    alg = SpectralResamplingToSentinel2aAlgorithm()
+    parameters = {
+        alg.P_RASTER: filename,
+        alg.P_OUTPUT_RASTER: join(folder, 'sentinel2.tif')
+    }
+    t0 = perf_counter()
+    TestCase.runalg(alg, parameters)
+    duration = perf_counter() - t0
+    print(f'EnMAP -> Sentinel-2: {width}x{height} pixels in {duration:.2f}s '
+          f'({width * height / duration:,.0f} pixels/s)')
+
+
+if __name__ == '__main__':
+    benchmark()
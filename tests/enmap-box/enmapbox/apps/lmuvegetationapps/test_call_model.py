@@ -0,0 +1,68 @@
+import json
+import os
+from os.path import join
+
+import numpy as np
+
+from lmuvegetationapps.Resources.PROSAIL.call_model import InitModel
+
+from enmapboxprocessing.testcase import TestCase
+
+
+class TestInitModel(TestCase):
+
+    def createLut(self, LUT_dir, parallelism, resume=False, seed=42, cab=(0.0, 80.0)):
+        os.makedirs(LUT_dir, exist_ok=True)
+        model = InitModel(lop='prospectD', canopy_arch='sail', int_boost=10000, s2s='default')
+        model.initialize_vectorized(
+            LUT_dir=LUT_dir, LUT_name='lut', ns=30, max_per_file=20, tts=[20.0, 40.0, 2], tto=[0.0], psi=[0.0],
+            N=[1.1, 2.5], cab=list(cab), cw=[0.0002, 0.02], cm=[0.0001, 0.005], LAI=[0.5, 8.0], LIDF=[10.0, 80.0],
+            typeLIDF=[2], hspot=[0.1], psoil=[0.5], car=[0.0, 12.0], cbrown=[0.0, 1.0], anth=[0.0, 10.0],
+            cp=[0.001], cbc=[0.01], LAIu=[0.0], cd=[0.0], sd=[0.0], h=[0.0], soil=[0.1] * 2101,
+            seed=seed, parallelism=parallelism, resume=resume, progress_callback=lambda progress, message: None
+        )
+        return [np.load(join(LUT_dir, f'lut_{geo}_{split}.npy')) for geo in range(2) for split in range(2)]
+
+    def test_serialVsParallel(self):
+        serial = self.createLut(self.filename('serial/'), 1)
+        parallel = self.createLut(self.filename('parallel/'), 2)
+        self.assertEqual([(2122, 20), (2122, 10)] * 2, [array.shape for array in serial])
+        for array1, array2 in zip(serial, parallel):
+            self.assertArrayEqual(array1, array2)
+
+    def test_resume(self):
+        LUT_dir = self.filename('resume/')
+        lut = self.createLut(LUT_dir, 1)
+        os.remove(join(LUT_dir, 'lut_1_0.npy'))
+        self.markIncomplete(LUT_dir)
+        resumed = self.createLut(LUT_dir, 1, resume=True, seed=None)  # the seed of the interrupted run is reused
+        for array1, array2 in zip(lut, resumed):
+            self.assertArrayEqual(array1, array2)
+
+    def test_resumeWithOtherParameters(self):
+        LUT_dir = self.filename('resumeWithOtherParameters/')
+        self.createLut(LUT_dir, 1)
+        os.remove(join(LUT_dir, 'lut_1_0.npy'))
+        self.markIncomplete(LUT_dir)
+        with self.assertWarns(UserWarning):
+            resumed = self.createLut(LUT_dir, 1, resume=True, cab=(10.0, 50.0))  # stale splits must not be reused
+        lut = self.createLut(self.filename('otherParameters/'), 1, cab=(10.0, 50.0))
+        for array1, array2 in zip(lut, resumed):
+            self.assertArrayEqual(array1, array2)
+
+    def test_noResumeByDefault(self):
+        LUT_dir = self.filename('noResume/')
+        self.createLut(LUT_dir, 1)
+        resumed = self.createLut(LUT_dir, 1, cab=(10.0, 50.0))
+        lut = self.createLut(self.filename('noResumeReference/'), 1, cab=(10.0, 50.0))
+        for array1, array2 in zip(lut, resumed):
+            self.assertArrayEqual(array1, array2)
+
+    def markIncomplete(self, LUT_dir):
+        # simulate an interrupted run
+        filename = join(LUT_dir, 'lut_00resume.json')
+        with open(filename) as file:
+            state = json.load(file)
+        state['complete'] = False
+        with open(filename, 'w') as file:
+            json.dump(state, file)
@@ -0,0 +1,22 @@
+from lmuvegetationapps.Resources.PROSAIL import dataSpec
+
+from enmapboxprocessing.testcase import TestCase
+
+
+class TestDataSpec(TestCase):
+
+    def test_constants(self):
+        from lmuvegetationapps.Resources.PROSAIL.dataSpec import lambd, PD_k_Cab, PD_t12, Rsoil1
+        self.assertEqual((2101,), lambd.shape)
+        self.assertEqual((2101,), PD_k_Cab.shape)
+        self.assertEqual((1, 2101), PD_t12.shape)
+        self.assertAlmostEqual(0.064881, PD_k_Cab[0])
+        self.assertAlmostEqual(0.95692180550750894, PD_t12[0, 0])
+        self.assertEqual('float64', Rsoil1.dtype.name)
+
+        for name in dataSpec._names:
+            self.assertIn(name, dir(dataSpec))
+            self.assertEqual(2101, getattr(dataSpec, name).size)
+
+        with self.assertRaises(AttributeError):
+            dataSpec.undefined
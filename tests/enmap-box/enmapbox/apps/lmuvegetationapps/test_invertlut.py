@@ -0,0 +1,69 @@
+import unittest
+
+import numpy as np
+from osgeo import gdal
+
+from enmapbox.testing import EnMAPBoxTestCase
+
+
+def has_package(name: str):
+    try:
+        __import__(name)
+        return True
+    except ModuleNotFoundError:
+        return False
+
+
+@unittest.skipIf(not has_package('scipy'), 'scipy is not installed')
+class TestRTMInversion(EnMAPBoxTestCase):
+
+    def setUp(self):
+        np.random.seed(42)
+        self.lut = np.random.uniform(0, 10000, (50, 500))
+        self.image = np.random.uniform(0, 10000, (50, 20))
+
+    def test_costmatrix(self):
+        from enmapbox.apps.lmuvegetationapps.LUT.InvertLUT_core import RTMInversion
+
+        for ctype in [1, 2, 3]:
+            costmatrix = RTMInversion._costmatrix(self.image, self.lut, ctype)
+            self.assertEqual((20, 500), costmatrix.shape)
+            for i in range(self.image.shape[1]):
+                estimates = RTMInversion._costfun(self.image[:, i:i + 1], self.lut, ctype)
+                if ctype == 1:  # RMSE is returned as squared euclidean distance
+                    estimates = estimates ** 2 * self.lut.shape[0]
+                self.assertTrue(np.allclose(estimates, costmatrix[i]))
+
+    def test_nbest_bruteVsTree(self):
+        from scipy.spatial import cKDTree
+        from enmapbox.apps.lmuvegetationapps.LUT.InvertLUT_core import RTMInversion
+
+        inv = RTMInversion()
+        inv.nbfits = 10
+        for ctype in [1, 2]:
+            inv.ctype = ctype
+            brute = inv._nbest(self.image, self.lut)
+            tree = inv._nbest(self.image, self.lut, tree=cKDTree(self.lut.T))
+            self.assertEqual((20, 10), brute.shape)
+            self.assertTrue(np.array_equal(np.sort(brute, axis=1), np.sort(tree, axis=1)))
+
+    def test_chunkSize(self):
+        from enmapbox.apps.lmuvegetationapps.LUT.InvertLUT_core import RTMInversion
+
+        inv = RTMInversion()
+        inv.chunk_size = 1000
+        gdal.SetConfigOption('ENMAPBOX_MEMORY_BUDGET', '1')  # 1 MB
+        try:
+            inv.ctype = 1
+            self.assertEqual(2 ** 20 // (4 * 1000 * 16), inv._chunk_size(nlut=1000, parallelism=4, brute=True))
+            inv.ctype = 2
+            self.assertEqual(2 ** 20 // (4 * 1000 * 24), inv._chunk_size(nlut=1000, parallelism=4, brute=True))
+            self.assertEqual(1, inv._chunk_size(nlut=10 ** 6, parallelism=4, brute=True))
+            self.assertEqual(1000, inv._chunk_size(nlut=10, parallelism=1, brute=True))  # upper limit
+            self.assertEqual(1000, inv._chunk_size(nlut=10 ** 6, parallelism=4, brute=False))
+        finally:
+            gdal.SetConfigOption('ENMAPBOX_MEMORY_BUDGET', None)
+
+
+if __name__ == '__main__':
+    unittest.main(buffer=False)
@@ -35,6 +35,7 @@ class EnFROSPTestCases(EnMAPBoxTestCase):
 
     def test_application(self):
         EB = EnMAPBox()
+        EB.applicationRegistry.loadLazyApplications()
 
         app = [a for a in EB.applicationRegistry.applications() if isinstance(a, EnFROSPEnMAPBoxApp)]
         self.assertTrue(len(app) == 1, msg='EnFROSPEnMAPBoxApp was not loaded during EnMAP-Box startup')
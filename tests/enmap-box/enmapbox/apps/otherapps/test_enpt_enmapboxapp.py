@@ -35,6 +35,7 @@ class EnPTTestCases(EnMAPBoxTestCase):
 
     def test_application(self):
         EB = EnMAPBox()
+        EB.applicationRegistry.loadLazyApplications()
 
         app = [a for a in EB.applicationRegistry.applications() if isinstance(a, EnPTEnMAPBoxApp)]
         self.assertTrue(len(app) == 1, msg='EnPTEnMAPBoxApp was not loaded during EnMAP-Box startup')
@@ -0,0 +1,112 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from enmapbox.testing import TestCase, start_app
+
+start_app()
+
+
+def has_package(name: str):
+    try:
+        __import__(name)
+        return True
+    except (ModuleNotFoundError, SystemError):
+        return False
+
+
+has_numba = has_package('numba')
+
+
+def hys_namespace():
+    # data.read checks the data type against the classes in the hys namespace
+    from ensomap import hys
+    from ensomap.hys.data import cube, mask, SpectralLibrary
+    return mock.patch.multiple(hys, create=True, cube=cube, mask=mask, SpectralLibrary=SpectralLibrary)
+
+
+class Checked(object):
+
+    def __init__(self, checked: bool):
+        self.checked = checked
+
+    def isChecked(self):
+        return self.checked
+
+
+class TestEnSoMAPKernels(TestCase):
+
+    @unittest.skipIf(not has_numba, 'numba not installed')
+    def test_parallel_feature_kernels(self):
+        from ensomap.hys import feat_specan_clay1, feat_specan_oc1, feat_specan_oc2, feat_specind_ndgi
+
+        np.random.seed(42)
+        wvl = np.linspace(0.4, 2.5, 50, dtype=np.float32)
+        cube = np.random.uniform(0.05, 0.5, (50, 7, 5)).astype(np.float32)
+        mask = np.ones((7, 5), dtype=np.int32)
+        mask[2, 3] = 0
+        ind = np.array([10, 30], dtype=np.int32)
+        for module in [feat_specan_clay1, feat_specan_oc1, feat_specan_oc2, feat_specind_ndgi]:
+            out = module.process(cube, wvl, ind, mask)
+            expected = module.process.py_func(cube, wvl, ind, mask)
+            np.testing.assert_allclose(out, expected, rtol=1e-4)
+            self.assertTrue(np.isnan(out[2, 3]))
+
+    @unittest.skipIf(not has_numba, 'numba not installed')
+    def test_band_range(self):
+        from ensomap.hys import feat_specan_clay1, feat_specan_oc4, feat_specind_clay1, feat_specind_ndgi
+        from ensomap.hys.data import cube as Cube
+        from ensomap.hys.ui_map import _get_band_range
+
+        np.random.seed(42)
+        wvl = np.linspace(0.4, 2.5, 50, dtype=np.float32)
+        cube = np.random.uniform(0.05, 0.5, (50, 7, 5)).astype(np.float32)
+        mask = np.ones((7, 5), dtype=np.int32)
+        soil = {
+            'clay1': {'mod': feat_specan_clay1, 'wid': Checked(True), 'bands': [12, 30]},
+            'oc4': {'mod': feat_specan_oc4, 'wid': Checked(True), 'bands': [14, 20, 25]},
+            'clayind': {'mod': feat_specind_clay1, 'wid': Checked(True), 'bands': [18, 22, 27]},
+            'ndgi': {'mod': feat_specind_ndgi, 'wid': Checked(False), 'bands': [2, 45]},  # not selected
+        }
+        meta = {'samples': '5', 'lines': '7', 'bands': '50'}
+        with hys_namespace():
+            first_band, last_band = _get_band_range(soil, Cube('', meta), len(wvl))
+            self.assertEqual((12, 31), (first_band, last_band))
+            self.assertEqual((0, 50), _get_band_range(soil, object(), len(wvl)))
+            for item in soil.values():
+                item['wid'].checked = False
+            self.assertEqual((0, 50), _get_band_range(soil, Cube('', meta), len(wvl)))
+
+        # results for the band subset with shifted band indices match the results for all bands
+        for key in ['clay1', 'oc4', 'clayind']:
+            module = soil[key]['mod']
+            ind = np.array(soil[key]['bands'], dtype=np.int32)
+            expected = module.process(cube, wvl, ind, mask)
+            out = module.process(
+                cube[first_band:last_band], wvl[first_band:last_band], ind - np.int32(first_band), mask
+            )
+            np.testing.assert_array_equal(expected, out)
+
+
+class TestEnSoMAPData(TestCase):
+
+    def test_read_tiles(self):
+        from ensomap.hys.data import cube as Cube
+
+        array = np.random.uniform(0.05, 0.5, (6, 7, 4)).astype(np.float32)  # bands, lines, samples
+        tmp = self.createTestOutputDirectory()
+        for interleave, axes in [('bsq', (0, 1, 2)), ('bil', (1, 0, 2)), ('bip', (1, 2, 0))]:
+            filename = (tmp / f'cube_{interleave}.dat').as_posix()
+            np.transpose(array, axes).tofile(filename)
+            meta = {'samples': '4', 'lines': '7', 'bands': '6', 'data type': '4', 'interleave': interleave}
+            cube = Cube(filename, meta)
+            cube.tile_data(block_size=3)
+            self.assertEqual(3, cube.bn)
+            with hys_namespace():
+                for band_range, bands in [(None, slice(0, 6)), ((2, 5), slice(2, 5))]:
+                    tiles = list(cube.read_tiles(band_range=band_range))
+                    self.assertEqual([0, 1, 2], [k for k, im in tiles])
+                    for k, im in tiles:
+                        lines = slice(cube.bp[k], cube.bp[k] + cube.bs[k])
+                        np.testing.assert_array_equal(array[bands, lines], im, err_msg=interleave)
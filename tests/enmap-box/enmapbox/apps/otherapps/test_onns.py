@@ -1,4 +1,9 @@
+import os
+import shutil
 import unittest
+from os.path import join, dirname
+
+import numpy as np
 
 from enmapbox.testing import start_app, TestCase
 from enmapboxtestdata import SensorProducts, sensorProductsRoot
@@ -10,9 +15,22 @@ MISSING_MODULE = None
 try:
     from hzg_onns.core import onns
     from enmapbox.apps.hzg_onns import OnnsProcessingAlgorithm
+    from hzg_onns.nnhs import nnhs
 except ModuleNotFoundError as ex:
     MISSING_MODULE = str(ex)
 
+MISSING_PROCESSOR_MODULE = None
+try:
+    from scipy.spatial.distance import mahalanobis
+    from scipy.stats import chi2
+    from hzg_onns import ONNS_v091_20260622_for_EnMAP_Box as processor
+except ModuleNotFoundError as ex:
+    MISSING_PROCESSOR_MODULE = str(ex)
+
+onnsRoot = join(dirname(dirname(dirname(dirname(dirname(dirname(__file__)))))), 'enmapbox', 'apps', 'hzg_onns')
+netFile = join(onnsRoot, 'nets', 'C2X_OLCI_20161013_Conc_WC11_23x47x22x7_85.7.net')
+classesFolder = join(onnsRoot, 'classification', 'preselect_reducedHL_20161006H1203')
+
 
 class ONNSTestCases(TestCase):
 
@@ -51,5 +69,135 @@ class ONNSTestCases(TestCase):
         Processing.runAlgorithm(alg, parameters=param)
 
 
+@unittest.skipIf(MISSING_MODULE, f'Missing module: {MISSING_MODULE}')
+class NnhsTestCases(TestCase):
+
+    def copyNet(self) -> str:
+        # work on a copy, the binary cache must not be written into the source tree
+        filename = join(self.createTestOutputDirectory(cleanup=True), os.path.basename(netFile))
+        shutil.copyfile(netFile, filename)
+        return filename
+
+    def test_ff_nnhs_batch(self):
+        net = nnhs(self.copyNet())
+        net.ChunkSize = 7
+        np.random.seed(42)
+        inp = np.random.uniform(net.inrange[0], net.inrange[1], (50, net.ninp))
+        inp[3, 0] = np.nan
+        inp[20] = np.nan
+        expected = np.array([net.ff_nnhs(x) for x in inp])
+        actual = net.ff_nnhs_batch(inp)
+        self.assertEqual((50, net.noutp), actual.shape)
+        self.assertTrue(np.all(np.isnan(actual[[3, 20]])))
+        np.testing.assert_allclose(actual, expected, rtol=1e-10, atol=1e-12)
+
+    def test_cache(self):
+        filename = self.copyNet()
+        net = nnhs(filename)
+        self.assertTrue(os.path.exists(net.cache_file()))
+        self.assertEqual(dirname(filename), dirname(net.cache_file()))
+
+        cached = nnhs(filename)
+        self.assertTrue(cached.load_cache())
+        self.assertEqual(net.invar, cached.invar)
+        self.assertEqual(net.outvar, cached.outvar)
+        self.assertEqual(net.size, cached.size)
+        for a, b in zip(net.wgt + net.bias, cached.wgt + cached.bias):
+            np.testing.assert_array_equal(a, b)
+        np.testing.assert_array_equal(net.inrange, cached.inrange)
+        np.testing.assert_array_equal(net.outrange, cached.outrange)
+        inp = np.mean(net.inrange, axis=0)
+        np.testing.assert_array_equal(net.ff_nnhs(inp), cached.ff_nnhs(inp))
+
+        # a modified net invalidates the cache
+        mtime = os.path.getmtime(net.cache_file())
+        os.utime(filename, (mtime + 10, mtime + 10))
+        self.assertFalse(cached.load_cache())
+
+
+@unittest.skipIf(MISSING_PROCESSOR_MODULE, f'Missing module: {MISSING_PROCESSOR_MODULE}')
+class OnnsProcessorTestCases(TestCase):
+
+    def spectra(self) -> np.ndarray:
+        # noisy spectra around the cluster means (normalised log10(Rrs + 1) and their sum)
+        means = np.loadtxt(join(classesFolder, 'means_check.csv'), delimiter=',', skiprows=1)
+        np.random.seed(42)
+        spectra = np.repeat(means[:, :11] * means[:, 11:], 20, axis=0)
+        spectra *= np.random.uniform(0.8, 1.2, spectra.shape)
+        return 10 ** spectra - 1
+
+    def classifyClusteringFuzzyLegacy(self, Rrs_ONNS, path_to_classes, scaled):
+        # per-spectrum implementation from before the vectorisation
+        weights = np.array([0.1, 0.5, 1, 1, 1, 1, 1, 1, 0.8, 0.8, 0.2])
+        with processor.nc(join(path_to_classes, 'class_cov.nc')) as a:
+            new_covs = np.array(a['covariance'])
+        with processor.nc(join(path_to_classes, 'class_means.nc')) as a:
+            new_means = np.array(a['cluster_means'])
+        Nvar = 11
+        Ncluster = 13
+        d_all = np.log10(Rrs_ONNS + 1)
+        if scaled:
+            d_all = d_all / np.sum(d_all, axis=1)[:, None]
+        m = np.empty([Rrs_ONNS.shape[0], Ncluster])
+        for i in range(Ncluster):
+            VI = new_covs[i, :Nvar, :Nvar]
+            diagVI = np.diag(VI)
+            if scaled:
+                dist = np.apply_along_axis(lambda x: np.sum(weights * (x - new_means[0:Nvar, i]) ** 2 / diagVI), 1,
+                                           d_all[:, 0:Nvar])
+            else:
+                dist = np.apply_along_axis(lambda x: mahalanobis(u=x, v=new_means[0:Nvar, i], VI=VI) ** 2, 1,
+                                           d_all[:, 0:Nvar])
+            m[:, i] = 1 - chi2.cdf(x=dist, df=Nvar)
+        maxMemb = np.apply_along_axis(lambda x: np.array(list(range(1, Ncluster + 1)))[x == np.max(x)][0], 1, m)
+        maxMemb[np.logical_not(np.apply_along_axis(lambda x: np.max(x), 1, m) > 10 ** -9)] = 0
+        return m, maxMemb
+
+    def test_classify_clustering_fuzzy_scaled(self):
+        Rrs = self.spectra()
+        m, m2, total_membership, maxMemb = processor.classify_clustering_fuzzy(1, Rrs, classesFolder)[:4]
+        expectedM, expectedMaxMemb = self.classifyClusteringFuzzyLegacy(Rrs, classesFolder, True)
+        np.testing.assert_allclose(m, expectedM, rtol=1e-10, atol=1e-12)
+        np.testing.assert_array_equal(maxMemb, expectedMaxMemb)
+        self.assertTrue(np.any(maxMemb > 0))
+
+    def test_classify_clustering_fuzzy_unscaled(self):
+        # the unscaled (mahalanobis) variant is selected by a logfile without weights
+        folder = join(self.createTestOutputDirectory(cleanup=True), 'classes')
+        shutil.copytree(classesFolder, folder)
+        with open(join(folder, 'logfile.txt')) as file:
+            lines = [line for line in file.readlines() if 'weights' not in line]
+        with open(join(folder, 'logfile.txt'), 'w') as file:
+            file.writelines(lines)
+
+        Rrs = self.spectra()
+        m, m2, total_membership, maxMemb = processor.classify_clustering_fuzzy(1, Rrs, folder)[:4]
+        expectedM, expectedMaxMemb = self.classifyClusteringFuzzyLegacy(Rrs, folder, False)
+        np.testing.assert_allclose(m, expectedM, rtol=1e-10, atol=1e-12)
+        np.testing.assert_array_equal(maxMemb, expectedMaxMemb)
+
+    def test_merge_products(self):
+        np.random.seed(42)
+        total_membership = np.random.uniform(0, 1, 100)
+        total_out_weighted = np.random.uniform(0, 10, (100, 5))
+        total_out_bNN = np.random.uniform(0, 10, (100, 5))
+        Case = np.random.uniform(0, 1, 100) < 0.5
+
+        merged, flag = processor.merge_products(total_membership, total_out_weighted, total_out_bNN, Case)
+
+        # per-pixel implementation from before the vectorisation
+        expectedFlag = np.zeros(100)
+        for i in range(100):
+            if Case[i] and total_membership[i] < 0.3:
+                expectedFlag[i] = 1
+            elif not Case[i] and total_membership[i] < 0.3:
+                expectedFlag[i] = 2
+        expectedMerged = np.copy(total_out_weighted)
+        expectedMerged[total_membership < 0.3, :] = total_out_bNN[total_membership < 0.3, :]
+        np.testing.assert_array_equal(flag, expectedFlag)
+        np.testing.assert_array_equal(merged, np.around(expectedMerged, decimals=4))
+        self.assertTrue(np.any(flag == 1) and np.any(flag == 2))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,73 @@
+import numpy as np
+
+from enmapboxprocessing.driver import Driver
+from enmapboxprocessing.testcase import TestCase
+from qgis.core import QgsRasterLayer
+from scatterplotapp.scatterplottask import ScatterPlotDensity, ScatterPlotTask
+
+
+class TestScatterPlotDensity(TestCase):
+
+    def test_incrementalHistogram(self):
+        np.random.seed(42)
+        x = np.random.uniform(0, 10, 1000)
+        y = 2 * x + 1 + np.random.normal(0, 0.1, 1000)
+        density = ScatterPlotDensity((10, 20), ((0., 10.), (0., 20.)))
+        density.update(x[:300], y[:300])
+        density.update(x[300:], y[300:])
+
+        counts, _, _ = np.histogram2d(x, y, (10, 20), ((0., 10.), (0., 20.)))
+        self.assertArrayEqual(counts.astype(np.int64), density.counts)
+        self.assertEqual(1000, density.n)
+
+        slope, intercept, r2, rmse = density.linearFit()
+        self.assertTrue(np.allclose(np.polyfit(x, y, 1), [slope, intercept]))
+        self.assertAlmostEqual(np.corrcoef(x, y)[0, 1] ** 2, r2)
+        self.assertAlmostEqual(np.sqrt(np.mean((x - y) ** 2)), rmse)
+
+    def test_keepPoints(self):
+        density = ScatterPlotDensity((2, 2), ((0., 1.), (0., 1.)), keepPoints=True)
+        density.update(np.array([0., 1.]), np.array([1., 0.]))
+        density.update(np.array([5.]), np.array([5.]))  # outside of the range, but kept
+        x, y = density.xy()
+        self.assertArrayEqual(np.array([0., 1., 5.]), x)
+        self.assertArrayEqual(np.array([[0, 1], [1, 0]]), density.counts)
+
+    def test_derivedRangeCoversAllValues(self):
+        array = np.ones((2, 50, 50))
+        array[:, 13, 17] = 100  # extreme value, not included in the preview
+        filename = self.filename('raster.tif')
+        writer = Driver(filename).createFromArray(array)
+        writer.close()
+        layer = QgsRasterLayer(filename)
+        previewSize = ScatterPlotTask.PreviewSize
+        ScatterPlotTask.PreviewSize = 4
+        try:
+            task = ScatterPlotTask(1, layer, 1, layer, 2, layer.extent(), 0, (10, 10), ((None, None), (None, None)))
+            self.assertTrue(task.run())
+        finally:
+            ScatterPlotTask.PreviewSize = previewSize
+        self.assertIsNone(task.error)
+        self.assertEqual(((1., 100.), (1., 100.)), task.density.range)
+        self.assertEqual(50 * 50, task.density.n)
+        self.assertEqual(1, task.density.counts[-1, -1])
+
+    def test_emptyPreview(self):
+        array = np.zeros((2, 50, 50))
+        array[0, 13, 17] = 1  # only valid pixel, not included in the preview
+        array[1, 13, 17] = 2
+        filename = self.filename('rasterEmptyPreview.tif')
+        writer = Driver(filename).createFromArray(array)
+        writer.setNoDataValue(0)
+        writer.close()
+        layer = QgsRasterLayer(filename)
+        previewSize = ScatterPlotTask.PreviewSize
+        ScatterPlotTask.PreviewSize = 4
+        try:
+            task = ScatterPlotTask(1, layer, 1, layer, 2, layer.extent(), 0, (10, 10), ((None, None), (None, None)))
+            self.assertTrue(task.run())
+        finally:
+            ScatterPlotTask.PreviewSize = previewSize
+        self.assertIsNone(task.error)
+        self.assertEqual(((1., 1.), (2., 2.)), task.density.range)
+        self.assertEqual(1, task.density.n)
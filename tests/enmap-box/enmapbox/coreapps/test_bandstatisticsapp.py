@@ -1,3 +1,4 @@
+import time
 import unittest
 
 from enmapbox.coreapps.bandstatisticsapp.bandstatisticsdialog import BandStatisticsDialog
@@ -59,9 +60,12 @@ class BandStatisticsAppTests(EnMAPBoxTestCase):
                 dialog.onAddAllBandsClicked()
                 self.assertEqual(dialog.mTable.rowCount(), 2)
 
-                # 6. Run statistics calculation
+                # 6. Run statistics calculation (in the background)
                 dialog.onApplyClicked()
-                QApplication.processEvents()
+                t0 = time.time()
+                while dialog.mTask is not None and time.time() - t0 < 30:
+                    QApplication.processEvents()
+                self.assertIsNone(dialog.mTask)
 
                 # 7. Verify the results in the table
                 # Band | Histogram | Min | Max | Mean | StdDev
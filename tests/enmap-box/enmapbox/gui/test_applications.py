@@ -19,6 +19,7 @@ __copyright__ = 'Copyright 2017, Benjamin Jakimow'
 import unittest
 from collections import namedtuple
 
+from enmapbox.gui.applicationmanifest import ApplicationManifest, LazyProcessingAlgorithm
 from enmapbox.gui.applications import ApplicationRegistry
 from qgis.PyQt.QtCore import QTimer
 from qgis.PyQt.QtWidgets import QApplication, QAction, QWidget, QMenu
@@ -173,6 +174,60 @@ class test_applications(EnMAPBoxTestCase):
         EB.close()
         QgsProject.instance().removeAllMapLayers()
 
+    def test_lazyLoading(self):
+        EB = EnMAPBox(load_core_apps=False, load_other_apps=False)
+        appDir = pathlib.Path(DIR_REPO) / 'examples' / 'minimumexample'
+        manifestFile = self.createTestOutputDirectory() / 'AppTests' / 'applicationmanifest.json'
+        if os.path.isfile(manifestFile):
+            os.remove(manifestFile)
+
+        # 1. first start: load the package and create the manifest
+        reg = ApplicationRegistry(EB, lazyLoading=True)
+        reg.mManifest = ApplicationManifest(manifestFile)
+        self.assertTrue(reg.addApplicationFolder(appDir))
+        self.assertEqual(len(reg), 1)
+        manifest = ApplicationManifest(manifestFile).entry(appDir)
+        self.assertTrue(manifest['lazy'])
+        self.assertEqual(['My First EnMAPBox App'], [app['name'] for app in manifest['apps']])
+        self.assertEqual(['Applications'], manifest['menuItems'][0]['path'])
+        self.assertTrue(len(manifest['algorithms']) > 0)
+        reg.removeApplication(reg.applications()[0])
+
+        # 2. next start: register menu items and algorithms from the manifest, without loading the package
+        for name in [name for name in sys.modules if name.split('.')[0] == 'minimumexample']:
+            del sys.modules[name]
+        reg = ApplicationRegistry(EB, lazyLoading=True)
+        reg.mManifest = ApplicationManifest(manifestFile)
+        self.assertTrue(reg.addApplicationFolder(appDir))
+        self.assertEqual(len(reg), 0)
+        self.assertNotIn('minimumexample', sys.modules)
+
+        # placeholders expose the full parameter list
+        definition = [d for d in manifest['algorithms'] if d['name'] == 'examplealgorithm'][0]
+        placeholder = LazyProcessingAlgorithm(definition, reg.lazyProcessingAlgorithm).create({})
+        self.assertEqual(
+            ['pathInput', 'value', 'pathOutput'], [p.name() for p in placeholder.parameterDefinitions()]
+        )
+        self.assertEqual(['pathOutput'], [o.name() for o in placeholder.outputDefinitions()])
+        for definition in manifest['algorithms']:
+            placeholder = LazyProcessingAlgorithm(definition, reg.lazyProcessingAlgorithm).create({})
+            self.assertEqual(len(definition['parameters']), len(placeholder.parameterDefinitions()))
+        self.assertNotIn('minimumexample', sys.modules)
+        self.assertEqual(['minimumexample'], reg.lazyApplications())
+        self.assertEqual('lazy', reg.mLoadingTimes['minimumexample'][0])
+        self.assertIn('minimumexample', reg.loadingTimesReport())
+
+        # 3. first use of a menu item loads the package
+        menu = reg.findMenu(['Applications', 'Mininum Example App'])
+        self.assertIsInstance(menu, QMenu)
+        menu.actions()[0].trigger()
+        self.assertEqual(len(reg), 1)
+        self.assertEqual([], reg.lazyApplications())
+        self.assertEqual('loaded on demand', reg.mLoadingTimes['minimumexample'][0])
+
+        EB.close()
+        QgsProject.instance().removeAllMapLayers()
+
     def test_deployed_apps(self):
 
         pathCoreApps = pathlib.Path(DIR_ENMAPBOX) / 'coreapps'
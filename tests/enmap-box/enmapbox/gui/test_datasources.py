@@ -23,12 +23,14 @@ from enmapbox import initAll, DIR_REPO
 from enmapbox.exampledata import enmap, hires, landcover_polygon
 from enmapbox.gui.datasources.datasources import SpatialDataSource, DataSource, RasterDataSource, VectorDataSource, \
     FileDataSource
+from enmapbox.gui.datasources.ingestion import DataSourceProbeCache
 from enmapbox.gui.datasources.manager import DataSourceManager, DataSourceManagerPanelUI, DataSourceFactory
 from enmapbox.gui.enmapboxgui import EnMAPBox
 from enmapbox.testing import TestObjects, EnMAPBoxTestCase
 from enmapbox.testing import start_app
 from enmapboxtestdata import classifierDumpSkops, library_berlin, enmap_srf_library
 from qgis.PyQt import sip
+from qgis.PyQt.QtWidgets import QApplication
 from qgis.core import QgsProject, QgsMapLayer, QgsRasterLayer, QgsVectorLayer, QgsRasterRenderer, edit, \
     QgsVectorTileLayer
 from qgis.gui import QgsMapCanvas
@@ -113,6 +115,42 @@ class DataSourceTests(EnMAPBoxTestCase):
         dsm.addDataSources([p2, p1])
         self.assertTrue(len(dsm) == 1)
 
+    def test_DataSourceProbeCache(self):
+
+        filename = self.createTestOutputDirectory() / 'datasourceprobes.json'
+        cache = DataSourceProbeCache(filename)
+        details = cache.probe(enmap)
+        self.assertTrue(len(details) == 1)
+        self.assertEqual(details[0].uri(), cache.sublayerDetails(enmap)[0].uri())
+        cache.save()
+        self.assertTrue(filename.is_file())
+
+        # read from persistent cache
+        cache = DataSourceProbeCache(filename)
+        cached = cache.sublayerDetails(enmap)
+        self.assertEqual(details[0].uri(), cached[0].uri())
+        self.assertEqual(details[0].providerKey(), cached[0].providerKey())
+        self.assertEqual(details[0].type(), cached[0].type())
+
+        # no entries for non-file sources
+        self.assertTrue(cache.sublayerDetails('not a file') is None)
+
+    def test_addDataSourcesAsync(self):
+
+        dsm = DataSourceManager()
+        n = dsm.addDataSourcesAsync([enmap, hires, landcover_polygon])
+        self.assertEqual(3, n)
+        self.assertEqual(0, dsm.addDataSourcesAsync([enmap]))  # already pending
+        self.assertTrue(len(dsm.pendingSources()) > 0 or len(dsm) > 0)
+
+        t0 = datetime.datetime.now()
+        while len(dsm.pendingSources()) > 0 and datetime.datetime.now() - t0 < datetime.timedelta(seconds=30):
+            QApplication.processEvents()
+            sleep(0.05)
+        self.assertEqual(0, len(dsm.pendingSources()))
+        self.assertEqual(3, len(dsm))
+        self.assertEqual(0, dsm.addDataSourcesAsync([enmap]))  # already added
+
     def test_DataSourcePanelUI(self):
 
         dsm = DataSourceManager()
@@ -2,9 +2,10 @@ import numpy as np
 from qgis.core import QgsRasterLayer, QgsVectorLayer, QgsMapLayer
 
 from enmapboxprocessing.algorithm.classificationperformancestratifiedalgorithm import (
-    stratifiedAccuracyAssessment, ClassificationPerformanceStratifiedAlgorithm
+    stratifiedAccuracyAssessment, ClassificationPerformanceStratifiedAlgorithm, stratifiedAccuracyAssessmentFromCounts
 )
 from enmapboxprocessing.algorithm.testcase import TestCase
+from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.typing import Category
 from enmapboxprocessing.utils import Utils
 from enmapboxtestdata import landcover_map_l3
@@ -74,6 +75,36 @@ class Test_aa_stratified(TestCase):
         self.assertTrue(np.allclose(cwa[4], stats.f1))
         self.assertTrue(np.allclose(cwa[5], stats.f1_se, rtol=1e-3))
 
+    def test_fromCounts(self):
+        map = list('AAAAAAABBBABBBBBBBBBBBCCCCCCBBDDDDDDDDDD') + ['A', 'X']
+        reference = list('AAAAACBABCABBBBBAABBCCCCCDDBBADDDDDDDCCB') + ['A', 'B']
+        stratum = list('1111111111222222222233333333334444444444') + ['9', '1']  # other stratum and other map value
+        h = ['1', '2', '3', '4']
+        N_h = [40000, 30000, 20000, 10000]
+        classValues = ['A', 'B', 'C', 'D']
+        classNames = ['Class A', 'Class B', 'Class C', 'Class D']
+        gold = stratifiedAccuracyAssessment(stratum, reference, map, h, N_h, classValues, classNames)
+
+        counts = np.zeros((len(h) + 1, len(classValues), len(classValues) + 1), np.int64)
+        for s, r, m in zip(stratum, reference, map):
+            i = h.index(s) if s in h else len(h)
+            k = classValues.index(m) if m in classValues else len(classValues)
+            counts[i, classValues.index(r), k] += 1
+        lead = stratifiedAccuracyAssessmentFromCounts(counts, h, N_h, classValues, classNames)
+
+        self.assertEqual(gold.n, lead.n)
+        self.assertEqual(gold.N, lead.N)
+        for key in ['confusion_matrix_proportions', 'confusion_matrix_counts', 'overall_accuracy',
+                    'overall_accuracy_se', 'area_proportion', 'area_proportion_se', 'users_accuracy',
+                    'users_accuracy_se', 'producers_accuracy', 'producers_accuracy_se', 'f1', 'f1_se']:
+            self.assertTrue(np.allclose(getattr(gold, key), getattr(lead, key), atol=1e-6, equal_nan=True), key)
+
+    def test_fromCounts_emptyStratum(self):
+        counts = np.zeros((2, 2, 2), np.int64)
+        counts[0, 0, 0] = 1
+        with self.assertRaises(ValueError):
+            stratifiedAccuracyAssessmentFromCounts(counts, [1, 2], [10, 10], [1, 2], ['a', 'b'])
+
     def test_withSmall_sampleSize(self):
         map = ['A', 'B', 'C']
         reference = ['A', 'B', 'C']
@@ -148,3 +179,24 @@ class TestClassificationPerformanceStratifiedAlgorithm(TestCase):
         self.assertEqual(77, int(stats['overall_accuracy'] * 100))
         self.assertListEqual([100, 33], [int(v * 100) for v in stats['users_accuracy']])
         self.assertListEqual([75, 100], [int(v * 100) for v in stats['producers_accuracy']])
+
+    def test_confusionCounts(self):
+        stratification = np.array([[[1, 1, 2, 2, 2, 9]]])
+        reference = np.array([[[1, 0, 1, 2, 2, 1]]])  # 0 is no reference
+        prediction = np.array([[[10, 20, 20, 20, 5, 10]]])  # 10 -> 1, 20 -> 2, 5 is not a class
+        readers = list()
+        for array, basename in [(stratification, 's.tif'), (reference, 'r.tif'), (prediction, 'p.tif')]:
+            writer = self.rasterFromArray(array, basename)
+            writer.close()
+            readers.append(RasterReader(writer.source()))
+
+        alg = ClassificationPerformanceStratifiedAlgorithm()
+        counts, N_h = alg.confusionCounts(*readers, [1, 2], [1, 2], {10: 1, 20: 2})
+        self.assertArrayEqual(np.array([2, 3]), N_h)
+        self.assertEqual((3, 2, 3), counts.shape)
+        self.assertEqual(5, np.sum(counts))
+        self.assertEqual(1, counts[0, 0, 0])  # stratum 1, reference 1, predicted 1
+        self.assertEqual(1, counts[1, 0, 1])  # stratum 2, reference 1, predicted 2
+        self.assertEqual(1, counts[1, 1, 1])  # stratum 2, reference 2, predicted 2
+        self.assertEqual(1, counts[1, 1, 2])  # stratum 2, reference 2, predicted other
+        self.assertEqual(1, counts[2, 0, 0])  # other stratum, reference 1, predicted 1
@@ -48,6 +48,27 @@ class TestPredictClassificationAlgorithm(TestCase):
         result = self.runalg(alg, parameters)
         self.assertEqual(127249, np.sum(RasterReader(result[alg.P_OUTPUT_CLASSIFICATION]).array()))
 
+    def test_parallelism(self):
+        algFit = FitTestClassifierAlgorithm()
+        algFit.initAlgorithm()
+        parametersFit = {
+            algFit.P_DATASET: classifierDumpSkops,
+            algFit.P_CLASSIFIER: algFit.defaultCodeAsString(),
+            algFit.P_OUTPUT_CLASSIFIER: self.filename('classifier.skops')
+        }
+        self.runalg(algFit, parametersFit)
+
+        alg = PredictClassificationAlgorithm()
+        alg.initAlgorithm()
+        alg.parallelism = 4
+        parameters = {
+            alg.P_RASTER: enmap,
+            alg.P_CLASSIFIER: parametersFit[algFit.P_OUTPUT_CLASSIFIER],
+            alg.P_OUTPUT_CLASSIFICATION: self.filename('classification.tif')
+        }
+        result = self.runalg(alg, parameters)
+        self.assertEqual(127249, np.sum(RasterReader(result[alg.P_OUTPUT_CLASSIFICATION]).array()))
+
     def test_rasterMask(self):
         algFit = FitTestClassifierAlgorithm()
         algFit.initAlgorithm()
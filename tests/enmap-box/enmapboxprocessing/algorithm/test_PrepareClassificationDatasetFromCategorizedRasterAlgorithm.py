@@ -1,3 +1,4 @@
+import numpy as np
 from qgis.core import QgsVectorLayer, QgsRasterLayer
 
 from enmapboxprocessing.algorithm.libraryfromclassificationdatasetalgorithm import \
@@ -5,6 +6,7 @@ from enmapboxprocessing.algorithm.libraryfromclassificationdatasetalgorithm impo
 from enmapboxprocessing.algorithm.prepareclassificationdatasetfromcategorizedrasteralgorithm import \
     PrepareClassificationDatasetFromCategorizedRasterAlgorithm
 from enmapboxprocessing.algorithm.testcase import TestCase
+from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxprocessing.typing import ClassifierDump
 from enmapboxprocessing.utils import Utils
 from enmapboxtestdata import enmap_potsdam
@@ -103,3 +105,25 @@ class TestPrepareClassificationDatasetFromCategorizedRasterAlgorithm(TestCase):
         dump = ClassifierDump(**Utils.modelLoad(parameters[alg.P_OUTPUT_DATASET]))
         self.assertEqual(224, dump.X.shape[1])
         self.assertEqual(224, len(dump.features))
+
+    def test_sampleLabeledPixels(self):
+        array = np.arange(2 * 30 * 40).reshape((2, 30, 40))
+        labels = np.zeros((1, 30, 40))
+        labels[0, 2, 5] = 1
+        labels[0, 2, 3] = 2
+        labels[0, 25, 38] = 1
+        labels[0, 10, 20] = 3  # not a requested value
+        writer = self.rasterFromArray(array)
+        writer.close()
+        classificationWriter = self.rasterFromArray(labels)
+        classificationWriter.close()
+        reader = RasterReader(writer.source())
+        classificationReader = RasterReader(classificationWriter.source())
+        X, XMask, y, rows, columns = PrepareClassificationDatasetFromCategorizedRasterAlgorithm.sampleLabeledPixels(
+            reader, classificationReader, 1, [1, 2]
+        )
+        self.assertArrayEqual(np.array([2, 2, 25]), rows)
+        self.assertArrayEqual(np.array([3, 5, 38]), columns)
+        self.assertArrayEqual(np.array([2, 1, 1]), y)
+        self.assertArrayEqual(array[:, rows, columns].T, X)
+        self.assertTrue(np.all(XMask))
@@ -23,3 +23,13 @@ class TestRasterLayerZonalAggregationAlgorithm(TestCase):
             alg.P_OUTPUT_TABLE: self.filename('table.gpkg'),
         }
         self.runalg(alg, parameters)
+
+    def test_functions(self):
+        alg = RasterLayerZonalAggregationAlgorithm()
+        parameters = {
+            alg.P_RASTER: enmap,
+            alg.P_CATEGORIZED_RASTER: landcover_map_l3,
+            alg.P_FUNCTION: [alg.ArithmeticMeanFunction, alg.CountFunction, alg.MedianFunction, alg.P0 + 90],
+            alg.P_OUTPUT_TABLE: self.filename('tableFunctions.csv'),
+        }
+        self.runalg(alg, parameters)
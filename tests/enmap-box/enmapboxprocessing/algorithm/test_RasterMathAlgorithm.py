@@ -5,7 +5,9 @@ import numpy as np
 from osgeo import gdal
 
 from enmapbox.testing import start_app
+from enmapboxprocessing.algorithm.rastermathalgorithm.fusedexpression import FusedExpression
 from enmapboxprocessing.algorithm.rastermathalgorithm.rastermathalgorithm import RasterMathAlgorithm
+from enmapboxprocessing.algorithm.rastermathalgorithm.rastermathplan import RasterMathPlan
 from enmapboxprocessing.algorithm.testcase import TestCase
 from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxtestdata import enmap, landcover_polygon, hires
@@ -290,3 +292,70 @@ class TestRasterMathAlgorithm(TestCase):
         }
         result = self.runalg(alg, parameters)
         self.assertArrayEqual(-99, RasterReader(result[alg.P_OUTPUT_RASTER]).array(0, 0, 1, 1))
+
+    def test_executionPlan(self):
+        reader = RasterReader(enmap)
+        code = 'a = R1@42 + R1Mask@42\n' \
+               'b = R1@685nm\n' \
+               'c = R1.noDataValue()'
+        plan = RasterMathPlan(code, {'R1': reader}, [], RasterMathAlgorithm.P_OUTPUT_RASTER, [])
+        self.assertEqual([], plan.fullRasters)  # neither single bands nor the reader require all bands
+        self.assertEqual([42], plan.readBands['R1'])  # band 42 is referenced three times, but read once
+        self.assertEqual({(42,): ['R1@42', 'R1@42', 'R1@685nm']}, plan.atBands['R1'])
+        self.assertIn('R1_.noDataValue()', plan.code)
+        self.assertIn('R1: ', str(plan))
+
+        plan = RasterMathPlan('R1 * R2Mask', {'R1': reader, 'R2': reader}, [], 'outputRaster', [])
+        self.assertEqual(['R1', 'R2'], plan.fullRasters)
+        self.assertTrue(plan.isSingleLineCode)
+        self.assertEqual('outputRaster = R1 * R2Mask', plan.code)
+
+    def test_withAtAndWholeRaster(self):
+        alg = RasterMathAlgorithm()
+        parameters = {
+            alg.P_R1: enmap,
+            alg.P_CODE: 'raster = R1@42 + R1[41:42] * 0',  # band 42 is taken from the full read
+            alg.P_OUTPUT_RASTER: self.filename('raster.tif')
+        }
+        result = self.runalg(alg, parameters)
+        self.assertArrayEqual(
+            RasterReader(enmap).array(bandList=[42]), RasterReader(result[alg.P_OUTPUT_RASTER]).array()
+        )
+
+    def test_fusedExpression(self):
+        self.assertIsNone(FusedExpression.fromExpression('np.sum(R1, axis=0)'))  # not element-wise
+        self.assertIsNone(FusedExpression.fromExpression('R1[0]'))
+        self.assertIsNone(FusedExpression.fromExpression('0 < R1 < 1'))
+        self.assertIsNone(FusedExpression.fromExpression('a = R1'))
+
+        expression = FusedExpression.fromExpression('np.sqrt((R1At850nm - R1At650nm) / (R1At850nm + R1At650nm))')
+        self.assertEqual(['R1At850nm', 'R1At650nm'], expression.names)
+        self.assertEqual('sqrt((R1At850nm - R1At650nm) / (R1At850nm + R1At650nm))', expression.numexprExpression)
+
+        np.random.seed(42)
+        namespace = {
+            'R1At850nm': np.random.uniform(1, 2, (1, 500, 300)).astype(np.float32),
+            'R1At650nm': np.random.uniform(0, 1, (1, 500, 300)).astype(np.float32)
+        }
+        gold = expression.evaluateNumpy(namespace)
+        for backend in [FusedExpression.ChunkedBackend, FusedExpression.backend()]:
+            result = expression.evaluate(namespace, backend)
+            self.assertEqual(gold.dtype, result.dtype)
+            self.assertTrue(np.allclose(gold, result))
+        self.assertArrayEqual(gold, expression.evaluate(namespace, FusedExpression.ChunkedBackend))
+        self.assertIsNone(expression.evaluate(namespace, FusedExpression.NumpyBackend))
+
+    def test_fusedBackends(self):
+        results = list()
+        for backend in [FusedExpression.NumpyBackend, FusedExpression.ChunkedBackend]:
+            gdal.SetConfigOption('ENMAPBOX_RASTERMATH_BACKEND', backend)
+            alg = RasterMathAlgorithm()
+            parameters = {
+                alg.P_R1: enmap,
+                alg.P_CODE: '(R1@850nm - R1@650nm) / (R1@850nm + R1@650nm)',
+                alg.P_OUTPUT_RASTER: self.filename(f'ndvi_{backend}.tif')
+            }
+            result = self.runalg(alg, parameters)
+            results.append(RasterReader(result[alg.P_OUTPUT_RASTER]).array())
+        gdal.SetConfigOption('ENMAPBOX_RASTERMATH_BACKEND', None)
+        self.assertArrayEqual(results[0], results[1])
@@ -89,6 +89,34 @@ class TestRasterizeCategorizedVectorAlgorithm(TestCase):
         result = self.runalg(alg, parameters)
         self.assertEqual(3816, np.sum(RasterReader(result[alg.P_OUTPUT_CATEGORIZED_RASTER]).array()))
 
+    def test_memoryBudget(self):
+        alg = RasterizeCategorizedVectorAlgorithm()
+        alg.initAlgorithm()
+        parameters = {
+            alg.P_CATEGORIZED_VECTOR: QgsVectorLayer(landcover_polygon),
+            alg.P_GRID: QgsRasterLayer(enmap),
+            alg.P_COVERAGE: 100,
+            alg.P_OUTPUT_CATEGORIZED_RASTER: self.filename('classification_smallbudget.tif')
+        }
+        gdal.SetConfigOption('ENMAPBOX_MEMORY_BUDGET', '1')  # 1 MB, i.e. a single line per block
+        try:
+            result = self.runalg(alg, parameters)
+        finally:
+            gdal.SetConfigOption('ENMAPBOX_MEMORY_BUDGET', None)
+        self.assertEqual(3816, np.sum(RasterReader(result[alg.P_OUTPUT_CATEGORIZED_RASTER]).array()))
+
+    def test_majorityVoting(self):
+        array = np.array([
+            [1, 2, 0, 0],
+            [2, 1, 0, 3],
+            [0, 0, 2, 2],
+            [0, 0, 2, 2],
+        ], dtype=np.uint8)
+        classes, coverage = RasterizeCategorizedVectorAlgorithm.majorityVoting(array, 2)
+        # tie between class 1 and 2 is won by class 2, which reaches the maximum count first (like GDAL mode)
+        self.assertArrayEqual(np.array([[2, 3], [0, 2]]), classes)
+        self.assertArrayEqual(np.array([[1, 0.25], [0, 1]], dtype=np.float32), coverage)
+
     def _test_issue1420(self):
 
         # change categories
@@ -1,9 +1,11 @@
 import unittest
 
+import numpy as np
 from osgeo import gdal
 
 from enmapboxprocessing.algorithm.samplerastervaluesalgorithm import SampleRasterValuesAlgorithm
 from enmapboxprocessing.algorithm.testcase import TestCase
+from enmapboxprocessing.rasterreader import RasterReader
 from enmapboxtestdata import enmap, landcover_polygon, hires_potsdom
 from enmapboxtestdata import landcover_points_singlepart_epsg3035
 from qgis.core import (QgsRasterLayer, QgsVectorLayer)
@@ -22,6 +24,57 @@ class TestSampleRasterValuesAlgorithm(TestCase):
         }
         self.runalg(alg, parameters)
 
+    def test_sampledValues(self):
+        alg = SampleRasterValuesAlgorithm()
+        alg.initAlgorithm()
+        parameters = {
+            alg.P_RASTER: enmap,
+            alg.P_VECTOR: landcover_points_singlepart_epsg3035,
+            alg.P_OUTPUT_POINTS: self.filename('sample_values.gpkg')
+        }
+        result = self.runalg(alg, parameters)
+        points = QgsVectorLayer(result[alg.P_OUTPUT_POINTS])
+        self.assertEqual(QgsVectorLayer(landcover_points_singlepart_epsg3035).featureCount(), points.featureCount())
+        reader = RasterReader(enmap)
+        for feature in points.getFeatures():
+            x, y = feature.attribute('PIXEL_X'), feature.attribute('PIXEL_Y')
+            profile = reader.arrayFromPixelOffsetAndSize(x, y, 1, 1)
+            for bandNo in [1, 42, reader.bandCount()]:
+                self.assertEqual(profile[bandNo - 1][0, 0], feature.attribute(f'SAMPLE_{bandNo}'))
+
+    def test_sampledValuesInChunks(self):
+        alg = SampleRasterValuesAlgorithm()
+        alg.initAlgorithm()
+        parameters = {
+            alg.P_RASTER: enmap,
+            alg.P_VECTOR: landcover_points_singlepart_epsg3035,
+            alg.P_OUTPUT_POINTS: self.filename('sample_values_gold.gpkg')
+        }
+        gold = QgsVectorLayer(self.runalg(alg, parameters)[alg.P_OUTPUT_POINTS])
+        chunkSize = SampleRasterValuesAlgorithm.ChunkSize
+        SampleRasterValuesAlgorithm.ChunkSize = 7
+        try:
+            parameters[alg.P_OUTPUT_POINTS] = self.filename('sample_values_chunks.gpkg')
+            lead = QgsVectorLayer(self.runalg(alg, parameters)[alg.P_OUTPUT_POINTS])
+        finally:
+            SampleRasterValuesAlgorithm.ChunkSize = chunkSize
+        self.assertEqual(
+            [feature.attributes() for feature in gold.getFeatures()],
+            [feature.attributes() for feature in lead.getFeatures()]
+        )
+
+    def test_samplePixelsBlockSize(self):
+        reader = RasterReader(enmap)
+        pixelX = np.array([0, 5, 200, 3, 219, 100, 5])
+        pixelY = np.array([0, 7, 390, 3, 399, 50, 7])
+        inside = np.ones_like(pixelX, bool)
+        gold = SampleRasterValuesAlgorithm.samplePixels(reader, pixelX, pixelY, inside, (reader.width(), 1))
+        lead = SampleRasterValuesAlgorithm.samplePixels(reader, pixelX, pixelY, inside, (4, 4))
+        self.assertArrayEqual(gold[0], lead[0])
+        self.assertArrayEqual(gold[1], lead[1])
+        profile = reader.arrayFromPixelOffsetAndSize(200, 390, 1, 1)
+        self.assertArrayEqual(np.array(profile)[:, 0, 0], lead[0][:, 2])
+
     def test_sampleFromVectorPolygons(self):
         alg = SampleRasterValuesAlgorithm()
         alg.initAlgorithm()
@@ -1,5 +1,7 @@
 import numpy as np
 
+from enmapboxprocessing.algorithm.spectralresamplingbyresponsefunctionconvolutionalgorithmbase import \
+    SpectralResamplingByResponseFunctionConvolutionAlgorithmBase
 from enmapboxprocessing.algorithm.spectralresamplingtoenmapalgorithm import SpectralResamplingToEnmapAlgorithm
 from enmapboxprocessing.algorithm.spectralresamplingtolandsatalgorithm import SpectralResamplingToLandsatOliAlgorithm
 from enmapboxprocessing.algorithm.testcase import TestCase
@@ -26,3 +28,17 @@ class TestSpectralResamplingByResponseFunctionConvolutionAlgorithmBase(TestCase)
         }
         result = self.runalg(alg, parameters)
         self.assertEqual(-8712000, np.round(np.sum(RasterReader(result[alg.P_OUTPUT_RASTER]).array()[0])))
+
+    def test_resampleData_withMaskedValues(self):
+        responses = {'a': [(500, 1.), (501, 0.5)], 'b': [(502, 1.)], 'c': [(600, 1.)]}
+        weightMatrix = SpectralResamplingByResponseFunctionConvolutionAlgorithmBase.responseWeightMatrix(
+            [500, 501, 502], responses
+        )
+        self.assertArrayEqual(np.array([[1., 0.5, 0.], [0., 0., 1.], [0., 0., 0.]]), weightMatrix)
+
+        array = np.array([[[10., 10.]], [[40., 40.]], [[5., np.nan]]])
+        marray = np.array([[[True, False]], [[True, True]], [[True, False]]])
+        outarray = SpectralResamplingByResponseFunctionConvolutionAlgorithmBase.resampleData(
+            array, marray, weightMatrix, -99
+        )
+        self.assertArrayEqual(np.array([[[20., 40.]], [[5., -99]], [[-99, -99]]]), outarray)
@@ -0,0 +1,105 @@
+from os import listdir
+
+import numpy as np
+from osgeo import gdal
+
+from enmapboxprocessing.bandstatisticsservice import BandStatisticsAccumulator, BandStatisticsService
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.testcase import TestCase
+from enmapboxtestdata import enmap
+from qgis.core import QgsRasterLayer, QgsRasterRange
+
+
+class TestBandStatisticsAccumulator(TestCase):
+
+    def setUp(self):
+        np.random.seed(42)
+        self.array = np.random.normal(50, 10, (2, 30, 40))
+        self.marray = np.random.uniform(0, 1, (2, 30, 40)) > 0.1
+
+    def test_statistics(self):
+        accumulator = BandStatisticsAccumulator(2)
+        # process in two blocks
+        accumulator.update(self.array[:, :10], self.marray[:, :10])
+        accumulator.update(self.array[:, 10:], self.marray[:, 10:])
+
+        for i, stats in enumerate(accumulator.statistics()):
+            values = self.array[i][self.marray[i]]
+            self.assertEqual(len(values), stats.count)
+            self.assertEqual(np.min(values), stats.minimum)
+            self.assertEqual(np.max(values), stats.maximum)
+            self.assertAlmostEqual(np.mean(values), stats.mean)
+            self.assertAlmostEqual(np.std(values), stats.stdDev)
+            self.assertEqual(len(values), np.sum(stats.histogramCounts))
+            self.assertAlmostEqual(len(values), np.sum(stats.histogram(10)))
+            lower, upper = stats.cumulativeCut(0.02, 0.98)
+            self.assertAlmostEqual(np.percentile(values, 2), lower, 0)
+            self.assertAlmostEqual(np.percentile(values, 98), upper, 0)
+            self.assertEqual((stats.minimum, stats.maximum), stats.cumulativeCut(0, 1))
+
+    def test_histogramExtension(self):
+        accumulator = BandStatisticsAccumulator(1, 16)
+        accumulator.update(np.array([[[0., 1.]]]), np.array([[[True, True]]]))
+        accumulator.update(np.array([[[-10., 100.]]]), np.array([[[True, True]]]))
+        stats = accumulator.statistics()[0]
+        self.assertEqual(4, np.sum(stats.histogramCounts))
+        self.assertLessEqual(stats.histogramMinimum, -10)
+        self.assertGreater(stats.histogramMinimum + 16 * stats.histogramBinWidth, 100)
+        self.assertEqual((-10, 100), stats.cumulativeCut(0, 1))
+
+    def test_emptyBand(self):
+        accumulator = BandStatisticsAccumulator(1)
+        accumulator.update(np.array([[[np.nan, 1.]]]), np.array([[[True, False]]]))
+        stats = accumulator.statistics()[0]
+        self.assertEqual(0, stats.count)
+        self.assertTrue(all(np.isnan(stats.cumulativeCut(0.02, 0.98))))
+
+
+class TestBandStatisticsService(TestCase):
+
+    def test_bandStatistics(self):
+        gdal.SetConfigOption('ENMAPBOX_STATISTICS_CACHE', self.filename('bandstatistics'))
+        BandStatisticsService.clearCache()
+        layer = QgsRasterLayer(enmap)
+        reader = RasterReader(layer)
+        statistics = BandStatisticsService.bandStatistics(layer, [1, 42])
+        for bandNo, stats in zip([1, 42], statistics):
+            array = reader.array(bandList=[bandNo])
+            values = array[0][reader.maskArray(array, [bandNo])[0]]
+            self.assertEqual(len(values), stats.count)
+            self.assertEqual(np.min(values), stats.minimum)
+            self.assertEqual(np.max(values), stats.maximum)
+
+        # read from memory cache and from persistent cache
+        self.assertIs(statistics[1], BandStatisticsService.bandStatistics(layer, [42])[0])
+        BandStatisticsService.clearCache()
+        cached = BandStatisticsService.bandStatistics(layer, [42])[0]
+        self.assertIsNot(statistics[1], cached)
+        self.assertEqual(statistics[1].mean, cached.mean)
+        self.assertArrayEqual(statistics[1].histogramCounts, cached.histogramCounts)
+        gdal.SetConfigOption('ENMAPBOX_STATISTICS_CACHE', None)
+
+    def test_cacheKeyNoDataSettings(self):
+        layer = QgsRasterLayer(enmap)
+        reader = RasterReader(layer)
+        key = BandStatisticsService.cacheKey(reader, 1, reader.extent(), 0)
+        reader.setUserNoDataValue(1, [QgsRasterRange(0, 100)])
+        self.assertNotEqual(key, BandStatisticsService.cacheKey(reader, 1, reader.extent(), 0))
+        reader.setUserNoDataValue(1, [])
+        self.assertEqual(key, BandStatisticsService.cacheKey(reader, 1, reader.extent(), 0))
+        reader.setUseSourceNoDataValue(1, not reader.useSourceNoDataValue(1))
+        self.assertNotEqual(key, BandStatisticsService.cacheKey(reader, 1, reader.extent(), 0))
+
+    def test_cacheFolderEviction(self):
+        folder = self.filename('bandstatistics_eviction')
+        gdal.SetConfigOption('ENMAPBOX_STATISTICS_CACHE', folder)
+        gdal.SetConfigOption('ENMAPBOX_STATISTICS_CACHE_SIZE', '0.05')  # room for a single band
+        try:
+            BandStatisticsService.clearCache()
+            layer = QgsRasterLayer(enmap)
+            BandStatisticsService.bandStatistics(layer, [1, 2, 3])
+            self.assertEqual(1, len([name for name in listdir(folder) if name.endswith('.npz')]))
+        finally:
+            gdal.SetConfigOption('ENMAPBOX_STATISTICS_CACHE', None)
+            gdal.SetConfigOption('ENMAPBOX_STATISTICS_CACHE_SIZE', None)
+            BandStatisticsService.clearCache()
@@ -0,0 +1,55 @@
+import numpy as np
+
+from enmapboxprocessing.blockplanner import BlockPlanner
+from enmapboxprocessing.driver import Driver
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.testcase import TestCase
+from qgis.core import Qgis
+
+
+class TestBlockPlanner(TestCase):
+
+    def createRaster(self, basename: str, format: str, options) -> RasterReader:
+        array = np.zeros((10, 1000, 600), np.int16)
+        filename = self.filename(basename)
+        Driver(filename, format, options).createFromArray(array).close()
+        return RasterReader(filename)
+
+    def test_stripedRaster(self):
+        reader = self.createRaster('striped.bsq', Driver.EnviFormat, Driver.DefaultEnviBsqCreationOptions)
+        planner = BlockPlanner(reader, memoryBudget=600 * 100 * 10 * 2)
+        planner.addInput(reader)
+        self.assertEqual((600, 1), planner.nativeBlockSize())
+        self.assertEqual((600, 100), planner.blockSize())
+        self.assertEqual(600 * 100 * 10 * 2, planner.peakMemoryUsage(600, 100))
+
+        # working memory, outputs and blocks in flight reduce the block size
+        planner.addWorkingMemory(10, 2)
+        planner.addOutput(10, Qgis.DataType.Int16)
+        planner.setBlocksInFlight(2)
+        self.assertEqual((600, 16), planner.blockSize())
+
+    def test_tiledRaster(self):
+        reader = self.createRaster('tiled.tif', Driver.GTiffFormat, Driver.DefaultGTiffCreationOptions)
+        self.assertEqual((256, 256), BlockPlanner(reader).nativeBlockSize())
+
+        # whole tile rows
+        planner = BlockPlanner(reader, memoryBudget=600 * 600 * 10 * 2)
+        planner.addInput(reader)
+        self.assertEqual((600, 512), planner.blockSize())
+
+        # tile-aligned chunks of a single tile row
+        planner = BlockPlanner(reader, memoryBudget=256 * 512 * 10 * 2)
+        planner.addInput(reader)
+        self.assertEqual((512, 256), planner.blockSize())
+
+        # blocks cover the whole raster
+        blocks = list(planner.walkGrid())
+        self.assertEqual(600 * 1000, sum([block.width * block.height for block in blocks]))
+
+    def test_overlap(self):
+        reader = self.createRaster('overlap.bsq', Driver.EnviFormat, Driver.DefaultEnviBsqCreationOptions)
+        planner = BlockPlanner(reader, memoryBudget=(600 + 20) * (100 + 20) * 10 * 2)
+        planner.addInput(reader)
+        planner.setOverlap(10)
+        self.assertEqual((600, 100), planner.blockSize())
@@ -0,0 +1,78 @@
+from os.path import isfile
+
+import numpy as np
+
+from enmapboxprocessing.blockprocessor import BlockProcessor
+from enmapboxprocessing.driver import Driver
+from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.testcase import TestCase
+from enmapboxtestdata import enmap
+from qgis.core import QgsRectangle
+
+FACTOR = None
+
+
+def initFactor(factor):
+    global FACTOR
+    FACTOR = factor
+
+
+def multiply(array):
+    return array * FACTOR
+
+
+class TestBlockProcessor(TestCase):
+
+    def runProcessor(self, parallelism: int) -> np.ndarray:
+        reader = RasterReader(enmap)
+        filename = self.filename(f'sum_{parallelism}.tif')
+        writer = Driver(filename).createLike(reader, nBands=1)
+        processor = BlockProcessor(parallelism)
+        writtenBlocks = list()
+
+        def createSlot():
+            return reader if processor.parallelism == 1 else reader.clone()
+
+        def readBlock(reader_: RasterReader, block: RasterBlockInfo):
+            return reader_.arrayFromBlock(block, [1, 2, 3], dtype=np.float32)
+
+        def processBlock(array):
+            return np.sum(array, axis=0, keepdims=True)
+
+        def writeBlock(block: RasterBlockInfo, array):
+            writtenBlocks.append(block)
+            writer.writeArray(array, block.xOffset, block.yOffset)
+
+        blocks = list(reader.walkGrid(50, 7))
+        processor.run(blocks, readBlock, processBlock, writeBlock, createSlot)
+        writer.close()
+        self.assertListEqual(blocks, writtenBlocks)  # blocks are written in order
+        return RasterReader(filename).array()[0]
+
+    def test_parallelism(self):
+        gold = self.runProcessor(1)
+        lead = self.runProcessor(4)
+        self.assertArrayEqual(gold, lead)
+
+    def test_maximumBlocksInFlight(self):
+        self.assertEqual(1, BlockProcessor(1).maximumBlocksInFlight())
+        self.assertEqual(8, BlockProcessor(4).maximumBlocksInFlight())
+
+    def test_invalidParallelism(self):
+        with self.assertRaises(ValueError):
+            BlockProcessor(0)
+
+    def test_initializer(self):
+        for parallelism in [1, 2]:
+            processor = BlockProcessor(parallelism, initializer=initFactor, initargs=(3,))
+            results = list()
+            blocks = [RasterBlockInfo(QgsRectangle(), 0, y, 1, 1) for y in range(5)]
+            processor.run(
+                blocks, lambda slot, block: block.yOffset, multiply, lambda block, result: results.append(result)
+            )
+            self.assertListEqual([0, 3, 6, 9, 12], results)
+
+    def test_pythonExecutable(self):
+        executable = BlockProcessor.pythonExecutable()
+        self.assertTrue(executable is None or isfile(executable))
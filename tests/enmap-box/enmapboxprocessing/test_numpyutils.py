@@ -31,3 +31,19 @@ class TestNumpyUtils(TestCase):
     def test_rebinSum(self):
         a = np.array(list(range(16))).reshape(4, 4)
         self.assertTrue(np.all(np.equal([[10, 18], [42, 50]], NumpyUtils.rebinSum(a, (2, 2)))))
+
+    def test_bufferView(self):
+        buffer = np.zeros((2, 4, 3))
+        view = NumpyUtils.bufferView(buffer, (2, 3, 3))
+        self.assertEqual((2, 3, 3), view.shape)
+        self.assertTrue(view.flags.c_contiguous)
+        view[:] = 1
+        self.assertEqual(18, buffer.sum())
+        with self.assertRaises(ValueError):
+            NumpyUtils.bufferView(buffer, (2, 5, 3))
+
+    def test_categoryIndices(self):
+        a = np.array([[3, 1, 2], [7, 3, nan]])
+        indices = NumpyUtils.categoryIndices(a, [3, 1, 2])  # values need not be sorted
+        self.assertTrue(np.all(np.equal([[0, 1, 2], [3, 0, 3]], indices)))
+        self.assertTrue(np.all(np.equal(0, NumpyUtils.categoryIndices(a, []))))
@@ -0,0 +1,64 @@
+import numpy as np
+from osgeo import gdal
+
+from enmapboxprocessing.rasterblockcache import RasterBlockCache
+from enmapboxprocessing.rasterreader import RasterReader
+from enmapboxprocessing.testcase import TestCase
+from enmapboxtestdata import enmap
+
+
+class TestRasterBlockCache(TestCase):
+
+    def setUp(self):
+        RasterBlockCache.invalidate()
+
+    def test_array(self):
+        reader = RasterReader(enmap)
+        for xOffset, yOffset, width, height, bandList in [
+            (10, 20, 1, 1, None),  # z-profile
+            (0, 70, reader.width(), 1, [42]),  # x-profile
+            (150, 0, 1, reader.height(), [42]),  # y-profile
+            (60, 60, 10, 10, [1, 2])  # crossing tile borders
+        ]:
+            gold = np.array(reader.arrayFromPixelOffsetAndSize(xOffset, yOffset, width, height, bandList))
+            # first read fills the cache, second read is served from the cache
+            for i in range(2):
+                array = reader.cachedArrayFromPixelOffsetAndSize(xOffset, yOffset, width, height, bandList)
+                self.assertArrayEqual(gold, array)
+        self.assertTrue(RasterBlockCache.cachedBytes() > 0)
+
+    def test_sharedBetweenReaders(self):
+        RasterReader(enmap).cachedArrayFromPixelOffsetAndSize(10, 20, 1, 1)
+        n = RasterBlockCache.cachedBytes()
+        RasterReader(enmap).cachedArrayFromPixelOffsetAndSize(11, 21, 1, 1)  # same tiles
+        self.assertEqual(n, RasterBlockCache.cachedBytes())
+
+    def test_invalidate(self):
+        reader = RasterReader(enmap)
+        reader.cachedArrayFromPixelOffsetAndSize(10, 20, 1, 1)
+        RasterBlockCache.invalidate(reader.source())
+        self.assertEqual(0, RasterBlockCache.cachedBytes())
+
+    def test_modifiedSource(self):
+        writer = self.rasterFromArray(np.zeros((1, 10, 10)), 'raster.tif')
+        writer.close()
+        reader = RasterReader(writer.source())
+        self.assertEqual(0, reader.cachedArrayFromPixelOffsetAndSize(0, 0, 1, 1)[0, 0, 0])
+        writer = self.rasterFromArray(np.ones((1, 10, 10)), 'raster.tif')
+        writer.close()
+        RasterBlockCache._mtimes[reader.source()] = -1  # simulate modification inside the file timestamp resolution
+        reader = RasterReader(writer.source())
+        self.assertEqual(1, reader.cachedArrayFromPixelOffsetAndSize(0, 0, 1, 1)[0, 0, 0])
+
+    def test_byteBudget(self):
+        gdal.SetConfigOption('ENMAPBOX_BLOCK_CACHE', '1')  # 1 MB
+        reader = RasterReader(enmap)
+        for x in range(0, reader.width(), 64):
+            reader.cachedArrayFromPixelOffsetAndSize(x, 0, 1, 1)
+            self.assertLessEqual(RasterBlockCache.cachedBytes(), 1024 ** 2)
+        gdal.SetConfigOption('ENMAPBOX_BLOCK_CACHE', None)
+
+    def test_outsideRaster(self):
+        reader = RasterReader(enmap)
+        with self.assertRaises(ValueError):
+            reader.cachedArrayFromPixelOffsetAndSize(-1, 0, 1, 1)
@@ -4,6 +4,7 @@ from os.path import exists
 import numpy as np
 from osgeo import gdal
 
+from enmapboxprocessing.driver import Driver
 from enmapboxprocessing.rasterblockinfo import RasterBlockInfo
 from enmapboxprocessing.rasterreader import RasterReader, setMetadataCache, metadataCache
 from enmapboxprocessing.testcase import TestCase
@@ -12,7 +13,7 @@ from enmapboxtestdata import enmap, r_terra_timeseries_days, r_terra_timeseries_
     SensorProducts, sensorProductsRoot
 from enmapboxtestdata import fraction_polygon_l3
 from qgis.PyQt.QtCore import QDateTime, QSizeF, QPoint
-from qgis.core import QgsRasterRange, QgsRasterLayer, Qgis, QgsRectangle, QgsCoordinateReferenceSystem
+from qgis.core import QgsRasterRange, QgsRasterLayer, Qgis, QgsRectangle, QgsCoordinateReferenceSystem, QgsGeometry
 
 
 class TestRasterReader(TestCase):
@@ -155,6 +156,68 @@ class TestRasterReader(TestCase):
         lead[0][10:-10, 10:-10] = reader.noDataValue(1)
         self.assertTrue(np.all(np.equal(reader.noDataValue(1), lead)))
 
+    def test_arrayFromBoundingBoxAndSize_gdalFastPath(self):
+        for options in [
+            Driver.DefaultEnviBsqCreationOptions, Driver.DefaultEnviBilCreationOptions,
+            Driver.DefaultEnviBipCreationOptions
+        ]:
+            gold = np.random.randint(0, 100, (5, 20, 30), np.int16)
+            filename = self.filename(f'{options[0].split("=")[1].lower()}.bsq')
+            Driver(filename, Driver.EnviFormat, options).createFromArray(gold).close()
+            reader = RasterReader(filename)
+            block = RasterBlockInfo(reader.extent(), 0, 0, 30, 20)
+            self.assertEqual((0, 0), reader.gdalReadWindow(block.extent, 30, 20, [1, 3]))
+            lead = reader.arrayFromBlock(block, [1, 3])
+            self.assertArrayEqual(gold[[0, 2]], lead)
+
+            # compare with QGIS provider path
+            reader.useGdalFastPath = False
+            self.assertIsNone(reader.gdalReadWindow(block.extent, 30, 20, [1, 3]))
+            self.assertArrayEqual(reader.arrayFromBlock(block, [1, 3]), lead)
+            for block in reader.walkGrid(7, 3):
+                reader.useGdalFastPath = True
+                lead = reader.arrayFromBlock(block)
+                reader.useGdalFastPath = False
+                self.assertArrayEqual(reader.arrayFromBlock(block), lead)
+
+    def test_array_withOutputBuffer(self):
+        reader = RasterReader(enmap)
+        gold = reader.gdalDataset.ReadAsArray()
+
+        out = reader.allocateArray(220, 400)
+        lead = reader.array(out=out)
+        self.assertIs(out, lead)
+        self.assertArrayEqual(gold, lead)
+
+        out = reader.allocateArray(220, 400, [1, 2], np.float32)
+        lead = reader.array(bandList=[1, 2], out=out)
+        self.assertEqual(np.float32, lead.dtype)
+        self.assertArrayEqual(gold[:2], lead)
+
+        lead = reader.array(bandList=[1, 2], dtype=np.float64)
+        self.assertIsInstance(lead, np.ndarray)
+        self.assertEqual(np.float64, lead.dtype)
+        self.assertArrayEqual(gold[:2], lead)
+
+        # provider path
+        reader.useGdalFastPath = False
+        out = reader.allocateArray(220, 400, [1, 2], np.float32)
+        lead = reader.array(bandList=[1, 2], out=out)
+        self.assertIs(out, lead)
+        self.assertArrayEqual(gold[:2], lead)
+
+        with self.assertRaises(ValueError):
+            reader.array(bandList=[1], out=out)
+
+    def test_gdalReadWindow(self):
+        reader = RasterReader(enmap)
+        self.assertEqual((0, 0), reader.gdalReadWindow(reader.extent(), 220, 400, [1]))
+        self.assertIsNone(reader.gdalReadWindow(reader.extent(), 110, 200, [1]))  # resampling
+        self.assertIsNone(reader.gdalReadWindow(reader.extent().buffered(30), 222, 402, [1]))  # outside
+
+        reader = RasterReader(enmap, True, QgsCoordinateReferenceSystem('EPSG:4326'))
+        self.assertIsNone(reader.gdalReadWindow(reader.extent(), 220, 400, [1]))  # reprojection
+
     def test_arrayFromPixelOffsetAndSize(self):
         array = np.zeros((1, 5, 5))
         array[0, 0] = 1
@@ -781,3 +844,46 @@ class TestRasterReader(TestCase):
         self.assertEqual(cache['wavelength'][0], reader.wavelength(1))
         self.assertIsNone(reader.wavelength(2))
         self.assertEqual(cache['wavelength'][2], reader.wavelength(3))
+
+    def test_geometriesCoverage(self):
+        writer = self.rasterFromArray(
+            np.zeros((1, 4, 4)), extent=QgsRectangle(0, 0, 4, 4), crs=QgsCoordinateReferenceSystem.fromEpsgId(32633)
+        )
+        writer.close()
+        reader = RasterReader(writer.source())
+        geometries = [
+            QgsGeometry.fromWkt('POLYGON((0.5 3.5, 2 3.5, 2 4, 0.5 4, 0.5 3.5))'),
+            QgsGeometry.fromWkt('POLYGON((0 0, 1 0, 1 1, 0 1, 0 0))'),
+            QgsGeometry.fromWkt('POLYGON((1 3, 2 3, 2 4, 1 4, 1 3))'),  # overlaps first geometry
+            QgsGeometry.fromWkt('POLYGON((10 10, 11 10, 11 11, 10 11, 10 10))'),  # outside the raster
+        ]
+        coverages = reader.geometriesCoverage(geometries)
+        self.assertEqual(4, len(coverages))
+        self.assertArrayEqual(np.array([0, 1]), coverages[0][0])
+        self.assertArrayEqual(np.array([0.25, 0.5], np.float32), coverages[0][1])
+        self.assertArrayEqual(np.array([12]), coverages[1][0])
+        self.assertArrayEqual(np.array([1.]), coverages[1][1])
+        self.assertArrayEqual(np.array([1]), coverages[2][0])
+        self.assertArrayEqual(np.array([1.]), coverages[2][1])
+        self.assertEqual(0, len(coverages[3][0]))
+
+        fractionArray, extent = reader.geometryCoverage(geometries[0])
+        self.assertAlmostEqual(0.75, float(np.sum(fractionArray)), 5)
+
+    def test_geometriesCoverage_multipleStrips(self):
+        writer = self.rasterFromArray(
+            np.zeros((1, 12, 4)), extent=QgsRectangle(0, 0, 4, 12), crs=QgsCoordinateReferenceSystem.fromEpsgId(32633)
+        )
+        writer.close()
+        reader = RasterReader(writer.source())
+        geometries = [
+            QgsGeometry.fromWkt('POLYGON((0.5 1, 1.5 1, 1.5 11, 0.5 11, 0.5 1))'),  # spans all strips
+            QgsGeometry.fromWkt('POLYGON((3 0, 4 0, 4 1, 3 1, 3 0))'),  # inside the last strip only
+        ]
+        # oversampling 1000 rasterizes strips of 4 pixel rows
+        coverages = reader.geometriesCoverage(geometries, 1000)
+        pixelIndices = [row * 4 + column for row in range(1, 11) for column in [0, 1]]
+        self.assertArrayEqual(np.array(pixelIndices), coverages[0][0])
+        self.assertArrayEqual(np.full(20, 0.5, np.float32), coverages[0][1])
+        self.assertArrayEqual(np.array([47]), coverages[1][0])
+        self.assertArrayEqual(np.array([1.]), coverages[1][1])
@@ -0,0 +1,27 @@
+import numpy as np
+
+from enmapboxprocessing.testcase import TestCase
+from enmapboxprocessing.transitioncounter import TransitionCounter
+
+
+class TestTransitionCounter(TestCase):
+
+    def test_update(self):
+        array1 = np.array([[1, 1, 2, 2, 0]])
+        array2 = np.array([[1, 3, 3, 3, 3]])
+        array3 = np.array([[5, 5, 5, 6, 6]])
+        counter = TransitionCounter([[1, 2], [3, 1], [5, 6]])
+        # process in two blocks
+        counter.update([array1[:, :2], array2[:, :2], array3[:, :2]])
+        counter.update([array1[:, 2:], array2[:, 2:], array3[:, 2:]])
+
+        self.assertEqual(5, counter.pixelCount)
+        self.assertArrayEqual(np.array([2, 2]), counter.categorySizess[0])
+        self.assertArrayEqual(np.array([4, 1]), counter.categorySizess[1])
+        self.assertArrayEqual(np.array([3, 2]), counter.categorySizess[2])
+        self.assertArrayEqual(np.array([[1, 1], [2, 0]]), counter.linkSizess[0])  # 0 is not a category
+        self.assertArrayEqual(np.array([[2, 2], [1, 0]]), counter.linkSizess[1])
+
+    def test_tooFewLayers(self):
+        with self.assertRaises(ValueError):
+            TransitionCounter([[1, 2]])
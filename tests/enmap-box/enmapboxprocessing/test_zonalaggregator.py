@@ -0,0 +1,69 @@
+import numpy as np
+
+from enmapboxprocessing.testcase import TestCase
+from enmapboxprocessing.zonalaggregator import ZonalAggregator
+
+
+class TestZonalAggregator(TestCase):
+
+    def setUp(self):
+        np.random.seed(42)
+        self.zones = np.random.choice([0, 1, 5, 3], (30, 40))
+        self.array = np.random.uniform(0, 100, (2, 30, 40))
+        self.marray = np.random.uniform(0, 1, (2, 30, 40)) > 0.1
+
+    def test_statistics(self):
+        aggregator = ZonalAggregator([1, 5, 3, 7], 2)
+        # process in two blocks
+        aggregator.update(self.zones[:10], self.array[:, :10], self.marray[:, :10])
+        aggregator.update(self.zones[10:], self.array[:, 10:], self.marray[:, 10:])
+
+        for bandIndex in range(2):
+            for zoneIndex, zoneValue in enumerate([1, 5, 3]):
+                values = self.array[bandIndex][(self.zones == zoneValue) & self.marray[bandIndex]]
+                self.assertEqual(len(values), aggregator.count[bandIndex, zoneIndex])
+                self.assertAlmostEqual(np.sum(values), aggregator.sum[bandIndex, zoneIndex])
+                self.assertAlmostEqual(np.mean(values), aggregator.mean()[bandIndex, zoneIndex])
+                self.assertAlmostEqual(np.std(values), aggregator.standardDeviation()[bandIndex, zoneIndex])
+                self.assertEqual(np.min(values), aggregator.minimum[bandIndex, zoneIndex])
+                self.assertEqual(np.max(values), aggregator.maximum[bandIndex, zoneIndex])
+        # zone 7 is empty
+        self.assertArrayEqual(np.array([0, 0]), aggregator.count[:, 3])
+        self.assertTrue(np.all(np.isnan(aggregator.mean()[:, 3])))
+
+    def test_quantiles(self):
+        aggregator = ZonalAggregator([1, 5, 3], 2, [(0., 100.), (0., 100.)], 1000)
+        aggregator.update(self.zones, self.array, self.marray)
+        p0, p50, p100 = aggregator.quantiles([0, 50, 100])
+        for bandIndex in range(2):
+            for zoneIndex, zoneValue in enumerate([1, 5, 3]):
+                values = self.array[bandIndex][(self.zones == zoneValue) & self.marray[bandIndex]]
+                self.assertEqual(np.min(values), p0[bandIndex, zoneIndex])
+                self.assertEqual(np.max(values), p100[bandIndex, zoneIndex])
+                self.assertLess(abs(np.median(values) - p50[bandIndex, zoneIndex]), 1.)
+
+    def test_sparseHistogram(self):
+        dense = ZonalAggregator([1, 5, 3, 7], 2, [(0., 100.), (0., 100.)], 1000)
+        self.assertIsNotNone(dense.histogram)
+        dense.update(self.zones, self.array, self.marray)
+        denseHistogramSize = ZonalAggregator.DenseHistogramSize
+        ZonalAggregator.DenseHistogramSize = 0
+        try:
+            sparse = ZonalAggregator([1, 5, 3, 7], 2, [(0., 100.), (0., 100.)], 1000)
+        finally:
+            ZonalAggregator.DenseHistogramSize = denseHistogramSize
+        self.assertIsNone(sparse.histogram)
+        # process in two blocks
+        sparse.update(self.zones[:10], self.array[:, :10], self.marray[:, :10])
+        sparse.update(self.zones[10:], self.array[:, 10:], self.marray[:, 10:])
+
+        for a, b in zip(dense.histogramEntries(), sparse.histogramEntries()):
+            self.assertArrayEqual(a, b)
+        for a, b in zip(dense.quantiles([0, 25, 50, 100]), sparse.quantiles([0, 25, 50, 100])):
+            np.testing.assert_array_equal(a, b)  # NaN for the empty zone 7
+        self.assertTrue(np.all(np.isnan(sparse.quantiles([50])[0][:, 3])))  # zone 7 is empty
+
+    def test_quantilesWithoutHistogram(self):
+        aggregator = ZonalAggregator([1], 1)
+        with self.assertRaises(ValueError):
+            aggregator.quantiles([50])